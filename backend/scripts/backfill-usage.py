@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import logging
+
+from agents import DEFAULT_AGENT, get_agent
+from db_manager import DatabaseManager, schema_app_data
+from memory import initialize_database
+from migrations import SCHEMA_VERSION_TABLE
+
+
+async def backfill(db_manager: DatabaseManager, agent_id: str, limit: int | None) -> int:
+    # Conversations started before the counters existed, with what the counters hold so far
+    rows = db_manager.execute_query(
+        f"""
+        SELECT c.thread_id, c.user_id, c.created_at,
+               COALESCE(u.user_messages, 0), COALESCE(u.ai_messages, 0)
+        FROM {schema_app_data}.conversations c
+        LEFT JOIN {schema_app_data}.conversation_usage u USING (thread_id)
+        WHERE NOT COALESCE(u.backfilled, FALSE)
+          AND c.created_at < (SELECT applied_at FROM {SCHEMA_VERSION_TABLE} WHERE version = 4)
+        ORDER BY c.created_at
+        LIMIT %s
+        """,
+        (limit,),
+        label="usage.backfill",
+    )
+
+    agent = get_agent(agent_id)
+    async with initialize_database() as saver:
+        agent.checkpointer = saver
+        for thread_id, user_id, created_at, counted_user, counted_ai in rows:
+            state = await agent.aget_state(config={"configurable": {"thread_id": str(thread_id)}})
+            messages = [m for m in state.values.get("messages", []) if m is not None]
+            user_messages = sum(m.type == "human" for m in messages)
+            ai_messages = sum(m.type == "ai" for m in messages)
+            db_manager.record_run_usage(
+                thread_id,
+                user_id,
+                max(user_messages - counted_user, 0),
+                max(ai_messages - counted_ai, 0),
+                runs=0,
+                at=created_at,
+                backfill=True,
+            )
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add the messages of conversations started before the usage counters "
+        "existed to the counters, from their checkpointed state. Run it once after upgrading; "
+        "conversations already backfilled are skipped, so it can be interrupted and re-run."
+    )
+    parser.add_argument("--agent", default=DEFAULT_AGENT, help="Agent whose state is read")
+    parser.add_argument(
+        "--limit", type=int, default=None, help="Backfill at most this many conversations"
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    count = asyncio.run(backfill(DatabaseManager(), args.agent, args.limit))
+    print(f"Backfilled the usage counters of {count} conversations.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+def start_service(workers: int, port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "service:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=SRC_DIR,
+        env={**os.environ, "PYTHONPATH": str(SRC_DIR)},
+    )
+
+
+def wait_until_healthy(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=5).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"The service at {base_url} did not become healthy in {timeout:.0f}s")
+
+
+async def load(
+    base_url: str, path: str, headers: dict, concurrency: int, duration: float
+) -> tuple[int, int, list[float]]:
+    """Request `path` from `concurrency` clients for `duration` seconds."""
+    latencies: list[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def client(http: httpx.AsyncClient) -> None:
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await http.get(path, headers=headers)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as http:
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+    return len(latencies), errors, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the service's throughput for increasing worker counts. Each run "
+        "starts uvicorn with that many workers against the configured database, loads one "
+        "endpoint, then stops it. Run the load generator on another machine for large counts, "
+        "since it competes with the workers for CPU."
+    )
+    parser.add_argument(
+        "--workers",
+        default="1,2,4,8",
+        help="Comma-separated worker counts; scaling is relative to the first (default: 1,2,4,8)",
+    )
+    parser.add_argument("--path", default="/info", help="Endpoint to request (default: /info)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load per run")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds of load not measured")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--token", default=os.getenv("AUTH_SECRET"), help="Bearer token")
+
+    args = parser.parse_args()
+    base_url = f"http://127.0.0.1:{args.port}"
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+
+    print(f"{args.path}, {args.concurrency} clients, {args.duration:.0f}s per run", end=", ")
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'workers':>7} {'req/s':>9} {'scaling':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    baseline = None
+    for workers in (int(count) for count in args.workers.split(",")):
+        service = start_service(workers, args.port)
+        try:
+            wait_until_healthy(base_url, timeout=60)
+            asyncio.run(load(base_url, args.path, headers, args.concurrency, args.warmup))
+            ok, errors, latencies = asyncio.run(
+                load(base_url, args.path, headers, args.concurrency, args.duration)
+            )
+        finally:
+            service.terminate()
+            service.wait()
+        throughput = ok / args.duration
+        baseline = baseline or throughput
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+        print(
+            f"{workers:>7} {throughput:>9.0f} {throughput / baseline:>7.2f}x "
+            f"{quantiles[49] * 1000:>8.1f} {quantiles[98] * 1000:>8.1f} {errors:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import argparse
+import contextlib
 import os
 import tempfile
 from urllib.parse import urlparse
@@ -114,6 +115,11 @@ def main():
         action="store_true",
         help="Generate embeddings (requires OpenAI API key)",
     )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Drop the block search indexes while loading and rebuild them once at the end",
+    )
 
     args = parser.parse_args()
 
@@ -147,13 +153,14 @@ def main():
 
         processed_count = 0
         failed_count = 0
-        for pdf_url in pdf_urls:
-            source_id = index_pdf_from_url(pdf_url, db_manager, rag_system, temp_dir)
-            if source_id is not None:
-                processed_count += 1
-            else:
-                failed_count += 1
-            print("-" * 20)
+        with rag_system.bulk_load() if args.bulk else contextlib.nullcontext():
+            for pdf_url in pdf_urls:
+                source_id = index_pdf_from_url(pdf_url, db_manager, rag_system, temp_dir)
+                if source_id is not None:
+                    processed_count += 1
+                else:
+                    failed_count += 1
+                print("-" * 20)
 
         print(
             f"\nProcessing complete. Successfully processed: {processed_count}, Failed/Skipped: {failed_count}"
@@ -0,0 +1,59 @@
+import argparse
+import logging
+import signal
+
+from db_manager import DatabaseManager
+from indexing_worker import IndexingWorker
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index document sources from the shared indexing job queue. "
+        "Run as many workers as needed, on any number of machines."
+    )
+    parser.add_argument("--worker-id", help="Worker identifier (default: hostname:pid)")
+    parser.add_argument("--batch-size", type=int, help="Jobs claimed per round trip")
+    parser.add_argument("--lease-seconds", type=int, help="Lease duration renewed by heartbeats")
+    parser.add_argument(
+        "--poll-interval", type=float, help="Seconds to wait when the queue is empty"
+    )
+    parser.add_argument(
+        "--enqueue",
+        action="store_true",
+        help="Queue a job for every document source that is not indexed yet before starting",
+    )
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="With --enqueue, also requeue sources whose job already finished",
+    )
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per queued job")
+    parser.add_argument(
+        "--once", action="store_true", help="Exit when the queue is empty instead of polling"
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.enqueue:
+        queued = DatabaseManager().enqueue_indexing_jobs(
+            max_attempts=args.max_attempts, reindex=args.reindex
+        )
+        print(f"Queued {queued} indexing jobs.")
+
+    worker = IndexingWorker(
+        worker_id=args.worker_id,
+        batch_size=args.batch_size,
+        lease_seconds=args.lease_seconds,
+        poll_interval=args.poll_interval,
+    )
+    # Stop claiming on SIGTERM/SIGINT; the job in progress is finished first
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+
+    processed = worker.run(once=args.once)
+    print(f"Worker {worker.worker_id} processed {processed} jobs.")
+
+
+if __name__ == "__main__":
+    main()
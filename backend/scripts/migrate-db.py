@@ -0,0 +1,41 @@
+import argparse
+import logging
+
+import migrations
+from db_manager import DatabaseManager
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Apply the pending database schema migrations. Run it before starting new "
+        "code when the service and workers run with DB_AUTO_MIGRATE=false."
+    )
+    parser.add_argument(
+        "--status", action="store_true", help="Only show the applied and pending migrations"
+    )
+    parser.add_argument(
+        "--target", type=int, default=None, help="Stop after this version (default: latest)"
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    DatabaseManager.check_schema = False
+    db_manager = DatabaseManager()
+
+    version = migrations.current_version(db_manager)
+    pending = [m for m in migrations.MIGRATIONS if m.version > version]
+    print(f"Schema version {version}, latest {migrations.LATEST_VERSION}.")
+    if args.status:
+        for migration in pending:
+            print(f"  pending: {migration.version} {migration.name}")
+        return
+
+    applied = migrations.migrate(db_manager, target=args.target)
+    for migration in applied:
+        print(f"  applied: {migration.version} {migration.name}")
+    print(f"Applied {len(applied)} migrations.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import logging
+from itertools import islice
+
+from db_manager import DatabaseManager
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Move uploaded file contents still stored inline in the files table to the "
+        "blob store (BLOB_STORE_BACKEND / BLOB_STORE_PATH). Safe to interrupt and re-run."
+    )
+    parser.add_argument("--batch-size", type=int, default=50, help="Files moved per transaction")
+    parser.add_argument(
+        "--gc",
+        action="store_true",
+        help="Also delete stored blobs that no file references any more",
+    )
+    parser.add_argument(
+        "--grace-hours",
+        type=float,
+        default=24,
+        help="With --gc, keep unreferenced blobs stored more recently than this",
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    db_manager = DatabaseManager()
+    moved = db_manager.offload_file_contents(batch_size=args.batch_size)
+    print(f"Moved {moved} file contents to the blob store.")
+
+    if args.gc:
+        store = db_manager.blob_store
+        deleted = 0
+        digests_iter = store.iter_digests()
+        while digests := list(islice(digests_iter, 1000)):
+            unused = db_manager.unreferenced_blobs(digests)
+            deleted += store.delete_unused(unused, grace_seconds=args.grace_hours * 3600)
+        print(f"Deleted {deleted} unreferenced blobs.")
+
+    print("Run VACUUM FULL (or pg_repack) on the files table to return the freed space to the OS.")
+
+
+if __name__ == "__main__":
+    main()
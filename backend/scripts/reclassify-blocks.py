@@ -0,0 +1,28 @@
+import argparse
+import logging
+
+from reclassify import Reclassifier
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-run the content classifier over stored blocks without re-parsing PDFs. "
+        "Only documents classified with an older classifier version are updated."
+    )
+    parser.add_argument("--document", action="append", help="Only reclassify this document name")
+    parser.add_argument("--workers", type=int, help="Classifier processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Blocks per UPDATE batch")
+    parser.add_argument(
+        "--force", action="store_true", help="Reclassify every document, whatever its version"
+    )
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    reclassifier = Reclassifier(workers=args.workers, batch_size=args.batch_size)
+    count = reclassifier.run(names=args.document, force=args.force)
+    print(f"Reclassified {count} documents with classifier version {reclassifier.version}.")
+
+
+if __name__ == "__main__":
+    main()
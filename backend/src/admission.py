@@ -0,0 +1,249 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Hashable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+try:
+    from .lru import LRUCache
+    from .metrics import REGISTRY
+except ImportError:
+    from lru import LRUCache
+    from metrics import REGISTRY
+
+admission_wait_seconds = REGISTRY.histogram(
+    "admission_wait_seconds", "Time agent runs waited in the admission queue.", ["outcome"]
+)
+admission_rejections = REGISTRY.counter(
+    "admission_rejections_total", "Agent runs refused by admission control.", ["reason"]
+)
+
+
+class AdmissionRejected(RuntimeError):
+    """The run was refused; the caller should answer `status_code` with Retry-After."""
+
+    def __init__(self, detail: str, status_code: int, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+@dataclass(eq=False)
+class _Waiter:
+    user: Hashable
+    admitted: asyncio.Future
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+
+class Admission:
+    """A run accepted by the controller: queued until `wait` returns, then holding a slot."""
+
+    def __init__(self, controller: "AdmissionController", waiter: _Waiter):
+        self._controller = controller
+        self._waiter = waiter
+        self._released = False
+
+    async def wait(self) -> AsyncIterator[int]:
+        """
+        Yield the run's queue position each time it changes, and return once it may start.
+        Raises AdmissionRejected when it waited longer than the controller's queue timeout.
+        """
+        waiter = self._waiter
+        deadline = waiter.enqueued_at + self._controller.queue_timeout
+        position = None
+        try:
+            while not waiter.admitted.done():
+                waiter.changed.clear()
+                current = self._controller.position(waiter)
+                if current is not None and current != position:
+                    position = current
+                    yield position
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise self._controller._reject("queue_timeout", 503)
+                try:
+                    await asyncio.wait_for(waiter.changed.wait(), remaining)
+                except TimeoutError:
+                    continue
+        except BaseException:
+            self._controller._abandon(waiter)
+            raise
+        admission_wait_seconds.observe(time.monotonic() - waiter.enqueued_at, outcome="admitted")
+
+    def release(self) -> None:
+        """Give the slot back, or leave the queue if the run never started. Idempotent."""
+        if not self._released:
+            self._released = True
+            self._controller._abandon(self._waiter)
+
+
+class AdmissionController:
+    """
+    Admission control for agent runs of one process: at most `max_running` runs at once and
+    `max_running_per_user` per user. The others wait in a fair queue: the next run is taken
+    from the user with the fewest runs going, then the one served least recently, so one
+    user's burst does not hold everyone else back.
+
+    A run that would wait is refused at once with 429 when its user already has
+    `max_queued_per_user` runs waiting, or with 503 when `max_queued` runs wait in total;
+    runs still queued after `queue_timeout` seconds are refused with 503. A running limit of
+    0 means unlimited, a queue limit of 0 means runs never wait.
+    """
+
+    def __init__(
+        self,
+        max_running: int | None = None,
+        max_running_per_user: int | None = None,
+        max_queued: int | None = None,
+        max_queued_per_user: int | None = None,
+        queue_timeout: float | None = None,
+    ):
+        def setting(value, name, default):
+            return value if value is not None else type(default)(os.getenv(name, default))
+
+        self.max_running = setting(max_running, "ADMISSION_MAX_RUNNING", 32)
+        self.max_running_per_user = setting(max_running_per_user, "ADMISSION_MAX_PER_USER", 2)
+        self.max_queued = setting(max_queued, "ADMISSION_MAX_QUEUED", 128)
+        self.max_queued_per_user = setting(max_queued_per_user, "ADMISSION_MAX_QUEUED_PER_USER", 4)
+        self.queue_timeout = setting(queue_timeout, "ADMISSION_QUEUE_TIMEOUT", 60.0)
+        self._running: dict[Hashable, int] = {}
+        self._queues: dict[Hashable, deque[_Waiter]] = {}
+        # Turn at which each recently active user was last admitted
+        self._served: LRUCache[Hashable, int] = LRUCache(4096)
+        self._turns = itertools.count(1)
+        self._queued = 0
+        # Moving average of run durations, for Retry-After
+        self._run_seconds = 10.0
+        self._started: dict[_Waiter, float] = {}
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "running": self.running,
+            "queued": self._queued,
+            "users_running": len(self._running),
+            "users_queued": len(self._queues),
+        }
+
+    def enqueue(self, user: Hashable) -> Admission:
+        """Queue a run of `user`, or raise AdmissionRejected when the queue is full."""
+        queue = self._queues.get(user, ())
+        if (
+            queue
+            or (
+                self.max_running_per_user
+                and self._running.get(user, 0) >= self.max_running_per_user
+            )
+            or (self.max_running and self.running >= self.max_running)
+        ):
+            if len(queue) >= self.max_queued_per_user:
+                raise self._reject("user_limit", 429)
+            if self._queued >= self.max_queued:
+                raise self._reject("queue_full", 503)
+        waiter = _Waiter(user, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(user, deque()).append(waiter)
+        self._queued += 1
+        self._dispatch()
+        return Admission(self, waiter)
+
+    @asynccontextmanager
+    async def admit(self, user: Hashable) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block, waiting for it without position updates."""
+        admission = self.enqueue(user)
+        try:
+            async for _ in admission.wait():
+                pass
+            yield
+        finally:
+            admission.release()
+
+    def position(self, waiter: _Waiter) -> int | None:
+        """1-based place of a queued run, None once it left the queue."""
+        queues = [self._queues[user] for user in self._turn_order()]
+        ahead = 0
+        for depth in range(max(map(len, queues), default=0)):
+            for queue in queues:
+                if depth < len(queue):
+                    ahead += 1
+                    if queue[depth] is waiter:
+                        return ahead
+        return None
+
+    def _turn_order(self) -> list[Hashable]:
+        """Users with queued runs, fewest running first, then least recently served."""
+        return sorted(
+            self._queues, key=lambda user: (self._running.get(user, 0), self._served.get(user) or 0)
+        )
+
+    def _dispatch(self) -> None:
+        admitted = False
+        while not self.max_running or self.running < self.max_running:
+            user = next(
+                (
+                    user
+                    for user in self._turn_order()
+                    if not self.max_running_per_user
+                    or self._running.get(user, 0) < self.max_running_per_user
+                ),
+                None,
+            )
+            if user is None:
+                break
+            queue = self._queues[user]
+            waiter = queue.popleft()
+            self._queued -= 1
+            if not queue:
+                del self._queues[user]
+            self._running[user] = self._running.get(user, 0) + 1
+            self._served.put(user, next(self._turns))
+            self._started[waiter] = time.monotonic()
+            waiter.admitted.set_result(None)
+            waiter.changed.set()
+            admitted = True
+        if admitted:
+            for queue in self._queues.values():
+                for waiter in queue:
+                    waiter.changed.set()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        started = self._started.pop(waiter, None)
+        if started is not None:
+            self._run_seconds = 0.8 * self._run_seconds + 0.2 * (time.monotonic() - started)
+            self._running[waiter.user] -= 1
+            if not self._running[waiter.user]:
+                del self._running[waiter.user]
+        else:
+            queue = self._queues.get(waiter.user)
+            if queue is None or waiter not in queue:
+                return
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del self._queues[waiter.user]
+            admission_wait_seconds.observe(
+                time.monotonic() - waiter.enqueued_at, outcome="abandoned"
+            )
+            for queue in self._queues.values():
+                for other in queue:
+                    other.changed.set()
+        self._dispatch()
+
+    def _reject(self, reason: str, status_code: int) -> AdmissionRejected:
+        admission_rejections.inc(reason=reason)
+        # Roughly when enough runs will have finished to make room
+        slots = max(self.max_running, 1)
+        retry_after = math.ceil(self._run_seconds * (self._queued + 1) / slots)
+        detail = (
+            "Too many concurrent requests for this user."
+            if status_code == 429
+            else "The service is busy, please retry later."
+        )
+        return AdmissionRejected(detail, status_code, min(max(retry_after, 1), 300))
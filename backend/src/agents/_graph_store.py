@@ -1,11 +1,49 @@
+import hashlib
+import json
+import logging
+import os
 import time
 import uuid
+from dataclasses import dataclass
 from threading import Timer
 from uuid import UUID
 
+from async_db_manager import AsyncDatabaseManager
 from db_manager import DatabaseManager
+from lazy import reset_after_fork
+from leader import LeaderLock
+from lru import LRUCache
 
+logger = logging.getLogger(__name__)
 
+# Seconds between two runs of the graph partition maintenance
+MAINTENANCE_INTERVAL = 300
+
+
+@dataclass(frozen=True, slots=True)
+class StoredGraph:
+    """A graph as served by /graph: its Plotly JSON, a strong ETag and its expiry."""
+
+    body: bytes
+    etag: str
+    expires_at: float
+
+    @classmethod
+    def from_json(cls, fig_json, expires_in: float) -> "StoredGraph":
+        body = fig_json.encode() if isinstance(fig_json, str) else json.dumps(fig_json).encode()
+        return cls(
+            body=body,
+            etag=f'"{hashlib.sha256(body).hexdigest()}"',
+            expires_at=time.time() + expires_in,
+        )
+
+    @property
+    def max_age(self) -> int:
+        """Seconds the graph may still be served, and cached by clients."""
+        return max(int(self.expires_at - time.time()), 0)
+
+
+@reset_after_fork
 class GraphStore:
     _instance = None
 
@@ -15,42 +53,103 @@ class GraphStore:
             cls._instance._initialized = False
         return cls._instance
 
-    def __init__(self, expiry_seconds=3600):
+    def __init__(self, expiry_seconds=3600, retention_days=None):
         if self._initialized:
             return
 
         self.db_manager = DatabaseManager()
         self.default_expiry_seconds = expiry_seconds
+        # Expired graphs are no longer served but kept this long, by whole monthly partitions
+        self.retention_days = (
+            retention_days
+            if retention_days is not None
+            else int(os.getenv("GRAPH_RETENTION_DAYS", "90"))
+        )
+        # Graphs never change once stored: hot ones are served from memory until they expire
+        self._cache: LRUCache[UUID, StoredGraph] = LRUCache(
+            int(os.getenv("GRAPH_CACHE_SIZE", "128"))
+        )
+        self._leader: LeaderLock | None = None
+        self._timer: Timer | None = None
+        self._maintaining = False
         self._initialized = True
 
-        self._start_cleanup_timer()
-
     def store_graph(self, fig_json, expiry_seconds=None):
-        """Stores graph JSON, returns its ID."""
-        graph_id = uuid.uuid4()
+        """Stores graph JSON, returns its ID (the existing one for an identical graph)."""
         expiry = expiry_seconds if expiry_seconds is not None else self.default_expiry_seconds
         expiry_time = time.time() + expiry
-        self.db_manager.save_graph(graph_id, fig_json, expiry_time)
+        graph_id = self.db_manager.save_graph(
+            uuid.uuid4(), fig_json, expiry_time, self.retention_days
+        )
+        self._remember(graph_id, {"graph_json": fig_json, "expires_in": expiry})
         return str(graph_id)
 
     def get_graph(self, graph_id_str: str):
         """Retrieves graph JSON by ID if not expired."""
+        graph = self.get_stored_graph(graph_id_str)
+        return graph.body.decode() if graph else None
+
+    def get_stored_graph(self, graph_id_str: str) -> StoredGraph | None:
         try:
             graph_id_uuid = UUID(graph_id_str)
         except ValueError:
             return None
-        return self.db_manager.get_graph(graph_id_uuid)
+        graph = self._cache.get(graph_id_uuid)
+        if graph is None:
+            graph = self._remember(graph_id_uuid, self.db_manager.get_graph_entry(graph_id_uuid))
+        return graph
+
+    async def aget_stored_graph(self, graph_id_str: str) -> StoredGraph | None:
+        try:
+            graph_id_uuid = UUID(graph_id_str)
+        except ValueError:
+            return None
+        graph = self._cache.get(graph_id_uuid)
+        if graph is None:
+            entry = await AsyncDatabaseManager(self.db_manager).get_graph_entry(graph_id_uuid)
+            graph = self._remember(graph_id_uuid, entry)
+        return graph
+
+    def _remember(self, graph_id: UUID, entry: dict | None) -> StoredGraph | None:
+        if entry is None or entry["graph_json"] is None:
+            return None
+        graph = StoredGraph.from_json(entry["graph_json"], entry["expires_in"])
+        self._cache.put(graph_id, graph, ttl=entry["expires_in"])
+        return graph
 
     def _cleanup_expired(self):
-        """Calls the database manager to delete expired graphs."""
-        # self.db_manager.delete_expired_graphs()
-        # We actually don't want to delete expired graphs
+        """Drops the partitions of graphs past their retention period."""
+        try:
+            self.db_manager.maintain_graph_partitions(self.retention_days)
+        except Exception as e:
+            logger.warning(f"Could not maintain the graph partitions: {e}")
+
+    def start_maintenance(self, leader: LeaderLock | None = None):
+        """
+        Maintain the graph partitions from this process every MAINTENANCE_INTERVAL seconds.
+        With `leader`, only while it holds that lock: one worker does it for all of them.
+        """
+        if self._maintaining:
+            return
+        self._leader = leader
+        self._maintaining = True
+        self._start_cleanup_timer()
 
-    def _start_cleanup_timer(self):
-        self._cleanup_expired()
-        t = Timer(300, self._start_cleanup_timer)
-        t.daemon = True
-        t.start()
+    def stop_maintenance(self):
+        self._maintaining = False
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._leader is not None:
+            self._leader.release()
 
+    def _start_cleanup_timer(self, delay: float = 0):
+        # The first run happens in the timer thread too, off the caller's event loop
+        self._timer = Timer(delay, self._cleanup_and_reschedule)
+        self._timer.daemon = True
+        self._timer.start()
 
-graph_store = GraphStore()
+    def _cleanup_and_reschedule(self):
+        if self._leader is None or self._leader.is_leader():
+            self._cleanup_expired()
+        if self._maintaining:
+            self._start_cleanup_timer(MAINTENANCE_INTERVAL)
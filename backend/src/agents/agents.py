@@ -1,3 +1,4 @@
+from collections.abc import Callable
 from dataclasses import dataclass
 
 from langgraph.pregel import Pregel
@@ -7,30 +8,38 @@ try:
 except ImportError:
     from src.schema import AgentInfo
 
-try:
-    from agents.pg_rag_assistant import pg_rag_assistant
-except ImportError:
-    from .pg_rag_assistant import pg_rag_assistant
-
 DEFAULT_AGENT = "pg_rag_assistant"
 
 
+def _load_pg_rag_assistant() -> Pregel:
+    try:
+        from agents.pg_rag_assistant import pg_rag_assistant
+    except ImportError:
+        from .pg_rag_assistant import pg_rag_assistant
+    return pg_rag_assistant
+
+
 @dataclass
 class Agent:
     description: str
-    graph: Pregel
+    graph: Pregel | None = None
+    # Instead of `graph`: imports and compiles it on first use, with its tools
+    load: Callable[[], Pregel] | None = None
 
 
 agents: dict[str, Agent] = {
     "pg_rag_assistant": Agent(
         description="An assistant that has access to a postgres database, plotly and pdf visualisation tools.",
-        graph=pg_rag_assistant,
+        load=_load_pg_rag_assistant,
     )
 }
 
 
 def get_agent(agent_id: str) -> Pregel:
-    return agents[agent_id].graph
+    agent = agents[agent_id]
+    if agent.graph is None and agent.load is not None:
+        agent.graph = agent.load()
+    return agent.graph
 
 
 def get_all_agent_info() -> list[AgentInfo]:
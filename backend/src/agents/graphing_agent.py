@@ -1,3 +1,4 @@
+import logging
 from typing import Any
 
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
@@ -7,6 +8,8 @@ from langgraph.prebuilt import ToolNode
 from agents.tools_plotly import tool_create_graph
 from core import get_model, settings
 
+logger = logging.getLogger(__name__)
+
 
 class GraphingAgentState(MessagesState, total=False):
     """
@@ -331,13 +334,13 @@ def handle_tool_result(state: GraphingAgentState) -> GraphingAgentState:
 
         if is_sql_error or retries_exhausted:
             # Don't retry SQL errors or if max retries reached
-            print(
+            logger.warning(
                 f"Graphing Agent: {'SQL Error' if is_sql_error else 'Max retries reached'}. Stopping. Error: {tool_output}"
             )
             return {"error": tool_output}  # Store final error and signal end
         else:
             # Increment retry count for non-SQL errors
-            print(
+            logger.warning(
                 f"Graphing Agent: Tool failed (Attempt {current_retry_count + 1}). Retrying. Error: {tool_output}"
             )
             return {
@@ -346,7 +349,7 @@ def handle_tool_result(state: GraphingAgentState) -> GraphingAgentState:
             }  # Update retry count, keep error for next model call
     else:
         # Success - tool returned a graph_id
-        print(f"Graphing Agent: Tool succeeded. Graph ID: {tool_output}")
+        logger.info(f"Graphing Agent: Tool succeeded. Graph ID: {tool_output}")
         return {
             "graph_id": tool_output,
             "error": None,
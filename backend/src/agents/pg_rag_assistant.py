@@ -1,5 +1,6 @@
 import os
 from datetime import datetime
+from functools import cache
 from typing import Literal
 
 from dotenv import load_dotenv
@@ -15,7 +16,6 @@ from agents.rag_tool import highlight_pdf, query_rag, query_rag_from_id
 from agents.tool_graphing_agent import tool_graphing_agent
 from agents.tools_pg import execute_sql
 from core import get_model, settings
-from memory.postgres import get_postgres_saver
 
 load_dotenv()
 
@@ -32,27 +32,31 @@ class AgentState(MessagesState, total=False):
 
 tools = [execute_sql, tool_graphing_agent, query_rag, query_rag_from_id, highlight_pdf]
 
-current_date = datetime.now().strftime("%B %d, %Y")
 
-instructions = os.getenv("SYSTEM_PROMPT", False)
-if not instructions:
-    system_prompt = os.getenv("SYSTEM_PROMPT_PATH")
-    with open(system_prompt, encoding="utf-8") as f:
-        instructions = f.read()
+@cache
+def get_instructions() -> str:
+    """The system prompt, read from SYSTEM_PROMPT or SYSTEM_PROMPT_PATH on first model call."""
+    current_date = datetime.now().strftime("%B %d, %Y")
 
-instructions = (
-    instructions.replace("{", "{{")
-    .replace("}", "}}")
-    .replace("/././/", "{")
-    .replace("//././.", "}")
-)
-instructions = instructions.replace("CURRENT_DATE", current_date)
+    instructions = os.getenv("SYSTEM_PROMPT", False)
+    if not instructions:
+        system_prompt = os.getenv("SYSTEM_PROMPT_PATH")
+        with open(system_prompt, encoding="utf-8") as f:
+            instructions = f.read()
+
+    instructions = (
+        instructions.replace("{", "{{")
+        .replace("}", "}}")
+        .replace("/././/", "{")
+        .replace("//././.", "}")
+    )
+    return instructions.replace("CURRENT_DATE", current_date)
 
 
 def wrap_model(model: BaseChatModel) -> RunnableSerializable[AgentState, AIMessage]:
     model = model.bind_tools(tools, tool_choice="auto")
     preprocessor = RunnableLambda(
-        lambda state: [SystemMessage(content=instructions)] + state["messages"],
+        lambda state: [SystemMessage(content=get_instructions())] + state["messages"],
         name="StateModifier",
     )
     return preprocessor | model
@@ -145,4 +149,5 @@ def pending_tool_calls(state: AgentState) -> Literal["tools", "done"]:
 
 agent.add_conditional_edges("model", pending_tool_calls, {"tools": "tools", "done": END})
 
-pg_rag_assistant = agent.compile(checkpointer=get_postgres_saver())
+# The checkpointer is attached by the service lifespan once the saver is set up
+pg_rag_assistant = agent.compile()
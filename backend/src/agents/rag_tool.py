@@ -1,4 +1,5 @@
 import json
+import logging
 import os
 from typing import Any
 
@@ -6,11 +7,23 @@ from dotenv.main import load_dotenv
 from langchain_core.tools import BaseTool, tool
 
 from db_manager import schema_app_data  # Import schema_app_data
-from rag_system import RAGSystem
+from rag_system import get_rag_system
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
-# Initialize the RAG system
-rag_system = RAGSystem()
+
+
+def _source_args_error(
+    source_names: list[str] | None, source_query: str | None
+) -> dict[str, str] | None:
+    if source_names is not None and source_query is not None:
+        return {
+            "error": "Provide either 'source_names' (list of strings) or 'source_query' (SQL string), but not both."
+        }
+    if source_query and not source_query.strip().lower().startswith("select"):
+        return {"error": "Invalid source_query: Must start with SELECT if provided."}
+    return None
 
 
 def query_rag(
@@ -50,16 +63,11 @@ def query_rag(
 
     ## if confident in nlm ingestor output, use tag: Filter by tag: 'header', 'list_item', 'para' or 'table'
 
-    if source_names is not None and source_query is not None:
-        return {
-            "error": "Provide either 'source_names' (list of strings) or 'source_query' (SQL string), but not both."
-        }
-
-    if source_query and not source_query.strip().lower().startswith("select"):
-        return {"error": "Invalid source_query: Must start with SELECT if provided."}
+    if error := _source_args_error(source_names, source_query):
+        return error
 
     try:
-        result = rag_system.query(
+        result = get_rag_system().query(
             user_query=keywords,
             source_query=source_query,
             source_names=source_names,
@@ -113,16 +121,11 @@ def query_rag_lds(
             - total_document_count (int): Number of unique documents containing at least one matching block.
         Or an error dictionary if something goes wrong.
     """
-    if source_names is not None and source_query is not None:
-        return {
-            "error": "Provide either 'source_names' (list of strings) or 'source_query' (SQL string), but not both."
-        }
-
-    if source_query and not source_query.strip().lower().startswith("select"):
-        return {"error": "Invalid source_query: Must start with SELECT if provided."}
+    if error := _source_args_error(source_names, source_query):
+        return error
 
     try:
-        result = rag_system.query(
+        result = get_rag_system().query(
             user_query=keywords,
             source_query=source_query,
             source_names=source_names,
@@ -140,24 +143,73 @@ def query_rag_lds(
         return {"error": f"Error during search: {str(e)}"}
 
 
-def query_rag_from_id_func(
-    block_indices: int | list[int],
-    source_name: str | None = None,
+async def aquery_rag(
+    keywords: list[str],
+    source_query: str | None = None,
+    source_names: list[str] | None = None,
     get_children: bool = True,
-    get_surrounding: bool = True,
-) -> list[dict[str, Any]]:  # Return type changed to List[Dict]
-    """
-    Get specific document blocks by their indices, optionally including surrounding blocks.
+    page: int | None = None,
+    offset: int = 0,
+    limit: int = 20,
+    count_only: bool = False,
+) -> dict[str, Any] | str:
+    """Async `query_rag`, run on the asyncio connection pool."""
+    if error := _source_args_error(source_names, source_query):
+        return error
+    try:
+        return await get_rag_system().aquery(
+            keywords,
+            source_query=source_query,
+            source_names=source_names,
+            offset=offset,
+            limit=limit,
+            page=page,
+            get_children=get_children,
+            count_only=count_only,
+        )
+    except Exception as e:
+        return {"error": f"Error during search: {str(e)}"}
 
-    Args:
-        block_indices: Block index or list of block indices to retrieve.
-        source_name: Name of the document (optional).
-        get_children: Whether to retrieve child blocks.
-        get_surrounding: Whether to retrieve the 2 blocks before and 2 after each specified index.
 
-    Returns:
-        List of dictionaries with text blocks information, or a list containing an error dictionary.
-    """
+async def aquery_rag_lds(
+    keywords: list[str],
+    source_query: str | None = None,
+    source_names: list[str] | None = None,
+    get_children: bool = True,
+    page: int | None = None,
+    offset: int = 0,
+    limit: int = 20,
+    content_type: str | None = None,
+    section_filter: list[str] | None = None,
+    demand_priority: int | None = None,
+    count_only: bool = False,
+) -> dict[str, Any] | str:
+    """Async `query_rag_lds`, run on the asyncio connection pool."""
+    if error := _source_args_error(source_names, source_query):
+        return error
+    try:
+        return await get_rag_system().aquery(
+            keywords,
+            source_query=source_query,
+            source_names=source_names,
+            offset=offset,
+            limit=limit,
+            page=page,
+            get_children=get_children,
+            content_type=content_type,
+            section_filter=section_filter,
+            demand_priority=demand_priority,
+            count_only=count_only,
+        )
+    except Exception as e:
+        return {"error": f"Error during search: {str(e)}"}
+
+
+def _indices_to_fetch(
+    block_indices: int | list[int], get_surrounding: bool
+) -> list[int] | list[dict[str, str]]:
+    """Normalise `block_indices`, widened to the 2 blocks around each with `get_surrounding`.
+    Returns a list containing an error dictionary on invalid input."""
     # Convert single index to list if needed
     if isinstance(block_indices, int | str):
         try:
@@ -187,62 +239,51 @@ def query_rag_from_id_func(
                         final_indices_to_fetch.add(surrounding_idx)
             except ValueError:
                 return [{"error": f"Invalid index '{idx_val}' in block_indices."}]
-        indices_to_fetch = sorted(list(final_indices_to_fetch))
-    else:
-        try:
-            indices_to_fetch = [int(idx_val) for idx_val in block_indices]
-        except ValueError:
-            return [{"error": "Invalid index in block_indices. All must be integers."}]
-
-    # Get blocks by the potentially expanded list of indices
-    blocks = rag_system.get_blocks_by_idx(indices_to_fetch, source_name, get_children)
-
-    if not blocks:  # get_blocks_by_idx should return a list
-        return [
-            {"error": "No blocks found with the provided indices"}
-        ]  # Return list with error dict
-
-    # Try to enrich blocks with classification metadata
+        return sorted(list(final_indices_to_fetch))
     try:
-        # Ensure blocks is a list of dicts and block_idx exists
-        block_indices_list = [
-            block["block_idx"]
-            for block in blocks
-            if isinstance(block, dict) and "block_idx" in block
-        ]
-        if block_indices_list:
-            metadata_query = f"""
-            SELECT
-                block_idx,
-                content_type,
-                section_type,
-                demand_priority
-            FROM
-                {schema_app_data}.rag_document_blocks
-            WHERE
-                block_idx IN ({', '.join(['%s'] * len(block_indices_list))})
-            """
-
-            metadata_results = rag_system.db_manager.execute_query(
-                metadata_query, tuple(block_indices_list)
-            )
+        return [int(idx_val) for idx_val in block_indices]
+    except ValueError:
+        return [{"error": "Invalid index in block_indices. All must be integers."}]
+
+
+def _metadata_query(blocks: list[dict[str, Any]]) -> tuple[str, tuple] | None:
+    # Ensure blocks is a list of dicts and block_idx exists
+    block_indices_list = [
+        block["block_idx"] for block in blocks if isinstance(block, dict) and "block_idx" in block
+    ]
+    if not block_indices_list:
+        return None
+    metadata_query = f"""
+    SELECT
+        block_idx,
+        content_type,
+        section_type,
+        demand_priority
+    FROM
+        {schema_app_data}.rag_document_blocks
+    WHERE
+        block_idx IN ({', '.join(['%s'] * len(block_indices_list))})
+    """
+    return metadata_query, tuple(block_indices_list)
+
+
+def _format_blocks(
+    blocks: list[dict[str, Any]], metadata_results: list[tuple] | None
+) -> list[dict[str, Any]]:
+    """Enrich blocks with classification metadata and keep the fields returned to the agent."""
+    metadata_lookup = {}
+    if metadata_results:
+        for row in metadata_results:
+            if row[1] or row[2] or row[3]:
+                metadata_lookup[row[0]] = {
+                    "content_type": row[1],
+                    "section_type": row[2],
+                    "demand_priority": row[3],
+                }
 
-            metadata_lookup = {}
-            if metadata_results:
-                for row in metadata_results:
-                    if row[1] or row[2] or row[3]:
-                        metadata_lookup[row[0]] = {
-                            "content_type": row[1],
-                            "section_type": row[2],
-                            "demand_priority": row[3],
-                        }
-
-            for block in blocks:
-                if isinstance(block, dict) and block.get("block_idx") in metadata_lookup:
-                    block.update(metadata_lookup[block["block_idx"]])
-    except Exception:
-        # Silently continue if enrichment fails, or log an error
-        pass
+    for block in blocks:
+        if isinstance(block, dict) and block.get("block_idx") in metadata_lookup:
+            block.update(metadata_lookup[block["block_idx"]])
 
     # Return enriched blocks information
     result_blocks = []
@@ -270,6 +311,78 @@ def query_rag_from_id_func(
     return result_blocks
 
 
+def query_rag_from_id_func(
+    block_indices: int | list[int],
+    source_name: str | None = None,
+    get_children: bool = True,
+    get_surrounding: bool = True,
+) -> list[dict[str, Any]]:  # Return type changed to List[Dict]
+    """
+    Get specific document blocks by their indices, optionally including surrounding blocks.
+
+    Args:
+        block_indices: Block index or list of block indices to retrieve.
+        source_name: Name of the document (optional).
+        get_children: Whether to retrieve child blocks.
+        get_surrounding: Whether to retrieve the 2 blocks before and 2 after each specified index.
+
+    Returns:
+        List of dictionaries with text blocks information, or a list containing an error dictionary.
+    """
+    indices_to_fetch = _indices_to_fetch(block_indices, get_surrounding)
+    if indices_to_fetch and isinstance(indices_to_fetch[0], dict):
+        return indices_to_fetch
+
+    # Get blocks by the potentially expanded list of indices
+    blocks = get_rag_system().get_blocks_by_idx(indices_to_fetch, source_name, get_children)
+
+    if not blocks:  # get_blocks_by_idx should return a list
+        return [
+            {"error": "No blocks found with the provided indices"}
+        ]  # Return list with error dict
+
+    # Try to enrich blocks with classification metadata
+    metadata_results = None
+    try:
+        if metadata_query := _metadata_query(blocks):
+            metadata_results = get_rag_system().db_manager.execute_query(
+                *metadata_query, label="rag.metadata"
+            )
+    except Exception:
+        # Silently continue if enrichment fails, or log an error
+        pass
+
+    return _format_blocks(blocks, metadata_results)
+
+
+async def aquery_rag_from_id_func(
+    block_indices: int | list[int],
+    source_name: str | None = None,
+    get_children: bool = True,
+    get_surrounding: bool = True,
+) -> list[dict[str, Any]]:
+    """Async `query_rag_from_id_func`, run on the asyncio connection pool."""
+    indices_to_fetch = _indices_to_fetch(block_indices, get_surrounding)
+    if indices_to_fetch and isinstance(indices_to_fetch[0], dict):
+        return indices_to_fetch
+
+    blocks = await get_rag_system().aget_blocks_by_idx(indices_to_fetch, source_name, get_children)
+    if not blocks:
+        return [{"error": "No blocks found with the provided indices"}]
+
+    metadata_results = None
+    try:
+        if metadata_query := _metadata_query(blocks):
+            metadata_results = await get_rag_system().async_db_manager.execute_query(
+                *metadata_query, label="rag.metadata"
+            )
+    except Exception:
+        # Silently continue if enrichment fails, or log an error
+        pass
+
+    return _format_blocks(blocks, metadata_results)
+
+
 def highlight_pdf_func(pdf_requests: list[dict[str, Any]], debug: bool | None = False) -> str:
     """
     Prepare information for highlighting multiple PDFs by block indices.
@@ -301,7 +414,9 @@ def highlight_pdf_func(pdf_requests: list[dict[str, Any]], debug: bool | None =
             continue
 
         check_query = f"SELECT DISTINCT name FROM {schema_app_data}.rag_document_blocks WHERE name = %s LIMIT 1"
-        exact_match = rag_system.db_manager.execute_query(check_query, (pdf_file,))
+        exact_match = get_rag_system().db_manager.execute_query(
+            check_query, (pdf_file,), label="rag.find_document"
+        )
 
         found_pdf_name = None
         if exact_match:
@@ -309,8 +424,8 @@ def highlight_pdf_func(pdf_requests: list[dict[str, Any]], debug: bool | None =
         else:
             cleaned_pdf_file = pdf_file.strip().replace(",", "")
             like_query = f"SELECT DISTINCT name FROM {schema_app_data}.rag_document_blocks WHERE name ILIKE %s"
-            similar_matches = rag_system.db_manager.execute_query(
-                like_query, (f"%{cleaned_pdf_file}%",)
+            similar_matches = get_rag_system().db_manager.execute_query(
+                like_query, (f"%{cleaned_pdf_file}%",), label="rag.find_document"
             )
 
             if not similar_matches:
@@ -323,7 +438,7 @@ def highlight_pdf_func(pdf_requests: list[dict[str, Any]], debug: bool | None =
                 continue
             elif len(similar_matches) == 1:
                 found_pdf_name = similar_matches[0][0]
-                print(
+                logger.info(
                     f"Exact match for '{pdf_file}' not found. Using similar match: '{found_pdf_name}'"
                 )
             else:
@@ -349,6 +464,7 @@ def highlight_pdf_func(pdf_requests: list[dict[str, Any]], debug: bool | None =
 
 if os.getenv("LANGUAGE") == "french":
     query_rag: BaseTool = tool(query_rag_lds)
+    query_rag.coroutine = aquery_rag_lds
     query_rag.name = "Query_RAG"
     query_rag.description = """
     Use this tool to search for information in documents with simplified return format and pagination support.
@@ -380,6 +496,7 @@ if os.getenv("LANGUAGE") == "french":
     """
 else:
     query_rag: BaseTool = tool(query_rag)
+    query_rag.coroutine = aquery_rag
     query_rag.name = "Query_RAG"
     query_rag.description = """
     Use this tool to search for information in documents with simplified return format and pagination support.
@@ -408,6 +525,7 @@ else:
     """
 
 query_rag_from_id: BaseTool = tool(query_rag_from_id_func)
+query_rag_from_id.coroutine = aquery_rag_from_id_func
 query_rag_from_id.name = "Query_RAG_From_Id"
 query_rag_from_id.description = """
 Use this tool to retrieve specific document blocks by their indices.
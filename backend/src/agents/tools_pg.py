@@ -7,9 +7,11 @@ from decimal import Decimal
 from typing import Literal
 
 from dotenv import load_dotenv
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool, tool
 
 from db_manager import DatabaseManager
+from sql_guard import QueryRejected, query_owner, run_shared_query
 
 logger = logging.getLogger(__name__)  # Added logger
 
@@ -17,13 +19,14 @@ load_dotenv()
 
 LANGUAGE = os.environ.get("LANGUAGE", "english")
 
-# Instantiate DatabaseManager - it's a singleton
-try:
-    db_manager = DatabaseManager()
-except Exception as e:
-    logger.error(f"Failed to initialize DatabaseManager in tools_pg: {e}")
-    # Depending on desired behavior, could raise this or have tools fail gracefully
-    db_manager = None
+
+def _get_db_manager() -> DatabaseManager | None:
+    """The DatabaseManager singleton, connected on first tool use rather than at import."""
+    try:
+        return DatabaseManager()
+    except Exception as e:
+        logger.error(f"Failed to initialize DatabaseManager in tools_pg: {e}")
+        return None
 
 
 def to_csv_string_value(obj):
@@ -37,13 +40,14 @@ def to_csv_string_value(obj):
     return str(obj)
 
 
-def _execute_safe_query(query: str, params: tuple = None) -> list[tuple]:
+def _execute_safe_query(query: str, params: tuple = None, label: str = "pg_tool") -> list[tuple]:
     """Executes a read-only query safely using DatabaseManager."""
+    db_manager = _get_db_manager()
     if not db_manager:
         raise ConnectionError("DatabaseManager not initialized. Cannot execute query.")
     try:
         # DatabaseManager's execute_query handles connection and cursor management
-        results = db_manager.execute_query(query, params)
+        results = db_manager.execute_query(query, params, label=label)
         return results
     except Exception as e:
         # db_manager.execute_query should handle rollbacks if it initiated a transaction
@@ -79,7 +83,7 @@ def _get_letter_names_from_subquery(subquery: str) -> list[str]:
         raise ValueError("Error: Subquery contains potentially harmful operations.")
 
     try:
-        results = _execute_safe_query(subquery)
+        results = _execute_safe_query(subquery, label="pg_tool.letters")
         # Expecting a single column of strings (letter names)
         letter_names = [row[0] for row in results if isinstance(row[0], str)]
         if not letter_names:
@@ -169,7 +173,7 @@ def _get_demands_data(
             params_list.append(offset)
 
     params_for_main_query = tuple(params_list)
-    results = _execute_safe_query(final_query, params_for_main_query)
+    results = _execute_safe_query(final_query, params_for_main_query, label="pg_tool.demands")
 
     # Process results
     if return_type == "count":
@@ -202,7 +206,9 @@ def _get_demands_data(
         if len(count_query_parts) > 1:
             final_count_query += " WHERE " + " AND ".join(count_query_parts[1:])
 
-        total_count_results = _execute_safe_query(final_count_query, tuple(count_params_list))
+        total_count_results = _execute_safe_query(
+            final_count_query, tuple(count_params_list), label="pg_tool.demands_count"
+        )
         total_matching_demands = total_count_results[0][0] if total_count_results else 0
 
         return demands_list, total_matching_demands
@@ -339,7 +345,7 @@ def count_demands(
 # --- Existing execute_sql function ---
 
 
-def execute_sql_func(sql_query: str) -> str:
+def execute_sql_func(sql_query: str, config: RunnableConfig = None) -> str:
     """Execute a read-only SQL query with safety checks and returns results as CSV.
 
     Args:
@@ -349,6 +355,7 @@ def execute_sql_func(sql_query: str) -> str:
         str: The result of the SQL query as a CSV string (semicolon separated),
              or an error message if the query fails or is disallowed.
     """
+    db_manager = _get_db_manager()
     if not db_manager:
         return "Error: DatabaseManager not initialized. Cannot execute SQL."
 
@@ -368,37 +375,15 @@ def execute_sql_func(sql_query: str) -> str:
     if any(keyword in sql_lower for keyword in dangerous_keywords):
         return "Error: Query contains potentially harmful operations."
 
-    conn = None
     try:
-        # We need direct cursor access for cursor.description to get column names.
-        # So, we manage the connection lifecycle here.
-        conn = db_manager.get_connection()
-        with (
-            conn.cursor() as current_cursor
-        ):  # Use 'current_cursor' to avoid conflict if 'cursor' was a global
-            current_cursor.execute(sql_query)
-            results = current_cursor.fetchall()
-
-            # Try to get column names from cursor.description
-            # This part remains largely the same, but uses current_cursor
-            if not current_cursor.description:  # Fallback if no description
-                if results:
-                    output_io = io.StringIO()
-                    csv_writer = csv.writer(output_io, delimiter=";")
-                    # Determine number of columns from the first row if possible
-                    num_cols = (
-                        len(results[0]) if results and isinstance(results[0], list | tuple) else 1
-                    )
-                    if num_cols == 1:
-                        csv_writer.writerow(["result"])
-                    else:
-                        csv_writer.writerow([f"col_{i+1}" for i in range(num_cols)])
-                    for row_data in results:
-                        csv_writer.writerow([to_csv_string_value(item) for item in row_data])
-                    return output_io.getvalue()
-                return ""  # No results and no description
-
-            colnames = [desc[0] for desc in current_cursor.description]
+        # Runs read-only under the SQL_EXECUTOR statement timeout / work_mem / cost limits,
+        # and registers the backend pid so an aborted run can cancel it. An identical query
+        # already running for another run is awaited instead of executed again.
+        colnames, results = run_shared_query(
+            sql_query, "SQL_EXECUTOR", owner=query_owner(config), db_manager=db_manager
+        )
+        if not colnames:
+            return ""  # No result set
 
         # Proceed with CSV generation using colnames and results
         output_io = io.StringIO()
@@ -437,21 +422,14 @@ def execute_sql_func(sql_query: str) -> str:
             else:
                 return truncated_csv_string + truncation_error_msg
 
-        # conn.commit() # Typically SELECT queries don't need commit unless they call functions with side effects.
-        # DatabaseManager connections might be autocommit=True.
         return csv_output_string
+    except QueryRejected as e:
+        logger.warning(f"SQL query rejected: {e} SQL: {sql_query}")
+        return f"Error executing query: {e}"
     except Exception as e:
-        if conn:  # Ensure rollback if connection was established
-            try:
-                conn.rollback()  # Rollback on the specific connection used
-            except Exception as rb_e:
-                logger.error(f"Error during rollback: {rb_e}")
         error_message = str(e).replace("\n", " ").strip()
         logger.error(f"Error executing SQL function: {error_message} SQL: {sql_query}")
         return f"Error executing query: {error_message}"
-    finally:
-        if conn:
-            db_manager.release_connection(conn)  # Ensure connection is released
 
 
 execute_sql: BaseTool = tool(execute_sql_func)
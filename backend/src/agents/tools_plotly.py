@@ -1,15 +1,47 @@
+import base64
+import logging
 import re
 from typing import Any
 
-import pandas as pd
-import plotly.express as px
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import BaseTool, tool
 
 from agents._graph_store import GraphStore
 from db_manager import DatabaseManager
+from sql_guard import QueryRejected, query_owner, run_shared_query
 
-graph_store = GraphStore()
-db_manager = DatabaseManager()
+logger = logging.getLogger(__name__)
+
+
+def _narrow_floats(value):
+    """Plotly typed arrays of float64 narrowed to float32 where that keeps ~7 significant digits."""
+    import numpy as np
+
+    if isinstance(value, dict):
+        if value.get("dtype") == "f8" and isinstance(value.get("bdata"), str):
+            wide = np.frombuffer(base64.b64decode(value["bdata"]), dtype="<f8")
+            narrow = wide.astype("<f4")
+            if np.allclose(narrow, wide, rtol=1e-6, atol=0, equal_nan=True):
+                return {
+                    **value,
+                    "dtype": "f4",
+                    "bdata": base64.b64encode(narrow.tobytes()).decode(),
+                }
+            return value
+        return {key: _narrow_floats(item) for key, item in value.items()}
+    if isinstance(value, list | tuple):
+        return [_narrow_floats(item) for item in value]
+    return value
+
+
+def compact_figure_json(fig) -> str:
+    """
+    The figure as Plotly JSON, its arrays in the base64 typed-array encoding and its floats in
+    single precision, which is all a chart can show.
+    """
+    from plotly.io.json import to_json_plotly
+
+    return to_json_plotly(_narrow_floats(fig.to_plotly_json()))
 
 
 def create_graph(
@@ -30,6 +62,7 @@ def create_graph(
     template: str = "plotly_white",  # chart style template
     markers: bool = False,  # whether to show markers on line charts
     preprocess: dict[str, bool | str | list[str]] | None = None,  # preprocessing instructions
+    config: RunnableConfig = None,
 ):
     """
     Generates a Plotly chart as JSON from either a SQL query or directly provided data.
@@ -83,6 +116,10 @@ def create_graph(
     if not query and not data:
         raise ValueError("Must provide either 'query' or 'data'.")
 
+    # Imported on first use: pandas and plotly dominate the import time of the agents
+    import pandas as pd
+    import plotly.express as px
+
     # 1) Load data into DataFrame
     if data:
         df = pd.DataFrame(data)
@@ -90,7 +127,18 @@ def create_graph(
         # Execute the SQL query
         cleaned_query = re.sub(r"(?<!%)%(?!%)", "%%", query)
         try:
-            df = pd.read_sql(cleaned_query, con=db_manager.engine)
+            # Read-only, under the CREATE_GRAPH statement timeout / work_mem / cost limits, and
+            # shared with identical queries in flight
+            columns, rows = run_shared_query(
+                cleaned_query,
+                "CREATE_GRAPH",
+                (),
+                owner=query_owner(config),
+                db_manager=DatabaseManager(),
+            )
+            df = pd.DataFrame(rows, columns=columns)
+        except QueryRejected as e:
+            raise ValueError(f"SQL Execution Error: {e}") from None
         except Exception as e:
             # Catch potential SQL execution errors (broadly for now)
             # and prefix the error message for identification by the agent.
@@ -304,9 +352,9 @@ def create_graph(
         )
 
     # 4) Export figure to JSON for frontend rendering
-    fig_json = fig.to_json()
-    id = graph_store.store_graph(fig_json)
-    print(f"Graph stored with ID: {id}")
+    fig_json = compact_figure_json(fig)
+    id = GraphStore().store_graph(fig_json)
+    logger.info(f"Graph stored with ID: {id}")
     return id
 
 
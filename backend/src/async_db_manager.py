@@ -0,0 +1,446 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any
+from uuid import UUID, uuid4
+
+try:
+    from psycopg.rows import dict_row
+    from psycopg.types.json import Jsonb
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    dict_row = None
+    Jsonb = None
+    AsyncConnectionPool = None
+
+try:
+    from .db_manager import (
+        GRAPH_ENTRY_SQL,
+        RECORD_RUN_USAGE_SQL,
+        SAVE_FEEDBACK_SQL,
+        UPLOAD_JOB_SQL,
+        USAGE_TOTALS_SQL,
+        DatabaseManager,
+        decode_graph_entry,
+        schema_app_data,
+    )
+    from .lazy import reset_after_fork
+    from .metrics import observe_query
+    from .schema.schema import UserFeedbackCreate, UserFeedbackRead, UserInDB
+except ImportError:
+    from db_manager import (
+        GRAPH_ENTRY_SQL,
+        RECORD_RUN_USAGE_SQL,
+        SAVE_FEEDBACK_SQL,
+        UPLOAD_JOB_SQL,
+        USAGE_TOTALS_SQL,
+        DatabaseManager,
+        decode_graph_entry,
+        schema_app_data,
+    )
+    from lazy import reset_after_fork
+    from metrics import observe_query
+    from schema.schema import UserFeedbackCreate, UserFeedbackRead, UserInDB
+
+logger = logging.getLogger(__name__)
+
+ADMIN_USER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def _sync_fallback(method):
+    """Run the DatabaseManager method of the same name in a worker thread when there is no
+    asyncio pool (Cloud SQL connector, or psycopg 3 not installed)."""
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if self.pool is None:
+            sync_method = getattr(self.db_manager, method.__name__)
+            return await asyncio.to_thread(sync_method, *args, **kwargs)
+        return await method(self, *args, **kwargs)
+
+    return wrapper
+
+
+@reset_after_fork
+class AsyncDatabaseManager:
+    """
+    Async counterpart of DatabaseManager for `async def` endpoints and tools.
+
+    Queries run on a psycopg 3 AsyncConnectionPool, so waiting on PostgreSQL never blocks
+    the event loop. Connection settings come from the DatabaseManager; the pool opens on
+    first use and is closed by the service lifespan.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, db_manager: DatabaseManager | None = None):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    instance._initialize(db_manager or DatabaseManager())
+                    cls._instance = instance
+        return cls._instance
+
+    def _initialize(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self.pool = None
+        if AsyncConnectionPool is None:
+            logger.warning("psycopg 3 is not installed; async queries run in worker threads.")
+        elif db_manager.using_google_connector:
+            logger.info("Cloud SQL connector in use; async queries run in worker threads.")
+        else:
+            self.pool = AsyncConnectionPool(
+                db_manager.connection_string,
+                min_size=int(os.getenv("DB_ASYNC_POOL_MIN_SIZE", "1")),
+                max_size=int(os.getenv("DB_ASYNC_POOL_MAX_SIZE", "20")),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+                max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+                max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+                kwargs={"autocommit": True},
+                check=AsyncConnectionPool.check_connection,
+                open=False,
+                name="async_db",
+            )
+        self._open_lock = asyncio.Lock()
+        self._opened = False
+
+    async def open(self) -> None:
+        if self.pool is None or self._opened:
+            return
+        async with self._open_lock:
+            if not self._opened:
+                await self.pool.open()
+                self._opened = True
+
+    async def close(self) -> None:
+        if self.pool is not None and self._opened:
+            await self.pool.close()
+            self._opened = False
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Any]:
+        await self.open()
+        async with self.pool.connection() as conn:
+            yield conn
+
+    def pool_stats(self) -> dict[str, int] | None:
+        return self.pool.get_stats() if self.pool is not None and self._opened else None
+
+    @_sync_fallback
+    async def execute_query(self, query: str, params=None, label: str | None = None) -> list[tuple]:
+        """Run one statement and return its rows; timed in the metrics under `label`."""
+        async with self.connection() as conn, conn.cursor() as cursor:
+            with observe_query(label, query, params) as observed:
+                await cursor.execute(query, params or None)
+                rows = await cursor.fetchall() if cursor.description else []
+                observed.rows = len(rows)
+            return rows
+
+    async def _fetchone(self, query: str, params, label: str) -> dict[str, Any] | None:
+        async with self.connection() as conn, conn.cursor(row_factory=dict_row) as cursor:
+            with observe_query(label, query, params) as observed:
+                await cursor.execute(query, params)
+                row = await cursor.fetchone()
+                observed.rows = int(row is not None)
+            return row
+
+    async def _fetchall(self, query: str, params, label: str) -> list[dict[str, Any]]:
+        async with self.connection() as conn, conn.cursor(row_factory=dict_row) as cursor:
+            with observe_query(label, query, params) as observed:
+                await cursor.execute(query, params)
+                rows = await cursor.fetchall()
+                observed.rows = len(rows)
+            return rows
+
+    @_sync_fallback
+    async def get_lexicon_definitions(self, words) -> list[dict[str, str]]:
+        results = []
+        for word in words:
+            try:
+                row = await self._fetchone(
+                    "SELECT entity, definition FROM public.lexicon WHERE entity LIKE %s",
+                    (word,),
+                    "lexicon.lookup",
+                )
+                if row:
+                    results.append({"entity": row["entity"], "def": row["definition"]})
+            except Exception as e:
+                logger.error(f"Error querying public.lexicon: {e}")
+        return results
+
+    # User operations
+    @_sync_fallback
+    async def create_user(self, email: str, hashed_password: str) -> UserInDB:
+        user_data = await self._fetchone(
+            f"""
+            INSERT INTO {schema_app_data}.users (id, email, hashed_password)
+            VALUES (%s, %s, %s)
+            RETURNING id, email, hashed_password, created_at, updated_at
+            """,
+            (uuid4(), email, hashed_password),
+            "users.create",
+        )
+        return UserInDB(**user_data)
+
+    @_sync_fallback
+    async def get_user_by_email(self, email: str) -> UserInDB | None:
+        user_data = await self._fetchone(
+            f"SELECT id, email, hashed_password, created_at, updated_at "
+            f"FROM {schema_app_data}.users WHERE email = %s",
+            (email,),
+            "users.by_email",
+        )
+        return UserInDB(**user_data) if user_data else None
+
+    @_sync_fallback
+    async def get_user_by_id(self, user_id: UUID) -> UserInDB | None:
+        user_data = await self._fetchone(
+            f"SELECT id, email, hashed_password, created_at, updated_at "
+            f"FROM {schema_app_data}.users WHERE id = %s",
+            (user_id,),
+            "users.by_id",
+        )
+        return UserInDB(**user_data) if user_data else None
+
+    # Feedback
+    @_sync_fallback
+    async def save_user_feedback(self, feedback_data: UserFeedbackCreate) -> UserFeedbackRead:
+        saved_feedback = await self._fetchone(
+            f"""
+            INSERT INTO {schema_app_data}.user_feedback (user_id, feedback_content)
+            VALUES (%s, %s)
+            RETURNING id, user_id, feedback_content, created_at
+            """,
+            (feedback_data.user_id, feedback_data.feedback_content),
+            "feedback.save_user",
+        )
+        return UserFeedbackRead(**saved_feedback)
+
+    @_sync_fallback
+    async def save_feedback(
+        self,
+        run_id: str,
+        key: str,
+        score: float,
+        conversation_id: str | None = None,
+        commented_message_text: str | None = None,
+        additional_data: dict[str, Any] | None = None,
+    ) -> int:
+        row = await self._fetchone(
+            SAVE_FEEDBACK_SQL,
+            (
+                run_id,
+                key,
+                score,
+                conversation_id,
+                commented_message_text,
+                Jsonb(additional_data) if additional_data else None,
+            ),
+            "feedback.save",
+        )
+        return row["id"]
+
+    @_sync_fallback
+    async def get_feedback_for_run(self, run_id: str) -> list[dict[str, Any]]:
+        return await self._fetchall(
+            f"""
+            SELECT id, run_id, key, score, conversation_id, commented_message_text,
+                   additional_data, created_at
+            FROM {schema_app_data}.feedback
+            WHERE run_id = %s ORDER BY created_at DESC
+            """,
+            (run_id,),
+            "feedback.by_run",
+        )
+
+    @_sync_fallback
+    async def get_feedbacks_for_conversation(self, conversation_id: str) -> list[dict[str, Any]]:
+        return await self._fetchall(
+            f"""
+            SELECT id, run_id, key, score, conversation_id, commented_message_text,
+                   additional_data, created_at
+            FROM {schema_app_data}.feedback
+            WHERE conversation_id = %s ORDER BY created_at DESC
+            """,
+            (conversation_id,),
+            "history.feedbacks",
+        )
+
+    # Usage counters
+    @_sync_fallback
+    async def record_run_usage(
+        self,
+        thread_id: UUID | str,
+        user_id: UUID | str | None,
+        user_messages: int,
+        ai_messages: int,
+        runs: int = 1,
+        at: datetime | None = None,
+        backfill: bool = False,
+    ) -> None:
+        await self.execute_query(
+            RECORD_RUN_USAGE_SQL,
+            {
+                "thread_id": str(thread_id),
+                "user_id": str(user_id) if user_id else None,
+                "user_messages": user_messages,
+                "ai_messages": ai_messages,
+                "runs": runs,
+                "at": at,
+                "backfill": backfill,
+            },
+            label="usage.record",
+        )
+
+    @_sync_fallback
+    async def get_usage_totals(self) -> dict[str, int]:
+        return await self._fetchone(USAGE_TOTALS_SQL, None, "usage.totals")
+
+    # Conversations
+    @_sync_fallback
+    async def save_conversation_title(self, thread_id: UUID, user_id: UUID, title: str) -> None:
+        async with self.connection() as conn:
+            await conn.execute(
+                f"""
+                INSERT INTO {schema_app_data}.conversations (thread_id, user_id, title)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (thread_id) DO UPDATE SET
+                    title = EXCLUDED.title,
+                    updated_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+                WHERE {schema_app_data}.conversations.user_id = %s
+                """,
+                (thread_id, user_id, title, user_id),
+            )
+
+    @_sync_fallback
+    async def get_conversation_title(self, thread_id: UUID, user_id: UUID) -> str | None:
+        row = await self._fetchone(
+            f"""
+            SELECT title FROM {schema_app_data}.conversations
+            WHERE thread_id = %s AND user_id = %s
+            """,
+            (thread_id, user_id),
+            "conversations.title",
+        )
+        return row["title"] if row else None
+
+    @_sync_fallback
+    async def get_conversations(self, user_id: UUID, limit: int = 20) -> list[dict[str, Any]]:
+        query = f"""
+        SELECT thread_id, title, created_at, updated_at FROM {schema_app_data}.conversations
+        WHERE user_id = %s ORDER BY updated_at DESC LIMIT %s
+        """
+        params = (user_id, limit)
+        if str(user_id) == ADMIN_USER_ID:
+            query = f"""
+            SELECT * FROM (
+                SELECT
+                    c.thread_id,
+                    CASE
+                        WHEN f.conversation_id IS NOT NULL
+                        THEN '🔴 ' || split_part(u.email, '@', 1) || ': ' || c.title
+                        ELSE split_part(u.email, '@', 1) || ': ' || c.title
+                    END AS title,
+                    c.created_at,
+                    c.updated_at
+                FROM {schema_app_data}.conversations c
+                JOIN {schema_app_data}.users u ON c.user_id = u.id
+                LEFT JOIN {schema_app_data}.feedback f
+                    ON CAST(c.thread_id AS text) = f.conversation_id
+                ORDER BY c.updated_at DESC
+                LIMIT %s
+            ) all_convs
+            GROUP BY 1, 2, 3, 4
+            ORDER BY updated_at DESC
+            """
+            params = (limit,)
+        return await self._fetchall(query, params, "conversations.list")
+
+    @_sync_fallback
+    async def reassign_and_rename_conversation(
+        self,
+        thread_id: UUID,
+        current_user_id: UUID,
+        new_user_id: UUID,
+        title_prefix: str,
+    ) -> bool:
+        try:
+            async with self.connection() as conn, conn.transaction():
+                cursor = await conn.execute(
+                    f"""
+                    SELECT title FROM {schema_app_data}.conversations
+                    WHERE thread_id = %s AND user_id = %s
+                    FOR UPDATE
+                    """,
+                    (thread_id, current_user_id),
+                )
+                result = await cursor.fetchone()
+                if not result:
+                    logger.warning(
+                        f"Conversation {thread_id} not found for user {current_user_id} "
+                        "during reassignment attempt."
+                    )
+                    return False
+
+                new_title = f"{title_prefix}{result[0]}"
+                await conn.execute(
+                    f"""
+                    UPDATE {schema_app_data}.conversations
+                    SET user_id = %s, title = %s,
+                        updated_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+                    WHERE thread_id = %s AND user_id = %s
+                    """,
+                    (new_user_id, new_title, thread_id, current_user_id),
+                )
+                await conn.execute(
+                    f"""
+                    UPDATE {schema_app_data}.files SET user_id = %s
+                    WHERE thread_id = %s AND user_id = %s
+                    """,
+                    (new_user_id, thread_id, current_user_id),
+                )
+            logger.info(
+                f"Conversation {thread_id} successfully reassigned from user {current_user_id} "
+                f"to {new_user_id} with title '{new_title}'."
+            )
+            return True
+        except Exception as e:
+            logger.error(
+                f"Error reassigning conversation {thread_id} from user {current_user_id} "
+                f"to {new_user_id}: {e}"
+            )
+            return False
+
+    # Graphs and documents
+    @_sync_fallback
+    async def get_graph(self, graph_id: UUID) -> str | None:
+        row = await self.get_graph_entry(graph_id)
+        return row["graph_json"] if row else None
+
+    @_sync_fallback
+    async def get_graph_entry(self, graph_id: UUID) -> dict[str, Any] | None:
+        row = await self._fetchone(GRAPH_ENTRY_SQL, (graph_id,), "graphs.get")
+        return decode_graph_entry(row)
+
+    @_sync_fallback
+    async def get_upload_job(self, job_id: UUID) -> dict[str, Any] | None:
+        row = await self._fetchone(UPLOAD_JOB_SQL, (job_id,), "upload_jobs.get")
+        return row["snapshot"] if row else None
+
+    @_sync_fallback
+    async def get_document_source_status(self, name: str) -> dict[str, Any] | None:
+        return await self._fetchone(
+            f"""
+            SELECT id, name, path, url, is_indexed, created_at, updated_at
+            FROM {schema_app_data}.document_sources WHERE name LIKE %s
+            """,
+            (f"%{name}%",),
+            "documents.status",
+        )
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class BlobTooLarge(ValueError):
+    """Raised by limit_size when a stream goes past its size limit."""
+
+
+@dataclass(frozen=True, slots=True)
+class StoredBlob:
+    """Address of stored content: its SHA-256 hex digest, and its size in bytes."""
+
+    sha256: str
+    size: int
+
+
+class BlobStore(ABC):
+    """
+    Content-addressed storage for uploaded files: blobs are written once under the SHA-256 of
+    their bytes, so identical uploads share one copy, and are read back as streams.
+    """
+
+    @abstractmethod
+    def put_stream(self, chunks: Iterable[bytes]) -> StoredBlob:
+        """Store the concatenation of `chunks`, hashing while writing."""
+
+    @abstractmethod
+    def open(self, sha256: str) -> BinaryIO:
+        """Open a stored blob for reading. Raises FileNotFoundError when it is missing."""
+
+    @abstractmethod
+    def exists(self, sha256: str) -> bool: ...
+
+    @abstractmethod
+    def delete(self, sha256: str) -> bool:
+        """Remove a blob; returns whether it existed. Callers check it is no longer referenced."""
+
+    @abstractmethod
+    def written_at(self, sha256: str) -> float | None:
+        """When the blob was last stored (epoch seconds, re-puts included), None if missing."""
+
+    @abstractmethod
+    def iter_digests(self) -> Iterator[str]:
+        """Every stored digest, for garbage collection."""
+
+    def delete_unused(self, digests: Iterable[str], grace_seconds: float = 3600) -> int:
+        """
+        Delete blobs the caller found unreferenced, except those stored in the last
+        `grace_seconds`: an upload of the same bytes may be about to reference them.
+        """
+        cutoff = time.time() - grace_seconds
+        deleted = 0
+        for sha256 in digests:
+            written = self.written_at(sha256)
+            if written is not None and written < cutoff:
+                deleted += self.delete(sha256)
+        return deleted
+
+    def put(self, data: bytes) -> StoredBlob:
+        return self.put_stream([data])
+
+    def iter_chunks(self, sha256: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        with self.open(sha256) as stream:
+            while chunk := stream.read(chunk_size):
+                yield chunk
+
+    @contextmanager
+    def local_file(self, sha256: str, suffix: str = "") -> Iterator[Path]:
+        """
+        A filesystem path holding the blob, for parsers that need one. Backends that keep
+        blobs on local disk yield the blob itself, which must then not be modified.
+        """
+        with tempfile.NamedTemporaryFile(suffix=suffix) as copy:
+            for chunk in self.iter_chunks(sha256):
+                copy.write(chunk)
+            copy.flush()
+            yield Path(copy.name)
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under `root`, sharded by digest prefix: root/ab/cd/abcd…"""
+
+    def __init__(self, root: str | os.PathLike):
+        self.root = Path(root)
+        self._tmp = self.root / "tmp"
+        self._tmp.mkdir(parents=True, exist_ok=True)
+
+    def path(self, sha256: str) -> Path:
+        if len(sha256) != 64 or not all(c in "0123456789abcdef" for c in sha256):
+            raise ValueError(f"Not a SHA-256 hex digest: {sha256!r}")
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def put_stream(self, chunks: Iterable[bytes]) -> StoredBlob:
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+            blob = StoredBlob(digest.hexdigest(), size)
+            target = self.path(blob.sha256)
+            if target.exists():
+                # Keep the existing copy; refreshing its time protects it from delete_unused
+                os.utime(target)
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                # Atomic on the same filesystem, so readers never see a partial blob
+                os.replace(tmp_name, target)
+            return blob
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    def open(self, sha256: str) -> BinaryIO:
+        return self.path(sha256).open("rb")
+
+    def exists(self, sha256: str) -> bool:
+        return self.path(sha256).is_file()
+
+    def delete(self, sha256: str) -> bool:
+        try:
+            self.path(sha256).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def written_at(self, sha256: str) -> float | None:
+        try:
+            return self.path(sha256).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def iter_digests(self) -> Iterator[str]:
+        for path in self.root.glob("??/??/*"):
+            if len(path.name) == 64 and path.is_file():
+                yield path.name
+
+    @contextmanager
+    def local_file(self, sha256: str, suffix: str = "") -> Iterator[Path]:
+        path = self.path(sha256)
+        if not path.is_file():
+            raise FileNotFoundError(f"Blob {sha256} not found in {self.root}")
+        yield path
+
+
+# Backends selectable with BLOB_STORE_BACKEND; other storage (e.g. object storage) can be
+# added with register_blob_backend without touching the callers.
+_BACKENDS: dict[str, Callable[[], BlobStore]] = {
+    "local": lambda: LocalBlobStore(os.getenv("BLOB_STORE_PATH", "blobs")),
+}
+_store: BlobStore | None = None
+
+
+def register_blob_backend(name: str, factory: Callable[[], BlobStore]) -> None:
+    _BACKENDS[name] = factory
+
+
+def get_blob_store() -> BlobStore:
+    """The process-wide blob store configured by BLOB_STORE_BACKEND (default: local)."""
+    global _store
+    if _store is None:
+        backend = os.getenv("BLOB_STORE_BACKEND", "local")
+        if backend not in _BACKENDS:
+            raise ValueError(
+                f"Unknown BLOB_STORE_BACKEND {backend!r}; available: {', '.join(_BACKENDS)}"
+            )
+        _store = _BACKENDS[backend]()
+    return _store
+
+
+def copy_stream(source: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Read a file object in chunks, e.g. to pass an upload to BlobStore.put_stream."""
+    while chunk := source.read(chunk_size):
+        yield chunk
+
+
+def limit_size(chunks: Iterable[bytes], max_bytes: int) -> Iterator[bytes]:
+    """
+    Pass `chunks` through, raising BlobTooLarge as soon as more than `max_bytes` went by
+    (0 for no limit): put_stream then stops writing and discards what it had.
+    """
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        if max_bytes and size > max_bytes:
+            raise BlobTooLarge(f"Larger than the {max_bytes} bytes allowed")
+        yield chunk
@@ -1,4 +1,5 @@
 import re
+from collections.abc import Iterable
 from enum import Enum
 
 
@@ -44,6 +45,9 @@ def normalize_text(text: str) -> str:
 class ContentClassifier:
     """Classifier for document blocks to identify sections and demands"""
 
+    # Bump whenever the patterns change so stored blocks get re-classified
+    VERSION = 1
+
     def __init__(self):
         self.section_patterns = {
             SectionType.SYNTHESIS: [
@@ -163,12 +167,36 @@ class ContentClassifier:
         # Otherwise it's regular content
         return (ContentType.REGULAR, current_section, None)
 
-    def is_letter_de_suite(self, blocks_content: list[str]) -> bool:
+    def classify_sequence(
+        self, contents: list[str | None]
+    ) -> list[tuple[ContentType, SectionType | None, int | None] | None]:
+        """
+        Classify the blocks of a document in reading order, carrying the current section
+        from each section header to the blocks that follow it.
+
+        Returns one entry per block, None for blocks without content.
+        """
+        current_section = None
+        labels = []
+        for content in contents:
+            if not content:
+                labels.append(None)
+                continue
+
+            content_type, section_type, demand_priority = self.classify_block(
+                content, current_section
+            )
+            if content_type == ContentType.SECTION_HEADER:
+                current_section = section_type
+            labels.append((content_type, section_type, demand_priority))
+        return labels
+
+    def is_letter_de_suite(self, blocks_content: Iterable[str]) -> bool:
         """
         Check if the document appears to be a 'lettre de suite' based on section patterns.
 
         Args:
-            blocks_content: List of block contents to analyze
+            blocks_content: Block contents to analyze, consumed once
 
         Returns:
             True if document contains typical letter sections
@@ -1,39 +1,10 @@
+import os
 from functools import cache
-from typing import TypeAlias
-
-try:
-    from langchain_anthropic import ChatAnthropic
-except ImportError:
-    ChatAnthropic = None
-try:
-    from langchain_aws.chat_models import ChatBedrock
-except ImportError:
-    ChatBedrock = None
-try:
-    from langchain_community.chat_models import FakeListChatModel
-except ImportError:
-    FakeListChatModel = None
-try:
-    from langchain_google_genai import ChatGoogleGenerativeAI
-except ImportError:
-    ChatGoogleGenerativeAI = None
-try:
-    from langchain_groq import ChatGroq
-except ImportError:
-    ChatGroq = None
-try:
-    from langchain_ollama import ChatOllama
-except ImportError:
-    ChatOllama = None
-try:
-    from langchain_openai import AzureChatOpenAI, ChatOpenAI
-except ImportError:
-    AzureChatOpenAI = None
-    ChatOpenAI = None
-try:
-    from langchain_mistralai import ChatMistralAI
-except ImportError:
-    ChatMistralAI = None
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, TypeAlias
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
 
 from core.settings import settings
 from schema.models import (
@@ -80,7 +51,22 @@ _MODEL_TABLE = {
     AlbertModelName.Albert_Large: "albert-large",
 }
 
-if FakeListChatModel:
+# Chat model providers are imported on first use: each langchain_* package costs hundreds of
+# milliseconds to import, and most deployments use a single one.
+ModelT: TypeAlias = "BaseChatModel"
+
+
+def _provider(module: str, name: str) -> Any:
+    try:
+        return getattr(import_module(module), name)
+    except ImportError as e:
+        package = module.split(".")[0].replace("_", "-")
+        raise ImportError(f"{package} is required for this model but not installed.") from e
+
+
+@cache
+def _fake_tool_model() -> type:
+    FakeListChatModel = _provider("langchain_community.chat_models", "FakeListChatModel")
 
     class FakeToolModel(FakeListChatModel):
         def __init__(self, responses: list[str]):
@@ -89,19 +75,7 @@ if FakeListChatModel:
         def bind_tools(self, tools):
             return self
 
-else:
-    FakeToolModel = None
-
-ModelT: TypeAlias = (
-    AzureChatOpenAI
-    | ChatOpenAI
-    | ChatAnthropic
-    | ChatGoogleGenerativeAI
-    | ChatGroq
-    | ChatBedrock
-    | ChatOllama
-    | FakeToolModel
-)
+    return FakeToolModel
 
 
 @cache
@@ -115,11 +89,13 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
         raise ValueError(f"Unsupported model: {model_name}")
 
     if model_name in OpenAIModelName:
+        ChatOpenAI = _provider("langchain_openai", "ChatOpenAI")
         return ChatOpenAI(model=api_model_name, temperature=0.5, streaming=True)
     if model_name in OpenAICompatibleName:
         if not settings.COMPATIBLE_BASE_URL or not settings.COMPATIBLE_MODEL:
             raise ValueError("OpenAICompatible base url and endpoint must be configured")
 
+        ChatOpenAI = _provider("langchain_openai", "ChatOpenAI")
         return ChatOpenAI(
             model=settings.COMPATIBLE_MODEL,
             temperature=0.5,
@@ -131,6 +107,7 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
         if not settings.AZURE_OPENAI_API_KEY or not settings.AZURE_OPENAI_ENDPOINT:
             raise ValueError("Azure OpenAI API key and endpoint must be configured")
 
+        AzureChatOpenAI = _provider("langchain_openai", "AzureChatOpenAI")
         return AzureChatOpenAI(
             azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
             deployment_name=api_model_name,
@@ -141,6 +118,7 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
             max_retries=3,
         )
     if model_name in DeepseekModelName:
+        ChatOpenAI = _provider("langchain_openai", "ChatOpenAI")
         return ChatOpenAI(
             model=api_model_name,
             temperature=0.5,
@@ -149,16 +127,21 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
             openai_api_key=settings.DEEPSEEK_API_KEY,
         )
     if model_name in AnthropicModelName:
+        ChatAnthropic = _provider("langchain_anthropic", "ChatAnthropic")
         return ChatAnthropic(model=api_model_name, temperature=0.5, streaming=True)
     if model_name in GoogleModelName:
+        ChatGoogleGenerativeAI = _provider("langchain_google_genai", "ChatGoogleGenerativeAI")
         return ChatGoogleGenerativeAI(model=api_model_name, temperature=0.5, streaming=True)
     if model_name in GroqModelName:
+        ChatGroq = _provider("langchain_groq", "ChatGroq")
         if model_name == GroqModelName.LLAMA_GUARD_3_8B:
             return ChatGroq(model=api_model_name, temperature=0.0)
         return ChatGroq(model=api_model_name, temperature=0.5)
     if model_name in AWSModelName:
+        ChatBedrock = _provider("langchain_aws.chat_models", "ChatBedrock")
         return ChatBedrock(model_id=api_model_name, temperature=0.5)
     if model_name in OllamaModelName:
+        ChatOllama = _provider("langchain_ollama", "ChatOllama")
         if settings.OLLAMA_BASE_URL:
             chat_ollama = ChatOllama(
                 model=settings.OLLAMA_MODEL,
@@ -169,6 +152,7 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
             chat_ollama = ChatOllama(model=settings.OLLAMA_MODEL, temperature=0.5)
         return chat_ollama
     if model_name in AlbertModelName:
+        ChatOpenAI = _provider("langchain_openai", "ChatOpenAI")
         return ChatOpenAI(
             base_url=settings.ALBERT_BASE_URL,
             model=api_model_name,
@@ -176,13 +160,19 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
             streaming=True,
             openai_api_key=settings.ALBERT_API_KEY,
         )
-    if model_name in MistralModelName and ChatMistralAI:
+    if model_name in MistralModelName:
+        ChatMistralAI = _provider("langchain_mistralai", "ChatMistralAI")
         return ChatMistralAI(
             model=api_model_name,
             temperature=0.5,
             streaming=True,
         )
     if model_name in FakeModelName:
-        return FakeToolModel(responses=["This is a test response from the fake model."])
+        return _fake_tool_model()(responses=["This is a test response from the fake model."])
 
     raise ValueError(f"Unsupported model: {model_name}")
+
+
+# Model clients keep HTTP connections: a forked worker opens its own rather than share them
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=get_model.cache_clear)
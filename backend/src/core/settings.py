@@ -46,6 +46,8 @@ class Settings(BaseSettings):
 
     HOST: str = "localhost"
     PORT: int = 8080
+    # Worker processes serving the API, each with its own connection pools (ignored in dev mode)
+    WORKERS: int = 1
 
     AUTH_SECRET: SecretStr | None = None
 
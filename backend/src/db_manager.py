@@ -1,14 +1,20 @@
+import gzip
+import hashlib
+import json
 import logging
 import os
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from datetime import UTC, date, datetime, timedelta
+from functools import cached_property
 from typing import Any
 from urllib.parse import urlparse
 from uuid import UUID, uuid4
 
 import psycopg2
 from dotenv import load_dotenv
-from psycopg2 import pool
-from psycopg2.extras import DictCursor, Json, register_uuid
-from sqlalchemy import create_engine
+from psycopg2.extras import DictCursor, Json, execute_batch, execute_values, register_uuid
 
 try:
     from google.cloud.sql.connector import Connector, IPTypes
@@ -19,15 +25,199 @@ except ImportError:
 load_dotenv()
 
 try:
+    from .blob_store import BlobStore, StoredBlob, get_blob_store
+    from .db_pool import ConnectionPool
+    from .lazy import reset_after_fork
+    from .metrics import observe_query
     from .schema.schema import UserFeedbackCreate, UserFeedbackRead, UserInDB
+    from .schema_catalog import SchemaCatalog
 except ImportError:
+    from blob_store import BlobStore, StoredBlob, get_blob_store
+    from db_pool import ConnectionPool
+    from lazy import reset_after_fork
+    from metrics import observe_query
     from schema.schema import UserFeedbackCreate, UserFeedbackRead, UserInDB
+    from schema_catalog import SchemaCatalog
 
 logger = logging.getLogger(__name__)
 
 schema_app_data = os.environ.get("SCHEMA_APP_DATA", "document_data")
+CATALOG_VERSION_TABLE = f"{schema_app_data}.catalog_version"
+
+# Usage counters (migration 4), shared by DatabaseManager and AsyncDatabaseManager. One
+# statement adds a finished run to its conversation, to the day of its user (the nil UUID
+# for anonymous runs) and to the totals; the conversation counts once, on its first run.
+RECORD_RUN_USAGE_SQL = f"""
+    WITH run AS (
+        SELECT COALESCE(%(at)s::timestamp, CURRENT_TIMESTAMP AT TIME ZONE 'UTC') AS at
+    ),
+    conversation AS (
+        INSERT INTO {schema_app_data}.conversation_usage AS cu
+            (thread_id, user_id, user_messages, ai_messages, runs, backfilled,
+             first_run_at, last_run_at)
+        SELECT %(thread_id)s::uuid, %(user_id)s::uuid, %(user_messages)s::bigint,
+               %(ai_messages)s::bigint, %(runs)s::bigint, %(backfill)s::boolean, run.at, run.at
+        FROM run
+        ON CONFLICT (thread_id) DO UPDATE SET
+            user_id = COALESCE(cu.user_id, EXCLUDED.user_id),
+            user_messages = cu.user_messages + EXCLUDED.user_messages,
+            ai_messages = cu.ai_messages + EXCLUDED.ai_messages,
+            runs = cu.runs + EXCLUDED.runs,
+            backfilled = cu.backfilled OR EXCLUDED.backfilled,
+            first_run_at = LEAST(cu.first_run_at, EXCLUDED.first_run_at),
+            last_run_at = GREATEST(cu.last_run_at, EXCLUDED.last_run_at)
+        RETURNING (xmax = 0)::int AS created
+    ),
+    daily AS (
+        INSERT INTO {schema_app_data}.usage_daily AS ud
+            (day, user_id, conversations, user_messages, ai_messages, runs)
+        SELECT run.at::date,
+               COALESCE(%(user_id)s::uuid, '00000000-0000-0000-0000-000000000000'),
+               conversation.created, %(user_messages)s::bigint, %(ai_messages)s::bigint,
+               %(runs)s::bigint
+        FROM run, conversation
+        ON CONFLICT (day, user_id) DO UPDATE SET
+            conversations = ud.conversations + EXCLUDED.conversations,
+            user_messages = ud.user_messages + EXCLUDED.user_messages,
+            ai_messages = ud.ai_messages + EXCLUDED.ai_messages,
+            runs = ud.runs + EXCLUDED.runs
+    )
+    UPDATE {schema_app_data}.usage_totals AS t SET
+        conversations = t.conversations + conversation.created,
+        user_messages = t.user_messages + %(user_messages)s,
+        ai_messages = t.ai_messages + %(ai_messages)s,
+        runs = t.runs + %(runs)s
+    FROM conversation
+"""
+
+USAGE_TOTALS_SQL = f"""
+    SELECT conversations, user_messages, ai_messages, runs FROM {schema_app_data}.usage_totals
+"""
+
+GRAPH_ENTRY_SQL = f"""
+    SELECT graph_gzip,
+           EXTRACT(EPOCH FROM expiry_time - (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'))::float
+               AS expires_in
+    FROM {schema_app_data}.graphs
+    WHERE graph_id = %s AND expiry_time > (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+    LIMIT 1
+"""
+
+UPLOAD_JOB_SQL = f"""
+    SELECT snapshot FROM {schema_app_data}.upload_jobs WHERE job_id = %s
+"""
+
+# Stores a graph unless an identical one is still being served, whose id is returned instead
+# and whose expiry is extended. Only rows the retention will keep past the new expiry are reused:
+# an older one stays in its created_at partition and would be dropped while still being served
+SAVE_GRAPH_SQL = f"""
+    WITH existing AS (
+        UPDATE {schema_app_data}.graphs
+        SET expiry_time = GREATEST(expiry_time, TO_TIMESTAMP(%(expiry_time)s) AT TIME ZONE 'UTC')
+        WHERE content_sha256 = %(content_sha256)s
+          AND expiry_time > (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+          AND created_at + make_interval(days => %(retention_days)s)
+              > TO_TIMESTAMP(%(expiry_time)s) AT TIME ZONE 'UTC'
+        RETURNING graph_id
+    ), inserted AS (
+        INSERT INTO {schema_app_data}.graphs (graph_id, content_sha256, graph_gzip, expiry_time)
+        SELECT %(graph_id)s, %(content_sha256)s, %(graph_gzip)s,
+               TO_TIMESTAMP(%(expiry_time)s) AT TIME ZONE 'UTC'
+        WHERE NOT EXISTS (SELECT 1 FROM existing)
+        RETURNING graph_id
+    )
+    SELECT graph_id FROM existing UNION ALL SELECT graph_id FROM inserted LIMIT 1
+"""
+
+GRAPH_PARTITION_PREFIX = "graphs_p"
+
+
+def encode_graph(graph_json: str | dict[str, Any]) -> tuple[str, bytes]:
+    """The content hash and the gzip-compressed bytes a graph is stored as."""
+    text = graph_json if isinstance(graph_json, str) else json.dumps(graph_json)
+    body = text.encode()
+    return hashlib.sha256(body).hexdigest(), gzip.compress(body, mtime=0)
+
+
+def decode_graph_entry(row) -> dict[str, Any] | None:
+    """A graphs row as returned by get_graph_entry, with its JSON decompressed."""
+    if row is None:
+        return None
+    return {
+        "graph_json": gzip.decompress(row["graph_gzip"]).decode(),
+        "expires_in": row["expires_in"],
+    }
+
+
+def graph_partition_bounds(month: date) -> tuple[str, date, date]:
+    """Name and [start, end) range of the monthly partition of `graphs` holding `month`."""
+    start = month.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return f"{GRAPH_PARTITION_PREFIX}{start:%Y%m}", start, end
+
+
+def create_graph_partitions(cursor, today: date, months_ahead: int = 1) -> None:
+    """Create the partitions of `graphs` for this month and the next `months_ahead` ones."""
+    month = today.replace(day=1)
+    for _ in range(months_ahead + 1):
+        name, start, end = graph_partition_bounds(month)
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {schema_app_data}.{name}
+                PARTITION OF {schema_app_data}.graphs FOR VALUES FROM (%s) TO (%s)
+            """,
+            (start, end),
+        )
+        month = end
+
+
+# Saves one feedback and adds it to the daily rollup of its key
+SAVE_FEEDBACK_SQL = f"""
+    WITH saved AS (
+        INSERT INTO {schema_app_data}.feedback
+            (run_id, key, score, conversation_id, commented_message_text, additional_data)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id, key, score, created_at
+    ),
+    rollup AS (
+        INSERT INTO {schema_app_data}.feedback_daily AS fd (day, key, feedback_count, score_sum)
+        SELECT created_at::date, key, 1, score FROM saved
+        ON CONFLICT (day, key) DO UPDATE SET
+            feedback_count = fd.feedback_count + 1,
+            score_sum = fd.score_sum + EXCLUDED.score_sum
+    )
+    SELECT id FROM saved
+"""
+
+
+class LocalConnector:
+    """
+    Stand-in for the Cloud SQL `Connector` that connects straight to a local PostgreSQL
+    (DB_HOST/DB_PORT), so the connector code path, pooling included, runs without GCP.
+
+    Selected with CLOUD_SQL_CONNECTOR=local.
+    """
+
+    def __init__(self, host: str | None = None, port: int | None = None):
+        self.host = host or os.getenv("DB_HOST", "localhost")
+        self.port = port or int(os.getenv("DB_PORT", "5432"))
+
+    def connect(self, instance_connection_string: str, driver: str, **kwargs):
+        if driver != "psycopg2":
+            raise ValueError(f"LocalConnector only supports psycopg2, not {driver}")
+        return psycopg2.connect(
+            host=self.host,
+            port=self.port,
+            user=kwargs["user"],
+            password=kwargs["password"],
+            dbname=kwargs["db"],
+        )
 
+    def close(self):
+        pass
 
+
+@reset_after_fork
 class DatabaseManager:
     """Manager for PostgreSQL database operations."""
 
@@ -49,12 +239,19 @@ class DatabaseManager:
         return results
 
     _instance = None
+    _instance_lock = threading.Lock()
+    # Turned off by scripts/migrate-db.py, which reports and applies migrations itself
+    check_schema = True
 
     def __new__(cls):
-        """Singleton pattern to ensure a single connection."""
+        """Singleton pattern to ensure a single connection pool, created on first use."""
         if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialize()
+            with cls._instance_lock:
+                if cls._instance is None:
+                    instance = super().__new__(cls)
+                    # Published only once initialized: a failed start is retried on next use
+                    instance._initialize()
+                    cls._instance = instance
         return cls._instance
 
     def _initialize(self):
@@ -70,7 +267,8 @@ class DatabaseManager:
         register_uuid()
 
         if self.instance_connection_name and self.db_user and self.db_pass and self.db_name:
-            if Connector is None:
+            use_local_connector = os.getenv("CLOUD_SQL_CONNECTOR", "").lower() == "local"
+            if Connector is None and not use_local_connector:
                 logger.error(
                     "INSTANCE_CONNECTION_NAME is set, but google-cloud-sql-connector library is not installed. Please install it."
                 )
@@ -80,11 +278,11 @@ class DatabaseManager:
                 f"Using Google Cloud SQL Connector for instance: {self.instance_connection_name}"
             )
             self.using_google_connector = True
-            self.connector = Connector()
+            self.connector = LocalConnector() if use_local_connector else Connector()
+            # Each connector connection costs a TLS handshake and IAM round trip: reuse them
+            self._connect = self._getconn_google_sql
+            self.conn_pool = self._create_pool(self._connect)
 
-            self.engine = create_engine("postgresql+psycopg2://", creator=self._getconn_google_sql)
-            self.connection = self._getconn_google_sql()
-            self.connection.autocommit = True
             self.connection_string = f"postgresql+psycopg2://{self.db_user}:***@{self.instance_connection_name}/{self.db_name}"
         else:
             logger.info("Using direct PostgreSQL connection.")
@@ -102,10 +300,6 @@ class DatabaseManager:
                     f"postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
                 )
 
-            self.engine = create_engine(self.connection_string)
-            self.connection = psycopg2.connect(self.connection_string)
-            self.connection.autocommit = True
-
             parsed_url = urlparse(self.connection_string)
             db_params = {
                 "host": parsed_url.hostname,
@@ -114,7 +308,8 @@ class DatabaseManager:
                 "password": parsed_url.password,
                 "port": parsed_url.port or 5432,
             }
-            self.conn_pool = pool.SimpleConnectionPool(1, 10, **db_params)
+            self._connect = lambda: psycopg2.connect(**db_params)
+            self.conn_pool = self._create_pool(self._connect)
 
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.embedding_enabled = self.api_key is not None
@@ -125,237 +320,40 @@ class DatabaseManager:
             self.embedding_model = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
             self.embedding_dim = 1536
 
-        self._create_tables()
+        if self.check_schema:
+            self._ensure_schema()
         # self.get_connection() # get_connection is called by methods needing it, not always on init
 
-    def _create_tables(self):
-        """Create the necessary schema and tables if they do not exist."""
-        conn = self.get_connection()
+    def _ensure_schema(self):
+        """Check the schema version, applying pending migrations unless DB_AUTO_MIGRATE=false."""
+        # Imported here: the migrations module builds its DDL from this module's settings
         try:
-            with conn.cursor() as cursor:
-                cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema_app_data}")
-
-                # Users table
-                cursor.execute(
-                    f"""
-                CREATE TABLE IF NOT EXISTS {schema_app_data}.users (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    email TEXT UNIQUE NOT NULL,
-                    hashed_password TEXT NOT NULL,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
-                    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
-                )
-                """
-                )
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_users_email ON {schema_app_data}.users(email)"
-                )
-
-                # Files table
-                cursor.execute(
-                    f"""
-                CREATE TABLE IF NOT EXISTS {schema_app_data}.files (
-                    id UUID PRIMARY KEY,
-                    thread_id UUID,
-                    user_id UUID, -- Will add FK constraint after ensuring users table exists
-                    filename TEXT NOT NULL,
-                    content_type TEXT,
-                    content BYTEA,
-                    text_content TEXT,
-                    metadata JSONB,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
-                )
-                """
-                )
-
-                # Conversations history table
-                cursor.execute(
-                    f"""
-                CREATE TABLE IF NOT EXISTS {schema_app_data}.conversations (
-                    thread_id UUID PRIMARY KEY,
-                    user_id UUID, -- Will add FK constraint
-                    title TEXT NOT NULL,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
-                    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
-                )
-                """
-                )
-
-                # Add user_id column and FK to files if not exists
-                try:
-                    cursor.execute(
-                        f"ALTER TABLE {schema_app_data}.files ADD COLUMN IF NOT EXISTS user_id UUID"
-                    )
-                    cursor.execute(
-                        f"""
-                        DO $$
-                        BEGIN
-                            IF NOT EXISTS (
-                                SELECT 1 FROM pg_constraint
-                                WHERE conname = 'fk_files_user_id' AND conrelid = '{schema_app_data}.files'::regclass
-                            ) THEN
-                                ALTER TABLE {schema_app_data}.files
-                                ADD CONSTRAINT fk_files_user_id FOREIGN KEY (user_id)
-                                REFERENCES {schema_app_data}.users(id) ON DELETE CASCADE;
-                            END IF;
-                        END $$;
-                    """
-                    )
-                except psycopg2.Error as e:
-                    logger.warning(
-                        f"Could not add user_id column or FK to files, might exist or other issue: {e}"
-                    )
-                    conn.rollback()
-                else:
-                    conn.commit()
-
-                # Add user_id column and FK to conversations if not exists
-                try:
-                    cursor.execute(
-                        f"ALTER TABLE {schema_app_data}.conversations ADD COLUMN IF NOT EXISTS user_id UUID"
-                    )
-                    cursor.execute(
-                        f"""
-                        DO $$
-                        BEGIN
-                            IF NOT EXISTS (
-                                SELECT 1 FROM pg_constraint
-                                WHERE conname = 'fk_conversations_user_id' AND conrelid = '{schema_app_data}.conversations'::regclass
-                            ) THEN
-                                ALTER TABLE {schema_app_data}.conversations
-                                ADD CONSTRAINT fk_conversations_user_id FOREIGN KEY (user_id)
-                                REFERENCES {schema_app_data}.users(id) ON DELETE CASCADE;
-                            END IF;
-                        END $$;
-                    """
-                    )
-                except psycopg2.Error as e:
-                    logger.warning(
-                        f"Could not add user_id column or FK to conversations, might exist or other issue: {e}"
-                    )
-                    conn.rollback()
-                else:
-                    conn.commit()
-
-                cursor.execute(
-                    f"""
-                CREATE TABLE IF NOT EXISTS {schema_app_data}.feedback (
-                    id SERIAL PRIMARY KEY,
-                    run_id TEXT NOT NULL,
-                    key TEXT NOT NULL,
-                    score FLOAT NOT NULL,
-                    conversation_id TEXT NULL,
-                    commented_message_text TEXT NULL,
-                    additional_data JSONB,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
-                )
-                """
-                )
-
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_files_thread_id ON {schema_app_data}.files(thread_id)"
-                )
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_files_user_id ON {schema_app_data}.files(user_id)"
-                )
-
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_feedback_run_id ON {schema_app_data}.feedback(run_id)"
-                )
-
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_conversations_created_at ON {schema_app_data}.conversations(updated_at DESC)"
-                )  # usually order by updated_at
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_conversations_user_id ON {schema_app_data}.conversations(user_id)"
-                )
-
-                cursor.execute(
-                    f"""
-                CREATE TABLE IF NOT EXISTS {schema_app_data}.uploaded_document_blocks (
-                    id SERIAL PRIMARY KEY,
-                    block_idx INTEGER NOT NULL,
-                    name TEXT NOT NULL,
-                    content TEXT,
-                    level INTEGER NOT NULL,
-                    page_idx INTEGER NOT NULL,
-                    tag TEXT NOT NULL,
-                    block_class TEXT,
-                    x0 FLOAT,
-                    y0 FLOAT,
-                    x1 FLOAT,
-                    y1 FLOAT,
-                    parent_idx INTEGER,
-                    UNIQUE(name, block_idx)
-                )
-                """
-                )
-
-                cursor.execute(
-                    f"""
-                CREATE TABLE IF NOT EXISTS {schema_app_data}.document_sources (
-                    id SERIAL PRIMARY KEY,
-                    name TEXT UNIQUE NOT NULL,
-                    path TEXT,
-                    url TEXT,
-                    is_indexed BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
-                    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
-                )
-                """
-                )
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_document_sources_name ON {schema_app_data}.document_sources(name)"
-                )
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_document_sources_path ON {schema_app_data}.document_sources(path)"
-                )
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_document_sources_url ON {schema_app_data}.document_sources(url)"
-                )
-
-                cursor.execute(
-                    f"""
-                CREATE TABLE IF NOT EXISTS {schema_app_data}.graphs (
-                    graph_id UUID PRIMARY KEY,
-                    graph_json JSONB NOT NULL,
-                    expiry_time TIMESTAMP WITHOUT TIME ZONE NOT NULL
-                )
-                """
-                )
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_graphs_expiry_time ON {schema_app_data}.graphs(expiry_time)"
-                )
-
-                # User Feedback table
-                cursor.execute(
-                    f"""
-                CREATE TABLE IF NOT EXISTS {schema_app_data}.user_feedback (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID NOT NULL REFERENCES {schema_app_data}.users(id) ON DELETE CASCADE,
-                    feedback_content TEXT NOT NULL,
-                    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
-                )
-                """
-                )
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_user_feedback_user_id ON {schema_app_data}.user_feedback(user_id)"
-                )
-                cursor.execute(
-                    f"CREATE INDEX IF NOT EXISTS idx_user_feedback_created_at ON {schema_app_data}.user_feedback(created_at DESC)"
-                )
-
-            conn.commit()
-        finally:
-            self.release_connection(conn)
+            from .migrations import ensure_schema
+        except ImportError:
+            from migrations import ensure_schema
+
+        ensure_schema(self)
+
+    @staticmethod
+    def _create_pool(connect) -> ConnectionPool:
+        return ConnectionPool(
+            connect,
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+            max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", "1800")),
+            max_idle=float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+            check_after=float(os.getenv("DB_POOL_CHECK_AFTER", "30")),
+        )
 
     def _getconn_google_sql(self):
         if not self.connector:
             logger.error("Google Cloud SQL Connector not initialized but connection attempt made.")
             raise RuntimeError("Google Cloud SQL Connector not initialized.")
         ip_type_str = os.environ.get("GOOGLE_SQL_IP_TYPE", "PUBLIC").upper()
-        ip_type = IPTypes.PUBLIC
+        ip_type = None
         if IPTypes:
+            ip_type = IPTypes.PUBLIC
             if ip_type_str == "PRIVATE":
                 ip_type = IPTypes.PRIVATE
             elif ip_type_str == "PUBLIC":
@@ -372,27 +370,24 @@ class DatabaseManager:
         return conn
 
     def close(self):
-        if hasattr(self, "connection") and self.connection and not self.connection.closed:
+        if hasattr(self, "conn_pool") and self.conn_pool:
             try:
-                self.connection.close()
+                self.conn_pool.closeall()
             except Exception as e:
-                logger.warning(f"Error closing main connection: {e}")
-
+                logger.warning(f"Error closing connection pool: {e}")
+        # The connector must outlive the pooled connections it created
         if self.using_google_connector and hasattr(self, "connector") and self.connector:
             try:
                 self.connector.close()
             except Exception as e:
                 logger.warning(f"Error closing Google SQL Connector: {e}")
-        elif hasattr(self, "conn_pool") and self.conn_pool:
-            try:
-                self.conn_pool.closeall()
-            except Exception as e:
-                logger.warning(f"Error closing psycopg2 connection pool: {e}")
+
+    def open_connection(self):
+        """A new connection outside the pool, closed by the caller (e.g. one holding a lock)."""
+        return self._connect()
 
     def get_connection(self):
-        if self.using_google_connector:
-            conn = self._getconn_google_sql()
-        elif self.conn_pool:
+        if self.conn_pool:
             conn = self.conn_pool.getconn()
         else:  # Fallback to direct connection if pool not initialized (e.g. during _initialize)
             conn = psycopg2.connect(self.connection_string)
@@ -400,18 +395,25 @@ class DatabaseManager:
         conn.autocommit = True  # Important for many operations
         return conn
 
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a `with` block."""
+        conn = self.get_connection()
+        try:
+            yield conn
+        finally:
+            self.release_connection(conn)
+
+    def pool_stats(self) -> dict[str, int | float] | None:
+        """Connection pool gauges and counters, or None when connections are not pooled."""
+        return self.conn_pool.stats() if self.conn_pool else None
+
     def release_connection(self, conn):
-        if self.using_google_connector:
-            if conn and not conn.closed:
-                try:
-                    conn.close()
-                except Exception as e:
-                    logger.warning(f"Error closing Google SQL connection: {e}")
-        elif self.conn_pool:
+        if self.conn_pool:
             try:
                 self.conn_pool.putconn(conn)
             except Exception as e:
-                logger.warning(f"Error releasing connection to psycopg2 pool: {e}")
+                logger.warning(f"Error releasing connection to the pool: {e}")
         elif conn and not conn.closed:  # Fallback for direct connections
             try:
                 conn.close()
@@ -488,6 +490,10 @@ class DatabaseManager:
             self.release_connection(conn)
 
     # File operations
+    @property
+    def blob_store(self) -> BlobStore:
+        return get_blob_store()
+
     def save_file(
         self,
         file_id: UUID,
@@ -495,18 +501,24 @@ class DatabaseManager:
         thread_id: UUID | None,
         filename: str,
         content_type: str,
-        content: bytes,
+        content: bytes | None = None,
         text_content: str | None = None,
         metadata: dict[str, Any] | None = None,
+        blob: StoredBlob | None = None,
     ) -> UUID:
+        """Record an uploaded file. Its bytes go to the blob store: pass `blob` when the caller
+        already streamed them there, or `content` to have them stored here."""
+        if blob is None:
+            blob = self.blob_store.put(content or b"")
         conn = self.get_connection()
         try:
             with conn.cursor() as cursor:
                 cursor.execute(
                     f"""
                     INSERT INTO {schema_app_data}.files
-                    (id, user_id, thread_id, filename, content_type, content, text_content, metadata)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    (id, user_id, thread_id, filename, content_type, content_sha256, size,
+                     text_content, metadata)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                     RETURNING id
                     """,
                     (
@@ -515,7 +527,8 @@ class DatabaseManager:
                         thread_id,
                         filename,
                         content_type,
-                        content,
+                        blob.sha256,
+                        blob.size,
                         text_content,
                         Json(metadata) if metadata else None,
                     ),
@@ -527,12 +540,14 @@ class DatabaseManager:
             self.release_connection(conn)
 
     def get_file(self, file_id: UUID, user_id: UUID) -> dict[str, Any] | None:
+        """File metadata, without its bytes (see open_file_content) or extracted text."""
         conn = self.get_connection()
         try:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
                 cursor.execute(
                     f"""
-                    SELECT id, thread_id, user_id, filename, content_type, content, text_content, metadata, created_at
+                    SELECT id, thread_id, user_id, filename, content_type, content_sha256,
+                           COALESCE(size, octet_length(content)) AS size, metadata, created_at
                     FROM {schema_app_data}.files
                     WHERE id = %s AND user_id = %s
                     """,
@@ -542,6 +557,114 @@ class DatabaseManager:
         finally:
             self.release_connection(conn)
 
+    def list_files(self, user_id: UUID, thread_id: UUID | None = None) -> list[dict[str, Any]]:
+        """Metadata of a user's files (optionally of one thread), newest first."""
+        query = f"""
+        SELECT id, thread_id, filename, content_type, content_sha256,
+               COALESCE(size, octet_length(content)) AS size, created_at
+        FROM {schema_app_data}.files
+        WHERE user_id = %s AND (%s::uuid IS NULL OR thread_id = %s::uuid)
+        ORDER BY created_at DESC
+        """
+        columns = (
+            "id",
+            "thread_id",
+            "filename",
+            "content_type",
+            "content_sha256",
+            "size",
+            "created_at",
+        )
+        rows = self.execute_query(query, (user_id, thread_id, thread_id), label="files.list")
+        return [dict(zip(columns, row, strict=True)) for row in rows]
+
+    def open_file_content(self, file_id: UUID, user_id: UUID) -> Iterator[bytes] | None:
+        """Stream a file's bytes from the blob store, or None when there is no such file.
+        Rows not yet offloaded are served from the legacy `content` column."""
+        rows = self.execute_query(
+            f"""
+            SELECT content_sha256, content_sha256 IS NULL AND content IS NOT NULL
+            FROM {schema_app_data}.files WHERE id = %s AND user_id = %s
+            """,
+            (file_id, user_id),
+            label="files.locate",
+        )
+        if not rows:
+            return None
+        sha256, inline = rows[0]
+        if sha256:
+            return self.blob_store.iter_chunks(sha256)
+        if inline:
+            content = self.execute_query(
+                f"SELECT content FROM {schema_app_data}.files WHERE id = %s",
+                (file_id,),
+                label="files.inline_content",
+            )
+            return iter([bytes(content[0][0])]) if content else iter(())
+        return iter(())
+
+    def offload_file_contents(self, batch_size: int = 50) -> int:
+        """
+        Move file bytes still stored inline in `files.content` to the blob store, `batch_size`
+        rows per transaction. Safe to interrupt and re-run. Returns the number of files moved.
+        """
+        moved = 0
+        while True:
+            conn = self.get_connection()
+            # One transaction per batch, so the selected rows stay locked until updated
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        f"""
+                        SELECT id, content FROM {schema_app_data}.files
+                        WHERE content IS NOT NULL AND content_sha256 IS NULL
+                        ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED
+                        """,
+                        (batch_size,),
+                    )
+                    rows = cursor.fetchall()
+                    # The blob is written before the row points at it and drops the bytes
+                    updates = []
+                    for file_id, content in rows:
+                        blob = self.blob_store.put(bytes(content))
+                        updates.append((blob.sha256, blob.size, file_id))
+                    execute_batch(
+                        cursor,
+                        f"""
+                        UPDATE {schema_app_data}.files
+                        SET content_sha256 = %s, size = %s, content = NULL WHERE id = %s
+                        """,
+                        updates,
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+                self.release_connection(conn)
+            moved += len(rows)
+            if rows:
+                logger.info(f"Moved {moved} file contents to the blob store")
+            if len(rows) < batch_size:
+                return moved
+
+    def unreferenced_blobs(self, digests: Iterable[str]) -> list[str]:
+        """The digests no files row points at, e.g. to remove blobs of deleted files."""
+        digests = list(digests)
+        if not digests:
+            return []
+        referenced = self.execute_query(
+            f"""
+            SELECT DISTINCT content_sha256 FROM {schema_app_data}.files
+            WHERE content_sha256 = ANY(%s)
+            """,
+            (digests,),
+            label="files.blob_refs",
+        )
+        return sorted(set(digests) - {row[0] for row in referenced})
+
     def get_file_text(self, file_id: UUID, user_id: UUID) -> str | None:
         conn = self.get_connection()
         try:
@@ -557,23 +680,26 @@ class DatabaseManager:
         finally:
             self.release_connection(conn)
 
-    def execute_query(self, query: str, params=None) -> list[tuple]:
+    def execute_query(self, query: str, params=None, label: str | None = None) -> list[tuple]:
+        """Run one statement and return its rows; timed in the metrics under `label`."""
         conn = self.get_connection()
         try:
-            with conn.cursor() as cursor:
+            with conn.cursor() as cursor, observe_query(label, query, params) as observed:
                 cursor.execute(query, params or ())
                 conn.commit()  # Assuming execute_query might include DML
-                return cursor.fetchall() if cursor.description else []
+                rows = cursor.fetchall() if cursor.description else []
+                observed.rows = len(rows)
+                return rows
         except Exception:
             conn.rollback()
             raise
         finally:
             self.release_connection(conn)
 
-    def execute_many(self, query: str, params_list: list[tuple]) -> None:
+    def execute_many(self, query: str, params_list: list[tuple], label: str | None = None) -> None:
         conn = self.get_connection()
         try:
-            with conn.cursor() as cursor:
+            with conn.cursor() as cursor, observe_query(label, query):
                 cursor.executemany(query, params_list)
                 conn.commit()
         except Exception:
@@ -582,6 +708,51 @@ class DatabaseManager:
         finally:
             self.release_connection(conn)
 
+    def execute_batch(
+        self,
+        query: str,
+        params_iter: Iterable[tuple],
+        page_size: int = 500,
+        label: str | None = None,
+    ) -> None:
+        """Run a statement for every params tuple, sending `page_size` statements per round trip.
+
+        `params_iter` is consumed lazily, so callers can stream rows without building a list.
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor, observe_query(label, query):
+                execute_batch(cursor, query, params_iter, page_size=page_size)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
+    def execute_values(
+        self,
+        query: str,
+        rows: Iterable[tuple],
+        template: str | None = None,
+        page_size: int = 1000,
+        label: str | None = None,
+    ) -> None:
+        """Run a statement whose single `VALUES %s` placeholder is expanded to many rows.
+
+        Rows are sent `page_size` at a time, e.g. for `UPDATE ... FROM (VALUES %s) AS v(...)`.
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cursor, observe_query(label, query):
+                execute_values(cursor, query, rows, template=template, page_size=page_size)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
     def is_embedding_enabled(self) -> bool:
         return self.embedding_enabled
 
@@ -629,10 +800,7 @@ class DatabaseManager:
         try:
             with conn.cursor() as cursor:
                 cursor.execute(
-                    f"""
-                    INSERT INTO {schema_app_data}.feedback (run_id, key, score, conversation_id, commented_message_text, additional_data)
-                    VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
-                    """,
+                    SAVE_FEEDBACK_SQL,
                     (
                         run_id,
                         key,
@@ -648,6 +816,47 @@ class DatabaseManager:
         finally:
             self.release_connection(conn)
 
+    # Usage counters
+    def record_run_usage(
+        self,
+        thread_id: UUID | str,
+        user_id: UUID | str | None,
+        user_messages: int,
+        ai_messages: int,
+        runs: int = 1,
+        at: datetime | None = None,
+        backfill: bool = False,
+    ) -> None:
+        """
+        Add a finished run to the usage counters of its conversation, user and day (UTC,
+        `at` defaults to now). backfill-usage.py records older history with runs=0.
+        """
+        self.execute_query(
+            RECORD_RUN_USAGE_SQL,
+            {
+                "thread_id": str(thread_id),
+                "user_id": str(user_id) if user_id else None,
+                "user_messages": user_messages,
+                "ai_messages": ai_messages,
+                "runs": runs,
+                "at": at,
+                "backfill": backfill,
+            },
+            label="usage.record",
+        )
+
+    def get_usage_totals(self) -> dict[str, int]:
+        """Conversations, messages and runs counted so far, read from a single row."""
+        conversations, user_messages, ai_messages, runs = self.execute_query(
+            USAGE_TOTALS_SQL, label="usage.totals"
+        )[0]
+        return {
+            "conversations": conversations,
+            "user_messages": user_messages,
+            "ai_messages": ai_messages,
+            "runs": runs,
+        }
+
     def get_feedback_for_run(self, run_id: str) -> list[dict[str, Any]]:
         conn = self.get_connection()
         try:
@@ -669,15 +878,18 @@ class DatabaseManager:
         """
         conn = self.get_connection()
         try:
-            with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute(
-                    f"""
-                    SELECT id, run_id, key, score, conversation_id, commented_message_text, additional_data, created_at FROM {schema_app_data}.feedback
-                    WHERE conversation_id = %s ORDER BY created_at DESC
-                    """,
-                    (conversation_id,),
-                )
-                return [dict(row) for row in cursor.fetchall()]
+            query = f"""
+                SELECT id, run_id, key, score, conversation_id, commented_message_text, additional_data, created_at FROM {schema_app_data}.feedback
+                WHERE conversation_id = %s ORDER BY created_at DESC
+                """
+            with (
+                conn.cursor(cursor_factory=DictCursor) as cursor,
+                observe_query("history.feedbacks", query, (conversation_id,)) as observed,
+            ):
+                cursor.execute(query, (conversation_id,))
+                rows = [dict(row) for row in cursor.fetchall()]
+                observed.rows = len(rows)
+                return rows
         finally:
             self.release_connection(conn)
 
@@ -755,9 +967,14 @@ class DatabaseManager:
 
         conn = self.get_connection()
         try:
-            with conn.cursor(cursor_factory=DictCursor) as cursor:
+            with (
+                conn.cursor(cursor_factory=DictCursor) as cursor,
+                observe_query("conversations.list", query, params) as observed,
+            ):
                 cursor.execute(query, params)
-                return [dict(row) for row in cursor.fetchall()]
+                rows = [dict(row) for row in cursor.fetchall()]
+                observed.rows = len(rows)
+                return rows
         finally:
             self.release_connection(conn)
 
@@ -782,10 +999,14 @@ class DatabaseManager:
                     f"""
                     DELETE FROM {schema_app_data}.files
                     WHERE thread_id = %s AND user_id = %s
+                    RETURNING content_sha256
                     """,
                     (thread_id, user_id),
                 )
+                digests = {row[0] for row in cursor.fetchall() if row[0]}
                 conn.commit()
+            # Other files (of any user) may share the same content
+            self.blob_store.delete_unused(self.unreferenced_blobs(digests))
             return deleted_count > 0
         except Exception as e:
             conn.rollback()
@@ -878,56 +1099,97 @@ class DatabaseManager:
                 conn.autocommit = True  # Reset autocommit before releasing
                 self.release_connection(conn)
 
-    def save_graph(self, graph_id: UUID, graph_json: dict[str, Any], expiry_time: float) -> None:
+    def save_graph(
+        self,
+        graph_id: UUID,
+        graph_json: str | dict[str, Any],
+        expiry_time: float,
+        retention_days: int,
+    ) -> UUID:
+        """
+        Store a graph compressed, and return its id: `graph_id`, or the id of an identical
+        graph that has not expired yet, whose expiry is pushed back to `expiry_time`.
+        Saves of the same graph are serialised, so concurrent ones store it once.
+        """
+        content_sha256, graph_gzip = encode_graph(graph_json)
+        params = {
+            "graph_id": graph_id,
+            "content_sha256": content_sha256,
+            "graph_gzip": psycopg2.Binary(graph_gzip),
+            "expiry_time": expiry_time,
+            "retention_days": retention_days,
+        }
         conn = self.get_connection()
         try:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    f"""
-                    INSERT INTO {schema_app_data}.graphs (graph_id, graph_json, expiry_time)
-                    VALUES (%s, %s, TO_TIMESTAMP(%s))
-                    ON CONFLICT (graph_id) DO UPDATE SET
-                        graph_json = EXCLUDED.graph_json,
-                        expiry_time = EXCLUDED.expiry_time
-                    """,
-                    (graph_id, Json(graph_json), expiry_time),
-                )
+            with conn.cursor() as cursor, observe_query("graphs.save", SAVE_GRAPH_SQL) as observed:
+                # Released at commit; the save then sees the row a concurrent one inserted
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (content_sha256,))
+                cursor.execute(SAVE_GRAPH_SQL, params)
+                graph_id = cursor.fetchone()[0]
                 conn.commit()
+                observed.rows = 1
+                return graph_id
+        except Exception:
+            conn.rollback()
+            raise
         finally:
             self.release_connection(conn)
 
-    def get_graph(self, graph_id: UUID) -> dict[str, Any] | None:
+    def get_graph(self, graph_id: UUID) -> str | None:
+        entry = self.get_graph_entry(graph_id)
+        return entry["graph_json"] if entry else None
+
+    def get_graph_entry(self, graph_id: UUID) -> dict[str, Any] | None:
+        """The graph JSON and the seconds left before it expires, if it has not yet."""
         conn = self.get_connection()
         try:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute(
-                    f"""
-                    SELECT graph_json FROM {schema_app_data}.graphs
-                    WHERE graph_id = %s AND expiry_time > (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
-                    """,
-                    (graph_id,),
-                )
-                result = cursor.fetchone()
-                return result["graph_json"] if result else None
+                cursor.execute(GRAPH_ENTRY_SQL, (graph_id,))
+                return decode_graph_entry(cursor.fetchone())
         finally:
             self.release_connection(conn)
 
-    def delete_expired_graphs(self) -> int:
+    def maintain_graph_partitions(
+        self, retention_days: int, today: date | None = None
+    ) -> list[str]:
+        """
+        Create the upcoming monthly partitions of `graphs` and drop those entirely older than
+        `retention_days`, so old graphs go without a DELETE scan. Returns the dropped ones.
+        """
+        today = today or datetime.now(UTC).date()
+        cutoff = today - timedelta(days=retention_days)
+        dropped = []
         conn = self.get_connection()
-        deleted_count = 0
         try:
             with conn.cursor() as cursor:
+                try:
+                    create_graph_partitions(cursor, today)
+                except psycopg2.Error as e:
+                    # Rows of that month already went to the default partition; keep using it
+                    logger.warning(f"Could not create the graph partitions: {e}")
                 cursor.execute(
-                    f"""
-                    DELETE FROM {schema_app_data}.graphs
-                    WHERE expiry_time <= (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
-                    RETURNING graph_id
                     """
+                    SELECT child.relname
+                    FROM pg_inherits
+                    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                    WHERE pg_inherits.inhparent = %s::regclass
+                    """,
+                    (f"{schema_app_data}.graphs",),
                 )
-                deleted_count = cursor.rowcount
-                conn.commit()
-                logger.info(f"Deleted {deleted_count} expired graphs from the database.")
-            return deleted_count
+                for (name,) in cursor.fetchall():
+                    if not name.startswith(GRAPH_PARTITION_PREFIX):
+                        continue
+                    month = datetime.strptime(name[len(GRAPH_PARTITION_PREFIX) :], "%Y%m").date()
+                    if graph_partition_bounds(month)[2] <= cutoff:
+                        cursor.execute(f"DROP TABLE {schema_app_data}.{name}")
+                        dropped.append(name)
+                cursor.execute(
+                    f"DELETE FROM {schema_app_data}.graphs_default WHERE created_at < %s",
+                    (cutoff,),
+                )
+            if dropped:
+                logger.info(f"Dropped graph partitions older than {cutoff}: {dropped}")
+            return dropped
         finally:
             self.release_connection(conn)
 
@@ -991,28 +1253,197 @@ class DatabaseManager:
         finally:
             self.release_connection(conn)
 
-    def list_schemas(self) -> list[str]:
-        query = """
-        SELECT schema_name FROM information_schema.schemata
-        WHERE schema_name NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
-          AND schema_name NOT LIKE 'pg_temp_%' AND schema_name NOT LIKE 'pg_toast_temp_%'
+    # Upload job progress
+    def save_upload_job(self, job_id: UUID, version: int, snapshot: dict[str, Any]) -> None:
+        """Record the state of an upload job, unless a later version already was."""
+        self.execute_query(
+            f"""
+            INSERT INTO {schema_app_data}.upload_jobs
+                (job_id, user_id, status, version, snapshot)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (job_id) DO UPDATE SET
+                status = EXCLUDED.status, version = EXCLUDED.version,
+                snapshot = EXCLUDED.snapshot,
+                updated_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+            WHERE {schema_app_data}.upload_jobs.version < EXCLUDED.version
+            """,
+            (job_id, snapshot["user_id"], snapshot["status"], version, Json(snapshot)),
+            label="upload_jobs.save",
+        )
+
+    def get_upload_job(self, job_id: UUID) -> dict[str, Any] | None:
+        rows = self.execute_query(UPLOAD_JOB_SQL, (job_id,), label="upload_jobs.get")
+        return rows[0][0] if rows else None
+
+    def delete_finished_upload_jobs(self, retention_seconds: float) -> int:
+        """Forget upload jobs finished more than `retention_seconds` ago."""
+        rows = self.execute_query(
+            f"""
+            DELETE FROM {schema_app_data}.upload_jobs
+            WHERE status IN ('succeeded', 'failed')
+              AND updated_at < (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+                  - make_interval(secs => %s)
+            RETURNING job_id
+            """,
+            (retention_seconds,),
+            label="upload_jobs.prune",
+        )
+        return len(rows)
+
+    # Indexing job queue
+    def enqueue_indexing_jobs(self, max_attempts: int = 3, reindex: bool = False) -> int:
+        """
+        Create a pending indexing job for every document source that does not have one yet.
+
+        With `reindex`, finished jobs are reset to pending as well. Returns the number of
+        jobs (re)queued.
+        """
+        query = f"""
+        INSERT INTO {schema_app_data}.indexing_jobs (source_id, max_attempts)
+        SELECT s.id, %s FROM {schema_app_data}.document_sources s
+        WHERE %s OR NOT s.is_indexed
+        ON CONFLICT (source_id) DO UPDATE SET
+            state = 'pending', attempts = 0, max_attempts = EXCLUDED.max_attempts,
+            worker_id = NULL, lease_expires_at = NULL, last_error = NULL,
+            updated_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        WHERE %s AND {schema_app_data}.indexing_jobs.state IN ('succeeded', 'failed')
+        RETURNING id
+        """
+        return len(self.execute_query(query, (max_attempts, reindex, reindex)))
+
+    def claim_indexing_jobs(
+        self, worker_id: str, batch_size: int = 1, lease_seconds: int = 300
+    ) -> list[dict[str, Any]]:
+        """
+        Lease up to `batch_size` runnable jobs for `worker_id`.
+
+        Runnable jobs are pending ones and running ones whose lease expired (their worker
+        died). Rows locked by a concurrent claim are skipped, so each job goes to one worker.
+        Expired jobs that already used all their attempts are marked failed instead.
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {schema_app_data}.indexing_jobs
+                    SET state = 'failed', worker_id = NULL, lease_expires_at = NULL,
+                        last_error = COALESCE(last_error, 'lease expired'),
+                        finished_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+                        updated_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+                    WHERE state = 'running'
+                      AND lease_expires_at < (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+                      AND attempts >= max_attempts
+                    """
+                )
+                cursor.execute(
+                    f"""
+                    WITH claimable AS (
+                        SELECT id FROM {schema_app_data}.indexing_jobs
+                        WHERE (state = 'pending'
+                               OR (state = 'running'
+                                   AND lease_expires_at < (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')))
+                          AND attempts < max_attempts
+                        ORDER BY id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE {schema_app_data}.indexing_jobs j
+                    SET state = 'running', worker_id = %s, attempts = j.attempts + 1,
+                        lease_expires_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+                            + make_interval(secs => %s),
+                        started_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+                        updated_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+                        stage_timings = '{{}}'::jsonb
+                    FROM claimable c, {schema_app_data}.document_sources s
+                    WHERE j.id = c.id AND s.id = j.source_id
+                    RETURNING j.id, j.source_id, j.attempts, s.name, s.path, s.url
+                    """,
+                    (batch_size, worker_id, lease_seconds),
+                )
+                jobs = [dict(row) for row in cursor.fetchall()]
+                conn.commit()
+                return jobs
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.release_connection(conn)
+
+    def heartbeat_indexing_jobs(
+        self, worker_id: str, job_ids: list[int], lease_seconds: int = 300
+    ) -> list[int]:
+        """Extend the leases `worker_id` holds on `job_ids`. Returns the ids still owned."""
+        if not job_ids:
+            return []
+        query = f"""
+        UPDATE {schema_app_data}.indexing_jobs
+        SET lease_expires_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC') + make_interval(secs => %s),
+            updated_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        WHERE id = ANY(%s) AND worker_id = %s AND state = 'running'
+        RETURNING id
         """
-        return [row[0] for row in self.execute_query(query)]
+        return [row[0] for row in self.execute_query(query, (lease_seconds, job_ids, worker_id))]
+
+    def complete_indexing_job(
+        self, job_id: int, worker_id: str, stage_timings: dict[str, float]
+    ) -> bool:
+        """Mark a leased job succeeded and its document source indexed."""
+        query = f"""
+        WITH done AS (
+            UPDATE {schema_app_data}.indexing_jobs
+            SET state = 'succeeded', lease_expires_at = NULL, last_error = NULL,
+                stage_timings = %s,
+                finished_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+                updated_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+            WHERE id = %s AND worker_id = %s AND state = 'running'
+            RETURNING source_id
+        )
+        UPDATE {schema_app_data}.document_sources s
+        SET is_indexed = TRUE, updated_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        FROM done WHERE s.id = done.source_id
+        RETURNING s.id
+        """
+        return bool(self.execute_query(query, (Json(stage_timings), job_id, worker_id)))
+
+    def fail_indexing_job(
+        self, job_id: int, worker_id: str, error: str, stage_timings: dict[str, float]
+    ) -> str | None:
+        """
+        Release a leased job after an error. The job goes back to pending while it has
+        attempts left, otherwise it is marked failed. Returns the new state.
+        """
+        query = f"""
+        UPDATE {schema_app_data}.indexing_jobs
+        SET state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+            worker_id = NULL, lease_expires_at = NULL, last_error = %s, stage_timings = %s,
+            finished_at = CASE WHEN attempts >= max_attempts
+                THEN (CURRENT_TIMESTAMP AT TIME ZONE 'UTC') END,
+            updated_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        WHERE id = %s AND worker_id = %s AND state = 'running'
+        RETURNING state
+        """
+        rows = self.execute_query(query, (error, Json(stage_timings), job_id, worker_id))
+        return rows[0][0] if rows else None
+
+    @cached_property
+    def schema_catalog(self) -> SchemaCatalog:
+        return SchemaCatalog(self, CATALOG_VERSION_TABLE)
+
+    def list_schemas(self) -> list[str]:
+        return self.schema_catalog.schemas()
 
     def list_tables(self, schema: str) -> list[str]:
-        query = "SELECT table_name FROM information_schema.tables WHERE table_schema = %s AND table_type = 'BASE TABLE'"
-        return [row[0] for row in self.execute_query(query, (schema,))]
+        return self.schema_catalog.tables(schema)
 
     def get_table_columns(self, schema: str, table: str) -> list[dict[str, str]]:
-        query = """
-        SELECT column_name, data_type FROM information_schema.columns
-        WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position
-        """
-        return [{"name": r[0], "type": r[1]} for r in self.execute_query(query, (schema, table))]
+        return self.schema_catalog.columns(schema, table)
 
     def get_column_samples(self, schema: str, table: str, column: str, n: int = 30) -> list[Any]:
         if not (schema.isidentifier() and table.isidentifier() and column.isidentifier()):
             raise ValueError("Invalid schema, table, or column name")
+        if not self.schema_catalog.has_column(schema, table, column):
+            raise ValueError(f"Unknown column {schema}.{table}.{column}")
         internal_limit = max(n * 5, 500)
         query = f"""
         SELECT DISTINCT "{column}" FROM (
@@ -1021,7 +1452,7 @@ class DatabaseManager:
         ) AS limited_scan LIMIT %s;
         """
         try:
-            results = self.execute_query(query, (internal_limit, n))
+            results = self.execute_query(query, (internal_limit, n), label="column_samples")
             return [
                 (str(r[0]) if not isinstance(r[0], str | int | float | bool | list | dict) else r[0])
                 for r in results
@@ -1034,8 +1465,9 @@ class DatabaseManager:
         columns = self.get_table_columns(schema, table)
         special_cols = {"embedding": [], "tsvector": []}
         for col in columns:
-            if "vector" in col["type"].lower():
-                special_cols["embedding"].append(col["name"])
-            elif "tsvector" == col["type"].lower():
+            col_type = col["type"].lower()
+            if col_type == "tsvector":
                 special_cols["tsvector"].append(col["name"])
+            elif "vector" in col_type:  # pgvector, e.g. vector(1536)
+                special_cols["embedding"].append(col["name"])
         return special_cols
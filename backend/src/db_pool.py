@@ -0,0 +1,249 @@
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+logger = logging.getLogger(__name__)
+
+
+class PoolError(Exception):
+    """Raised when the pool is closed or a connection cannot be handed out."""
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection becomes available within the acquire timeout."""
+
+
+@dataclass(slots=True)
+class _Entry:
+    conn: Any
+    created_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections created by `connect`.
+
+    Unlike psycopg2's SimpleConnectionPool it can be shared by request handlers, tool threads
+    and timers: callers block (up to `timeout` seconds) when `max_size` connections are out.
+    Connections idle for more than `check_after` seconds are pinged before being handed out,
+    connections older than `max_lifetime` are recycled, and idle connections above
+    `min_size` are closed after `max_idle` seconds.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        max_lifetime: float = 1800.0,
+        max_idle: float = 300.0,
+        check_after: float = 30.0,
+    ):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool bounds: min_size={min_size}, max_size={max_size}")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+
+        self._cond = threading.Condition()
+        self._idle: deque[_Entry] = deque()
+        self._checked_out: dict[int, _Entry] = {}
+        self._opening = 0
+        self._waiting = 0
+        self._closed = False
+
+        self._opened_total = 0
+        self._closed_total = 0
+        self._acquired_total = 0
+        self._timeouts_total = 0
+        self._acquire_seconds_total = 0.0
+        self._acquire_seconds_max = 0.0
+
+        for _ in range(min_size):
+            self._idle.append(self._open())
+
+    @property
+    def size(self) -> int:
+        return len(self._idle) + len(self._checked_out) + self._opening
+
+    def getconn(self, timeout: float | None = None) -> Any:
+        """Check out a healthy connection, waiting up to `timeout` (default: pool timeout)."""
+        started = time.perf_counter()
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+                self._prune_idle()
+                if self._idle:
+                    # Most recently used first, so surplus connections age out and get pruned
+                    entry = self._idle.pop()
+                    self._checked_out[id(entry.conn)] = entry
+                    break
+                if self.size < self.max_size:
+                    self._opening += 1
+                    entry = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts_total += 1
+                    waited = time.perf_counter() - started
+                    raise PoolTimeout(
+                        f"No database connection available after {waited:.1f}s "
+                        f"({self.max_size} in use, {self._waiting} waiting)"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        if entry is None:
+            try:
+                entry = self._open()
+            finally:
+                with self._cond:
+                    self._opening -= 1
+                    if entry is None:
+                        self._cond.notify()
+        elif not self._usable(entry):
+            # Keep the slot reserved while the stale connection is replaced
+            with self._cond:
+                del self._checked_out[id(entry.conn)]
+                self._opening += 1
+            self._close(entry)
+            try:
+                entry = self._open()
+            except Exception:
+                entry = None
+                raise
+            finally:
+                with self._cond:
+                    self._opening -= 1
+                    if entry is None:
+                        self._cond.notify()
+
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self._checked_out[id(entry.conn)] = entry
+            self._acquired_total += 1
+            self._acquire_seconds_total += elapsed
+            self._acquire_seconds_max = max(self._acquire_seconds_max, elapsed)
+        return entry.conn
+
+    def putconn(self, conn: Any, close: bool = False) -> None:
+        """Return a connection; broken, expired or `close`d connections are discarded."""
+        with self._cond:
+            entry = self._checked_out.pop(id(conn), None)
+        if entry is None:
+            logger.warning("Connection returned to a pool it does not belong to; closing it")
+            self._close(_Entry(conn))
+            return
+
+        discard = close or self._closed or conn.closed or self._expired(entry)
+        if not discard:
+            status = conn.get_transaction_status()
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+
+        if discard:
+            self._close(entry)
+        with self._cond:
+            if not discard:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float | None = None) -> Iterator[Any]:
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self) -> None:
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._cond.notify_all()
+        for entry in idle:
+            self._close(entry)
+
+    def stats(self) -> dict[str, int | float]:
+        with self._cond:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": len(self._checked_out),
+                "waiting": self._waiting,
+                "connections_opened": self._opened_total,
+                "connections_closed": self._closed_total,
+                "acquired": self._acquired_total,
+                "acquire_timeouts": self._timeouts_total,
+                "acquire_seconds_total": round(self._acquire_seconds_total, 6),
+                "acquire_seconds_max": round(self._acquire_seconds_max, 6),
+            }
+
+    def _open(self) -> _Entry:
+        entry = _Entry(self._connect())
+        with self._cond:
+            self._opened_total += 1
+        return entry
+
+    def _close(self, entry: _Entry) -> None:
+        try:
+            if not entry.conn.closed:
+                entry.conn.close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled connection: {e}")
+        with self._cond:
+            self._closed_total += 1
+
+    def _expired(self, entry: _Entry) -> bool:
+        return time.monotonic() - entry.created_at > self.max_lifetime
+
+    def _usable(self, entry: _Entry) -> bool:
+        if entry.conn.closed or self._expired(entry):
+            return False
+        if time.monotonic() - entry.last_used < self.check_after:
+            return True
+        try:
+            with entry.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not entry.conn.autocommit:
+                entry.conn.rollback()
+            return True
+        except Exception as e:
+            logger.info(f"Dropping unhealthy pooled connection: {e}")
+            return False
+
+    def _prune_idle(self) -> None:
+        """Close the least recently used idle connections above min_size. Caller holds the lock."""
+        now = time.monotonic()
+        while (
+            self._idle
+            and self.size > self.min_size
+            and now - self._idle[0].last_used > self.max_idle
+        ):
+            self._close(self._idle.popleft())
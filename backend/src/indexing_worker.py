@@ -0,0 +1,143 @@
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from typing import Any
+from urllib.parse import urlparse
+
+import requests
+
+try:
+    from .db_manager import DatabaseManager
+    from .rag_system import RAGSystem
+except ImportError:
+    from db_manager import DatabaseManager
+    from rag_system import RAGSystem
+
+logger = logging.getLogger(__name__)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class IndexingWorker:
+    """
+    Index document sources claimed from the `indexing_jobs` queue.
+
+    Any number of workers, on any number of machines, can run against the same database:
+    jobs are leased with `FOR UPDATE SKIP LOCKED`, leases are renewed by a heartbeat thread
+    while work is in progress, and a job whose worker stops heartbeating becomes claimable
+    again once its lease expires.
+    """
+
+    def __init__(
+        self,
+        worker_id: str | None = None,
+        batch_size: int | None = None,
+        lease_seconds: int | None = None,
+        poll_interval: float | None = None,
+        db_manager: DatabaseManager | None = None,
+        rag_system: RAGSystem | None = None,
+    ):
+        self.worker_id = worker_id or default_worker_id()
+        self.batch_size = batch_size or int(os.getenv("INDEXING_BATCH_SIZE", "1"))
+        self.lease_seconds = lease_seconds or int(os.getenv("INDEXING_LEASE_SECONDS", "300"))
+        self.poll_interval = poll_interval or float(os.getenv("INDEXING_POLL_INTERVAL", "5"))
+        self.db_manager = db_manager or DatabaseManager()
+        self.rag_system = rag_system or RAGSystem()
+
+        self._held: set[int] = set()
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def run(self, once: bool = False) -> int:
+        """
+        Claim and process batches until stopped. With `once`, return as soon as the queue
+        is empty. Returns the number of jobs processed.
+        """
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop, name=f"heartbeat-{self.worker_id}", daemon=True
+        )
+        heartbeat.start()
+        processed = 0
+        try:
+            while not self._stop.is_set():
+                jobs = self.db_manager.claim_indexing_jobs(
+                    self.worker_id, self.batch_size, self.lease_seconds
+                )
+                if not jobs:
+                    if once:
+                        break
+                    self._stop.wait(self.poll_interval)
+                    continue
+                with self._held_lock:
+                    self._held.update(job["id"] for job in jobs)
+                for job in jobs:
+                    self.process_job(job)
+                    processed += 1
+        finally:
+            self._stop.set()
+            heartbeat.join()
+        return processed
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def process_job(self, job: dict[str, Any]) -> bool:
+        """Index one claimed job and record its outcome. Returns whether it succeeded."""
+        timings: dict[str, float] = {}
+        started = time.perf_counter()
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                fetch_started = time.perf_counter()
+                pdf_path = self._resolve_pdf(job, temp_dir)
+                timings["fetch"] = time.perf_counter() - fetch_started
+                self.rag_system.index_document(
+                    pdf_path, document_name_override=job["name"], timings=timings
+                )
+            timings["total"] = time.perf_counter() - started
+            self.db_manager.complete_indexing_job(job["id"], self.worker_id, timings)
+            logger.info(f"Indexed '{job['name']}' (job {job['id']}) in {timings['total']:.1f}s")
+            return True
+        except Exception as e:
+            timings["total"] = time.perf_counter() - started
+            state = self.db_manager.fail_indexing_job(job["id"], self.worker_id, str(e), timings)
+            logger.error(f"Indexing '{job['name']}' (job {job['id']}) failed, now {state}: {e}")
+            return False
+        finally:
+            with self._held_lock:
+                self._held.discard(job["id"])
+
+    def _resolve_pdf(self, job: dict[str, Any], temp_dir: str) -> str:
+        if job.get("path") and os.path.exists(job["path"]):
+            return job["path"]
+        if not job.get("url"):
+            raise FileNotFoundError(f"Document source '{job['name']}' has no readable path or url")
+
+        filename = os.path.basename(urlparse(job["url"]).path) or "downloaded.pdf"
+        pdf_path = os.path.join(temp_dir, filename)
+        with requests.get(job["url"], stream=True, timeout=30) as response:
+            response.raise_for_status()
+            with open(pdf_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+        return pdf_path
+
+    def _heartbeat_loop(self) -> None:
+        interval = max(self.lease_seconds / 3, 1)
+        while not self._stop.wait(interval):
+            with self._held_lock:
+                held = list(self._held)
+            if not held:
+                continue
+            try:
+                owned = self.db_manager.heartbeat_indexing_jobs(
+                    self.worker_id, held, self.lease_seconds
+                )
+                if lost := set(held) - set(owned):
+                    logger.warning(f"Worker {self.worker_id} lost the lease on jobs {sorted(lost)}")
+            except Exception as e:
+                logger.warning(f"Heartbeat failed for worker {self.worker_id}: {e}")
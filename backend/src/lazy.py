@@ -0,0 +1,84 @@
+import os
+import threading
+from collections.abc import Callable
+from functools import update_wrapper
+from typing import Generic, TypeVar
+
+T = TypeVar("T")
+
+_UNSET = object()
+
+# Objects a forked child inherited from its parent. They stay referenced so that nothing
+# finalizes them in the child: closing a database connection there ends the parent's session.
+_inherited: list[object] = []
+
+
+def _after_fork_in_child(fn: Callable[[], None]) -> None:
+    if hasattr(os, "register_at_fork"):  # Not on Windows, which does not fork
+        os.register_at_fork(after_in_child=fn)
+
+
+def reset_after_fork(cls: type[T]) -> type[T]:
+    """
+    Class decorator for singletons keeping their instance in `cls._instance`: a forked child
+    (e.g. a worker of a pre-forking server) builds its own instance instead of sharing the
+    parent's connections, pools and threads.
+    """
+
+    def forget() -> None:
+        if cls._instance is not None:
+            _inherited.append(cls._instance)
+            cls._instance = None
+        if hasattr(cls, "_instance_lock"):
+            cls._instance_lock = threading.Lock()
+
+    _after_fork_in_child(forget)
+    return cls
+
+
+class LazySingleton(Generic[T]):
+    """
+    Accessor for a process-wide object built by `factory` on first call instead of at import,
+    so importing a module does not open connections or load models it may never use.
+
+    Concurrent first calls build the object once. A factory that raises leaves it unbuilt, and
+    the next call tries again. A forked child builds its own object rather than use the parent's.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._instance = _UNSET
+        update_wrapper(self, factory)
+        _after_fork_in_child(self._forget_after_fork)
+
+    def __call__(self) -> T:
+        instance = self._instance
+        if instance is _UNSET:
+            with self._lock:
+                if self._instance is _UNSET:
+                    self._instance = self._factory()
+                instance = self._instance
+        return instance
+
+    @property
+    def created(self) -> bool:
+        """Whether the object exists, e.g. to shut it down without building it first."""
+        return self._instance is not _UNSET
+
+    def reset(self) -> None:
+        """Forget the object; the next call builds a new one (tests, after a fork)."""
+        with self._lock:
+            self._instance = _UNSET
+
+    def _forget_after_fork(self) -> None:
+        # The lock may have been held by another thread of the parent at the time of the fork
+        self._lock = threading.Lock()
+        if self._instance is not _UNSET:
+            _inherited.append(self._instance)
+            self._instance = _UNSET
+
+
+def lazy_singleton(factory: Callable[[], T]) -> LazySingleton[T]:
+    """Decorator form of LazySingleton for a zero-argument factory function."""
+    return LazySingleton(factory)
@@ -0,0 +1,66 @@
+import contextlib
+import logging
+import os
+import threading
+from collections.abc import Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLock:
+    """
+    Elects one process among those sharing a database, e.g. the workers of a multi-worker
+    service, to run background maintenance: the one holding the session advisory lock `name`
+    on a connection of its own, outside the pool.
+
+    The lock goes away with its connection, so when the leader exits or loses the database,
+    another process takes over at its next `is_leader` call.
+    """
+
+    def __init__(self, name: str, connect: Callable[[], Any]):
+        self.name = name
+        self._connect = connect
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def is_leader(self) -> bool:
+        """Whether this process holds the lock, taking it when it is free."""
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    with self._conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    return True
+                except Exception as e:
+                    logger.warning(f"Lost the connection holding the {self.name} lock: {e}")
+                    self._close()
+            conn = None
+            try:
+                conn = self._connect()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (self.name,))
+                    if cursor.fetchone()[0]:
+                        self._conn, conn = conn, None
+                        logger.info(f"Process {os.getpid()} now runs the {self.name} tasks")
+                        return True
+                return False
+            except Exception as e:
+                logger.warning(f"Could not take the {self.name} lock: {e}")
+                return False
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def release(self) -> None:
+        """Give the lock up (closing its connection), e.g. at shutdown."""
+        with self._lock:
+            self._close()
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            # Closing a connection that is already broken may raise as well
+            with contextlib.suppress(Exception):
+                self._conn.close()
+            self._conn = None
@@ -4,8 +4,8 @@ from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
 from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
 from core.settings import DatabaseType, settings
-from memory.postgres import get_postgres_saver
-from memory.sqlite import get_sqlite_saver
+from memory.postgres import get_postgres_latest_checkpoint_id, get_postgres_saver
+from memory.sqlite import get_sqlite_latest_checkpoint_id, get_sqlite_saver
 
 
 def initialize_database() -> AbstractAsyncContextManager[AsyncSqliteSaver | AsyncPostgresSaver]:
@@ -19,4 +19,14 @@ def initialize_database() -> AbstractAsyncContextManager[AsyncSqliteSaver | Asyn
         return get_sqlite_saver()
 
 
-__all__ = ["initialize_database"]
+def latest_checkpoint_id(thread_id: str) -> str | None:
+    """
+    Id of the latest checkpoint of a thread, None for a thread without any. Unlike the
+    checkpointer's get_tuple, it does not load and deserialise the checkpoint.
+    """
+    if settings.DATABASE_TYPE == DatabaseType.POSTGRES:
+        return get_postgres_latest_checkpoint_id(thread_id)
+    return get_sqlite_latest_checkpoint_id(thread_id)
+
+
+__all__ = ["initialize_database", "latest_checkpoint_id"]
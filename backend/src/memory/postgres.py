@@ -7,16 +7,23 @@ from db_manager import DatabaseManager
 
 logger = logging.getLogger(__name__)
 
-# Instantiate DatabaseManager - it's a singleton
-# This will raise an error during import if DB config is invalid,
-# effectively replacing validate_postgres_config()
-try:
-    db_manager = DatabaseManager()
-except Exception as e:
-    logger.error(f"Failed to initialize DatabaseManager in memory.postgres: {e}")
-    # If DatabaseManager fails, get_postgres_saver will likely fail or use a None db_manager.
-    # This makes db_manager effectively None if initialization fails.
-    db_manager = None
+# AsyncPostgresSaver keeps its tables in the database of the DatabaseManager
+LATEST_CHECKPOINT_SQL = """
+    SELECT checkpoint_id FROM checkpoints
+    WHERE thread_id = %s AND checkpoint_ns = ''
+    ORDER BY checkpoint_id DESC
+    LIMIT 1
+"""
+
+
+def _get_db_manager() -> DatabaseManager | None:
+    """The DatabaseManager singleton, connected when a saver is requested rather than at import."""
+    try:
+        return DatabaseManager()
+    except Exception as e:
+        logger.error(f"Failed to initialize DatabaseManager in memory.postgres: {e}")
+        return None
+
 
 # def validate_postgres_config() -> None: # No longer strictly needed
 #     """
@@ -39,6 +46,7 @@ except Exception as e:
 
 def get_postgres_saver() -> BaseCheckpointSaver:
     """Initialize and return a PostgreSQL saver instance using DatabaseManager."""
+    db_manager = _get_db_manager()
     if not db_manager:
         logger.error(
             "DatabaseManager not available for get_postgres_saver. Check logs for initialization errors."
@@ -69,3 +77,11 @@ def get_postgres_saver() -> BaseCheckpointSaver:
         )
         # Re-raise the exception so the application knows checkpointing setup failed.
         raise
+
+
+def get_postgres_latest_checkpoint_id(thread_id: str) -> str | None:
+    """Id of the latest checkpoint of a thread, read without loading the checkpoint."""
+    rows = DatabaseManager().execute_query(
+        LATEST_CHECKPOINT_SQL, (thread_id,), label="checkpoints.latest"
+    )
+    return rows[0][0] if rows else None
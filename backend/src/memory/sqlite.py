@@ -1,4 +1,5 @@
-from contextlib import AbstractAsyncContextManager
+import sqlite3
+from contextlib import AbstractAsyncContextManager, closing
 
 from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
@@ -8,3 +9,14 @@ from core.settings import settings
 def get_sqlite_saver() -> AbstractAsyncContextManager[AsyncSqliteSaver]:
     """Initialize and return a SQLite saver instance."""
     return AsyncSqliteSaver.from_conn_string(settings.SQLITE_DB_PATH)
+
+
+def get_sqlite_latest_checkpoint_id(thread_id: str) -> str | None:
+    """Id of the latest checkpoint of a thread, read without loading the checkpoint."""
+    with closing(sqlite3.connect(settings.SQLITE_DB_PATH)) as conn:
+        row = conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' "
+            "ORDER BY checkpoint_id DESC LIMIT 1",
+            (thread_id,),
+        ).fetchone()
+    return row[0] if row else None
@@ -0,0 +1,297 @@
+import logging
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("slow_query")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+# Queries slower than this many milliseconds are logged by the `slow_query` logger
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "500"))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterator[str]:
+        """Exposition lines of every series of the metric."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonic counter, one series per label combination."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds, one series per label combination."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: [count per bucket (last one is +Inf)..., sum]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            series[index] += 1
+            series[-1] += value
+
+    def snapshot(self, **labels: str) -> dict[str, float]:
+        """Count and sum of one series, e.g. for tests and /health."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            if series is None:
+                return {"count": 0, "sum": 0.0}
+            return {"count": sum(series[:-1]), "sum": series[-1]}
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0
+            bounds = [*map(_format_value, self.buckets), "+Inf"]
+            for bound, count in zip(bounds, values[:-1], strict=True):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_value(values[-1])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class GaugeCallback(_Metric):
+    """Gauge read at scrape time from `collect`, which returns {label values: value}."""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], dict[tuple[str, ...], float]],
+        labelnames: Iterable[str] = (),
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def samples(self) -> Iterator[str]:
+        try:
+            values = self.collect()
+        except Exception as e:
+            logger.warning(f"Could not collect {self.name}: {e}")
+            return
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Registry:
+    """The metrics of this process, rendered in the Prometheus text exposition format."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # Re-registering (e.g. a module reloaded in tests) replaces the previous metric
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_callback(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], dict[tuple[str, ...], float]],
+        labelnames: Iterable[str] = (),
+    ) -> GaugeCallback:
+        return self.register(GaugeCallback(name, documentation, collect, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+db_query_seconds = REGISTRY.histogram(
+    "db_query_duration_seconds", "Database statement latency by logical query label.", ["label"]
+)
+db_query_rows = REGISTRY.histogram(
+    "db_query_rows", "Rows returned per database statement.", ["label"], buckets=ROW_BUCKETS
+)
+db_query_errors = REGISTRY.counter(
+    "db_query_errors_total", "Database statements that raised, by query label.", ["label"]
+)
+http_request_seconds = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status code.",
+    ["method", "route", "status"],
+)
+
+
+_pools: dict[str, Callable[[], dict[str, Any] | None]] = {}
+
+
+def register_pool(name: str, stats: Callable[[], dict[str, Any] | None]) -> None:
+    """Expose the numeric fields of a pool's stats() as db_pool{pool=name, stat=...}."""
+    _pools[name] = stats
+
+
+def _collect_pools() -> dict[tuple[str, ...], float]:
+    values = {}
+    for name, stats in list(_pools.items()):
+        for stat, value in (stats() or {}).items():
+            if isinstance(value, int | float):
+                values[(name, stat)] = value
+    return values
+
+
+REGISTRY.gauge_callback(
+    "db_pool", "Database connection pool gauges and totals.", _collect_pools, ["pool", "stat"]
+)
+
+
+def redact_params(params: Any) -> Any:
+    """Parameter shapes for logs: values are replaced by their type (and length for strings)."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: redact_params(value) for key, value in params.items()}
+    if isinstance(params, list | tuple):
+        if len(params) > 10:
+            return f"<{type(params).__name__}:{len(params)}>"
+        return [redact_params(value) for value in params]
+    if isinstance(params, str | bytes):
+        return f"<{type(params).__name__}:{len(params)}>"
+    return f"<{type(params).__name__}>"
+
+
+# A SQL string literal, quotes doubled inside it
+_SQL_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+def redact_statement(query: str) -> str:
+    """A statement for logs, on one line, its literals (inlined search terms, names) as `'?'`."""
+    return re.sub(r"\s+", " ", _SQL_LITERAL.sub("'?'", query)).strip()
+
+
+class QueryObservation:
+    __slots__ = ("rows",)
+
+    def __init__(self):
+        self.rows: int | None = None
+
+
+@contextmanager
+def observe_query(label: str | None, query: str, params: Any = None) -> Iterator[QueryObservation]:
+    """
+    Time one database statement under `label`: records its latency, its row count (set
+    `.rows` on the yielded object) and errors, and logs it to `slow_query` above
+    DB_SLOW_QUERY_MS with its literals and parameters redacted.
+    """
+    label = label or "unlabelled"
+    observation = QueryObservation()
+    started = time.perf_counter()
+    try:
+        yield observation
+    except Exception:
+        db_query_errors.inc(label=label)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        db_query_seconds.observe(elapsed, label=label)
+        if observation.rows is not None:
+            db_query_rows.observe(observation.rows, label=label)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            statement = redact_statement(query)[:500]
+            slow_query_logger.warning(
+                f"{label} took {elapsed * 1000:.0f} ms (rows={observation.rows}): "
+                f"{statement} params={redact_params(params)}"
+            )
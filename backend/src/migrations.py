@@ -0,0 +1,631 @@
+import logging
+import os
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+import psycopg2
+import psycopg2.errors
+
+try:
+    from .db_manager import (
+        CATALOG_VERSION_TABLE,
+        create_graph_partitions,
+        encode_graph,
+        schema_app_data,
+    )
+except ImportError:
+    from db_manager import (
+        CATALOG_VERSION_TABLE,
+        create_graph_partitions,
+        encode_graph,
+        schema_app_data,
+    )
+
+logger = logging.getLogger(__name__)
+
+LANGUAGE = os.environ.get("LANGUAGE", "english")
+
+SCHEMA_VERSION_TABLE = f"{schema_app_data}.schema_version"
+# Session advisory lock held while migrating: concurrent starts wait for the one applying them
+MIGRATION_LOCK = f"migrations:{schema_app_data}"
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    """One schema change. `apply` runs inside the transaction that records `version`."""
+
+    version: int
+    name: str
+    apply: Callable[[object], None]
+
+
+def _app_tables(cursor) -> None:
+    """Users, files, conversations, feedback, uploaded documents, indexing jobs and graphs."""
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.users (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            email TEXT UNIQUE NOT NULL,
+            hashed_password TEXT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+            updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_email ON {schema_app_data}.users(email);
+
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.files (
+            id UUID PRIMARY KEY,
+            thread_id UUID,
+            user_id UUID,
+            filename TEXT NOT NULL,
+            content_type TEXT,
+            content BYTEA, -- legacy inline content, see offload_file_contents
+            content_sha256 TEXT, -- address of the content in the blob store
+            size BIGINT,
+            text_content TEXT,
+            metadata JSONB,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        );
+
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.conversations (
+            thread_id UUID PRIMARY KEY,
+            user_id UUID,
+            title TEXT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+            updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        );
+
+        ALTER TABLE {schema_app_data}.files ADD COLUMN IF NOT EXISTS user_id UUID;
+        ALTER TABLE {schema_app_data}.conversations ADD COLUMN IF NOT EXISTS user_id UUID;
+
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.feedback (
+            id SERIAL PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            key TEXT NOT NULL,
+            score FLOAT NOT NULL,
+            conversation_id TEXT NULL,
+            commented_message_text TEXT NULL,
+            additional_data JSONB,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_files_thread_id ON {schema_app_data}.files(thread_id);
+        CREATE INDEX IF NOT EXISTS idx_files_user_id ON {schema_app_data}.files(user_id);
+        -- File bytes live in the blob store; tables created before keep them inline until
+        -- offload_file_contents moves them out
+        ALTER TABLE {schema_app_data}.files
+            ADD COLUMN IF NOT EXISTS content_sha256 TEXT,
+            ADD COLUMN IF NOT EXISTS size BIGINT;
+        CREATE INDEX IF NOT EXISTS idx_files_content_sha256
+            ON {schema_app_data}.files(content_sha256);
+        CREATE INDEX IF NOT EXISTS idx_feedback_run_id ON {schema_app_data}.feedback(run_id);
+        CREATE INDEX IF NOT EXISTS idx_conversations_created_at
+            ON {schema_app_data}.conversations(updated_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_conversations_user_id
+            ON {schema_app_data}.conversations(user_id);
+
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.uploaded_document_blocks (
+            id SERIAL PRIMARY KEY,
+            block_idx INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            content TEXT,
+            level INTEGER NOT NULL,
+            page_idx INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            block_class TEXT,
+            x0 FLOAT,
+            y0 FLOAT,
+            x1 FLOAT,
+            y1 FLOAT,
+            parent_idx INTEGER,
+            content_type TEXT DEFAULT 'regular',
+            section_type TEXT,
+            demand_priority INTEGER,
+            content_hash TEXT,
+            UNIQUE(name, block_idx)
+        );
+        -- Uploaded blocks share the classification and hash columns written by RAGSystem
+        ALTER TABLE {schema_app_data}.uploaded_document_blocks
+            ADD COLUMN IF NOT EXISTS content_type TEXT DEFAULT 'regular',
+            ADD COLUMN IF NOT EXISTS section_type TEXT,
+            ADD COLUMN IF NOT EXISTS demand_priority INTEGER,
+            ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.document_sources (
+            id SERIAL PRIMARY KEY,
+            name TEXT UNIQUE NOT NULL,
+            path TEXT,
+            url TEXT,
+            is_indexed BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+            updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        );
+        CREATE INDEX IF NOT EXISTS idx_document_sources_name
+            ON {schema_app_data}.document_sources(name);
+        CREATE INDEX IF NOT EXISTS idx_document_sources_path
+            ON {schema_app_data}.document_sources(path);
+        CREATE INDEX IF NOT EXISTS idx_document_sources_url
+            ON {schema_app_data}.document_sources(url);
+
+        -- Indexing work queue, one row per document source (see indexing_worker.py)
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.indexing_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            source_id INTEGER UNIQUE NOT NULL
+                REFERENCES {schema_app_data}.document_sources(id) ON DELETE CASCADE,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            worker_id TEXT,
+            lease_expires_at TIMESTAMP WITHOUT TIME ZONE,
+            last_error TEXT,
+            stage_timings JSONB NOT NULL DEFAULT '{{}}'::jsonb,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+            updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+            started_at TIMESTAMP WITHOUT TIME ZONE,
+            finished_at TIMESTAMP WITHOUT TIME ZONE,
+            CHECK (state IN ('pending', 'running', 'succeeded', 'failed'))
+        );
+        CREATE INDEX IF NOT EXISTS idx_indexing_jobs_claimable
+            ON {schema_app_data}.indexing_jobs(state, lease_expires_at, id)
+            WHERE state IN ('pending', 'running');
+
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.graphs (
+            graph_id UUID PRIMARY KEY,
+            graph_json JSONB NOT NULL,
+            expiry_time TIMESTAMP WITHOUT TIME ZONE NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_graphs_expiry_time ON {schema_app_data}.graphs(expiry_time);
+
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.user_feedback (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            user_id UUID NOT NULL REFERENCES {schema_app_data}.users(id) ON DELETE CASCADE,
+            feedback_content TEXT NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        );
+        CREATE INDEX IF NOT EXISTS idx_user_feedback_user_id
+            ON {schema_app_data}.user_feedback(user_id);
+        CREATE INDEX IF NOT EXISTS idx_user_feedback_created_at
+            ON {schema_app_data}.user_feedback(created_at DESC);
+        """
+    )
+
+    # Databases created before user accounts may hold rows the constraints reject; they are
+    # then left without them, as before versioning
+    cursor.execute("SAVEPOINT user_fks")
+    try:
+        cursor.execute(
+            f"""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_constraint
+                    WHERE conname = 'fk_files_user_id' AND conrelid = '{schema_app_data}.files'::regclass
+                ) THEN
+                    ALTER TABLE {schema_app_data}.files
+                    ADD CONSTRAINT fk_files_user_id FOREIGN KEY (user_id)
+                    REFERENCES {schema_app_data}.users(id) ON DELETE CASCADE;
+                END IF;
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_constraint
+                    WHERE conname = 'fk_conversations_user_id'
+                      AND conrelid = '{schema_app_data}.conversations'::regclass
+                ) THEN
+                    ALTER TABLE {schema_app_data}.conversations
+                    ADD CONSTRAINT fk_conversations_user_id FOREIGN KEY (user_id)
+                    REFERENCES {schema_app_data}.users(id) ON DELETE CASCADE;
+                END IF;
+            END $$;
+            """
+        )
+    except psycopg2.Error as e:
+        logger.warning(f"Could not add the user_id foreign keys to files and conversations: {e}")
+        cursor.execute("ROLLBACK TO SAVEPOINT user_fks")
+    else:
+        cursor.execute("RELEASE SAVEPOINT user_fks")
+
+
+def _rag_tables(cursor) -> None:
+    """
+    Indexed document blocks and their deduplicated search text. The secondary search indexes
+    are (re)built by RAGSystem, which drops them during bulk loads.
+    """
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.rag_document_blocks (
+            id SERIAL PRIMARY KEY,
+            block_idx INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            content TEXT,
+            level INTEGER NOT NULL,
+            page_idx INTEGER NOT NULL,
+            tag TEXT NOT NULL,
+            block_class TEXT,
+            x0 FLOAT,
+            y0 FLOAT,
+            x1 FLOAT,
+            y1 FLOAT,
+            parent_idx INTEGER,
+            content_type TEXT DEFAULT 'regular',
+            section_type TEXT,
+            demand_priority INTEGER,
+            content_hash TEXT,
+            UNIQUE(name, block_idx)
+        );
+
+        -- One row, tsvector and GIN entry per distinct block text
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.block_contents (
+            content_hash TEXT PRIMARY KEY,
+            content TEXT NOT NULL,
+            content_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('{LANGUAGE}', content)) STORED,
+            doc_count INTEGER NOT NULL DEFAULT 0
+        );
+
+        ALTER TABLE {schema_app_data}.rag_document_blocks ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+        -- ContentClassifier.VERSION the blocks of each document were last classified with
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.document_classifications (
+            name TEXT PRIMARY KEY,
+            classifier_version INTEGER NOT NULL,
+            classified_at TIMESTAMP WITHOUT TIME ZONE DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        );
+        """
+    )
+
+    # Blocks indexed before content deduplication carry their own tsvector column: move their
+    # search text into block_contents, then drop the column (and its GIN index)
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = 'rag_document_blocks'
+          AND column_name = 'content_tsv'
+        """,
+        (schema_app_data,),
+    )
+    if not cursor.fetchall():
+        return
+    logger.info("Migrating rag_document_blocks search text into block_contents...")
+    cursor.execute(
+        f"""
+        UPDATE {schema_app_data}.rag_document_blocks SET content_hash = md5(content)
+        WHERE content IS NOT NULL AND content_hash IS NULL
+        """
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO {schema_app_data}.block_contents (content_hash, content, doc_count)
+        SELECT content_hash, MIN(content), COUNT(DISTINCT name)
+        FROM {schema_app_data}.rag_document_blocks
+        WHERE content_hash IS NOT NULL
+        GROUP BY content_hash
+        ON CONFLICT (content_hash) DO UPDATE SET doc_count = EXCLUDED.doc_count
+        """
+    )
+    cursor.execute(f"ALTER TABLE {schema_app_data}.rag_document_blocks DROP COLUMN content_tsv")
+
+
+def _catalog_version(cursor) -> None:
+    """
+    Version counter bumped on every DDL statement, so SchemaCatalog notices schema changes
+    before its TTL expires.
+    """
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {CATALOG_VERSION_TABLE} (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            version BIGINT NOT NULL DEFAULT 0
+        );
+        INSERT INTO {CATALOG_VERSION_TABLE} DEFAULT VALUES ON CONFLICT DO NOTHING;
+        """
+    )
+    cursor.execute("SAVEPOINT event_trigger")
+    try:
+        cursor.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION {schema_app_data}.bump_catalog_version()
+            RETURNS event_trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                UPDATE {CATALOG_VERSION_TABLE} SET version = version + 1;
+            END $$;
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_event_trigger WHERE evtname = 'catalog_version_ddl'
+                ) THEN
+                    CREATE EVENT TRIGGER catalog_version_ddl ON ddl_command_end
+                    EXECUTE FUNCTION {schema_app_data}.bump_catalog_version();
+                END IF;
+            END $$;
+            """
+        )
+    except psycopg2.Error as e:
+        # Event triggers need superuser; the schema catalog then relies on its TTL
+        logger.warning(f"Could not install the catalog version event trigger: {e}")
+        cursor.execute("ROLLBACK TO SAVEPOINT event_trigger")
+    else:
+        cursor.execute("RELEASE SAVEPOINT event_trigger")
+
+
+def _usage_counters(cursor) -> None:
+    """
+    Usage counters maintained as runs finish (DatabaseManager.record_run_usage) and daily
+    feedback rollups maintained as feedback is saved, so usage statistics never scan the
+    conversations or their checkpoints.
+    """
+    cursor.execute(
+        f"""
+        CREATE TABLE {schema_app_data}.conversation_usage (
+            thread_id UUID PRIMARY KEY,
+            user_id UUID,
+            user_messages BIGINT NOT NULL DEFAULT 0,
+            ai_messages BIGINT NOT NULL DEFAULT 0,
+            runs BIGINT NOT NULL DEFAULT 0,
+            -- History before the counters existed was added by backfill-usage.py
+            backfilled BOOLEAN NOT NULL DEFAULT FALSE,
+            first_run_at TIMESTAMP WITHOUT TIME ZONE,
+            last_run_at TIMESTAMP WITHOUT TIME ZONE
+        );
+        CREATE INDEX idx_conversation_usage_user_id
+            ON {schema_app_data}.conversation_usage(user_id);
+
+        -- Activity per UTC day and user; runs without a user are counted under the nil UUID
+        CREATE TABLE {schema_app_data}.usage_daily (
+            day DATE NOT NULL,
+            user_id UUID NOT NULL,
+            conversations BIGINT NOT NULL DEFAULT 0,
+            user_messages BIGINT NOT NULL DEFAULT 0,
+            ai_messages BIGINT NOT NULL DEFAULT 0,
+            runs BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, user_id)
+        );
+        CREATE INDEX idx_usage_daily_user_id ON {schema_app_data}.usage_daily(user_id, day);
+
+        CREATE TABLE {schema_app_data}.usage_totals (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            conversations BIGINT NOT NULL DEFAULT 0,
+            user_messages BIGINT NOT NULL DEFAULT 0,
+            ai_messages BIGINT NOT NULL DEFAULT 0,
+            runs BIGINT NOT NULL DEFAULT 0
+        );
+        INSERT INTO {schema_app_data}.usage_totals DEFAULT VALUES;
+
+        CREATE TABLE {schema_app_data}.feedback_daily (
+            day DATE NOT NULL,
+            key TEXT NOT NULL,
+            feedback_count BIGINT NOT NULL DEFAULT 0,
+            score_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, key)
+        );
+        INSERT INTO {schema_app_data}.feedback_daily (day, key, feedback_count, score_sum)
+        SELECT created_at::date, key, COUNT(*), SUM(score)
+        FROM {schema_app_data}.feedback
+        GROUP BY created_at::date, key;
+        """
+    )
+
+
+def _feedback_conversation_index(cursor) -> None:
+    """/history reads the feedbacks of one conversation at a time."""
+    cursor.execute(
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_feedback_conversation_id
+            ON {schema_app_data}.feedback(conversation_id, created_at DESC)
+        """
+    )
+
+
+def _graph_partitions(cursor) -> None:
+    """
+    Graphs stored gzip-compressed with their content hash, so identical ones are stored once
+    (DatabaseManager.save_graph), in monthly partitions that maintain_graph_partitions drops
+    after the retention period. Graphs still being served are carried over.
+    """
+    cursor.execute(
+        f"""
+        ALTER TABLE {schema_app_data}.graphs RENAME TO graphs_legacy;
+        DROP INDEX IF EXISTS {schema_app_data}.idx_graphs_expiry_time;
+
+        CREATE TABLE {schema_app_data}.graphs (
+            graph_id UUID NOT NULL,
+            content_sha256 TEXT NOT NULL,
+            graph_gzip BYTEA NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+                DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'),
+            expiry_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (graph_id, created_at)
+        ) PARTITION BY RANGE (created_at);
+        CREATE INDEX idx_graphs_content_sha256
+            ON {schema_app_data}.graphs(content_sha256, expiry_time);
+        -- Catches rows of months whose partition was not created in time
+        CREATE TABLE {schema_app_data}.graphs_default
+            PARTITION OF {schema_app_data}.graphs DEFAULT;
+        """
+    )
+    create_graph_partitions(cursor, datetime.now(UTC).date())
+    cursor.execute(
+        f"""
+        SELECT graph_id, graph_json::text, expiry_time FROM {schema_app_data}.graphs_legacy
+        WHERE expiry_time > (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        """
+    )
+    for graph_id, graph_json, expiry_time in cursor.fetchall():
+        content_sha256, graph_gzip = encode_graph(graph_json)
+        cursor.execute(
+            f"""
+            INSERT INTO {schema_app_data}.graphs
+                (graph_id, content_sha256, graph_gzip, expiry_time)
+            VALUES (%s, %s, %s, %s)
+            """,
+            (graph_id, content_sha256, psycopg2.Binary(graph_gzip), expiry_time),
+        )
+    cursor.execute(f"DROP TABLE {schema_app_data}.graphs_legacy")
+
+
+def _upload_jobs(cursor) -> None:
+    """
+    Upload job progress, written by the worker process running the job, so that any worker
+    of the service can answer /upload/jobs (see UploadJobManager).
+    """
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {schema_app_data}.upload_jobs (
+            job_id UUID PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            snapshot JSONB NOT NULL,
+            updated_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+                DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        );
+        CREATE INDEX IF NOT EXISTS idx_upload_jobs_finished
+            ON {schema_app_data}.upload_jobs(updated_at)
+            WHERE status IN ('succeeded', 'failed');
+        """
+    )
+
+
+def _rag_block_texts_in_contents(cursor) -> None:
+    """
+    Block texts are kept once in block_contents, which the readers join: add the texts that are
+    still missing there, then drop the copy each rag_document_blocks row held.
+    """
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = %s AND table_name = 'rag_document_blocks' AND column_name = 'content'
+        """,
+        (schema_app_data,),
+    )
+    if not cursor.fetchall():
+        return
+    cursor.execute(
+        f"""
+        UPDATE {schema_app_data}.rag_document_blocks SET content_hash = md5(content)
+        WHERE content <> '' AND content_hash IS NULL
+        """
+    )
+    cursor.execute(
+        f"""
+        INSERT INTO {schema_app_data}.block_contents (content_hash, content, doc_count)
+        SELECT content_hash, MIN(content), COUNT(DISTINCT name)
+        FROM {schema_app_data}.rag_document_blocks
+        WHERE content_hash IS NOT NULL
+        GROUP BY content_hash
+        ON CONFLICT (content_hash) DO UPDATE SET doc_count = EXCLUDED.doc_count
+        """
+    )
+    cursor.execute(f"ALTER TABLE {schema_app_data}.rag_document_blocks DROP COLUMN content")
+
+
+# Applied in order and recorded in schema_version. Never edit or renumber a released
+# migration: add a new one. The first ones only use IF NOT EXISTS DDL, so databases created
+# before versioning adopt them without changes.
+MIGRATIONS: list[Migration] = [
+    Migration(1, "app_tables", _app_tables),
+    Migration(2, "rag_tables", _rag_tables),
+    Migration(3, "catalog_version", _catalog_version),
+    Migration(4, "usage_counters", _usage_counters),
+    Migration(5, "feedback_conversation_index", _feedback_conversation_index),
+    Migration(6, "graph_partitions", _graph_partitions),
+    Migration(7, "upload_jobs", _upload_jobs),
+    Migration(8, "rag_block_texts_in_contents", _rag_block_texts_in_contents),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+class SchemaOutdatedError(RuntimeError):
+    """The database is behind the code and migrations may not be applied on startup."""
+
+
+def current_version(db_manager) -> int:
+    """Highest applied migration, 0 for a database that was never migrated. One cheap query."""
+    try:
+        rows = db_manager.execute_query(
+            f"SELECT COALESCE(MAX(version), 0) FROM {SCHEMA_VERSION_TABLE}",
+            label="schema_version.check",
+        )
+    except (psycopg2.errors.UndefinedTable, psycopg2.errors.InvalidSchemaName):
+        return 0
+    return rows[0][0] if rows else 0
+
+
+def migrate(db_manager, target: int | None = None) -> list[Migration]:
+    """
+    Apply the pending migrations up to `target` (default: all), each in its own transaction,
+    and return them.
+
+    A session advisory lock elects one process: others starting at the same time wait for it,
+    then find nothing left to apply.
+    """
+    target = LATEST_VERSION if target is None else target
+    applied_now: list[Migration] = []
+    conn = db_manager.get_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(hashtext(%s))", (MIGRATION_LOCK,))
+            try:
+                conn.autocommit = False
+                cursor.execute(
+                    f"""
+                    CREATE SCHEMA IF NOT EXISTS {schema_app_data};
+                    CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+                        version INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        duration_ms INTEGER,
+                        applied_at TIMESTAMP WITHOUT TIME ZONE
+                            DEFAULT (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+                    )
+                    """
+                )
+                cursor.execute(f"SELECT version FROM {SCHEMA_VERSION_TABLE}")
+                applied = {version for (version,) in cursor.fetchall()}
+                conn.commit()
+
+                for migration in MIGRATIONS:
+                    if migration.version in applied or migration.version > target:
+                        continue
+                    started = time.perf_counter()
+                    logger.info(f"Applying migration {migration.version} ({migration.name})")
+                    migration.apply(cursor)
+                    duration_ms = round((time.perf_counter() - started) * 1000)
+                    cursor.execute(
+                        f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, name, duration_ms) "
+                        "VALUES (%s, %s, %s)",
+                        (migration.version, migration.name, duration_ms),
+                    )
+                    conn.commit()
+                    applied_now.append(migration)
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+                cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (MIGRATION_LOCK,))
+    finally:
+        db_manager.release_connection(conn)
+    return applied_now
+
+
+def ensure_schema(db_manager, auto_migrate: bool | None = None) -> int:
+    """
+    Startup check: returns at once when the database is current. Otherwise applies the pending
+    migrations, or raises SchemaOutdatedError when DB_AUTO_MIGRATE is disabled (deployments
+    that run backend/scripts/migrate-db.py before rolling out).
+    """
+    version = current_version(db_manager)
+    if version >= LATEST_VERSION:
+        if version > LATEST_VERSION:
+            logger.warning(
+                f"Database schema version {version} is newer than this code ({LATEST_VERSION})"
+            )
+        return version
+
+    if auto_migrate is None:
+        auto_migrate = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
+    if not auto_migrate:
+        raise SchemaOutdatedError(
+            f"Database schema is at version {version}, this code needs {LATEST_VERSION}. "
+            "Run backend/scripts/migrate-db.py, or set DB_AUTO_MIGRATE=true."
+        )
+    migrate(db_manager)
+    return LATEST_VERSION
@@ -0,0 +1,53 @@
+import io
+import threading
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    PdfReader = None
+    PdfWriter = None
+
+
+def is_available() -> bool:
+    """Whether PDFs can be split locally (requires the optional pypdf package)."""
+    return PdfReader is not None
+
+
+def page_ranges(num_pages: int, chunk_pages: int) -> list[tuple[int, int]]:
+    """
+    Split `num_pages` into consecutive half-open ranges of at most `chunk_pages` pages.
+
+    Example: page_ranges(5, 2) -> [(0, 2), (2, 4), (4, 5)]
+    """
+    if chunk_pages <= 0:
+        raise ValueError("chunk_pages must be a positive integer")
+    return [
+        (start, min(start + chunk_pages, num_pages)) for start in range(0, num_pages, chunk_pages)
+    ]
+
+
+class PdfSplitter:
+    """
+    A PDF file parsed once, then cut into standalone PDFs of page ranges. The pypdf reader is
+    not thread safe: extractions from several threads take turns.
+    """
+
+    def __init__(self, pdf_path: str):
+        if PdfReader is None:
+            raise ImportError("pypdf is required to split PDFs into page ranges.")
+        self._reader = PdfReader(pdf_path)
+        self._lock = threading.Lock()
+
+    @property
+    def num_pages(self) -> int:
+        return len(self._reader.pages)
+
+    def extract(self, start: int, end: int) -> bytes:
+        """Return a standalone PDF containing pages [start, end)."""
+        buffer = io.BytesIO()
+        with self._lock:
+            writer = PdfWriter()
+            for page_number in range(start, end):
+                writer.add_page(self._reader.pages[page_number])
+            writer.write(buffer)
+        return buffer.getvalue()
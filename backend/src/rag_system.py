@@ -1,25 +1,54 @@
+import asyncio
+import hashlib
 import json
+import logging
 import os
 import re
+import sys
+import time
+from collections.abc import Generator, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import Any
 
+import httpx
+import ijson
+import requests
 from dotenv import load_dotenv
 from llmsherpa.readers import LayoutPDFReader
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
 
 try:
-    from .content_classifiers import ContentClassifier, ContentType
+    from . import pdf_chunking
+    from .async_db_manager import AsyncDatabaseManager
+    from .content_classifiers import ContentClassifier
     from .db_manager import DatabaseManager, schema_app_data
+    from .lazy import lazy_singleton
+    from .lru import LRUCache
+    from .single_flight import SingleFlight, flight_key
 except ImportError:
-    from content_classifiers import ContentClassifier, ContentType
+    import pdf_chunking
+    from async_db_manager import AsyncDatabaseManager
+    from content_classifiers import ContentClassifier
     from db_manager import DatabaseManager, schema_app_data
+    from lazy import lazy_singleton
+    from lru import LRUCache
+    from single_flight import SingleFlight, flight_key
 
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 LANGUAGE = os.environ.get("LANGUAGE", "english")
 
+# Read paths are written once as generators that yield (label, sql, params) and are sent back
+# the fetched rows, then driven by either the psycopg2 pool or the asyncio pool. The label
+# names the statement in the query metrics.
+QuerySteps = Generator[tuple[str, str, Any], list[tuple], Any]
+
 
 def _prefix_columns_in_where_clause(clause_str: str, prefix: str = "js.") -> str:
     if not clause_str:
@@ -119,7 +148,7 @@ def _prefix_columns_in_order_by_clause(clause_str: str, prefix: str = "js.") ->
     return ", ".join(prefixed_terms)
 
 
-@dataclass
+@dataclass(slots=True)
 class BlockMetadata:
     """Metadata for a document block from llmsherpa"""
 
@@ -128,10 +157,10 @@ class BlockMetadata:
     page_idx: int
     tag: str
     block_class: str
-    bbox: list[float]
+    bbox: tuple[float, ...]
 
 
-@dataclass
+@dataclass(slots=True)
 class DocumentBlock:
     """Representation of a document block with content and metadata"""
 
@@ -139,6 +168,13 @@ class DocumentBlock:
     content: str
     metadata: BlockMetadata
     parent_idx: int | None = None
+    content_type: str = "regular"
+    section_type: str | None = None
+    demand_priority: int | None = None
+
+
+# JSON path of the block list inside an nlm-ingestor parseDocument response
+LAYOUT_BLOCKS_PATH = "return_dict.result.blocks.item"
 
 
 class SherpaDocumentProcessor:
@@ -149,67 +185,186 @@ class SherpaDocumentProcessor:
             "LLMSHERPA_API_URL",
             "http://localhost:5010/api/parseDocument?renderFormat=all&useNewIndentParser=true",
         )
+        self.request_timeout = float(os.getenv("LLMSHERPA_TIMEOUT", "600"))
+        self.max_retries = int(os.getenv("LLMSHERPA_MAX_RETRIES", "3"))
+        # Page-range fan-out: PDFs with at least `fanout_min_pages` pages are split into
+        # chunks of `fanout_chunk_pages` pages parsed concurrently. 0 disables fan-out.
+        self.fanout_min_pages = int(os.getenv("PDF_FANOUT_MIN_PAGES", "0"))
+        self.fanout_chunk_pages = int(os.getenv("PDF_FANOUT_CHUNK_PAGES", "50"))
+        self.fanout_concurrency = int(os.getenv("PDF_FANOUT_CONCURRENCY", "4"))
         self.pdf_reader = LayoutPDFReader(self.sherpa_api_url)
 
     def process_pdf(self, pdf_path):
         """Process a PDF file using llmsherpa and return DocumentBlock objects"""
+        fanout = self._fanout_page_ranges(pdf_path)
+        if fanout:
+            splitter, ranges = fanout
+            blocks = _run_sync(self.aprocess_page_ranges(pdf_path, ranges, splitter))
+            self._establish_hierarchy(blocks)
+            return blocks
+        return self._process_sherpa_data(self.iter_layout_blocks(pdf_path))
+
+    def _fanout_page_ranges(
+        self, pdf_path
+    ) -> tuple[pdf_chunking.PdfSplitter, list[tuple[int, int]]] | None:
+        """
+        Return the opened PDF and the page ranges to parse concurrently, or None to parse in a
+        single request.
+        """
+        if self.fanout_min_pages <= 0 or not os.path.isfile(pdf_path):
+            return None
+        if not pdf_chunking.is_available():
+            logger.warning("PDF fan-out is enabled but pypdf is not installed; parsing whole file.")
+            return None
+        splitter = pdf_chunking.PdfSplitter(pdf_path)
+        num_pages = splitter.num_pages
+        if num_pages < self.fanout_min_pages or num_pages <= self.fanout_chunk_pages:
+            return None
+        return splitter, pdf_chunking.page_ranges(num_pages, self.fanout_chunk_pages)
+
+    async def aprocess_page_ranges(
+        self,
+        pdf_path: str,
+        ranges: list[tuple[int, int]],
+        splitter: pdf_chunking.PdfSplitter | None = None,
+    ) -> list[DocumentBlock]:
+        """
+        Parse page ranges of a PDF concurrently and stitch the results into one document.
+
+        Every range is cut from the same parsed PDF (`splitter`, opened here if not given).
+        Page and block indices are shifted so they are consistent across the whole document.
+        The caller is responsible for establishing the hierarchy on the stitched blocks.
+        """
+        if splitter is None:
+            splitter = await asyncio.to_thread(pdf_chunking.PdfSplitter, pdf_path)
+        semaphore = asyncio.Semaphore(self.fanout_concurrency)
+        limits = httpx.Limits(max_connections=self.fanout_concurrency)
+        timeout = httpx.Timeout(self.request_timeout, connect=30.0)
+        file_stem = os.path.splitext(os.path.basename(pdf_path))[0]
+
+        async def parse_range(client: httpx.AsyncClient, start: int, end: int):
+            async with semaphore:
+                chunk = await asyncio.to_thread(splitter.extract, start, end)
+                files = {"file": (f"{file_stem}_p{start}-{end}.pdf", chunk, "application/pdf")}
+                async for attempt in AsyncRetrying(
+                    stop=stop_after_attempt(self.max_retries),
+                    wait=wait_exponential(multiplier=1, max=30),
+                    retry=retry_if_exception(_is_retryable_http_error),
+                    reraise=True,
+                ):
+                    with attempt:
+                        response = await client.post(self.sherpa_api_url, files=files)
+                        response.raise_for_status()
+                layout_blocks = response.json()["return_dict"]["result"]["blocks"]
+                return [self._to_document_block(block_data) for block_data in layout_blocks]
+
         try:
-            sherpa_data = self.pdf_reader.read_pdf(pdf_path).json
+            async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+                chunk_results = await asyncio.gather(
+                    *(parse_range(client, start, end) for start, end in ranges)
+                )
         except Exception as e:
             raise ValueError(f"Error processing PDF with llmsherpa: {e}")
-        return self._process_sherpa_data(sherpa_data)
 
-    def _process_sherpa_data(self, sherpa_data):
-        """Process raw llmsherpa output (JSON) and convert to DocumentBlock objects"""
+        return self._stitch_page_ranges(ranges, chunk_results)
+
+    @staticmethod
+    def _stitch_page_ranges(
+        ranges: list[tuple[int, int]], chunk_results: list[list[DocumentBlock]]
+    ) -> list[DocumentBlock]:
+        """Shift chunk-local page and block indices to document-global ones."""
         blocks = []
+        block_offset = 0
+        for (start_page, _), chunk_blocks in zip(ranges, chunk_results):
+            for block in chunk_blocks:
+                block.block_idx += block_offset
+                block.metadata.block_idx = block.block_idx
+                block.metadata.page_idx += start_page
+            blocks.extend(chunk_blocks)
+            if chunk_blocks:
+                block_offset = max(block.block_idx for block in chunk_blocks) + 1
+        return blocks
+
+    def iter_layout_blocks(self, pdf_path) -> Iterator[dict[str, Any]]:
+        """
+        Yield raw layout blocks for a PDF one at a time.
 
-        if isinstance(sherpa_data, str):
+        The parser response for a local file is decoded incrementally with ijson, so the
+        full layout JSON is never materialised. URLs are read with llmsherpa's reader.
+        """
+        try:
+            if not os.path.isfile(pdf_path):
+                yield from self.pdf_reader.read_pdf(pdf_path).json
+                return
+
+            with (
+                open(pdf_path, "rb") as pdf_file,
+                requests.post(
+                    self.sherpa_api_url,
+                    files={"file": (os.path.basename(pdf_path), pdf_file, "application/pdf")},
+                    stream=True,
+                    timeout=self.request_timeout,
+                ) as response,
+            ):
+                response.raise_for_status()
+                response.raw.decode_content = True
+                yield from ijson.items(response.raw, LAYOUT_BLOCKS_PATH, use_float=True)
+        except Exception as e:
+            raise ValueError(f"Error processing PDF with llmsherpa: {e}")
+
+    def _process_sherpa_data(self, sherpa_data):
+        """Process raw llmsherpa output (JSON) and convert to DocumentBlock objects"""
+        if isinstance(sherpa_data, str | bytes):
             try:
                 sherpa_data = json.loads(sherpa_data)
             except json.JSONDecodeError:
                 raise ValueError("Invalid JSON data from llmsherpa")
 
-        for block_data in sherpa_data:
-            # Extract content from sentences
-            content = ""
-            if "sentences" in block_data:
-                sentences = block_data["sentences"]
-                if isinstance(sentences, list):
-                    if sentences and isinstance(sentences[0], dict) and "text" in sentences[0]:
-                        content = " ".join(s["text"] for s in sentences)
-                    elif sentences and isinstance(sentences[0], str):
-                        content = " ".join(sentences)
-            elif "table_rows" in block_data:
-                for row in block_data["table_rows"]:
-                    try:
-                        cells = row.get("cells", [])
-                        if cells:
-                            content += " | ".join(str(cell["cell_value"]) for cell in cells) + "\n"
-                        elif row.get("cell_value"):
-                            content += str(row["cell_value"]) + "\n"
-                    except KeyError:
-                        raise ValueError("Invalid table row format")
-            elif "name" in block_data:
-                content = block_data["name"]
-            else:
-                raise ValueError("Invalid block data format")
-
-            metadata = BlockMetadata(
-                block_idx=block_data.get("block_idx", 0),
-                level=block_data.get("level", 0),
-                page_idx=block_data.get("page_idx", 0),
-                tag=block_data.get("tag", "unknown"),
-                block_class=block_data.get("block_class", ""),
-                bbox=block_data.get("bbox", [0, 0, 0, 0]),
-            )
-
-            block = DocumentBlock(block_idx=metadata.block_idx, content=content, metadata=metadata)
-
-            blocks.append(block)
+        blocks = [self._to_document_block(block_data) for block_data in sherpa_data]
 
         self._establish_hierarchy(blocks)
         return blocks
 
+    def _to_document_block(self, block_data: dict[str, Any]) -> DocumentBlock:
+        """Convert a single raw llmsherpa block into a compact DocumentBlock"""
+        # Extract content from sentences
+        content = ""
+        if "sentences" in block_data:
+            sentences = block_data["sentences"]
+            if isinstance(sentences, list):
+                if sentences and isinstance(sentences[0], dict) and "text" in sentences[0]:
+                    content = " ".join(s["text"] for s in sentences)
+                elif sentences and isinstance(sentences[0], str):
+                    content = " ".join(sentences)
+        elif "table_rows" in block_data:
+            lines = []
+            for row in block_data["table_rows"]:
+                try:
+                    cells = row.get("cells", [])
+                    if cells:
+                        lines.append(" | ".join(str(cell["cell_value"]) for cell in cells) + "\n")
+                    elif row.get("cell_value"):
+                        lines.append(str(row["cell_value"]) + "\n")
+                except KeyError:
+                    raise ValueError("Invalid table row format")
+            content = "".join(lines)
+        elif "name" in block_data:
+            content = block_data["name"]
+        else:
+            raise ValueError("Invalid block data format")
+
+        # Tags and classes repeat across every block, intern them so they are stored once
+        metadata = BlockMetadata(
+            block_idx=block_data.get("block_idx", 0),
+            level=block_data.get("level", 0),
+            page_idx=block_data.get("page_idx", 0),
+            tag=sys.intern(block_data.get("tag", "unknown")),
+            block_class=sys.intern(block_data.get("block_class", "")),
+            bbox=tuple(float(v) for v in block_data.get("bbox") or (0, 0, 0, 0)),
+        )
+
+        return DocumentBlock(block_idx=metadata.block_idx, content=content, metadata=metadata)
+
     def _establish_hierarchy(self, blocks):
         """Establish parent-child relationships based on level and position"""
         sorted_blocks = sorted(blocks, key=lambda b: (b.metadata.page_idx, b.metadata.bbox[1]))
@@ -225,12 +380,74 @@ class SherpaDocumentProcessor:
             hierarchy_stack.append(block)
 
 
+def content_hash(text: str) -> str:
+    """Key of a block text in block_contents, identical to Postgres' md5(text)."""
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def _is_retryable_http_error(exc: BaseException) -> bool:
+    """Retry transport failures and 5xx responses from the parser, not client errors."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+def _run_sync(coro):
+    """Run a coroutine to completion from synchronous code, even inside a running event loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
 class RAGSystem:
     """RAG system with text search and PDF backends"""
 
+    # Secondary search indexes (name -> table, definition), maintained outside of bulk loads
+    SECONDARY_INDEXES = {
+        "idx_block_contents_tsv": ("block_contents", "USING gin(content_tsv)"),
+        "idx_rag_blocks_content_hash": ("rag_document_blocks", "(content_hash)"),
+        "idx_rag_blocks_content_type": ("rag_document_blocks", "(content_type)"),
+        "idx_rag_blocks_section_type": ("rag_document_blocks", "(section_type)"),
+        "idx_rag_blocks_demand_priority": ("rag_document_blocks", "(demand_priority)"),
+    }
+    GIN_INDEX = f"{schema_app_data}.idx_block_contents_tsv"
+    # Columns written by _insert_blocks; rag_document_blocks has no content column, its texts
+    # are in block_contents
+    BLOCK_COLUMNS = (
+        "block_idx",
+        "name",
+        "content",
+        "level",
+        "page_idx",
+        "tag",
+        "block_class",
+        "x0",
+        "y0",
+        "x1",
+        "y1",
+        "parent_idx",
+        "content_type",
+        "section_type",
+        "demand_priority",
+        "content_hash",
+    )
+    BULK_LOAD_LOCK = f"bulk_load:{schema_app_data}.rag_document_blocks"
+
     def __init__(self):
         self.db_manager = DatabaseManager()
+        self.async_db_manager = AsyncDatabaseManager(self.db_manager)
         self.LANGUAGE = LANGUAGE
+        self.bulk_maintenance_work_mem = os.getenv("RAG_BULK_MAINTENANCE_WORK_MEM", "1GB")
+        self.bulk_gin_pending_list_limit = int(
+            os.getenv("RAG_BULK_GIN_PENDING_LIST_LIMIT", "65536")
+        )
+        # Texts shared by at least this many documents are treated as boilerplate
+        self.boilerplate_min_docs = int(os.getenv("RAG_BOILERPLATE_MIN_DOCS", "5"))
+        self.boilerplate_mode = os.getenv("RAG_BOILERPLATE_MODE", "downrank").lower()
+        self.boilerplate_weight = float(os.getenv("RAG_BOILERPLATE_WEIGHT", "0.1"))
 
         # Determine PDF parsing backend
         pdf_parser_backend = os.getenv("PDF_PARSER", "nlm-ingestor").lower()
@@ -242,46 +459,162 @@ class RAGSystem:
             self.processor = SherpaDocumentProcessor()
 
         self.content_classifier = ContentClassifier()
-        self._ensure_schema()
-
-    def _ensure_schema(self):
-        """Create necessary database schema if it doesn't exist"""
-        schema = f"""
-        CREATE TABLE IF NOT EXISTS {schema_app_data}.rag_document_blocks (
-            id SERIAL PRIMARY KEY,
-            block_idx INTEGER NOT NULL,
-            name TEXT NOT NULL,
-            content TEXT,
-            level INTEGER NOT NULL,
-            page_idx INTEGER NOT NULL,
-            tag TEXT NOT NULL,
-            block_class TEXT,
-            x0 FLOAT,
-            y0 FLOAT,
-            x1 FLOAT,
-            y1 FLOAT,
-            parent_idx INTEGER,
-            content_type TEXT DEFAULT 'regular',
-            section_type TEXT,
-            demand_priority INTEGER,
-            content_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('{LANGUAGE}', content)) STORED,
-            UNIQUE(name, block_idx)
-        );
-
-        CREATE INDEX IF NOT EXISTS idx_document_blocks_content_tsv ON {schema_app_data}.rag_document_blocks
-        USING gin(content_tsv);
-
-        CREATE INDEX IF NOT EXISTS idx_rag_blocks_content_type
-        ON {schema_app_data}.rag_document_blocks(content_type);
-
-        CREATE INDEX IF NOT EXISTS idx_rag_blocks_section_type
-        ON {schema_app_data}.rag_document_blocks(section_type);
-
-        CREATE INDEX IF NOT EXISTS idx_rag_blocks_demand_priority
-        ON {schema_app_data}.rag_document_blocks(demand_priority);
+        # Highlighting boxes by (document, block indices); they change only on re-indexing
+        self._annotations_cache: LRUCache[tuple, list[dict[str, Any]]] = LRUCache(
+            int(os.getenv("ANNOTATION_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("ANNOTATION_CACHE_TTL", "600")),
+        )
+        # Identical searches running at the same time (e.g. a room asking the same question)
+        # hit the database once
+        self._query_flights = SingleFlight("rag_query")
+        self._restore_indexes()
+
+    def _restore_indexes(self):
+        """
+        Create the secondary search indexes that are missing or invalid, e.g. after a bulk load
+        that died before rebuilding them. The tables themselves come from the migrations.
         """
+        if not self._indexes_need_restore():
+            return
 
-        self.db_manager.execute_query(schema)
+        if self._bulk_load_in_progress():
+            logger.warning(
+                "A bulk load is running on rag_document_blocks; its secondary indexes will be "
+                "rebuilt when it finishes."
+            )
+            return
+
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                self._drop_invalid_indexes(cursor)
+                for statement in self._index_statements():
+                    cursor.execute(statement)
+                cursor.execute(
+                    f"ALTER INDEX IF EXISTS {self.GIN_INDEX} RESET (gin_pending_list_limit)"
+                )
+                # A bulk load that died did not recount the documents it indexed either
+                cursor.execute(self._doc_counts_query())
+        finally:
+            self.db_manager.release_connection(conn)
+
+    def _indexes_need_restore(self) -> bool:
+        """One catalog read: are all secondary indexes valid, without a bulk load GIN setting?"""
+        rows = self.db_manager.execute_query(
+            """
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relnamespace = %s::regnamespace AND c.relname = ANY(%s) AND i.indisvalid
+              AND NOT COALESCE(
+                  array_to_string(c.reloptions, ',') LIKE '%%gin_pending_list_limit%%', FALSE
+              )
+            """,
+            (schema_app_data, list(self.SECONDARY_INDEXES)),
+            label="rag.indexes",
+        )
+        return {name for (name,) in rows} != set(self.SECONDARY_INDEXES)
+
+    def _index_statements(self, concurrently: bool = False) -> list[str]:
+        mode = "CONCURRENTLY " if concurrently else ""
+        return [
+            f"CREATE INDEX {mode}IF NOT EXISTS {name} ON {schema_app_data}.{table} {definition}"
+            for name, (table, definition) in self.SECONDARY_INDEXES.items()
+        ]
+
+    def _drop_invalid_indexes(self, cursor):
+        """Drop secondary indexes left invalid by an interrupted concurrent build."""
+        cursor.execute(
+            """
+            SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid IN (%s::regclass, %s::regclass) AND NOT i.indisvalid
+            """,
+            (f"{schema_app_data}.rag_document_blocks", f"{schema_app_data}.block_contents"),
+        )
+        for (name,) in cursor.fetchall():
+            if name in self.SECONDARY_INDEXES:
+                logger.warning(f"Dropping invalid index {name} before rebuilding it")
+                cursor.execute(f"DROP INDEX IF EXISTS {schema_app_data}.{name}")
+
+    def _bulk_load_in_progress(self) -> bool:
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (self.BULK_LOAD_LOCK,))
+                acquired = cursor.fetchone()[0]
+                if acquired:
+                    cursor.execute(
+                        "SELECT pg_advisory_unlock(hashtext(%s))", (self.BULK_LOAD_LOCK,)
+                    )
+                return not acquired
+        finally:
+            self.db_manager.release_connection(conn)
+
+    @contextmanager
+    def bulk_load(self, drop_indexes: bool = True):
+        """
+        Defer search index maintenance of rag_document_blocks/block_contents while indexing
+        many documents.
+
+        With `drop_indexes` the GIN and B-tree indexes are dropped for the duration of the
+        load, otherwise the GIN pending list is enlarged so inserts skip immediate GIN
+        updates. Documents indexed meanwhile, by any process, skip their doc_count recount.
+        On exit the indexes are rebuilt concurrently with a larger `maintenance_work_mem`,
+        doc_count is recounted for all texts and the tables are analyzed.
+
+        A session advisory lock is held for the whole load. `_restore_indexes` skips index
+        creation while it is held; if the loading process dies, the lock is released with
+        its connection and the next RAGSystem initialization restores the indexes.
+        """
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cursor:
+                # Waits for another bulk load on the same table to finish
+                cursor.execute("SELECT pg_advisory_lock(hashtext(%s))", (self.BULK_LOAD_LOCK,))
+                try:
+                    if drop_indexes:
+                        for name in self.SECONDARY_INDEXES:
+                            cursor.execute(f"DROP INDEX IF EXISTS {schema_app_data}.{name}")
+                    else:
+                        cursor.execute(
+                            f"ALTER INDEX IF EXISTS {self.GIN_INDEX} "
+                            "SET (gin_pending_list_limit = %s)",
+                            (self.bulk_gin_pending_list_limit,),
+                        )
+                    logger.info(
+                        f"Bulk load started on {schema_app_data}.rag_document_blocks "
+                        f"({'indexes dropped' if drop_indexes else 'GIN updates deferred'})"
+                    )
+                    yield self
+                finally:
+                    try:
+                        self._finish_bulk_load(cursor)
+                    finally:
+                        # Never hand a connection still holding the lock back to the pool
+                        cursor.execute("SELECT pg_advisory_unlock_all()")
+        finally:
+            self.db_manager.release_connection(conn)
+
+    def _finish_bulk_load(self, cursor):
+        started = time.perf_counter()
+        cursor.execute("SET maintenance_work_mem = %s", (self.bulk_maintenance_work_mem,))
+        try:
+            self._drop_invalid_indexes(cursor)
+            for statement in self._index_statements(concurrently=True):
+                cursor.execute(statement)
+            cursor.execute(
+                "SELECT gin_clean_pending_list(%s::regclass)",
+                (self.GIN_INDEX,),
+            )
+            cursor.execute(f"ALTER INDEX IF EXISTS {self.GIN_INDEX} RESET (gin_pending_list_limit)")
+            # Documents indexed during the load skipped their own recount
+            cursor.execute(self._doc_counts_query())
+            cursor.execute(
+                f"ANALYZE {schema_app_data}.rag_document_blocks, {schema_app_data}.block_contents"
+            )
+        finally:
+            cursor.execute("RESET maintenance_work_mem")
+        logger.info(
+            f"Bulk load indexes rebuilt and analyzed in {time.perf_counter() - started:.1f}s"
+        )
 
     def index_document(
         self,
@@ -289,49 +622,164 @@ class RAGSystem:
         document_name_override: str | None = None,
         existing_sherpa_data=None,
         table_name=f"{schema_app_data}.rag_document_blocks",
+        timings: dict[str, float] | None = None,
     ):
-        """Index a PDF document from a given path."""
+        """Index a PDF document from a given path.
+
+        If `timings` is given, the duration in seconds of the parse, classify and insert
+        stages is recorded into it.
+        """
         document_name = document_name_override if document_name_override is not None else pdf_path
+        timings = timings if timings is not None else {}
 
+        started = time.perf_counter()
         if existing_sherpa_data is None:
             blocks = self.processor.process_pdf(pdf_path)
         else:
             blocks = self.processor._process_sherpa_data(existing_sherpa_data)
+        timings["parse"] = time.perf_counter() - started
 
         # Check if this is a "lettre de suite" based on content patterns
-        blocks_content = [block.content for block in blocks if block.content]
-        is_letter_de_suite = self.content_classifier.is_letter_de_suite(blocks_content)
+        started = time.perf_counter()
+        is_letter_de_suite = self.content_classifier.is_letter_de_suite(
+            block.content for block in blocks if block.content
+        )
 
         if is_letter_de_suite:
-            print(f"Document {document_name} detected as 'lettre de suite'. Classifying blocks...")
+            logger.info(
+                f"Document {document_name} detected as 'lettre de suite'. Classifying blocks..."
+            )
             self._classify_blocks(blocks)
+        timings["classify"] = time.perf_counter() - started
 
+        started = time.perf_counter()
         self._insert_blocks(document_name, blocks, table_name)
+        if table_name == f"{schema_app_data}.rag_document_blocks":
+            self.record_classifier_version([document_name])
+        timings["insert"] = time.perf_counter() - started
         return document_name
 
+    def record_classifier_version(self, names: list[str], version: int | None = None):
+        """Remember which classifier version the blocks of `names` were classified with."""
+        version = ContentClassifier.VERSION if version is None else version
+        self.db_manager.execute_batch(
+            f"""
+            INSERT INTO {schema_app_data}.document_classifications (name, classifier_version)
+            VALUES (%s, %s)
+            ON CONFLICT (name) DO UPDATE SET
+            classifier_version = EXCLUDED.classifier_version,
+            classified_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+            """,
+            ((name, version) for name in names),
+        )
+
     def _classify_blocks(self, blocks):
         """Classify blocks for content type, section type, and demand priority."""
-        current_section = None
+        labels = self.content_classifier.classify_sequence([block.content for block in blocks])
 
-        for block in blocks:
-            if not block.content:
+        for block, label in zip(blocks, labels, strict=True):
+            if label is None:
                 continue
 
-            content_type, section_type, demand_priority = self.content_classifier.classify_block(
-                block.content, current_section
-            )
-
-            if content_type == ContentType.SECTION_HEADER:
-                current_section = section_type
-
+            content_type, section_type, demand_priority = label
             block.content_type = content_type.value
             block.section_type = section_type.value if section_type else None
             block.demand_priority = demand_priority
 
     def _insert_blocks(self, name, blocks, table_name=f"{schema_app_data}.rag_document_blocks"):
         """Insert blocks into database"""
-        params_list = []
+        searchable = table_name == f"{schema_app_data}.rag_document_blocks"
+        self._annotations_cache.discard_where(lambda key: key[0] == name)
+        # The content_hash index is dropped during bulk loads: doc_count is then recounted
+        # once for the whole table when the load finishes, not after every document
+        recount = searchable and not self._bulk_load_in_progress()
+        previous_hashes = set()
+        if recount:
+            # Texts the previous version of the document used, recounted with the new ones
+            previous_hashes = {
+                row[0]
+                for row in self.db_manager.execute_query(
+                    f"""
+                    SELECT DISTINCT content_hash FROM {table_name}
+                    WHERE name = %s AND content_hash IS NOT NULL
+                    """,
+                    (name,),
+                    label="rag.block_hashes",
+                )
+            }
+        if searchable:
+            # Each distinct text is stored and tsvector-indexed once in block_contents
+            contents = {}
+            for block in blocks:
+                if block.content:
+                    contents.setdefault(content_hash(block.content), block.content)
+            self.db_manager.execute_batch(
+                f"""
+                INSERT INTO {schema_app_data}.block_contents (content_hash, content)
+                VALUES (%s, %s) ON CONFLICT (content_hash) DO NOTHING
+                """,
+                contents.items(),
+            )
+
+        # Searchable blocks only reference their text in block_contents by its hash
+        columns = [column for column in self.BLOCK_COLUMNS if column != "content" or not searchable]
+        updates = ",\n        ".join(
+            f"{column} = EXCLUDED.{column}"
+            for column in columns
+            if column not in ("block_idx", "name")
+        )
+        query = f"""
+        INSERT INTO {table_name} ({", ".join(columns)})
+        VALUES ({", ".join(["%s"] * len(columns))})
+        ON CONFLICT (name, block_idx) DO UPDATE SET
+        {updates}
+        """
+
+        self.db_manager.execute_batch(
+            query, self._block_rows(name, blocks, with_content=not searchable)
+        )
+        # Blocks of a previous version of the document that the new one no longer has
+        self.db_manager.execute_query(
+            f"DELETE FROM {table_name} WHERE name = %s AND block_idx <> ALL(%s)",
+            (name, [block.block_idx for block in blocks]),
+            label="rag.delete_stale_blocks",
+        )
+
+        if recount and (contents or previous_hashes):
+            self._refresh_doc_counts(list(previous_hashes | contents.keys()))
 
+    def _refresh_doc_counts(self, hashes: list[str]):
+        """
+        Recount how many documents share each of the given block texts; texts no document
+        uses anymore drop to 0.
+        """
+        self.db_manager.execute_query(
+            self._doc_counts_query("WHERE content_hash = ANY(%s)", "AND b.content_hash = ANY(%s)"),
+            (hashes, hashes),
+            label="rag.doc_counts",
+        )
+
+    @staticmethod
+    def _doc_counts_query(blocks_filter: str = "", contents_filter: str = "") -> str:
+        """UPDATE of block_contents.doc_count, for the texts the filters select (default all)."""
+        return f"""
+        UPDATE {schema_app_data}.block_contents bc SET doc_count = COALESCE(c.doc_count, 0)
+        FROM {schema_app_data}.block_contents b
+        LEFT JOIN (
+            SELECT content_hash, COUNT(DISTINCT name) AS doc_count
+            FROM {schema_app_data}.rag_document_blocks
+            {blocks_filter}
+            GROUP BY content_hash
+        ) c ON c.content_hash = b.content_hash
+        WHERE bc.content_hash = b.content_hash {contents_filter}
+          AND bc.doc_count <> COALESCE(c.doc_count, 0)
+        """
+
+    @staticmethod
+    def _block_rows(
+        name: str, blocks: Iterable[DocumentBlock], with_content: bool = True
+    ) -> Iterator[tuple]:
+        """Lazily convert blocks to insert parameter tuples (in BLOCK_COLUMNS order)"""
         for block in blocks:
             bbox = block.metadata.bbox
             x0 = bbox[0] if len(bbox) > 0 else None
@@ -339,14 +787,10 @@ class RAGSystem:
             x1 = bbox[2] if len(bbox) > 2 else None
             y1 = bbox[3] if len(bbox) > 3 else None
 
-            content_type = getattr(block, "content_type", "regular")
-            section_type = getattr(block, "section_type", None)
-            demand_priority = getattr(block, "demand_priority", None)
-
-            params = (
+            yield (
                 block.block_idx,
                 name,
-                block.content,
+                *((block.content,) if with_content else ()),
                 block.metadata.level,
                 block.metadata.page_idx,
                 block.metadata.tag,
@@ -356,35 +800,31 @@ class RAGSystem:
                 x1,
                 y1,
                 block.parent_idx,
-                content_type,
-                section_type,
-                demand_priority,
+                block.content_type,
+                block.section_type,
+                block.demand_priority,
+                content_hash(block.content) if block.content else None,
             )
 
-            params_list.append(params)
-
-        query = f"""
-        INSERT INTO {table_name}
-        (block_idx, name, content, level, page_idx, tag, block_class,
-         x0, y0, x1, y1, parent_idx, content_type, section_type, demand_priority)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (name, block_idx) DO UPDATE SET
-        content = EXCLUDED.content,
-        level = EXCLUDED.level,
-        page_idx = EXCLUDED.page_idx,
-        tag = EXCLUDED.tag,
-        block_class = EXCLUDED.block_class,
-        x0 = EXCLUDED.x0,
-        y0 = EXCLUDED.y0,
-        x1 = EXCLUDED.x1,
-        y1 = EXCLUDED.y1,
-        parent_idx = EXCLUDED.parent_idx,
-        content_type = EXCLUDED.content_type,
-        section_type = EXCLUDED.section_type,
-        demand_priority = EXCLUDED.demand_priority
-        """
-
-        self.db_manager.execute_many(query, params_list)
+    def _run_steps(self, steps: QuerySteps):
+        """Drive a read path on the psycopg2 pool: send each statement's rows back into it."""
+        try:
+            label, query, params = next(steps)
+            while True:
+                rows = self.db_manager.execute_query(query, params, label=label)
+                label, query, params = steps.send(rows)
+        except StopIteration as done:
+            return done.value
+
+    async def _arun_steps(self, steps: QuerySteps):
+        """Drive a read path on the asyncio pool, without blocking the event loop."""
+        try:
+            label, query, params = next(steps)
+            while True:
+                rows = await self.async_db_manager.execute_query(query, params, label=label)
+                label, query, params = steps.send(rows)
+        except StopIteration as done:
+            return done.value
 
     def query(
         self,
@@ -399,10 +839,62 @@ class RAGSystem:
         section_filter: list[str] | None = None,
         demand_priority: int | None = None,
         count_only: bool = False,
+        boilerplate: str | None = None,
     ) -> dict[str, Any]:
         """
         Process a user query with simplified return format and single-query source handling.
+
+        `boilerplate` controls blocks whose text appears in at least `boilerplate_min_docs`
+        documents: "downrank" (scaled by `boilerplate_weight`), "exclude" or "keep".
+        Defaults to RAG_BOILERPLATE_MODE.
         """
+        kwargs = {
+            "source_query": source_query,
+            "source_names": source_names,
+            "limit": limit,
+            "offset": offset,
+            "page": page,
+            "get_children": get_children,
+            "content_type": content_type,
+            "section_filter": section_filter,
+            "demand_priority": demand_priority,
+            "count_only": count_only,
+            "boilerplate": boilerplate,
+        }
+        return self._query_flights.do(
+            flight_key(user_query, **kwargs),
+            lambda: self._run_steps(self._query_steps(user_query, **kwargs)),
+        )
+
+    async def aquery(self, user_query: str | list[str], **kwargs) -> dict[str, Any]:
+        """Async `query`, for event-loop callers. Takes the same arguments."""
+        return await self._query_flights.ado(
+            flight_key(user_query, **kwargs),
+            lambda: self._arun_steps(self._query_steps(user_query, **kwargs)),
+        )
+
+    def _query_steps(
+        self,
+        user_query: str | list[str],
+        source_query: str | None = None,
+        source_names: list[str] | None = None,
+        limit: int = 20,
+        offset: int = 0,
+        page: int | None = None,
+        get_children: bool = True,
+        content_type: str | None = None,
+        section_filter: list[str] | None = None,
+        demand_priority: int | None = None,
+        count_only: bool = False,
+        boilerplate: str | None = None,
+    ) -> QuerySteps:
+        boilerplate = (boilerplate or self.boilerplate_mode).lower()
+        is_boilerplate = f"COALESCE(bc.doc_count, 0) >= {int(self.boilerplate_min_docs)}"
+        score_weight = (
+            f" * CASE WHEN {is_boilerplate} THEN {float(self.boilerplate_weight)} ELSE 1 END"
+            if boilerplate == "downrank"
+            else ""
+        )
         # Ensure user_query is a list
         if isinstance(user_query, str):
             processed_query = user_query.split()
@@ -480,26 +972,33 @@ class RAGSystem:
             ts_query_for_format = " & ".join(formatted_elements)  # Used for FTS AND search
             select_base = f"""
             SELECT
-                r.name, r.block_idx, r.content, r.level, r.tag,
+                r.name, r.block_idx, COALESCE(bc.content, ''), r.level, r.tag,
                 r.content_type, r.section_type, r.demand_priority, r.parent_idx,
-                ts_rank_cd(r.content_tsv, to_tsquery('{self.LANGUAGE}','{{ts_query}}')) AS score
+                ts_rank_cd(bc.content_tsv, to_tsquery('{self.LANGUAGE}','{{ts_query}}'))
+                    {score_weight} AS score
             """
         else:
             select_base = """
             SELECT
-                r.name, r.block_idx, r.content, r.level, r.tag,
+                r.name, r.block_idx, COALESCE(bc.content, ''), r.level, r.tag,
                 r.content_type, r.section_type, r.demand_priority, r.parent_idx
             """
 
         from_r_clause = f"FROM {schema_app_data}.rag_document_blocks r"
+        contents_join = (
+            f"LEFT JOIN {schema_app_data}.block_contents bc ON bc.content_hash = r.content_hash"
+        )
 
         # Build search_query parts
-        search_query_parts = [select_base, from_r_clause]
+        search_query_parts = [select_base, from_r_clause, contents_join]
         if join_clause_str:
             search_query_parts.append(join_clause_str)
 
         # Build count_query parts
-        count_query_parts = [f"SELECT COUNT(*) FROM {schema_app_data}.rag_document_blocks r"]
+        count_query_parts = [
+            f"SELECT COUNT(*) FROM {schema_app_data}.rag_document_blocks r",
+            contents_join,
+        ]
         if join_clause_str:
             count_query_parts.append(join_clause_str)
 
@@ -507,8 +1006,10 @@ class RAGSystem:
         if formatted_elements:
             # ts_query variable for formatting is ts_query_for_format
             where_conditions.append(
-                f"r.content_tsv @@ to_tsquery('{self.LANGUAGE}', '{{ts_query}}')"
+                f"bc.content_tsv @@ to_tsquery('{self.LANGUAGE}', '{{ts_query}}')"
             )
+        if boilerplate == "exclude":
+            where_conditions.append(f"NOT {is_boilerplate}")
 
         # Add conditions from source_query's WHERE clause
         if where_join_conditions_list:
@@ -567,7 +1068,7 @@ class RAGSystem:
 
         # Execute queries
         _final_count_query = count_query.format(ts_query=ts_query_for_format).replace(";", "")
-        count_result = self.db_manager.execute_query(_final_count_query)
+        count_result = yield "rag.count", _final_count_query, None
         # Prepare document count query (unique document names)
         doc_count_query_parts = [
             (part.replace("COUNT(*)", "COUNT(DISTINCT r.name)") if "COUNT(*)" in part else part)
@@ -576,12 +1077,12 @@ class RAGSystem:
         _final_doc_count_query = (
             "\n".join(doc_count_query_parts).format(ts_query=ts_query_for_format).replace(";", "")
         )
-        doc_count_result = self.db_manager.execute_query(_final_doc_count_query)
+        doc_count_result = yield "rag.doc_count", _final_doc_count_query, None
 
         _final_search_query = search_query.format(ts_query=ts_query_for_format)
         _final_search_query += f" LIMIT {limit} OFFSET {offset}"
         if not count_only:
-            results = self.db_manager.execute_query(_final_search_query)
+            results = yield "rag.search", _final_search_query, None
 
         total_count_to_return = count_result[0][0] if count_result and count_result[0] else 0
         total_document_count = (
@@ -593,7 +1094,7 @@ class RAGSystem:
             ts_query_or_for_format = " | ".join(formatted_elements)  # OR version for FTS
 
             _final_count_query_or = count_query.format(ts_query=ts_query_or_for_format)
-            count_result_or = self.db_manager.execute_query(_final_count_query_or)
+            count_result_or = yield "rag.count", _final_count_query_or, None
             total_count_to_return = (
                 count_result_or[0][0] if count_result_or and count_result_or[0] else 0
             )
@@ -608,7 +1109,7 @@ class RAGSystem:
                 .format(ts_query=ts_query_or_for_format)
                 .replace(";", "")
             )
-            doc_count_result_or = self.db_manager.execute_query(_final_doc_count_query_or)
+            doc_count_result_or = yield "rag.doc_count", _final_doc_count_query_or, None
             total_document_count = (
                 doc_count_result_or[0][0] if doc_count_result_or and doc_count_result_or[0] else 0
             )
@@ -616,7 +1117,7 @@ class RAGSystem:
             _final_search_query_or = search_query.format(ts_query=ts_query_or_for_format)
             _final_search_query_or += f" LIMIT {limit} OFFSET {offset}"
             if not count_only:
-                results = self.db_manager.execute_query(_final_search_query_or)
+                results = yield "rag.search", _final_search_query_or, None
 
         if count_only:
             return {
@@ -641,7 +1142,7 @@ class RAGSystem:
 
             # Add children if requested
             if get_children:
-                children = self._get_children(row[1], row[0])
+                children = yield from self._children_steps(row[1], row[0])
                 result["children"] = [
                     {
                         "idx": c["block_idx"],
@@ -665,17 +1166,21 @@ class RAGSystem:
 
     def _get_children(self, parent_idx, name, limit=5):
         """Get child blocks for a given parent"""
+        return self._run_steps(self._children_steps(parent_idx, name, limit))
+
+    def _children_steps(self, parent_idx, name, limit=5) -> QuerySteps:
         query = f"""
         SELECT
-            id, block_idx, content, name, page_idx, level, tag, block_class,
-            x0, y0, x1, y1, parent_idx
-        FROM {schema_app_data}.rag_document_blocks
-        WHERE parent_idx = %s AND name = %s
-        ORDER BY page_idx, block_idx
+            r.id, r.block_idx, COALESCE(bc.content, ''), r.name, r.page_idx, r.level, r.tag,
+            r.block_class, r.x0, r.y0, r.x1, r.y1, r.parent_idx
+        FROM {schema_app_data}.rag_document_blocks r
+        LEFT JOIN {schema_app_data}.block_contents bc ON bc.content_hash = r.content_hash
+        WHERE r.parent_idx = %s AND r.name = %s
+        ORDER BY r.page_idx, r.block_idx
         LIMIT %s
         """
 
-        results = self.db_manager.execute_query(query, (parent_idx, name, limit))
+        results = yield "rag.children", query, (parent_idx, name, limit)
 
         return [
             {
@@ -699,6 +1204,14 @@ class RAGSystem:
 
     def get_blocks_by_idx(self, block_indices, source_name=None, get_children=False):
         """Get blocks by their block_idx values"""
+        return self._run_steps(self._blocks_by_idx_steps(block_indices, source_name, get_children))
+
+    async def aget_blocks_by_idx(self, block_indices, source_name=None, get_children=False):
+        return await self._arun_steps(
+            self._blocks_by_idx_steps(block_indices, source_name, get_children)
+        )
+
+    def _blocks_by_idx_steps(self, block_indices, source_name, get_children) -> QuerySteps:
         if not block_indices:
             return []
 
@@ -708,19 +1221,20 @@ class RAGSystem:
         placeholders = ", ".join(["%s"] * len(block_indices))
         query = f"""
         SELECT
-            id, block_idx, content, name, page_idx, level, tag, block_class,
-            x0, y0, x1, y1, parent_idx
-        FROM {schema_app_data}.rag_document_blocks
-        WHERE block_idx IN ({placeholders})
+            r.id, r.block_idx, COALESCE(bc.content, ''), r.name, r.page_idx, r.level, r.tag,
+            r.block_class, r.x0, r.y0, r.x1, r.y1, r.parent_idx
+        FROM {schema_app_data}.rag_document_blocks r
+        LEFT JOIN {schema_app_data}.block_contents bc ON bc.content_hash = r.content_hash
+        WHERE r.block_idx IN ({placeholders})
         """
 
         params = block_indices.copy()
 
         if source_name:
-            query += " AND name = %s"
+            query += " AND r.name = %s"
             params.append(source_name)
 
-        results = self.db_manager.execute_query(query, params)
+        results = yield "rag.blocks_by_idx", query, params
 
         if not results:
             return []
@@ -748,7 +1262,7 @@ class RAGSystem:
         if get_children:
             all_blocks = blocks.copy()
             for block in blocks:
-                children = self._get_children(block["block_idx"], block["name"])
+                children = yield from self._children_steps(block["block_idx"], block["name"])
                 all_blocks.extend(children)
             blocks = all_blocks
 
@@ -765,11 +1279,31 @@ class RAGSystem:
         Returns:
             List of annotation objects in the format needed for highlighting
         """
+        key = (pdf_file, tuple(block_indices or ()))
+        annotations = self._annotations_cache.get(key)
+        if annotations is None:
+            annotations = self._run_steps(self._annotations_steps(pdf_file, block_indices))
+            if annotations:
+                self._annotations_cache.put(key, annotations)
+        return [dict(annotation) for annotation in annotations]
+
+    async def aget_annotations_by_indices(self, pdf_file, block_indices):
+        key = (pdf_file, tuple(block_indices or ()))
+        annotations = self._annotations_cache.get(key)
+        if annotations is None:
+            annotations = await self._arun_steps(self._annotations_steps(pdf_file, block_indices))
+            if annotations:
+                self._annotations_cache.put(key, annotations)
+        return [dict(annotation) for annotation in annotations]
+
+    def _annotations_steps(self, pdf_file, block_indices) -> QuerySteps:
         if not block_indices:
             return []
 
         # Retrieve blocks by their indices
-        blocks = self.get_blocks_by_idx(block_indices, source_name=pdf_file)
+        blocks = yield from self._blocks_by_idx_steps(
+            block_indices, source_name=pdf_file, get_children=False
+        )
 
         if not blocks:
             return []
@@ -810,16 +1344,21 @@ class RAGSystem:
         Returns:
             List of annotation objects in the format needed for highlighting
         """
+        return self._run_steps(self._debug_blocks_steps(pdf_file))
 
+    async def adebug_blocks(self, pdf_file):
+        return await self._arun_steps(self._debug_blocks_steps(pdf_file))
+
+    def _debug_blocks_steps(self, pdf_file) -> QuerySteps:
         rag_check_query = f"""
         SELECT COUNT(*) FROM {schema_app_data}.rag_document_blocks WHERE name = %s
         """
-        rag_results = self.db_manager.execute_query(rag_check_query, (pdf_file,))
+        rag_results = yield "rag.debug_blocks", rag_check_query, (pdf_file,)
 
         upload_check_query = f"""
         SELECT COUNT(*) FROM {schema_app_data}.uploaded_document_blocks WHERE name = %s
         """
-        upload_results = self.db_manager.execute_query(upload_check_query, (pdf_file,))
+        upload_results = yield "rag.debug_blocks", upload_check_query, (pdf_file,)
 
         rag_count = rag_results[0][0] if rag_results else 0
         upload_count = upload_results[0][0] if upload_results else 0
@@ -832,9 +1371,11 @@ class RAGSystem:
 
         if rag_count == 0 and upload_count == 0:
             table_name = f"{schema_app_data}.uploaded_document_blocks"
-            print(f"No blocks found for {pdf_file} in either table. Defaulting to {table_name}.")
+            logger.info(
+                f"No blocks found for {pdf_file} in either table. Defaulting to {table_name}."
+            )
         else:
-            print(
+            logger.debug(
                 f"Found {rag_count} blocks in rag_document_blocks and {upload_count} blocks in uploaded_document_blocks. Using {table_name}."
             )
 
@@ -842,7 +1383,6 @@ class RAGSystem:
         SELECT
             id,
             block_idx,
-            content,
             name,
             page_idx,
             level,
@@ -860,23 +1400,22 @@ class RAGSystem:
         """
 
         params = (pdf_file,)
-        results = self.db_manager.execute_query(query, params)
+        results = yield "rag.debug_blocks", query, params
 
         blocks = [
             {
                 "id": row[0],
                 "block_idx": row[1],
-                "content": row[2],
-                "name": row[3],
-                "page_idx": row[4],
-                "level": row[5],
-                "tag": row[6],
-                "block_class": row[7],
-                "x0": row[8],
-                "y0": row[9],
-                "x1": row[10],
-                "y1": row[11],
-                "parent_idx": row[12],
+                "name": row[2],
+                "page_idx": row[3],
+                "level": row[4],
+                "tag": row[5],
+                "block_class": row[6],
+                "x0": row[7],
+                "y0": row[8],
+                "x1": row[9],
+                "y1": row[10],
+                "parent_idx": row[11],
                 "score": 1.0,  # Default score for directly retrieved blocks
             }
             for row in results
@@ -902,3 +1441,9 @@ class RAGSystem:
             annotations.append(annotation)
 
         return annotations
+
+
+@lazy_singleton
+def get_rag_system() -> RAGSystem:
+    """The RAGSystem shared by the agent tools and the API, created on first use."""
+    return RAGSystem()
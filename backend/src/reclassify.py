@@ -0,0 +1,147 @@
+import logging
+import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+
+try:
+    from .content_classifiers import ContentClassifier
+    from .db_manager import schema_app_data
+    from .rag_system import RAGSystem
+except ImportError:
+    from content_classifiers import ContentClassifier
+    from db_manager import schema_app_data
+    from rag_system import RAGSystem
+
+logger = logging.getLogger(__name__)
+
+# Labels of blocks that are not classified, as written by a fresh index
+UNCLASSIFIED = ("regular", None, None)
+
+UPDATE_BLOCKS_QUERY = f"""
+UPDATE {schema_app_data}.rag_document_blocks r
+SET content_type = v.content_type,
+    section_type = v.section_type,
+    demand_priority = v.demand_priority
+FROM (VALUES %s) AS v(name, block_idx, content_type, section_type, demand_priority)
+WHERE r.name = v.name AND r.block_idx = v.block_idx
+  AND (r.content_type, r.section_type, r.demand_priority)
+      IS DISTINCT FROM (v.content_type, v.section_type, v.demand_priority)
+"""
+UPDATE_BLOCKS_TEMPLATE = "(%s, %s::integer, %s, %s, %s::integer)"
+
+_classifier: ContentClassifier | None = None
+
+
+def _get_classifier() -> ContentClassifier:
+    global _classifier
+    if _classifier is None:
+        _classifier = ContentClassifier()
+    return _classifier
+
+
+def classify_document(name: str, rows: list[tuple[int, str | None]]) -> list[tuple]:
+    """
+    Re-derive the labels of one document's blocks, given as (block_idx, content) in block
+    order, exactly as RAGSystem.index_document would. Returns UPDATE value rows.
+    """
+    classifier = _get_classifier()
+    contents = [content for _, content in rows]
+    if classifier.is_letter_de_suite(content for content in contents if content):
+        labels = [
+            (label[0].value, label[1].value if label[1] else None, label[2])
+            if label
+            else UNCLASSIFIED
+            for label in classifier.classify_sequence(contents)
+        ]
+    else:
+        labels = [UNCLASSIFIED] * len(rows)
+    return [(name, block_idx, *label) for (block_idx, _), label in zip(rows, labels, strict=True)]
+
+
+class Reclassifier:
+    """
+    Refresh content_type/section_type/demand_priority of stored blocks after the
+    ContentClassifier patterns changed, without re-parsing the PDFs.
+
+    Documents are streamed from the database one at a time, classified in a pool of worker
+    processes (the regexes are CPU bound) and written back in batches by this process.
+    Only documents last classified with an older ContentClassifier.VERSION are touched.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        batch_size: int = 1000,
+        rag_system: RAGSystem | None = None,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.rag_system = rag_system or RAGSystem()
+        self.db_manager = self.rag_system.db_manager
+        self.version = ContentClassifier.VERSION
+
+    def outdated_documents(self, force: bool = False) -> list[str]:
+        query = f"""
+        SELECT d.name FROM (SELECT DISTINCT name FROM {schema_app_data}.rag_document_blocks) d
+        LEFT JOIN {schema_app_data}.document_classifications dc ON dc.name = d.name
+        WHERE %s OR dc.classifier_version IS NULL OR dc.classifier_version < %s
+        ORDER BY d.name
+        """
+        return [row[0] for row in self.db_manager.execute_query(query, (force, self.version))]
+
+    def iter_documents(self, names: Iterable[str]) -> Iterator[tuple[str, list[tuple]]]:
+        """Yield (name, [(block_idx, content), ...]) in block order, one document at a time."""
+        query = f"""
+        SELECT r.block_idx, bc.content FROM {schema_app_data}.rag_document_blocks r
+        LEFT JOIN {schema_app_data}.block_contents bc ON bc.content_hash = r.content_hash
+        WHERE r.name = %s ORDER BY r.block_idx
+        """
+        for name in names:
+            yield name, [tuple(row) for row in self.db_manager.execute_query(query, (name,))]
+
+    def run(self, names: list[str] | None = None, force: bool = False) -> int:
+        """Reclassify `names` (default: all outdated documents). Returns the document count."""
+        names = names if names is not None else self.outdated_documents(force)
+        logger.info(
+            f"Reclassifying {len(names)} documents with classifier v{self.version} "
+            f"on {self.workers} processes"
+        )
+        pending_rows: list[tuple] = []
+        pending_names: list[str] = []
+        done = 0
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            in_flight: set[Future] = set()
+            for name, rows in self.iter_documents(names):
+                in_flight.add(executor.submit(classify_document, name, rows))
+                # Bound how many fetched documents wait in memory for a worker
+                if len(in_flight) >= self.workers * 2:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    done += self._collect(finished, pending_rows, pending_names)
+                if len(pending_rows) >= self.batch_size:
+                    self._flush(pending_rows, pending_names)
+            done += self._collect(in_flight, pending_rows, pending_names)
+        self._flush(pending_rows, pending_names)
+        return done
+
+    def _collect(self, futures, pending_rows: list[tuple], pending_names: list[str]) -> int:
+        for future in futures:
+            rows = future.result()
+            pending_rows.extend(rows)
+            if rows:
+                pending_names.append(rows[0][0])
+        return len(futures)
+
+    def _flush(self, pending_rows: list[tuple], pending_names: list[str]) -> None:
+        if pending_rows:
+            self.db_manager.execute_values(
+                UPDATE_BLOCKS_QUERY,
+                pending_rows,
+                template=UPDATE_BLOCKS_TEMPLATE,
+                page_size=self.batch_size,
+            )
+        if pending_names:
+            self.rag_system.record_classifier_version(pending_names, self.version)
+            logger.info(f"Reclassified {len(pending_names)} documents")
+        pending_rows.clear()
+        pending_names.clear()
@@ -30,6 +30,7 @@ DocumentSourceResponse = schema.DocumentSourceResponse
 UserFeedbackCreate = schema.UserFeedbackCreate
 UserFeedbackResponse = schema.FeedbackResponse
 UserFeedbackRead = schema.UserFeedbackRead
+UploadJobStatus = schema.UploadJobStatus
 
 __all__ = [
     "AgentInfo",
@@ -51,4 +52,5 @@ __all__ = [
     "UserFeedbackCreate",
     "UserFeedbackRead",
     "FeedbackResponse",
+    "UploadJobStatus",
 ]
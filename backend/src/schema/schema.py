@@ -213,10 +213,25 @@ class ChatHistoryInput(BaseModel):
         default=None,
         description="Optional user ID to scope history retrieval if applicable on the backend.",
     )
+    limit: int | None = Field(
+        default=None,
+        ge=1,
+        description="Return only the most recent messages, at most this many. All by default.",
+        examples=[50],
+    )
+    before: int | None = Field(
+        default=None,
+        ge=0,
+        description="Cursor from `next_cursor` of the previous page, to get older messages.",
+    )
 
 
 class ChatHistory(BaseModel):
     messages: list[ChatMessage]
+    next_cursor: int | None = Field(
+        default=None,
+        description="Pass as `before` for older messages; None at the start of the conversation.",
+    )
 
 
 class AnnotationsRequest(BaseModel):
@@ -253,6 +268,28 @@ class DocumentSourceResponse(BaseModel):
     error: str | None = None
 
 
+class UploadJobStatus(BaseModel):
+    """Progress of a file upload being parsed and indexed in the background."""
+
+    job_id: UUID = Field(description="ID to poll the upload status with.")
+    file_id: UUID = Field(description="ID the file is stored under once the upload succeeds.")
+    filename: str
+    user_id: str
+    thread_id: str | None = None
+    status: Literal["queued", "running", "succeeded", "failed"] = Field(
+        description="Overall state of the upload job.",
+    )
+    stage: str = Field(
+        description="Current processing step.",
+        examples=["queued", "storing", "indexing", "saving", "done"],
+    )
+    progress: float = Field(ge=0.0, le=1.0, description="Approximate completion ratio.")
+    error: str | None = None
+    result: dict[str, Any] = Field(default={}, description="Upload result once succeeded.")
+    created_at: float
+    updated_at: float
+
+
 # User Feedback Models
 class UserFeedbackCreate(BaseModel):
     user_id: UUID = Field(description="The ID of the user submitting the feedback.")
@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+import time
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Tables and columns the current role can see, in one round trip. Same scope as the
+# information_schema views it replaces, but types come from format_type (e.g. vector(1536)
+# rather than USER-DEFINED).
+CATALOG_QUERY = """
+SELECT n.nspname, c.relname, a.attname, format_type(a.atttypid, a.atttypmod)
+FROM pg_namespace n
+LEFT JOIN pg_class c
+    ON c.relnamespace = n.oid AND c.relkind IN ('r', 'p')
+   AND has_table_privilege(c.oid, 'SELECT, INSERT, UPDATE, DELETE, REFERENCES')
+LEFT JOIN pg_attribute a
+    ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE n.nspname NOT IN ('pg_catalog', 'information_schema', 'pg_toast')
+  AND n.nspname NOT LIKE 'pg_temp_%' AND n.nspname NOT LIKE 'pg_toast_temp_%'
+  AND has_schema_privilege(n.oid, 'USAGE')
+ORDER BY n.nspname, c.relname, a.attnum
+"""
+
+Catalog = dict[str, dict[str, list[dict[str, str]]]]
+
+
+class SchemaCatalog:
+    """
+    In-memory copy of the database catalog (schemas -> tables -> columns) for the SQL-aware
+    tools and prompt generation, loaded from pg_catalog in a single query.
+
+    The copy is reloaded after `ttl` seconds, or sooner when the catalog version counter bumped
+    by the DDL event trigger (see the catalog_version migration) changes; that counter is
+    polled at most every `version_check` seconds. Without the trigger (it needs superuser),
+    the TTL alone bounds staleness.
+    """
+
+    def __init__(
+        self,
+        db_manager,
+        version_table: str | None,
+        ttl: float | None = None,
+        version_check: float | None = None,
+    ):
+        self.db_manager = db_manager
+        self.version_table = version_table
+        self.ttl = float(os.getenv("SCHEMA_CATALOG_TTL", "300")) if ttl is None else ttl
+        self.version_check = (
+            float(os.getenv("SCHEMA_CATALOG_VERSION_CHECK", "5"))
+            if version_check is None
+            else version_check
+        )
+        self._lock = threading.Lock()
+        self._catalog: Catalog | None = None
+        self._version: int | None = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._catalog = None
+
+    def schemas(self) -> list[str]:
+        return list(self._current())
+
+    def tables(self, schema: str) -> list[str]:
+        return list(self._current().get(schema, {}))
+
+    def columns(self, schema: str, table: str) -> list[dict[str, str]]:
+        # Copies, so callers cannot alter the cached entries
+        return [dict(column) for column in self._current().get(schema, {}).get(table, [])]
+
+    def has_column(self, schema: str, table: str, column: str) -> bool:
+        columns = self._current().get(schema, {}).get(table, [])
+        return any(c["name"] == column for c in columns)
+
+    def _current(self) -> Catalog:
+        with self._lock:
+            now = time.monotonic()
+            if self._catalog is not None and now - self._loaded_at < self.ttl:
+                if now - self._checked_at < self.version_check:
+                    return self._catalog
+                self._checked_at = now
+                if self._read_version() == self._version:
+                    return self._catalog
+                logger.info("Database schema changed, reloading the schema catalog")
+            # Loading under the lock: concurrent callers wait for one scan instead of each
+            # running their own
+            self._version = self._read_version()
+            self._catalog = self._load()
+            self._loaded_at = self._checked_at = time.monotonic()
+            return self._catalog
+
+    def _load(self) -> Catalog:
+        catalog: Catalog = {}
+        for schema, table, column, data_type in self.db_manager.execute_query(
+            CATALOG_QUERY, label="schema_catalog.load"
+        ):
+            tables = catalog.setdefault(schema, {})
+            if table is not None:
+                columns = tables.setdefault(table, [])
+                if column is not None:
+                    columns.append({"name": column, "type": data_type})
+        logger.info(
+            f"Schema catalog loaded: {len(catalog)} schemas, "
+            f"{sum(len(tables) for tables in catalog.values())} tables"
+        )
+        return catalog
+
+    def _read_version(self) -> Any:
+        if not self.version_table:
+            return None
+        try:
+            rows = self.db_manager.execute_query(
+                f"SELECT version FROM {self.version_table}", label="schema_catalog.version"
+            )
+            return rows[0][0] if rows else None
+        except Exception as e:
+            logger.debug(f"Catalog version unavailable, relying on the TTL: {e}")
+            return None
@@ -8,7 +8,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel, EmailStr
 
-from db_manager import DatabaseManager
+from async_db_manager import AsyncDatabaseManager
 from security import (
     create_access_token,
     create_refresh_token,
@@ -19,7 +19,6 @@ from security import (
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 security = HTTPBearer()
-db_manager = DatabaseManager()
 
 
 # Pydantic Models
@@ -100,7 +99,7 @@ async def register(request: RegisterRequest):
         User information and success message
     """
     # Check if user already exists
-    existing_user = db_manager.get_user_by_email(request.email)
+    existing_user = await AsyncDatabaseManager().get_user_by_email(request.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -112,7 +111,9 @@ async def register(request: RegisterRequest):
 
     # Create user in database
     try:
-        user = db_manager.create_user(email=request.email, hashed_password=hashed_password)
+        user = await AsyncDatabaseManager().create_user(
+            email=request.email, hashed_password=hashed_password
+        )
 
         return RegisterResponse(
             user_id=str(user.id),
@@ -138,7 +139,7 @@ async def login(request: LoginRequest):
         JWT tokens and user information
     """
     # Get user from database
-    user = db_manager.get_user_by_email(request.email)
+    user = await AsyncDatabaseManager().get_user_by_email(request.email)
 
     if not user:
         raise HTTPException(
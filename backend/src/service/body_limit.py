@@ -0,0 +1,72 @@
+from collections.abc import Callable
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodySizeLimitMiddleware:
+    """
+    Answers 413 to requests whose body is larger than `max_size` bytes before the endpoint
+    reads it all: at once when Content-Length says so, otherwise as soon as that many bytes
+    arrived, so an oversized upload is neither parsed nor spooled to disk. Only requests to
+    paths for which `applies_to` is true are limited; a `max_size` of 0 disables the limit.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_size: int,
+        applies_to: Callable[[str], bool] = lambda path: True,
+    ) -> None:
+        self.app = app
+        self.max_size = max_size
+        self.applies_to = applies_to
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.max_size or not self.applies_to(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        started = rejected = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    # The endpoint sees the client go away; its own answer is dropped
+                    rejected = True
+                    if not started:
+                        await self._reject(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal started
+            if not rejected:
+                started = True
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # An endpoint failing on the body it was cut off from has been answered already
+            if not rejected:
+                raise
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse(
+            {"detail": f"Request body larger than the {self.max_size} bytes allowed."},
+            status_code=413,
+        )
+        await response(scope, receive, send)
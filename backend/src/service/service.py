@@ -1,17 +1,24 @@
+import asyncio
+import functools
+import hashlib
 import inspect
 import json
 import logging
 import os
 import re
+import time
 import warnings
-from collections.abc import AsyncGenerator
+from collections import defaultdict
+from collections.abc import AsyncGenerator, Callable
 from contextlib import asynccontextmanager
 from typing import Annotated, Any
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, FastAPI, File, HTTPException, UploadFile, status
+import orjson
+from fastapi import APIRouter, Depends, FastAPI, File, HTTPException, Request, UploadFile, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from langchain_core._api import LangChainBetaWarning
 from langchain_core.messages import (
@@ -26,12 +33,18 @@ from langchain_core.runnables import RunnableConfig
 from langgraph.pregel import Pregel
 from langgraph.types import Command, Interrupt
 
+from admission import Admission, AdmissionController, AdmissionRejected
 from agents import DEFAULT_AGENT, get_agent, get_all_agent_info
 from agents._graph_store import GraphStore
+from async_db_manager import AsyncDatabaseManager
+from blob_store import BlobTooLarge, StoredBlob, copy_stream, get_blob_store, limit_size
 from core import settings
-from db_manager import DatabaseManager
-from memory import initialize_database
-from rag_system import RAGSystem
+from db_manager import DatabaseManager, schema_app_data
+from lazy import lazy_singleton
+from leader import LeaderLock
+from memory import initialize_database, latest_checkpoint_id
+from metrics import REGISTRY, http_request_seconds, register_pool
+from rag_system import get_rag_system
 from schema import (
     AnnotationItem,
     AnnotationsRequest,
@@ -46,6 +59,7 @@ from schema import (
     FeedbackResponse,
     ServiceMetadata,
     StreamInput,
+    UploadJobStatus,
     UserFeedbackCreate,
     UserFeedbackRead,
     UserInput,
@@ -53,18 +67,69 @@ from schema import (
 
 # Import and include auth router
 from service.auth_endpoints import router as auth_router
+from service.body_limit import BodySizeLimitMiddleware
+from service.compression import CompressionMiddleware
 from service.utils import (
     convert_message_content_to_string,
+    etag_matches,
     langchain_to_chat_message,
     remove_tool_calls,
 )
+from sql_guard import cancel_running_queries
+from text_extraction import ExtractedText, iter_decoded, iter_pdf_page_texts, take_text
+from upload_jobs import ProgressReporter, UploadJob, UploadJobManager, UploadQueueFullError
+
+# Limits concurrent agent runs (/invoke and /stream), see ADMISSION_* in the README
+admission = AdmissionController()
+REGISTRY.gauge_callback(
+    "admission",
+    "Agent runs running and queued by admission control.",
+    lambda: {(stat,): value for stat, value in admission.stats().items()},
+    ["stat"],
+)
+
+
+# Connected on first use (or at startup by the lifespan), not when the module is imported
+@lazy_singleton
+def get_db_manager() -> DatabaseManager:
+    db_manager = DatabaseManager()
+    register_pool("sync", db_manager.pool_stats)
+    return db_manager
+
+
+@lazy_singleton
+def get_async_db_manager() -> AsyncDatabaseManager:
+    async_db_manager = AsyncDatabaseManager(get_db_manager())
+    register_pool("async", async_db_manager.pool_stats)
+    return async_db_manager
+
 
-db_manager = DatabaseManager()
-rag_system = RAGSystem()
+# Job states are saved in PostgreSQL, so that any worker can answer /upload/jobs
+upload_jobs = UploadJobManager(store=get_db_manager)
+
+
+# Session advisory lock electing the worker that runs the background maintenance
+MAINTENANCE_LOCK = f"maintenance:{schema_app_data}"
+
+# Largest file accepted by /upload (0 for no limit)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(100 * 1024 * 1024)))
+
+# Seconds each /health probe may take before the service is reported unavailable
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "5"))
 
 warnings.filterwarnings("ignore", category=LangChainBetaWarning)
 logger = logging.getLogger(__name__)
 
+# Usage counter updates still being written, awaited at shutdown
+_usage_tasks: set[asyncio.Task] = set()
+
+# The user message starting a run gets this id prefix followed by the run_id
+RUN_MESSAGE_ID_PREFIX = "run-input-"
+
+# Streamed tokens are sent in frames of at most this many milliseconds or characters
+STREAM_TOKEN_WINDOW_MS = float(os.getenv("STREAM_TOKEN_WINDOW_MS", "20"))
+STREAM_TOKEN_MAX_CHARS = int(os.getenv("STREAM_TOKEN_MAX_CHARS", "64"))
+
 
 def verify_bearer(
     http_auth: Annotated[
@@ -83,8 +148,17 @@ def verify_bearer(
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """
     Configurable lifespan that initializes the appropriate database checkpointer based on settings.
+
+    It runs in every worker process once the server started (or forked) it: connection pools
+    are opened here, per worker, and only the worker holding the maintenance lock runs the
+    background maintenance.
     """
     try:
+        await get_async_db_manager().open()
+        graph_store = GraphStore()
+        graph_store.start_maintenance(
+            LeaderLock(MAINTENANCE_LOCK, get_db_manager().open_connection)
+        )
         async with initialize_database() as saver:
             await saver.setup()
             agents = get_all_agent_info()
@@ -92,6 +166,10 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
                 agent = get_agent(a.key)
                 agent.checkpointer = saver
             yield
+        await asyncio.gather(*_usage_tasks, return_exceptions=True)
+        graph_store.stop_maintenance()
+        upload_jobs.shutdown(wait=False)
+        await get_async_db_manager().close()
     except Exception as e:
         logger.error(f"Error during database initialization: {e}")
         raise
@@ -117,6 +195,36 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+)
+# Oversized uploads are refused before they are received, with room for the multipart framing
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_size=UPLOAD_MAX_BYTES and UPLOAD_MAX_BYTES + 64 * 1024,
+    applies_to=lambda path: path.endswith("/upload"),
+)
+
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Time every request by route template, e.g. /graph/{graph_id}. Streaming responses are
+    timed until their headers are sent."""
+    started = time.perf_counter()
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status_code),
+        )
+
 
 app.include_router(auth_router)
 
@@ -137,15 +245,20 @@ async def info() -> ServiceMetadata:
 
 
 @router.get("/graph/{graph_id}")
-async def get_graph(graph_id: str):
+async def get_graph(graph_id: str, request: Request):
     """
     Get a graph by its ID.
+
+    A graph never changes: clients may cache it until it expires, and revalidate it with its
+    ETag.
     """
-    graph_store = GraphStore()
-    fig_json = graph_store.get_graph(graph_id)
-    if fig_json is None:
+    graph = await GraphStore().aget_stored_graph(graph_id)
+    if graph is None:
         raise HTTPException(status_code=404, detail="Graph not found")
-    return Response(content=fig_json, media_type="application/json")
+    headers = {"ETag": graph.etag, "Cache-Control": f"private, max-age={graph.max_age}, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), graph.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=graph.body, media_type="application/json", headers=headers)
 
 
 def extract_words_with_two_uppercase(phrase: str) -> list[str]:
@@ -202,7 +315,7 @@ async def _handle_input(user_input: UserInput, agent: Pregel) -> tuple[dict[str,
     user_message = user_input.message
     two_uppercases = extract_words_with_two_uppercase(user_message)
 
-    lexicon_matches = db_manager.get_lexicon_definitions(two_uppercases)
+    lexicon_matches = await get_async_db_manager().get_lexicon_definitions(two_uppercases)
     system_message_str = []
     system_message = None
     for entry in lexicon_matches:
@@ -216,7 +329,8 @@ async def _handle_input(user_input: UserInput, agent: Pregel) -> tuple[dict[str,
         # assume user input is response to resume agent execution from interrupt
         input = Command(resume=user_message)
     else:
-        messages = [HumanMessage(content=user_message)]
+        # The id ties the turn to its run, see _message_run_ids
+        messages = [HumanMessage(content=user_message, id=f"{RUN_MESSAGE_ID_PREFIX}{run_id}")]
         messages.append(system_message)
         messages = [msg for msg in messages if msg is not None]  # Filter out None messages
         input = {"messages": messages}
@@ -228,6 +342,72 @@ async def _handle_input(user_input: UserInput, agent: Pregel) -> tuple[dict[str,
     return kwargs, run_id, lexicon_matches
 
 
+def _count_ai_messages(updates: dict[str, Any]) -> int:
+    """AI messages added to the state by one "updates" event of the graph."""
+    return sum(
+        isinstance(message, AIMessage)
+        for node, update in updates.items()
+        if node != "__interrupt__" and update
+        for message in update.get("messages", [])
+    )
+
+
+async def _save_run_usage(configurable: dict[str, Any], user_messages: int, ai_messages: int):
+    try:
+        await get_async_db_manager().record_run_usage(
+            configurable["thread_id"], configurable.get("user_id"), user_messages, ai_messages
+        )
+    except Exception as e:
+        logger.warning(f"Could not record the usage of thread {configurable['thread_id']}: {e}")
+
+
+def _record_run_usage(kwargs: dict[str, Any], ai_messages: int) -> None:
+    """
+    Count a finished run in the usage counters without delaying the response; a resumed
+    interrupt adds no user message.
+    """
+    user_messages = 0 if isinstance(kwargs["input"], Command) else 1
+    task = asyncio.create_task(
+        _save_run_usage(kwargs["config"]["configurable"], user_messages, ai_messages)
+    )
+    _usage_tasks.add(task)
+    task.add_done_callback(_usage_tasks.discard)
+
+
+def _enqueue_run(user_input: UserInput) -> Admission:
+    """
+    Queue the run with admission control, keyed by user (anonymous runs by thread), or
+    refuse it at once with 429/503 and Retry-After.
+    """
+    user_id = (user_input.agent_config or {}).get("user_id")
+    key = f"user:{user_id}" if user_id else f"thread:{user_input.thread_id or 'new'}"
+    try:
+        return admission.enqueue(key)
+    except AdmissionRejected as e:
+        raise _rejected(e)
+
+
+def _rejected(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+@asynccontextmanager
+async def _admitted(user_input: UserInput) -> AsyncGenerator[None, None]:
+    """Hold an admission slot for the block, waiting in the queue for it if needed."""
+    run = _enqueue_run(user_input)
+    try:
+        async for _ in run.wait():
+            pass
+    except AdmissionRejected as e:
+        raise _rejected(e)
+    try:
+        yield
+    finally:
+        run.release()
+
+
 @router.post("/{agent_id}/invoke")
 @router.post("/invoke")
 async def invoke(user_input: UserInput, agent_id: str = DEFAULT_AGENT) -> ChatMessage:
@@ -243,39 +423,95 @@ async def invoke(user_input: UserInput, agent_id: str = DEFAULT_AGENT) -> ChatMe
     # in interrupt-agent, or a tool step in research-assistant), it's omitted. Arguably,
     # you'd want to include it. You could update the API to return a list of ChatMessages
     # in that case.
-    agent: Pregel = get_agent(agent_id)
-    kwargs, run_id, dictionnary = await _handle_input(user_input, agent)
-    try:
-        response_events: list[tuple[str, Any]] = await agent.ainvoke(**kwargs, stream_mode=["updates", "values"])  # type: ignore # fmt: skip
-        response_type, response = response_events[-1]
-        message = None
-        if response_type == "values":
-            # Normal response, the agent completed successfully
-            message = response["messages"][-1]
-        elif response_type == "updates" and "__interrupt__" in response:
-            message = AIMessage(content=response["__interrupt__"][0].value)
-        else:
-            raise ValueError(f"Unexpected response type: {response_type}")
-        if message:
-            output = langchain_to_chat_message(message)
-        output.run_id = str(run_id)
-        return output
-    except Exception as e:
-        logger.exception(f"An exception occurred: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    async with _admitted(user_input):
+        agent: Pregel = get_agent(agent_id)
+        kwargs, run_id, dictionnary = await _handle_input(user_input, agent)
+        try:
+            response_events: list[tuple[str, Any]] = await agent.ainvoke(**kwargs, stream_mode=["updates", "values"])  # type: ignore # fmt: skip
+            _record_run_usage(
+                kwargs,
+                sum(
+                    _count_ai_messages(event)
+                    for mode, event in response_events
+                    if mode == "updates"
+                ),
+            )
+            response_type, response = response_events[-1]
+            message = None
+            if response_type == "values":
+                # Normal response, the agent completed successfully
+                message = response["messages"][-1]
+            elif response_type == "updates" and "__interrupt__" in response:
+                message = AIMessage(content=response["__interrupt__"][0].value)
+            else:
+                raise ValueError(f"Unexpected response type: {response_type}")
+            if message:
+                output = langchain_to_chat_message(message)
+            output.run_id = str(run_id)
+            return output
+        except Exception as e:
+            logger.exception(f"An exception occurred: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+def _sse(payload: dict[str, Any]) -> bytes:
+    return b"data: " + orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS) + b"\n\n"
+
+
+class _TokenCoalescer:
+    """
+    Joins streamed tokens into one SSE frame per `window` seconds or `max_chars` characters.
+
+    The first token after a quiet window goes out at once; tokens arriving faster are held
+    until the window has passed or the next event, which flushes them before itself.
+    """
+
+    def __init__(self, window: float, max_chars: int):
+        self.window = window
+        self.max_chars = max_chars
+        self._parts: list[str] = []
+        self._chars = 0
+        self._flushed_at = float("-inf")
+
+    def add(self, token: str) -> str | None:
+        """Buffer a token; returns the text to send when a frame is due."""
+        self._parts.append(token)
+        self._chars += len(token)
+        if self._chars >= self.max_chars or time.monotonic() - self._flushed_at >= self.window:
+            return self.flush()
+        return None
+
+    def flush(self) -> str | None:
+        if not self._parts:
+            return None
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._chars = 0
+        self._flushed_at = time.monotonic()
+        return text
 
 
 async def message_generator(
     user_input: StreamInput, agent_id: str = DEFAULT_AGENT
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[bytes, None]:
     """
     Generate a stream of messages from the agent.
 
-    This is the workhorse method for the /stream endpoint.
+    This is the workhorse method for the /stream endpoint. The stream opens with one
+    "metadata" event (run_id and the lexicon definitions matched in the input), followed by
+    "message" and "token" events; tokens are coalesced, see _TokenCoalescer.
     """
     agent: Pregel = get_agent(agent_id)
     kwargs, run_id, additional_data = await _handle_input(user_input, agent)
+    ai_message_count = 0
+    tokens = _TokenCoalescer(STREAM_TOKEN_WINDOW_MS / 1000, STREAM_TOKEN_MAX_CHARS)
 
+    yield _sse(
+        {
+            "type": "metadata",
+            "content": {"run_id": str(run_id), "additional_data": additional_data},
+        }
+    )
     try:
         # Process streamed events from the graph and yield messages over the SSE stream.
         async for stream_event in agent.astream(
@@ -286,6 +522,7 @@ async def message_generator(
             stream_mode, event = stream_event
             new_messages = []
             if stream_mode == "updates":
+                ai_message_count += _count_ai_messages(event)
                 for node, updates in event.items():
                     # A simple approach to handle agent interrupts.
                     # In a more sophisticated implementation, we could add
@@ -341,17 +578,19 @@ async def message_generator(
 
             for message in processed_messages:
                 if message is not None:
+                    if text := tokens.flush():
+                        yield _sse({"type": "token", "content": text})
                     try:
                         chat_message = langchain_to_chat_message(message)
                         chat_message.run_id = str(run_id)
                     except Exception as e:
                         logger.error(f"Error parsing message: {e}")
-                        yield f"data: {json.dumps({'additional_data': additional_data, 'type': 'error', 'content': 'Unexpected error'})}\n\n"
+                        yield _sse({"type": "error", "content": "Unexpected error"})
                         continue
                     # LangGraph re-sends the input message, which feels weird, so drop it
                     if chat_message.type == "human" and chat_message.content == user_input.message:
                         continue
-                    yield f"data: {json.dumps({'additional_data': additional_data, 'type': 'message', 'content': chat_message.model_dump()})}\n\n"
+                    yield _sse({"type": "message", "content": chat_message.model_dump()})
 
             if stream_mode == "messages":
                 if not user_input.stream_tokens:
@@ -368,12 +607,101 @@ async def message_generator(
                     # Empty content in the context of OpenAI usually means
                     # that the model is asking for a tool to be invoked.
                     # So we only print non-empty content.
-                    yield f"data: {json.dumps({'additional_data': additional_data, 'type': 'token', 'content': convert_message_content_to_string(content)})}\n\n"
+                    text = tokens.add(convert_message_content_to_string(content))
+                    if text:
+                        yield _sse({"type": "token", "content": text})
+        if text := tokens.flush():
+            yield _sse({"type": "token", "content": text})
+    except (asyncio.CancelledError, GeneratorExit):
+        # The client went away: stop the SQL the agent's tools still have running for this
+        # thread. Not awaited, the task is being torn down.
+        thread_id = kwargs["config"]["configurable"]["thread_id"]
+        asyncio.get_running_loop().run_in_executor(None, cancel_running_queries, thread_id)
+        raise
     except Exception as e:
         logger.exception(f"Error in message generator: {e}")
-        yield f"data: {json.dumps({'additional_data': [], 'type': 'error', 'content': str(e)})}\n\n"
+        if text := tokens.flush():
+            yield _sse({"type": "token", "content": text})
+        yield _sse({"type": "error", "content": str(e)})
     finally:
-        yield "data: [DONE]\n\n"
+        _record_run_usage(kwargs, ai_message_count)
+        yield b"data: [DONE]\n\n"
+
+
+async def _after_admission(
+    run: Admission, events: AsyncGenerator[bytes, None]
+) -> AsyncGenerator[bytes, None]:
+    """Send "queue" events with the run's position until it may start, then its stream."""
+    try:
+        async for position in run.wait():
+            yield _sse({"type": "queue", "content": {"position": position}})
+    except AdmissionRejected as e:
+        yield _sse({"type": "error", "content": str(e)})
+        yield b"data: [DONE]\n\n"
+        return
+    try:
+        async for event in events:
+            yield event
+    finally:
+        run.release()
+
+
+class _SharedStream:
+    """
+    The events of one /stream run, replayed from the start to every request following it, so
+    a duplicate submission of the same input joins the run instead of starting another. The
+    run is cancelled once no request follows it anymore.
+    """
+
+    def __init__(self, events: AsyncGenerator[bytes, None], on_done: Callable[[], None]):
+        self._events: list[bytes] = []
+        self._changed = asyncio.Condition()
+        self._done = False
+        self._followers = 0
+        self._task = asyncio.create_task(self._pump(events))
+        self._task.add_done_callback(lambda _: on_done())
+
+    async def _pump(self, events: AsyncGenerator[bytes, None]) -> None:
+        try:
+            async for event in events:
+                async with self._changed:
+                    self._events.append(event)
+                    self._changed.notify_all()
+        finally:
+            async with self._changed:
+                self._done = True
+                self._changed.notify_all()
+
+    async def follow(self) -> AsyncGenerator[bytes, None]:
+        self._followers += 1
+        sent = 0
+        try:
+            while True:
+                async with self._changed:
+                    while sent == len(self._events) and not self._done:
+                        await self._changed.wait()
+                    pending = self._events[sent:]
+                    done = self._done
+                for event in pending:
+                    yield event
+                sent += len(pending)
+                if done and sent == len(self._events):
+                    return
+        finally:
+            self._followers -= 1
+            if not self._followers and not self._task.done():
+                self._task.cancel()
+
+
+# /stream runs in flight by request body, joined by identical submissions
+_inflight_streams: dict[str, _SharedStream] = {}
+
+
+def _stream_key(user_input: StreamInput, agent_id: str) -> str | None:
+    """Identical submissions to an existing thread share one run; new threads never do."""
+    if not user_input.thread_id:
+        return None
+    return hashlib.sha256(f"{agent_id}:{user_input.model_dump_json()}".encode()).hexdigest()
 
 
 def _create_ai_message(parts: dict) -> AIMessage:
@@ -389,7 +717,7 @@ def _sse_response_example() -> dict[int | str, Any]:
             "description": "Server Sent Event Response",
             "content": {
                 "text/event-stream": {
-                    "example": "data: {'type': 'token', 'content': 'Hello'}\n\ndata: {'type': 'token', 'content': ' World'}\n\ndata: [DONE]\n\n",
+                    "example": 'data: {"type": "metadata", "content": {"run_id": "847c6285-8fc9-4560-a83f-4e6285809254", "additional_data": []}}\n\ndata: {"type": "token", "content": "Hello World"}\n\ndata: [DONE]\n\n',
                     "schema": {"type": "string"},
                 }
             },
@@ -412,11 +740,19 @@ async def stream(user_input: StreamInput, agent_id: str = DEFAULT_AGENT) -> Stre
     is also attached to all messages for recording feedback.
 
     Set `stream_tokens=false` to return intermediate messages but not token-by-token.
+    Runs waiting for admission first receive "queue" events with their position. A request
+    identical to one still streaming follows that run rather than starting its own.
     """
-    return StreamingResponse(
-        message_generator(user_input, agent_id),
-        media_type="text/event-stream",
-    )
+    key = _stream_key(user_input, agent_id)
+    shared = _inflight_streams.get(key) if key else None
+    if shared is None:
+        events = _after_admission(_enqueue_run(user_input), message_generator(user_input, agent_id))
+        if key is None:
+            return StreamingResponse(events, media_type="text/event-stream")
+        shared = _inflight_streams[key] = _SharedStream(
+            events, on_done=functools.partial(_inflight_streams.pop, key, None)
+        )
+    return StreamingResponse(shared.follow(), media_type="text/event-stream")
 
 
 @router.post("/feedback")
@@ -426,7 +762,7 @@ async def feedback(feedback: Feedback) -> FeedbackResponse:
     The feedback can be used for analytics and monitoring purposes.
     """
     try:
-        db_manager.save_feedback(
+        await get_async_db_manager().save_feedback(
             run_id=feedback.run_id,
             key=feedback.key,
             score=feedback.score,
@@ -453,10 +789,70 @@ async def feedback(feedback: Feedback) -> FeedbackResponse:
         raise HTTPException(status_code=500, detail=f"Error saving feedback: {str(e)}")
 
 
+def _message_run_ids(messages: list[AnyMessage]) -> list[str | None]:
+    """
+    Run of each message: a run starts with the user message whose id _handle_input derived
+    from its run_id. Messages saved before ids were set, or resumed interrupts, have none.
+    """
+    run_ids = []
+    run_id = None
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            message_id = message.id or ""
+            run_id = None
+            if message_id.startswith(RUN_MESSAGE_ID_PREFIX):
+                run_id = message_id.removeprefix(RUN_MESSAGE_ID_PREFIX)
+        run_ids.append(run_id)
+    return run_ids
+
+
+def _feedback_markdown(feedbacks: list[dict[str, Any]]) -> str:
+    feedbacks_by_score = defaultdict(list)
+    for fb in feedbacks:
+        feedbacks_by_score[fb.get("score", "")].append(fb)
+
+    feedback_md = ""
+    for score, fbs in feedbacks_by_score.items():
+        # Check if any feedback in this score group has a non-empty comment (excluding "Feedback humain en ligne")
+        feedbacks_with_comment = []
+        for fb in fbs:
+            comment = fb.get("additional_data", "").get("comment", "")
+            if comment == "Feedback humain en ligne":
+                comment = ""
+            if comment:
+                feedbacks_with_comment.append((fb, comment))
+        if feedbacks_with_comment:
+            # Only display feedbacks with comments for this score
+            for fb, comment in feedbacks_with_comment:
+                feedback_md += f"\n\n**Feedback** {int(score*5)*'⭐️'}\n"
+                feedback_md += f"""*{comment}*\n"""
+        else:
+            # No feedback with comment for this score, display all (even if no comment)
+            for fb in fbs:
+                comment = fb.get("additional_data", "").get("comment", "")
+                if comment == "Feedback humain en ligne":
+                    comment = ""
+                feedback_md += f"\n\n**Feedback** {int(score*5)*'⭐️'}\n"
+                if comment:
+                    feedback_md += f""": *{comment.strip()}*\n"""
+    return feedback_md
+
+
+def _history_etag(checkpoint_id: str | None, feedbacks: list[dict[str, Any]], input_data) -> str:
+    """Changes with the checkpoint, the feedbacks of the thread and the page asked for."""
+    last_feedback = max((fb["id"] for fb in feedbacks), default=None)
+    key = f"{checkpoint_id}:{len(feedbacks)}:{last_feedback}:{input_data.limit}:{input_data.before}"
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
 @router.post("/history")
-def history(input_data: ChatHistoryInput) -> ChatHistory:
+def history(input_data: ChatHistoryInput, request: Request, response: Response) -> ChatHistory:
     """
     Get chat history, with feedbacks injected into messages.
+
+    With `limit`, only the most recent messages are returned, and `next_cursor` pages through
+    older ones. The response carries an ETag: a request with a matching If-None-Match gets a
+    304 while neither the conversation nor its feedbacks changed.
     """
     agent: Pregel = get_agent(DEFAULT_AGENT)
     configurable_for_agent = {"thread_id": input_data.thread_id}
@@ -466,245 +862,350 @@ def history(input_data: ChatHistoryInput) -> ChatHistory:
         )
 
     try:
-        state_snapshot = agent.get_state(config=RunnableConfig(configurable=configurable_for_agent))
-        messages: list[AnyMessage] = state_snapshot.values.get("messages", [])
-        chat_messages: list[ChatMessage] = [
-            langchain_to_chat_message(m) for m in messages if m is not None
-        ]
-        # --- Ajout feedbacks ---
-        # Appel direct à la fonction get_feedbacks (importée dans ce fichier)
+        # The ETag is checked before the checkpoint is loaded and deserialised
+        checkpoint_id = latest_checkpoint_id(input_data.thread_id)
         try:
-            feedbacks_result = get_feedbacks(input_data.thread_id)
-            feedbacks = feedbacks_result.get("feedbacks", [])
+            feedbacks = get_db_manager().get_feedbacks_for_conversation(input_data.thread_id)
         except Exception as e:
             logger.error(f"Could not fetch feedbacks for thread {input_data.thread_id}: {e}")
             feedbacks = []
 
-        for msg in chat_messages:
-            matched_feedbacks = [
-                fb for fb in feedbacks if fb.get("commented_message_text") == msg.content
-            ]
+        etag = _history_etag(checkpoint_id, feedbacks, input_data)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+        if checkpoint_id is not None:
+            # That checkpoint, even if the thread moved on since: it is the one the ETag names
+            configurable_for_agent["checkpoint_id"] = checkpoint_id
+        state_snapshot = agent.get_state(config=RunnableConfig(configurable=configurable_for_agent))
+
+        messages: list[AnyMessage] = [
+            m for m in state_snapshot.values.get("messages", []) if m is not None
+        ]
+        run_ids = _message_run_ids(messages)
+        end = len(messages) if input_data.before is None else min(input_data.before, len(messages))
+        start = 0 if input_data.limit is None else max(end - input_data.limit, 0)
+
+        # Feedback is saved for the last message of a run; older feedback without a run in
+        # this thread is matched on the text of the message it was given for
+        last_message_of_run = {run_id: i for i, run_id in enumerate(run_ids) if run_id}
+        feedbacks_by_message: dict[int, list[dict[str, Any]]] = defaultdict(list)
+        feedbacks_by_text: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        for fb in feedbacks:
+            if fb.get("run_id") in last_message_of_run:
+                feedbacks_by_message[last_message_of_run[fb["run_id"]]].append(fb)
+            elif fb.get("commented_message_text") is not None:
+                feedbacks_by_text[fb["commented_message_text"]].append(fb)
+
+        chat_messages: list[ChatMessage] = []
+        for i in range(start, end):
+            msg = langchain_to_chat_message(messages[i])
+            if msg.type == "ai":
+                msg.run_id = run_ids[i]
+            matched_feedbacks = feedbacks_by_message.get(i, []) + feedbacks_by_text.get(
+                msg.content, []
+            )
             if matched_feedbacks:
-                # Group feedbacks by score
-                from collections import defaultdict
-
-                feedbacks_by_score = defaultdict(list)
-                for fb in matched_feedbacks:
-                    feedbacks_by_score[fb.get("score", "")].append(fb)
-
-                feedback_md = ""
-                for score, fbs in feedbacks_by_score.items():
-                    # Check if any feedback in this score group has a non-empty comment (excluding "Feedback humain en ligne")
-                    feedbacks_with_comment = []
-                    for fb in fbs:
-                        comment = fb.get("additional_data", "").get("comment", "")
-                        if comment == "Feedback humain en ligne":
-                            comment = ""
-                        if comment:
-                            feedbacks_with_comment.append((fb, comment))
-                    if feedbacks_with_comment:
-                        # Only display feedbacks with comments for this score
-                        for fb, comment in feedbacks_with_comment:
-                            feedback_md += f"\n\n**Feedback** {int(score*5)*'⭐️'}\n"
-                            feedback_md += f"""*{comment}*\n"""
-                    else:
-                        # No feedback with comment for this score, display all (even if no comment)
-                        for fb in fbs:
-                            comment = fb.get("additional_data", "").get("comment", "")
-                            if comment == "Feedback humain en ligne":
-                                comment = ""
-                            feedback_md += f"\n\n**Feedback** {int(score*5)*'⭐️'}\n"
-                            if comment:
-                                feedback_md += f""": *{comment.strip()}*\n"""
-                msg.content += feedback_md
-
-        return ChatHistory(messages=chat_messages)
+                msg.content += _feedback_markdown(matched_feedbacks)
+            chat_messages.append(msg)
+
+        return ChatHistory(messages=chat_messages, next_cursor=start or None)
     except Exception as e:
         logger.exception(f"An exception occurred: {e}")
         raise HTTPException(status_code=500, detail="Unexpected error")
 
 
 @router.get("/total_count_messages")
-def get_total_count_messages():
-    agent: Pregel = get_agent(DEFAULT_AGENT)
-    ADMIN_USER_ID = "00000000-0000-0000-0000-000000000001"
-    conversations = db_manager.get_conversations(user_id=ADMIN_USER_ID, limit=1000000)
+async def get_total_count_messages():
+    """Usage totals kept by the counters each finished run updates (see record_run_usage)."""
+    totals = await get_async_db_manager().get_usage_totals()
+    return {
+        "total_conversations": totals["conversations"],
+        "total_user_messages": totals["user_messages"],
+        "total_ai_messages": totals["ai_messages"],
+    }
 
-    total_user = 0
-    total_ai = 0
 
-    for conv in conversations:
-        thread_id = str(conv["thread_id"])
-        configurable_for_agent = {"thread_id": thread_id}
-        state_snapshot = agent.get_state(config=RunnableConfig(configurable=configurable_for_agent))
-        messages = state_snapshot.values.get("messages", [])
-        chat_messages: list[ChatMessage] = [
-            langchain_to_chat_message(m) for m in messages if m is not None
-        ]
-        user_count = 0
-        ai_count = 0
-        for m in chat_messages:
-            # Convert to ChatMessage if not already
-            if not isinstance(m, ChatMessage):
-                m = ChatMessage.model_validate(m)
-            if m.type == "human":
-                user_count += 1
-            elif m.type == "ai":
-                ai_count += 1
-        total_user += user_count
-        total_ai += ai_count
+def _extract_upload_text(
+    filename: str, extract: Callable[[], ExtractedText]
+) -> ExtractedText | None:
+    """Run a text extraction, logging failures: the file is kept without its text."""
+    try:
+        return extract()
+    except Exception as e:
+        logger.warning(f"Impossible to extract the content of '{filename}': {e}")
+        return None
+
+
+def _process_upload(
+    job: UploadJob,
+    report: ProgressReporter,
+    *,
+    blob: StoredBlob,
+    content_type: str,
+    agent_id: str,
+    loop: asyncio.AbstractEventLoop,
+) -> dict:
+    """Parse and index an uploaded file already in the blob store, on the upload worker pool."""
+    filename = job.filename
+    thread_id = job.thread_id
+    thread_uuid = UUID(thread_id) if thread_id else None
+
+    extracted: ExtractedText | None = None
+
+    # Text is read from the stored blob chunk by chunk (page by page for PDFs), up to
+    # UPLOAD_TEXT_MAX_CHARS characters. A file whose text cannot be extracted is still
+    # saved, but indexing errors fail the job.
+    if content_type.startswith("text/"):
+        report("extracting", 0.2)
+        extracted = _extract_upload_text(
+            filename, lambda: take_text(iter_decoded(get_blob_store().iter_chunks(blob.sha256)))
+        )
+    elif content_type.startswith("application/pdf"):
+        pdf_parser = os.environ.get("UPLOADED_PDF_PARSER", None)
+
+        # Parsers read the stored blob in place (local backend) or a temporary copy
+        with get_blob_store().local_file(blob.sha256, suffix=".pdf") as pdf_path:
+            if pdf_parser and "nlm-ingestor" in pdf_parser:
+                report("indexing", 0.2)
+                get_rag_system().index_document(
+                    pdf_path=str(pdf_path),
+                    document_name_override=(
+                        filename[:-4] if filename.endswith(".pdf") else filename
+                    ),
+                    table_name=f"{schema_app_data}.uploaded_document_blocks",
+                )
+                logger.info(f"PDF '{filename}' processed with 'nlm-ingestor' ({blob.sha256})")
+            elif pdf_parser and "pypdf" in pdf_parser:
+                report("extracting", 0.2)
 
-    return {
-        "total_conversations": len(conversations),
-        "total_user_messages": total_user,
-        "total_ai_messages": total_ai,
+                def extract_pdf() -> ExtractedText:
+                    with open(pdf_path, "rb") as pdf:
+                        return take_text(iter_pdf_page_texts(pdf))
+
+                extracted = _extract_upload_text(filename, extract_pdf)
+            elif pdf_parser:
+                logger.warning(
+                    f"Unsupported PDF parser configured: '{pdf_parser}'. "
+                    f"PDF '{filename}' stored ({blob.sha256}) but not processed for text content."
+                )
+            else:
+                logger.info(
+                    f"No PDF parser configured (UPLOADED_PDF_PARSER not set). "
+                    f"PDF '{filename}' stored ({blob.sha256}) but not processed for text content."
+                )
+    else:
+        logger.warning(
+            f"Unsupported file type: {content_type} for file '{filename}'. Content not extracted."
+        )
+
+    text_content = extracted.text if extracted else None
+    metadata = {
+        "original_name": filename,
+        "content_type": content_type,
+        "size": blob.size,
+        "sha256": blob.sha256,
     }
+    if extracted and extracted.truncated:
+        logger.warning(f"Text of '{filename}' truncated to {len(text_content)} characters")
+        metadata["text_truncated"] = True
+
+    report("saving", 0.8)
+    get_db_manager().save_file(
+        file_id=job.file_id,
+        user_id=job.user_id,
+        thread_id=thread_uuid,
+        filename=filename,
+        content_type=content_type,
+        blob=blob,
+        text_content=text_content,
+        metadata=metadata,
+    )
+
+    if thread_id and text_content:
+        report("attaching", 0.9)
+        # Agent state lives on the event loop (async checkpointer); hop back onto it.
+        asyncio.run_coroutine_threadsafe(
+            _add_file_to_thread(agent_id, thread_id, filename, text_content), loop
+        ).result()
+
+    logger.info(
+        f"File uploaded: {filename}, ID: {job.file_id}, Thread: {thread_id}, Blob: {blob.sha256}"
+    )
 
+    return {"file_id": str(job.file_id), "filename": filename, "sha256": blob.sha256}
 
-@router.post("/{agent_id}/upload")
-@router.post("/upload")
+
+async def _add_file_to_thread(
+    agent_id: str, thread_id: str, filename: str, text_content: str
+) -> None:
+    agent: Pregel = get_agent(agent_id)
+    config = RunnableConfig(configurable={"thread_id": thread_id})
+
+    try:
+        state = await agent.aget_state(config=config)
+        file_message = SystemMessage(
+            content=f"<CONTENT OF UPLOADED FILE {filename}>\n\n{text_content}\n\n</CONTENT OF UPLOADED FILE {filename}>",
+        )
+
+        new_messages = list(state.values.get("messages", []))
+        new_messages.append(file_message)
+
+        await agent.aupdate_state(values={"messages": new_messages}, config=config)
+
+        logger.info(
+            f"The file {filename} has successfully been added to the messages history of the thread {thread_id}"
+        )
+    except Exception as e:
+        logger.error(f"Error while adding the file content to the file history: {e}")
+
+
+@router.post("/{agent_id}/upload", status_code=status.HTTP_202_ACCEPTED)
+@router.post("/upload", status_code=status.HTTP_202_ACCEPTED)
 async def upload_file(
     file: UploadFile = File(...),
     thread_id: str | None = None,
     user_id: str | UUID | None = None,
     agent_id: str = DEFAULT_AGENT,
-) -> dict:
+) -> UploadJobStatus:
     """
     Upload a file to the agent service.
 
+    The file is parsed and indexed in the background; the response only acknowledges
+    the upload. Poll `/upload/jobs/{job_id}` or stream `/upload/jobs/{job_id}/events`
+    to follow progress.
+
     Args:
         file: The uploaded file
         thread_id: Optional thread ID to associate the file with
+        user_id: The user owning the file
         agent_id: The agent to use (defaults to the default agent)
 
     Returns:
-        dict: Contains the file_id of the uploaded file and storage path for PDFs
+        UploadJobStatus: The queued job, including the job_id and the future file_id
     """
-    try:
-        file_id = uuid4()
-        thread_uuid = UUID(thread_id) if thread_id else None
-
-        contents = await file.read()
-
-        text_content = None
-        pdf_storage_path = None
-
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id is required for uploading files.")
+    if thread_id:
         try:
-            if file.content_type.startswith("text/"):
-                text_content = contents.decode("utf-8", errors="ignore")
-            elif file.content_type.startswith("application/pdf"):
-                pdf_parser = os.environ.get("UPLOADED_PDF_PARSER", None)
-
-                base_storage_dir = "uploaded"
-                thread_dir = thread_id if thread_id else "no_thread"
-                storage_dir = os.path.join(base_storage_dir, thread_dir)
-
-                os.makedirs(storage_dir, exist_ok=True)
-
-                pdf_filename = file.filename
-                pdf_storage_path = os.path.join(storage_dir, pdf_filename)
-
-                with open(pdf_storage_path, "wb") as pdf_file_handle:
-                    pdf_file_handle.write(contents)
-
-                if pdf_parser and "nlm-ingestor" in pdf_parser:
-                    rag_system.index_document(
-                        pdf_path=pdf_storage_path,
-                        title=(
-                            pdf_filename[:-4] if pdf_filename.endswith(".pdf") else pdf_filename
-                        ),
-                        table_name="uploaded_document_blocks",
-                    )
-                    logger.info(
-                        f"PDF '{pdf_filename}' processed with 'nlm-ingestor' and stored at: {pdf_storage_path}"
-                    )
-                elif pdf_parser and "pypdf" in pdf_parser:
-                    from pypdf import PdfReader
-
-                    reader = PdfReader(pdf_storage_path)
-                    text_content = ""
-                    for page in reader.pages:
-                        text_content += page.extract_text() or ""
-                else:
-                    if pdf_parser:
-                        logger.warning(
-                            f"Unsupported PDF parser configured: '{pdf_parser}'. "
-                            f"PDF '{pdf_filename}' stored at '{pdf_storage_path}' but not processed for text content."
-                        )
-                    else:
-                        logger.info(
-                            f"No PDF parser configured (UPLOADED_PDF_PARSER not set). "
-                            f"PDF '{pdf_filename}' stored at '{pdf_storage_path}' but not processed for text content."
-                        )
-            else:
-                logger.warning(
-                    f"Unsupported file type: {file.content_type} for file '{file.filename}'. Content not extracted."
-                )
-        except Exception as e:
-            logger.warning(f"Impossible to extract file content: {e}")
-
-        metadata = {
-            "original_name": file.filename,
-            "content_type": file.content_type,
-            "size": len(contents),
-            "storage_path": pdf_storage_path,
-        }
+            UUID(thread_id)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Invalid thread_id format.")
 
-        if not user_id:
-            raise HTTPException(status_code=400, detail="user_id is required for uploading files.")
-
-        db_manager.save_file(
-            file_id=file_id,
-            user_id=user_id,  # Pass user_id to db_manager
-            thread_id=thread_uuid,
-            filename=file.filename,
-            content_type=file.content_type,
-            content=contents,
-            text_content=text_content,
-            metadata=metadata,
+    try:
+        # Streamed in chunks from the spooled upload to the blob store, hashing on the way:
+        # the file is never held in memory whole. Content-addressed, so re-uploads of the same
+        # file share one stored copy.
+        blob = await asyncio.to_thread(
+            get_blob_store().put_stream, limit_size(copy_stream(file.file), UPLOAD_MAX_BYTES)
+        )
+        job = UploadJob(filename=file.filename, user_id=str(user_id), thread_id=thread_id)
+        await asyncio.to_thread(
+            upload_jobs.submit,
+            job,
+            functools.partial(
+                _process_upload,
+                blob=blob,
+                content_type=file.content_type or "application/octet-stream",
+                agent_id=agent_id,
+                loop=asyncio.get_running_loop(),
+            ),
         )
+    except BlobTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File larger than the {UPLOAD_MAX_BYTES} bytes allowed.",
+        )
+    except UploadQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+    except Exception as e:
+        logger.error(f"Error while uploading the file: {e}")
+        raise HTTPException(status_code=500, detail=f"Error while uploading the file: {str(e)}")
 
-        if thread_id and text_content:
-            agent: Pregel = get_agent(agent_id)
-            config = RunnableConfig(configurable={"thread_id": thread_id})
+    logger.info(f"File queued for upload: {file.filename}, job: {job.job_id}, Thread: {thread_id}")
+    return UploadJobStatus.model_validate(upload_jobs.snapshot(job.job_id))
 
-            try:
-                state = await agent.aget_state(config=config)
-                file_message = SystemMessage(
-                    content=f"<CONTENT OF UPLOADED FILE {file.filename}>\n\n{text_content}\n\n</CONTENT OF UPLOADED FILE {file.filename}>",
-                )
 
-                new_messages = list(state.values.get("messages", []))
-                new_messages.append(file_message)
+async def _get_upload_job(job_id: UUID, user_id: str | UUID | None) -> dict:
+    if not user_id:
+        raise HTTPException(status_code=400, detail="user_id is required to follow an upload.")
+    # Running in this worker, or in another one which saved its state
+    job = upload_jobs.snapshot(job_id) or await get_async_db_manager().get_upload_job(job_id)
+    if job is None or job["user_id"] != str(user_id):
+        raise HTTPException(status_code=404, detail="Upload job not found.")
+    return job
+
 
-                await agent.aupdate_state(values={"messages": new_messages}, config=config)
+@router.get("/upload/jobs/{job_id}")
+async def get_upload_job(job_id: UUID, user_id: str | UUID | None = None) -> UploadJobStatus:
+    """Return the current status of a background upload."""
+    return UploadJobStatus.model_validate(await _get_upload_job(job_id, user_id))
 
-                logger.info(
-                    f"The file {file.filename} has successfully been added to the messages history of the thread {thread_id}"
-                )
-            except Exception as e:
-                logger.error(f"Error while adding the file content to the file history: {e}")
 
-        response_data = {"file_id": str(file_id), "filename": file.filename}
+@router.get("/upload/jobs/{job_id}/events", response_class=StreamingResponse)
+async def stream_upload_job(job_id: UUID, user_id: str | UUID | None = None) -> StreamingResponse:
+    """Stream the status of a background upload as server-sent events until it finishes."""
+    await _get_upload_job(job_id, user_id)
 
-        if pdf_storage_path:
-            response_data["storage_path"] = pdf_storage_path
+    async def event_generator() -> AsyncGenerator[str, None]:
+        async for job in upload_jobs.watch(job_id, load=get_async_db_manager().get_upload_job):
+            yield f"data: {json.dumps({'type': 'upload_job', 'content': job})}\n\n"
+        yield "data: [DONE]\n\n"
 
-        logger.info(
-            f"File uploaded: {file.filename}, ID: {file_id}, Thread: {thread_id}, Path: {pdf_storage_path}"
-        )
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
 
-        return response_data
 
+async def _probe(probe) -> dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(probe(), timeout=HEALTH_CHECK_TIMEOUT)
+        result: dict[str, Any] = {"status": "ok"}
     except Exception as e:
-        logger.error(f"Error while uploading the file: {e}")
-        raise HTTPException(status_code=500, detail=f"Error while uploading the file: {str(e)}")
+        result = {"status": "error", "error": str(e) or type(e).__name__}
+    result["seconds"] = round(time.perf_counter() - started, 4)
+    return result
 
 
 @app.get("/health")
-async def health_check():
-    """Health check endpoint."""
-    return {"status": "ok"}
+async def health_check() -> JSONResponse:
+    """
+    Readiness check: round-trips to PostgreSQL through both connection pools, and reports
+    their gauges. Answers 503 when a check fails or exceeds HEALTH_CHECK_TIMEOUT seconds.
+    """
+    database, async_database = await asyncio.gather(
+        _probe(
+            lambda: asyncio.to_thread(get_db_manager().execute_query, "SELECT 1", label="health")
+        ),
+        _probe(lambda: get_async_db_manager().execute_query("SELECT 1", label="health")),
+    )
+    checks = {"database": database, "async_database": async_database}
+    healthy = all(check["status"] == "ok" for check in checks.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=jsonable_encoder(
+            {
+                "status": "ok" if healthy else "unavailable",
+                "checks": checks,
+                # None when the manager could not be created
+                "db_pool": get_db_manager().pool_stats() if get_db_manager.created else None,
+                "async_db_pool": (
+                    get_async_db_manager().pool_stats() if get_async_db_manager.created else None
+                ),
+            }
+        ),
+    )
+
+
+@app.get("/metrics", dependencies=[Depends(verify_bearer)])
+async def metrics() -> Response:
+    """Query latencies, row counts, pool gauges and request latencies in Prometheus format."""
+    return Response(content=REGISTRY.render(), media_type=REGISTRY.CONTENT_TYPE)
 
 
 # @router.get("/feedback")
@@ -718,7 +1219,7 @@ def get_feedbacks(conversation_id: str) -> dict[str, Any]:
         Dictionary containing the list of feedbacks
     """
     try:
-        feedback_entries = db_manager.get_feedbacks_for_conversation(conversation_id)
+        feedback_entries = get_db_manager().get_feedbacks_for_conversation(conversation_id)
         return {
             "feedbacks": [
                 fb.model_dump() if hasattr(fb, "model_dump") else dict(fb)
@@ -741,7 +1242,7 @@ async def get_feedback(run_id: str) -> dict[str, Any]:
         Dictionary containing the feedback entries
     """
     try:
-        feedback_entries = db_manager.get_feedback_for_run(run_id)
+        feedback_entries = await get_async_db_manager().get_feedback_for_run(run_id)
         return {"run_id": run_id, "feedback": feedback_entries}
     except Exception as e:
         logger.error(f"Error retrieving feedback: {e}")
@@ -767,8 +1268,7 @@ async def set_conversation_title(
             status_code=400, detail="user_id is required to set conversation title."
         )
     try:
-        # Assuming db_manager.save_conversation_title now requires user_id
-        db_manager.save_conversation_title(UUID(thread_id), user_id, title)
+        await get_async_db_manager().save_conversation_title(UUID(thread_id), user_id, title)
         return {"status": "success", "thread_id": thread_id, "title": title}
     except Exception as e:
         logger.error(f"Error setting conversation title: {e}")
@@ -791,8 +1291,7 @@ async def get_conversations(limit: int = 20, user_id: str | UUID | None = None)
             status_code=400, detail="user_id is required to retrieve conversations."
         )
     try:
-        # Assuming db_manager.get_conversations now requires user_id
-        conversations = db_manager.get_conversations(user_id=user_id, limit=limit)
+        conversations = await get_async_db_manager().get_conversations(user_id=user_id, limit=limit)
         return {"conversations": conversations}
     except Exception as e:
         logger.error(f"Error retrieving conversations for user {user_id}: {e}")
@@ -818,7 +1317,7 @@ async def delete_conversation(thread_id: str, user_id: str | UUID | None = None)
 
     try:
         uuid_thread_id = UUID(thread_id)
-        success = db_manager.reassign_and_rename_conversation(
+        success = await get_async_db_manager().reassign_and_rename_conversation(
             thread_id=uuid_thread_id,
             current_user_id=user_id,
             new_user_id=admin_user_id,
@@ -833,7 +1332,7 @@ async def delete_conversation(thread_id: str, user_id: str | UUID | None = None)
             }
         else:
             # This could mean conversation not found for the user, or an issue during the transaction.
-            # db_manager.reassign_and_rename_conversation logs specific reasons.
+            # async_db_manager.reassign_and_rename_conversation logs specific reasons.
             raise HTTPException(
                 status_code=404,  # Or 500 if it's a general failure, but 404 is common for "not found or not authorized"
                 detail=f"Failed to mark conversation {thread_id} as deleted. It might not exist, not be owned by the user, or an internal error occurred.",
@@ -867,8 +1366,7 @@ async def get_conversation_title(
             status_code=400, detail="user_id is required to get conversation title."
         )
     try:
-        # Assuming db_manager.get_conversation_title now requires user_id
-        title = db_manager.get_conversation_title(UUID(thread_id), user_id)
+        title = await get_async_db_manager().get_conversation_title(UUID(thread_id), user_id)
         if title is not None:  # Check for None explicitly, as empty string could be a valid title
             return {"thread_id": thread_id, "title": title}
         else:
@@ -900,7 +1398,7 @@ async def get_rag_annotations(request: AnnotationsRequest) -> AnnotationsRespons
     """
     logger.info(f"RAG annotations requested for {request.pdf_file}, user_id: {request.user_id}")
     try:
-        annotations = rag_system.get_annotations_by_indices(
+        annotations = await get_rag_system().aget_annotations_by_indices(
             pdf_file=request.pdf_file,
             block_indices=request.block_indices,
             # user_id=request.user_id
@@ -920,7 +1418,7 @@ async def debug_rag_blocks(
     """
     logger.info(f"RAG debug_blocks requested for {request.pdf_file}, user_id: {request.user_id}")
     try:
-        annotations = rag_system.debug_blocks(
+        annotations = await get_rag_system().adebug_blocks(
             pdf_file=request.pdf_file
             # user_id=request.user_id
         )
@@ -938,7 +1436,9 @@ async def get_document_source_status_endpoint(
     Get the source status (path or URL) for a given document name.
     """
     try:
-        source_info_dict = db_manager.get_document_source_status(name=document_name)
+        source_info_dict = await get_async_db_manager().get_document_source_status(
+            name=document_name
+        )
         if source_info_dict:
             source_info_model = DocumentSourceInfo(**source_info_dict)
             return DocumentSourceResponse(source_info=source_info_model)
@@ -957,7 +1457,7 @@ async def create_user_feedback(feedback_data: UserFeedbackCreate) -> UserFeedbac
     Save user feedback to the database.
     """
     try:
-        saved_feedback = db_manager.save_user_feedback(feedback_data)
+        saved_feedback = await get_async_db_manager().save_user_feedback(feedback_data)
         logger.info(f"Saved user feedback from user {feedback_data.user_id}")
         return saved_feedback
     except Exception as e:
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import threading
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, TypeVar
+
+try:
+    from .metrics import REGISTRY
+except ImportError:
+    from metrics import REGISTRY
+
+T = TypeVar("T")
+
+single_flight_calls = REGISTRY.counter(
+    "single_flight_calls_total",
+    "Coalesced calls by flight group; shared ones awaited a call already in flight.",
+    ["group", "outcome"],
+)
+
+
+def flight_key(*args: Any, **kwargs: Any) -> str:
+    """A key identifying a call by its arguments, lists and dicts included."""
+    return json.dumps([args, kwargs], sort_keys=True, default=str)
+
+
+class _Call:
+    __slots__ = ("done", "error", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: a call whose key is already in flight waits for
+    that call and shares its result (or exception) instead of running again. Nothing is
+    cached once a call returns. Shared results are the same object for every caller, which
+    must not mutate them.
+
+    Exceptions of the `retry_on` types belong to the call that raised them (e.g. its own
+    request was cancelled): callers waiting on it run the call themselves instead.
+    """
+
+    def __init__(self, group: str, retry_on: tuple[type[BaseException], ...] = ()):
+        self.group = group
+        self.retry_on = retry_on
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Run `fn` for `key` in this thread, or wait for the thread already running it."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                break
+            single_flight_calls.inc(group=self.group, outcome="shared")
+            call.done.wait()
+            if call.error is None:
+                return call.result
+            if not isinstance(call.error, self.retry_on):
+                raise call.error
+        single_flight_calls.inc(group=self.group, outcome="executed")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Async `do`: run `fn()` for `key` in a task that every caller awaits. A caller being
+        cancelled leaves the call running for the others.
+        """
+        while True:
+            task = self._tasks.get(key)
+            if task is None:
+                single_flight_calls.inc(group=self.group, outcome="executed")
+                task = self._tasks[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda done: self._forget(key, done))
+                return await asyncio.shield(task)
+            single_flight_calls.inc(group=self.group, outcome="shared")
+            try:
+                return await asyncio.shield(task)
+            except self.retry_on:
+                continue
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
@@ -0,0 +1,218 @@
+import logging
+import os
+import threading
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+from psycopg2 import errors
+
+try:
+    from .db_manager import DatabaseManager
+    from .metrics import observe_query
+    from .single_flight import SingleFlight, flight_key
+except ImportError:
+    from db_manager import DatabaseManager
+    from metrics import observe_query
+    from single_flight import SingleFlight, flight_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATEMENT_TIMEOUT = "30s"
+
+
+class QueryRejected(ValueError):
+    """Raised when an agent query is refused or stopped; the message is meant for the model."""
+
+
+class QueryCancelled(QueryRejected):
+    """Raised when the run owning an agent query was aborted."""
+
+
+def _env(tool: str, name: str, default: str | None = None) -> str | None:
+    return os.getenv(f"{tool}_{name}") or os.getenv(f"AGENT_SQL_{name}") or default
+
+
+@dataclass(frozen=True, slots=True)
+class QueryLimits:
+    """
+    Resource limits for SQL written by an agent, read from `<TOOL>_<SETTING>` with
+    `AGENT_SQL_<SETTING>` as the fallback (e.g. SQL_EXECUTOR_STATEMENT_TIMEOUT, then
+    AGENT_SQL_STATEMENT_TIMEOUT).
+    """
+
+    statement_timeout: str = DEFAULT_STATEMENT_TIMEOUT
+    work_mem: str | None = None
+    # EXPLAIN pre-flight thresholds; None disables the check
+    max_cost: float | None = None
+    max_rows: float | None = None
+
+    @classmethod
+    def for_tool(cls, tool: str) -> "QueryLimits":
+        max_cost = _env(tool, "MAX_COST")
+        max_rows = _env(tool, "MAX_ROWS")
+        return cls(
+            statement_timeout=_env(tool, "STATEMENT_TIMEOUT", DEFAULT_STATEMENT_TIMEOUT),
+            work_mem=_env(tool, "WORK_MEM"),
+            max_cost=float(max_cost) if max_cost else None,
+            max_rows=float(max_rows) if max_rows else None,
+        )
+
+
+class RunningQueries:
+    """Backend pids of the agent queries in flight, by owner (the conversation thread id)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pids: dict[str, set[int]] = defaultdict(set)
+        self._cancelled: set[int] = set()
+
+    @contextmanager
+    def track(self, owner: str | None, pid: int) -> Iterator[None]:
+        """
+        Record `pid` as running a query of `owner` for the duration of the block, and raise
+        QueryCancelled instead of the QueryCanceled error when cancel() stopped it.
+        """
+        if owner is None:
+            yield
+            return
+        with self._lock:
+            self._pids[owner].add(pid)
+        try:
+            yield
+        except errors.QueryCanceled:
+            with self._lock:
+                if pid in self._cancelled:
+                    raise QueryCancelled(
+                        "Query cancelled because the request was aborted."
+                    ) from None
+            raise
+        finally:
+            with self._lock:
+                self._pids[owner].discard(pid)
+                if not self._pids[owner]:
+                    del self._pids[owner]
+                # The connection goes back to the pool: its next query is not the cancelled one
+                self._cancelled.discard(pid)
+
+    def cancel(self, owner: str, db_manager: DatabaseManager | None = None) -> int:
+        """Cancel every query `owner` has in flight. Returns how many were signalled."""
+        with self._lock:
+            if owner not in self._pids:
+                return 0
+        # Signalled under the lock, so none of these queries can end and its connection run
+        # another owner's query in between; the connection is borrowed before taking it
+        with (
+            (db_manager or DatabaseManager()).connection() as conn,
+            conn.cursor() as cursor,
+            self._lock,
+        ):
+            pids = list(self._pids.get(owner, ()))
+            if not pids:
+                return 0
+            self._cancelled.update(pids)
+            cursor.execute("SELECT pg_cancel_backend(pid) FROM unnest(%s::int[]) AS pid", (pids,))
+            rows = cursor.fetchall()
+        cancelled = sum(1 for (signalled,) in rows if signalled)
+        logger.info(f"Cancelled {cancelled} running agent queries for {owner}")
+        return cancelled
+
+
+running_queries = RunningQueries()
+
+
+def query_owner(config: dict | None) -> str | None:
+    """Owner of a tool call's queries: the conversation thread id of its RunnableConfig."""
+    return ((config or {}).get("configurable") or {}).get("thread_id")
+
+
+def cancel_running_queries(owner: str) -> int:
+    """Cancel the agent queries of an aborted run; never raises."""
+    try:
+        return running_queries.cancel(owner)
+    except Exception as e:
+        logger.warning(f"Could not cancel running queries for {owner}: {e}")
+        return 0
+
+
+def _check_plan(cursor, sql: str, params: Any, limits: QueryLimits) -> None:
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    plan = cursor.fetchone()[0][0]["Plan"]
+    cost, rows = plan["Total Cost"], plan["Plan Rows"]
+    if (limits.max_cost is not None and cost > limits.max_cost) or (
+        limits.max_rows is not None and rows > limits.max_rows
+    ):
+        raise QueryRejected(
+            f"Query rejected before execution: the planner estimates a cost of {cost:,.0f} "
+            f"(limit {limits.max_cost or 'none'}) and {rows:,.0f} rows "
+            f"(limit {limits.max_rows or 'none'}). Add WHERE filters or join conditions, "
+            "aggregate with GROUP BY, or add a LIMIT, then try again."
+        )
+
+
+def run_limited_query(
+    sql: str,
+    tool: str,
+    params: Any = None,
+    owner: str | None = None,
+    db_manager: DatabaseManager | None = None,
+) -> tuple[list[str], list[tuple]]:
+    """
+    Run an agent-written SELECT in a read-only transaction under `tool`'s limits, and return
+    (column names, rows). The `SET LOCAL`-style settings end with the transaction, so pooled
+    connections are returned untouched. Raises QueryRejected when the plan is too expensive,
+    the statement timeout fires or the owning run is cancelled.
+    """
+    limits = QueryLimits.for_tool(tool)
+    db_manager = db_manager or DatabaseManager()
+    with db_manager.connection() as conn, conn.cursor() as cursor:
+        pid = conn.get_backend_pid()
+        cursor.execute("BEGIN READ ONLY")
+        try:
+            cursor.execute(
+                "SELECT set_config('statement_timeout', %s, true)", (limits.statement_timeout,)
+            )
+            if limits.work_mem:
+                cursor.execute("SELECT set_config('work_mem', %s, true)", (limits.work_mem,))
+            if limits.max_cost is not None or limits.max_rows is not None:
+                _check_plan(cursor, sql, params, limits)
+            with (
+                running_queries.track(owner, pid),
+                observe_query(tool.lower(), sql, params) as observed,
+            ):
+                cursor.execute(sql, params)
+                columns = [column.name for column in cursor.description or ()]
+                rows = cursor.fetchall() if cursor.description else []
+                observed.rows = len(rows)
+        except errors.QueryCanceled:
+            raise QueryRejected(
+                f"Query stopped after the {limits.statement_timeout} statement timeout. "
+                "Narrow it with WHERE filters, aggregate with GROUP BY, or add a LIMIT."
+            ) from None
+        finally:
+            try:
+                cursor.execute("ROLLBACK")
+            except Exception as e:
+                logger.warning(f"Rollback after agent query failed: {e}")
+        return columns, rows
+
+
+# Identical agent queries running at the same time are executed once. A query cancelled with
+# its run is retried by the runs that were waiting for it.
+_query_flights = SingleFlight("agent_sql", retry_on=(QueryCancelled,))
+
+
+def run_shared_query(
+    sql: str,
+    tool: str,
+    params: Any = None,
+    owner: str | None = None,
+    db_manager: DatabaseManager | None = None,
+) -> tuple[list[str], list[tuple]]:
+    """run_limited_query, sharing the result of an identical query already in flight."""
+    return _query_flights.do(
+        flight_key(sql, tool, params),
+        lambda: run_limited_query(sql, tool, params=params, owner=owner, db_manager=db_manager),
+    )
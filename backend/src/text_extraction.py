@@ -0,0 +1,49 @@
+import codecs
+import os
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from typing import BinaryIO
+
+# Characters of text kept from an upload, for the files table and the conversation
+UPLOAD_TEXT_MAX_CHARS = int(os.getenv("UPLOAD_TEXT_MAX_CHARS", "1000000"))
+
+
+@dataclass(frozen=True, slots=True)
+class ExtractedText:
+    text: str
+    truncated: bool
+
+
+def take_text(parts: Iterable[str], max_chars: int = UPLOAD_TEXT_MAX_CHARS) -> ExtractedText:
+    """Join `parts` up to `max_chars` characters, without reading the parts beyond them."""
+    kept: list[str] = []
+    size = 0
+    for part in parts:
+        if size + len(part) > max_chars:
+            kept.append(part[: max_chars - size])
+            return ExtractedText("".join(kept), truncated=True)
+        kept.append(part)
+        size += len(part)
+    return ExtractedText("".join(kept), truncated=False)
+
+
+def iter_decoded(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """Decode a byte stream chunk by chunk, dropping invalid bytes (even split across chunks)."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="ignore")
+    for chunk in chunks:
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def iter_pdf_page_texts(pdf: BinaryIO) -> Iterator[str]:
+    """
+    Text of each page of an open PDF file, with pypdf. The file is read page by page as it
+    is iterated, not loaded whole, and pages already extracted are not kept in memory.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf)
+    for page in reader.pages:
+        yield page.extract_text() or ""
+        # Objects resolved for this page (content streams, fonts) are read again if needed
+        reader.resolved_objects.clear()
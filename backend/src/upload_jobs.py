@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Protocol
+from uuid import UUID, uuid4
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATES = frozenset({SUCCEEDED, FAILED})
+
+
+class UploadQueueFullError(RuntimeError):
+    """Raised when the upload pool already holds its maximum number of pending jobs."""
+
+
+@dataclass
+class UploadJob:
+    """Progress record for one background upload."""
+
+    filename: str
+    user_id: str
+    thread_id: str | None = None
+    file_id: UUID = field(default_factory=uuid4)
+    job_id: UUID = field(default_factory=uuid4)
+    status: str = QUEUED
+    stage: str = QUEUED
+    progress: float = 0.0
+    error: str | None = None
+    result: dict[str, Any] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    version: int = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def to_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data["job_id"] = str(self.job_id)
+        data["file_id"] = str(self.file_id)
+        data.pop("version")
+        return data
+
+
+ProgressReporter = Callable[[str, float], None]
+
+
+class UploadJobStore(Protocol):
+    """Where job states are shared between processes (the upload_jobs table of DatabaseManager)."""
+
+    def save_upload_job(self, job_id: UUID, version: int, snapshot: dict[str, Any]) -> None: ...
+
+    def delete_finished_upload_jobs(self, retention_seconds: float) -> int: ...
+
+
+class UploadJobManager:
+    """
+    Run upload parsing/indexing in a bounded thread pool and keep track of its progress.
+
+    Jobs run in the process that accepted the upload. With a `store`, every state change
+    is also saved there so that the other worker processes can report it; finished jobs are
+    forgotten after `retention_seconds`, in memory and in the store.
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_pending: int | None = None,
+        retention_seconds: float | None = None,
+        store: Callable[[], UploadJobStore] | None = None,
+    ):
+        self.max_workers = max_workers or int(os.getenv("UPLOAD_WORKERS", "2"))
+        self.max_pending = max_pending or int(os.getenv("UPLOAD_MAX_PENDING", "16"))
+        self.retention_seconds = (
+            retention_seconds
+            if retention_seconds is not None
+            else float(os.getenv("UPLOAD_JOB_RETENTION", "3600"))
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="upload-worker"
+        )
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._jobs: dict[UUID, UploadJob] = {}
+        self._lock = threading.Lock()
+        # Called on first use, so that creating the manager does not connect to the database
+        self._store = store
+
+    def submit(
+        self, job: UploadJob, fn: Callable[[UploadJob, ProgressReporter], dict]
+    ) -> UploadJob:
+        """
+        Queue `fn(job, report)` on the worker pool.
+
+        `fn` reports intermediate stages through `report(stage, progress)` and returns the
+        job result. Raises UploadQueueFullError instead of queueing unboundedly.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise UploadQueueFullError(
+                f"Too many uploads in progress ({self.max_pending}), try again later."
+            )
+        self._prune()
+        with self._lock:
+            self._jobs[job.job_id] = job
+            snapshot = job.to_dict()
+        self._save(job.job_id, job.version, snapshot)
+        try:
+            self._executor.submit(self._run, job, fn)
+        except RuntimeError:
+            self._slots.release()
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+            raise
+        return job
+
+    def get(self, job_id: UUID) -> UploadJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def snapshot(self, job_id: UUID) -> dict[str, Any] | None:
+        """Return a consistent copy of a job's state, or None if the job is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def update(self, job_id: UUID, **fields: Any) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            for key, value in fields.items():
+                setattr(job, key, value)
+            job.updated_at = time.time()
+            job.version += 1
+            version, snapshot = job.version, job.to_dict()
+        self._save(job_id, version, snapshot)
+
+    async def watch(
+        self,
+        job_id: UUID,
+        poll_interval: float = 0.5,
+        load: Callable[[UUID], Awaitable[dict[str, Any] | None]] | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Yield a job snapshot every time it changes, until the job finishes. Jobs running in
+        another process are read with `load` (from the store) instead.
+        """
+        last_version = -1
+        last_data = None
+        while True:
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None:
+                    changed = job.version != last_version
+                    last_version = job.version
+                    data = job.to_dict() if changed else None
+                    finished = job.finished
+            if job is None:
+                if load is None:
+                    return
+                loaded = await load(job_id)
+                if loaded is None:
+                    return
+                data = loaded if loaded != last_data else None
+                last_data = loaded
+                finished = loaded["status"] in FINISHED_STATES
+            if data is not None:
+                yield data
+            if finished:
+                return
+            await asyncio.sleep(poll_interval)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _run(self, job: UploadJob, fn: Callable[[UploadJob, ProgressReporter], dict]) -> None:
+        def report(stage: str, progress: float) -> None:
+            self.update(job.job_id, stage=stage, progress=progress)
+
+        self.update(job.job_id, status=RUNNING, stage="starting")
+        try:
+            result = fn(job, report)
+        except Exception as e:
+            logger.exception(f"Upload job {job.job_id} ({job.filename}) failed: {e}")
+            self.update(job.job_id, status=FAILED, stage=FAILED, error=str(e))
+        else:
+            self.update(
+                job.job_id, status=SUCCEEDED, stage="done", progress=1.0, result=result or {}
+            )
+        finally:
+            self._slots.release()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job.finished and job.updated_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        if self._store is not None:
+            try:
+                self._store().delete_finished_upload_jobs(self.retention_seconds)
+            except Exception as e:
+                logger.warning(f"Could not delete finished upload jobs: {e}")
+
+    def _save(self, job_id: UUID, version: int, snapshot: dict[str, Any]) -> None:
+        # Only the other processes read the store: the job goes on if it is unreachable
+        if self._store is None:
+            return
+        try:
+            self._store().save_upload_job(job_id, version, snapshot)
+        except Exception as e:
+            logger.warning(f"Could not save the state of upload job {job_id}: {e}")
@@ -1,7 +1,8 @@
 import json
 import os
+import time
 from collections.abc import AsyncGenerator, Generator
-from typing import Any
+from typing import Any, BinaryIO
 from uuid import UUID
 
 import httpx
@@ -14,6 +15,7 @@ from schema import (
     Feedback,
     ServiceMetadata,
     StreamInput,
+    UploadJobStatus,
     UserFeedbackCreate,
     UserFeedbackRead,
     UserInput,
@@ -21,6 +23,11 @@ from schema import (
 
 load_dotenv()
 
+# Returned by _parse_stream_line for the metadata event that opens a stream
+STREAM_METADATA = object()
+# Returned for the "queue" events of a run waiting for admission, with its queue position
+STREAM_QUEUED = object()
+
 
 class AgentClientError(Exception):
     pass
@@ -82,6 +89,8 @@ class AgentClient:
         self.timeout = timeout
         self.info: ServiceMetadata | None = None
         self.agent: str | None = None
+        # Last history page per request, revalidated with its ETag
+        self._history_cache: dict[tuple, tuple[str, ChatHistory]] = {}
         if get_info:
             self.retrieve_info()
         if agent:
@@ -241,23 +250,24 @@ class AgentClient:
                 parsed = json.loads(data)
             except Exception as e:
                 raise Exception(f"Error JSON parsing message from server: {e}")
-            additional_data = parsed.get("additional_data", None)
             match parsed["type"]:
+                case "metadata":
+                    # Sent once, first: the lexicon definitions matched in the input
+                    return STREAM_METADATA, parsed["content"].get("additional_data")
+                case "queue":
+                    return STREAM_QUEUED, parsed["content"].get("position")
                 case "message":
                     # Convert the JSON formatted message to an AnyMessage
                     try:
-                        return (
-                            ChatMessage.model_validate(parsed["content"]),
-                            additional_data,
-                        )
+                        return ChatMessage.model_validate(parsed["content"]), None
                     except Exception as e:
                         raise Exception(f"Server returned invalid message: {e}")
                 case "token":
                     # Yield the str token directly
-                    return parsed["content"], additional_data
+                    return parsed["content"], None
                 case "error":
                     error_msg = "Error: " + parsed["content"]
-                    return ChatMessage(type="ai", content=error_msg), additional_data
+                    return ChatMessage(type="ai", content=error_msg), None
         return None, None
 
     def stream(
@@ -310,11 +320,17 @@ class AgentClient:
                 timeout=self.timeout,
             ) as response:
                 response.raise_for_status()
+                additional_data = None
                 for line in response.iter_lines():
                     if line.strip():
-                        parsed, additional_data = self._parse_stream_line(line)
+                        parsed, metadata = self._parse_stream_line(line)
                         if parsed is None:
                             break
+                        if parsed is STREAM_METADATA:
+                            additional_data = metadata
+                            continue
+                        if parsed is STREAM_QUEUED:
+                            continue
                         yield parsed, additional_data
         except httpx.HTTPError:
             raise AgentClientError(f"Error: {json.loads(response.content)}")
@@ -372,11 +388,17 @@ class AgentClient:
                     timeout=self.timeout,
                 ) as response:
                     response.raise_for_status()
+                    additional_data = None
                     async for line in response.aiter_lines():
                         if line.strip():
-                            parsed, additional_data = self._parse_stream_line(line)
+                            parsed, metadata = self._parse_stream_line(line)
                             if parsed is None:
                                 break
+                            if parsed is STREAM_METADATA:
+                                additional_data = metadata
+                                continue
+                            if parsed is STREAM_QUEUED:
+                                continue
                             yield parsed, additional_data
             except httpx.HTTPError:
                 raise AgentClientError(f"Error: {json.loads(response.content)}")
@@ -446,45 +468,67 @@ class AgentClient:
         self,
         thread_id: str,
         user_id: str | UUID | None = None,
+        limit: int | None = None,
+        before: int | None = None,
     ) -> ChatHistory:
         """
         Get chat history.
 
+        A history fetched before is revalidated with its ETag, and reused as is when the
+        conversation did not change.
+
         Args:
             thread_id (str): Thread ID for identifying a conversation
             user_id (UUID, optional): User ID to scope history if backend supports
+            limit (int, optional): Only get the most recent messages, at most this many
+            before (int, optional): `next_cursor` of a previous page, to get older messages
         """
-        request = ChatHistoryInput(thread_id=thread_id, user_id=user_id)  # Pass user_id
+        request = ChatHistoryInput(thread_id=thread_id, user_id=user_id, limit=limit, before=before)
+        cache_key = (thread_id, str(user_id), limit, before)
+        headers = self._headers
+        if cached := self._history_cache.get(cache_key):
+            headers["If-None-Match"] = cached[0]
         try:
             response = httpx.post(
                 f"{self.base_url}/history",
-                json=request.model_dump(),
-                headers=self._headers,
+                json=request.model_dump(mode="json"),
+                headers=headers,
                 timeout=self.timeout,
             )
+            if response.status_code == 304 and cached:
+                return cached[1].model_copy(deep=True)
             response.raise_for_status()
         except httpx.HTTPError as e:
             raise AgentClientError(f"Error: {e}")
 
-        return ChatHistory.model_validate(response.json())
+        history = ChatHistory.model_validate(response.json())
+        if etag := response.headers.get("ETag"):
+            self._history_cache[cache_key] = (etag, history.model_copy(deep=True))
+        return history
 
     def upload_file(
         self,
         file_name: str,
-        file_content: bytes,
+        file_content: bytes | BinaryIO,
         file_type: str,
         thread_id: str | None = None,
         user_id: str | UUID | None = None,
+        wait: bool = True,
     ) -> str:
         """
         Upload a file to the agent service.
 
+        The backend parses and indexes the file in the background. By default this
+        waits for that job to finish so the file content is available to the next message.
+
         Args:
             file_name (str): The name of the file
-            file_content (bytes): The binary content of the file
+            file_content (bytes | BinaryIO): The content of the file, or a binary file object
+                read in chunks while sending
             file_type (str): The MIME type of the file
             thread_id (str, optional): Thread ID to associate the file with
             user_id (UUID, optional): User ID to associate the file with
+            wait (bool): Wait for the background processing to complete
 
         Returns:
             str: The ID of the uploaded file in the backend
@@ -519,8 +563,59 @@ class AgentClient:
         if "file_id" not in response_data:
             raise AgentClientError("Server did not return a file_id")
 
+        if wait and "job_id" in response_data:
+            self.wait_for_upload(response_data["job_id"], user_id=user_id)
+
         return response_data["file_id"]
 
+    def get_upload_status(
+        self, job_id: str, user_id: str | UUID | None = None
+    ) -> UploadJobStatus:
+        """
+        Get the status of a background upload.
+
+        Args:
+            job_id (str): The job ID returned by upload_file
+            user_id (UUID, optional): User ID the upload belongs to
+        """
+        params = {"user_id": str(user_id)} if user_id else None
+        try:
+            response = httpx.get(
+                f"{self.base_url}/upload/jobs/{job_id}",
+                params=params,
+                headers=self._headers,
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise AgentClientError(f"Error retrieving upload status: {e}")
+
+        return UploadJobStatus.model_validate(response.json())
+
+    def wait_for_upload(
+        self,
+        job_id: str,
+        user_id: str | UUID | None = None,
+        poll_interval: float = 1.0,
+        timeout: float | None = None,
+    ) -> UploadJobStatus:
+        """
+        Poll a background upload until it finishes.
+
+        Raises:
+            AgentClientError: If the upload fails or does not finish within `timeout` seconds
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            job = self.get_upload_status(job_id, user_id=user_id)
+            if job.status == "succeeded":
+                return job
+            if job.status == "failed":
+                raise AgentClientError(f"Error processing uploaded file: {job.error}")
+            if deadline is not None and time.monotonic() > deadline:
+                raise AgentClientError(f"Upload {job_id} still {job.stage} after {timeout}s")
+            time.sleep(poll_interval)
+
     def get_conversations(
         self, limit: int = 20, user_id: str | UUID | None = None
     ) -> list[dict[str, Any]]:
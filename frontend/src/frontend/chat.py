@@ -503,14 +503,15 @@ async def main() -> None:
             if files:
                 upload_status = st.status(dt.FILE_UPLOADING_STATUS, state="running")
                 for file_obj in files:
-                    file_content = file_obj.getvalue()
+                    file_obj.seek(0)
                     file_name = file_obj.name
                     file_type = file_obj.type
                     try:
                         # TODO: Ensure upload_file is user-scoped
                         file_id = agent_client.upload_file(
                             file_name=file_name,
-                            file_content=file_content,
+                            # Sent from the file object, without copying its bytes first
+                            file_content=file_obj,
                             file_type=file_type,
                             thread_id=st.session_state.thread_id,
                             user_id=current_user_id,
@@ -32,11 +32,32 @@ def index_pdf(pdf_path, use_embeddings=False):
         return None
 
 
+def queue_pdfs(pdf_paths):
+    """Register PDFs as document sources and queue them for the indexing workers."""
+    db_manager = DatabaseManager()
+    for pdf_path in pdf_paths:
+        name = os.path.basename(pdf_path)[:-4]
+        db_manager.add_document_source(name=name, path=os.path.abspath(pdf_path))
+    queued = db_manager.enqueue_indexing_jobs()
+    print(f"Queued {queued} indexing jobs.")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Index PDFs with llmsherpa")
     parser.add_argument("--pdf", help="Path to PDF file")
     parser.add_argument("--dir", help="Directory containing PDF files")
     parser.add_argument("--embeddings", action="store_true", help="Generate embeddings")
+    parser.add_argument(
+        "--queue",
+        action="store_true",
+        help="Only register the PDFs as document sources and queue indexing jobs for "
+        "index-worker.py instead of indexing them here",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Drop the block search indexes while loading and rebuild them once at the end",
+    )
 
     args = parser.parse_args()
 
@@ -44,15 +65,25 @@ def main():
         parser.error("Either --pdf or --dir must be specified")
 
     if args.pdf:
-        index_pdf(args.pdf, args.embeddings)
+        if args.queue:
+            queue_pdfs([args.pdf])
+        else:
+            index_pdf(args.pdf, args.embeddings)
 
     if args.dir:
         pdf_files = [
             os.path.join(args.dir, f) for f in os.listdir(args.dir) if f.lower().endswith(".pdf")
         ]
         print(f"Found {len(pdf_files)} PDF files in {args.dir}")
-        for pdf_file in pdf_files:
-            index_pdf(pdf_file, args.embeddings)
+        if args.queue:
+            queue_pdfs(pdf_files)
+        elif args.bulk:
+            with RAGSystem().bulk_load():
+                for pdf_file in pdf_files:
+                    index_pdf(pdf_file, args.embeddings)
+        else:
+            for pdf_file in pdf_files:
+                index_pdf(pdf_file, args.embeddings)
 
 
 if __name__ == "__main__":
@@ -170,6 +170,30 @@ def test_stream(agent_client):
         assert "500 Internal Server Error" in str(exc.value)
 
 
+def test_stream_metadata_applies_to_every_event(agent_client):
+    """The metadata event opening a stream is not yielded, but comes with each event."""
+    LEXICON = [{"entity": "RAG", "def": "Retrieval-augmented generation"}]
+    metadata = {"run_id": "847c6285-8fc9-4560-a83f-4e6285809254", "additional_data": LEXICON}
+    events = [
+        f"data: {json.dumps({'type': 'metadata', 'content': metadata})}",
+        f"data: {json.dumps({'type': 'token', 'content': 'RAG is'})}",
+        f"data: {json.dumps({'type': 'message', 'content': {'type': 'ai', 'content': 'RAG is'}})}",
+        "data: [DONE]",
+    ]
+    mock_response = Mock()
+    mock_response.status_code = 200
+    mock_response.iter_lines.return_value = events
+    mock_response.__enter__ = Mock(return_value=mock_response)
+    mock_response.__exit__ = Mock(return_value=None)
+
+    with patch("httpx.stream", return_value=mock_response):
+        responses = list(agent_client.stream("What is RAG?"))
+
+    assert [additional_data for _, additional_data in responses] == [LEXICON, LEXICON]
+    assert responses[0][0] == "RAG is"
+    assert isinstance(responses[1][0], ChatMessage)
+
+
 @pytest.mark.asyncio
 async def test_astream(agent_client):
     """Test asynchronous streaming."""
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import time
+from unittest.mock import MagicMock
+
+import blob_store
+import pytest
+from blob_store import BlobTooLarge, LocalBlobStore, limit_size
+from db_manager import DatabaseManager
+
+PDF = b"%PDF-1.7 fake letter" * 1000
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = LocalBlobStore(tmp_path / "blobs")
+    monkeypatch.setattr(blob_store, "_store", store)
+    return store
+
+
+def test_put_stream_hashes_while_writing_and_deduplicates(store):
+    chunks = [PDF[:7000], PDF[7000:]]
+
+    first = store.put_stream(chunks)
+    second = store.put(PDF)
+
+    assert first == second
+    assert first.sha256 == hashlib.sha256(PDF).hexdigest() and first.size == len(PDF)
+    assert list(store.iter_digests()) == [first.sha256]
+    assert b"".join(store.iter_chunks(first.sha256, chunk_size=4096)) == PDF
+    assert not any((store.root / "tmp").iterdir())
+
+
+def test_local_file_is_the_stored_blob(store):
+    blob = store.put(PDF)
+    with store.local_file(blob.sha256, suffix=".pdf") as path:
+        assert path.read_bytes() == PDF
+
+
+def test_rejects_paths_that_are_not_digests(store):
+    with pytest.raises(ValueError):
+        store.open("../../etc/passwd")
+
+
+def test_streams_past_the_size_limit_are_discarded_while_writing(store):
+    read = []
+
+    def chunks():
+        for chunk in (b"a" * 10, b"b" * 10, b"c" * 10):
+            read.append(chunk)
+            yield chunk
+
+    with pytest.raises(BlobTooLarge):
+        store.put_stream(limit_size(chunks(), 15))
+
+    # Stopped at the chunk going over the limit, without keeping a partial blob
+    assert len(read) == 2
+    assert list(store.iter_digests()) == []
+    assert not any((store.root / "tmp").iterdir())
+    assert store.put_stream(limit_size([b"a" * 10], 15)).size == 10
+
+
+def test_delete_unused_spares_recently_stored_blobs(store):
+    old, recent = store.put(b"old upload"), store.put(b"recent upload")
+    an_hour_ago = time.time() - 7200
+    os.utime(store.path(old.sha256), (an_hour_ago, an_hour_ago))
+
+    assert store.delete_unused([old.sha256, recent.sha256], grace_seconds=3600) == 1
+    assert not store.exists(old.sha256) and store.exists(recent.sha256)
+
+
+def test_save_file_stores_content_as_a_blob(store):
+    cursor = MagicMock()
+    cursor.fetchone.return_value = ("file-id",)
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+    manager = object.__new__(DatabaseManager)
+    manager.get_connection = lambda: conn
+    manager.release_connection = MagicMock()
+
+    manager.save_file("file-id", "user-id", None, "letter.pdf", "application/pdf", content=PDF)
+
+    query, params = cursor.execute.call_args.args
+    assert "content_sha256" in query and PDF not in params
+    assert params[5:7] == (hashlib.sha256(PDF).hexdigest(), len(PDF))
+    assert store.exists(params[5])
+
+
+def test_offload_moves_inline_contents_in_batches(store, monkeypatch):
+    batches = [[("a", memoryview(b"first")), ("b", memoryview(b"second"))], [("c", memoryview(b"first"))]]
+    cursor = MagicMock()
+    cursor.fetchall.side_effect = batches
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+    manager = object.__new__(DatabaseManager)
+    manager.get_connection = lambda: conn
+    manager.release_connection = MagicMock()
+    updates = MagicMock()
+    monkeypatch.setattr("db_manager.execute_batch", updates)
+
+    assert manager.offload_file_contents(batch_size=2) == 3
+
+    assert sorted(store.iter_digests()) == sorted(hashlib.sha256(c).hexdigest() for c in (b"first", b"second"))
+    assert [len(call.args[2]) for call in updates.call_args_list] == [2, 1]
+    assert conn.commit.call_count == 2
+    assert conn.autocommit is True
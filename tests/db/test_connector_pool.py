@@ -0,0 +1,63 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from db_manager import DatabaseManager, LocalConnector
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class RecordingConnector(LocalConnector):
+    """LocalConnector that hands out fake connections and records how it was called."""
+
+    def __init__(self):
+        super().__init__(host="db.local", port=5433)
+        self.calls = []
+
+    def connect(self, instance_connection_string, driver, **kwargs):
+        self.calls.append((instance_connection_string, driver, kwargs))
+        conn = MagicMock(closed=0, autocommit=True)
+        conn.get_transaction_status.return_value = TRANSACTION_STATUS_IDLE
+        return conn
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setenv("DB_POOL_MIN_SIZE", "0")
+    monkeypatch.setenv("DB_POOL_MAX_SIZE", "2")
+    manager = object.__new__(DatabaseManager)
+    manager.using_google_connector = True
+    manager.instance_connection_name = "project:region:instance"
+    manager.db_user, manager.db_pass, manager.db_name = "app", "secret", "rag"
+    manager.connector = RecordingConnector()
+    manager.conn_pool = manager._create_pool(manager._getconn_google_sql)
+    return manager
+
+
+def test_connector_connections_are_reused(manager):
+    for _ in range(3):
+        with manager.connection() as conn:
+            assert conn.autocommit is True
+
+    assert len(manager.connector.calls) == 1
+    instance, driver, kwargs = manager.connector.calls[0]
+    assert (instance, driver) == ("project:region:instance", "psycopg2")
+    assert (kwargs["user"], kwargs["db"]) == ("app", "rag")
+    assert manager.pool_stats()["acquired"] == 3
+
+
+def test_close_drains_pool_before_connector(manager):
+    with manager.connection() as conn:
+        pass
+    manager.connector.close = MagicMock(side_effect=lambda: conn.close.assert_called_once())
+
+    manager.close()
+
+    manager.connector.close.assert_called_once()
+
+
+def test_local_connector_connects_to_local_server():
+    with patch("db_manager.psycopg2.connect") as connect:
+        LocalConnector(host="db.local", port=5433).connect(
+            "project:region:instance", "psycopg2", user="app", password="secret", db="rag"
+        )
+
+    connect.assert_called_once_with(host="db.local", port=5433, user="app", password="secret", dbname="rag")
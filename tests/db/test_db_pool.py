@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+from db_pool import ConnectionPool, PoolTimeout
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if not self.conn.healthy:
+            raise ConnectionError("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = True
+        self.healthy = True
+        self.status = TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def make_pool(opened):
+    def connect():
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    def make_pool(**kwargs):
+        return ConnectionPool(connect, **kwargs)
+
+    return make_pool
+
+
+def test_reuses_connections_and_reports_stats(make_pool, opened):
+    pool = make_pool(min_size=1, max_size=2)
+
+    with pool.connection() as first:
+        assert pool.stats()["in_use"] == 1
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert len(opened) == 1
+    stats = pool.stats()
+    assert stats["acquired"] == 2
+    assert (stats["in_use"], stats["idle"], stats["waiting"]) == (0, 1, 0)
+
+
+def test_blocks_until_a_connection_is_returned(make_pool):
+    pool = make_pool(min_size=0, max_size=1, timeout=5)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+
+    assert pool.getconn() is conn
+    assert pool.stats()["acquire_seconds_max"] > 0
+
+
+def test_times_out_when_exhausted(make_pool):
+    pool = make_pool(min_size=0, max_size=1)
+    pool.getconn()
+
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.01)
+    assert pool.stats()["acquire_timeouts"] == 1
+
+
+def test_replaces_unhealthy_and_expired_connections(make_pool, opened):
+    pool = make_pool(min_size=1, max_size=1, check_after=0)
+    opened[0].healthy = False
+
+    conn = pool.getconn()
+    assert conn is opened[1] and opened[0].closed
+
+    pool.max_lifetime = 0
+    time.sleep(0.001)
+    pool.putconn(conn)
+    assert conn.closed
+    assert pool.stats()["size"] == 0
+
+
+def test_rolls_back_or_discards_dirty_connections(make_pool, opened):
+    pool = make_pool(min_size=0, max_size=2)
+    conn = pool.getconn()
+    conn.status = TRANSACTION_STATUS_INERROR
+    pool.putconn(conn)
+    assert conn.rollbacks == 1 and not conn.closed
+
+    conn = pool.getconn()
+    pool.putconn(conn, close=True)
+    assert conn.closed
@@ -0,0 +1,88 @@
+import base64
+import gzip
+import json
+from datetime import date
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+import numpy as np
+from agents.tools_plotly import compact_figure_json
+from db_manager import (
+    SAVE_GRAPH_SQL,
+    DatabaseManager,
+    decode_graph_entry,
+    encode_graph,
+    graph_partition_bounds,
+)
+
+
+def test_graphs_are_stored_compressed_under_their_content_hash():
+    sha, body = encode_graph('{"data": []}')
+
+    assert (sha, body) == encode_graph('{"data": []}')
+    assert encode_graph({"data": []}) == (sha, body)
+    assert gzip.decompress(body) == b'{"data": []}'
+    assert decode_graph_entry({"graph_gzip": memoryview(body), "expires_in": 5.0}) == {
+        "graph_json": '{"data": []}',
+        "expires_in": 5.0,
+    }
+    assert decode_graph_entry(None) is None
+
+
+def test_saving_an_identical_graph_returns_the_stored_id():
+    existing = uuid4()
+    db = object.__new__(DatabaseManager)
+    conn = MagicMock()
+    cursor = conn.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = (existing,)
+    db.get_connection = MagicMock(return_value=conn)
+    db.release_connection = MagicMock()
+
+    assert db.save_graph(uuid4(), '{"data": []}', 1.0e9, retention_days=90) == existing
+    (lock, (sha,)), (query, params) = (c.args for c in cursor.execute.call_args_list)
+    assert "pg_advisory_xact_lock" in lock and sha == encode_graph('{"data": []}')[0]
+    assert query is SAVE_GRAPH_SQL
+    assert params["content_sha256"] == sha and params["retention_days"] == 90
+    conn.commit.assert_called_once()
+    db.release_connection.assert_called_once_with(conn)
+
+
+def test_partitions_cover_whole_months():
+    assert graph_partition_bounds(date(2025, 12, 17)) == (
+        "graphs_p202512",
+        date(2025, 12, 1),
+        date(2026, 1, 1),
+    )
+
+
+def test_maintenance_creates_upcoming_partitions_and_drops_expired_ones():
+    cursor = MagicMock()
+    cursor.fetchall.return_value = [("graphs_p202501",), ("graphs_p202503",), ("graphs_default",)]
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+    db = object.__new__(DatabaseManager)
+    db.get_connection = MagicMock(return_value=conn)
+    db.release_connection = MagicMock()
+
+    dropped = db.maintain_graph_partitions(retention_days=60, today=date(2025, 5, 10))
+
+    assert dropped == ["graphs_p202501"]
+    statements = [call.args[0] for call in cursor.execute.call_args_list]
+    assert any("graphs_p202505" in s and "PARTITION OF" in s for s in statements)
+    assert any("graphs_p202506" in s and "PARTITION OF" in s for s in statements)
+    assert any(s.strip().endswith("graphs_p202501") and "DROP TABLE" in s for s in statements)
+    assert not any("DROP TABLE" in s and "graphs_p202503" in s for s in statements)
+    db.release_connection.assert_called_once_with(conn)
+
+
+def test_figures_are_serialised_as_single_precision_typed_arrays():
+    import plotly.graph_objects as go
+
+    y = np.array([0.1, 2.5, 1234.5678])
+    fig = go.Figure(go.Scatter(x=[1, 2, 3], y=y), layout={"title": {"text": "t"}})
+
+    trace = json.loads(compact_figure_json(fig))["data"][0]
+
+    assert trace["y"]["dtype"] == "f4"
+    stored = np.frombuffer(base64.b64decode(trace["y"]["bdata"]), dtype="<f4")
+    assert np.allclose(stored, y, rtol=1e-6)
@@ -0,0 +1,17 @@
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.sqlite import SqliteSaver
+from memory.sqlite import get_sqlite_latest_checkpoint_id
+
+
+def test_latest_checkpoint_id_is_read_from_the_saver_tables(tmp_path, monkeypatch):
+    path = str(tmp_path / "checkpoints.db")
+    monkeypatch.setattr("memory.sqlite.settings.SQLITE_DB_PATH", path)
+
+    with SqliteSaver.from_conn_string(path) as saver:
+        config = {"configurable": {"thread_id": "thread-1", "checkpoint_ns": ""}}
+        for _ in range(2):
+            checkpoint = empty_checkpoint()
+            config = saver.put(config, checkpoint, {}, {})
+
+    assert get_sqlite_latest_checkpoint_id("thread-1") == checkpoint["id"]
+    assert get_sqlite_latest_checkpoint_id("thread-2") is None
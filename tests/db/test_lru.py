@@ -0,0 +1,40 @@
+from unittest.mock import patch
+
+from lru import LRUCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_entries_expire_after_their_ttl():
+    cache = LRUCache(4, ttl=10)
+    with patch("lru.time.monotonic", return_value=100.0):
+        cache.put("default", 1)
+        cache.put("short", 2, ttl=1)
+    with patch("lru.time.monotonic", return_value=105.0):
+        assert cache.get("default") == 1
+        assert cache.get("short") is None
+    with patch("lru.time.monotonic", return_value=111.0):
+        assert cache.get("default") is None
+
+
+def test_zero_size_disables_the_cache_and_discard_where_filters_keys():
+    disabled = LRUCache(0)
+    disabled.put("a", 1)
+    assert disabled.get("a") is None
+
+    cache = LRUCache(4)
+    for key in [("doc", 1), ("doc", 2), ("other", 1)]:
+        cache.put(key, key[1])
+
+    assert cache.discard_where(lambda key: key[0] == "doc") == 2
+    assert len(cache) == 1
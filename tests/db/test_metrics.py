@@ -0,0 +1,87 @@
+import logging
+from unittest.mock import MagicMock
+
+import metrics
+import pytest
+from db_manager import DatabaseManager
+from metrics import Registry, observe_query, redact_params, redact_statement
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("op_seconds", "Operation latency.", ["op"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 3.0):
+        latency.observe(value, op="search")
+
+    text = registry.render()
+
+    assert "# TYPE op_seconds histogram" in text
+    assert 'op_seconds_bucket{op="search",le="0.1"} 1' in text
+    assert 'op_seconds_bucket{op="search",le="1"} 2' in text
+    assert 'op_seconds_bucket{op="search",le="+Inf"} 3' in text
+    assert 'op_seconds_count{op="search"} 3' in text
+    assert 'op_seconds_sum{op="search"} 3.55' in text
+
+
+def test_labels_must_match_declaration():
+    counter = Registry().counter("errors_total", "Errors.", ["label"])
+    with pytest.raises(ValueError):
+        counter.inc(table="blocks")
+
+
+def test_pool_gauges_are_read_at_scrape_time():
+    stats = {"in_use": 1, "waiting": 0}
+    metrics.register_pool("test", lambda: stats)
+    stats["in_use"] = 4
+
+    assert 'db_pool{pool="test",stat="in_use"} 4' in metrics.REGISTRY.render()
+
+
+def test_slow_queries_are_logged_with_redacted_params(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+    before = metrics.db_query_seconds.snapshot(label="test.slow")["count"]
+
+    with (
+        caplog.at_level(logging.WARNING, logger="slow_query"),
+        observe_query("test.slow", "SELECT *\n  FROM users WHERE email = %s", ("jane@example.org",)) as observed,
+    ):
+        observed.rows = 1
+
+    assert metrics.db_query_seconds.snapshot(label="test.slow")["count"] == before + 1
+    message = caplog.records[-1].getMessage()
+    assert "test.slow" in message and "SELECT * FROM users WHERE email = %s" in message
+    assert "jane@example.org" not in message and "<str:16>" in message
+
+
+def test_failed_queries_are_counted():
+    before = metrics.db_query_errors.value(label="test.fail")
+    with pytest.raises(RuntimeError), observe_query("test.fail", "SELECT 1"):
+        raise RuntimeError("connection lost")
+
+    assert metrics.db_query_errors.value(label="test.fail") == before + 1
+
+
+def test_redact_params_keeps_shapes_only():
+    assert redact_params(("abc", 3, None, [1] * 20)) == ["<str:3>", "<int>", None, "<list:20>"]
+    assert redact_params({"name": "letter"}) == {"name": "<str:6>"}
+
+
+def test_redact_statement_masks_inlined_literals():
+    query = "SELECT * FROM r\n WHERE r.name IN ('jane''s letter', 'memo') AND v @@ to_tsquery('secret')"
+    assert redact_statement(query) == "SELECT * FROM r WHERE r.name IN ('?', '?') AND v @@ to_tsquery('?')"
+
+
+def test_execute_query_records_rows_under_its_label():
+    cursor = MagicMock(description=[("x",)])
+    cursor.fetchall.return_value = [(1,), (2,)]
+    conn = MagicMock()
+    conn.cursor.return_value.__enter__.return_value = cursor
+    manager = object.__new__(DatabaseManager)
+    manager.get_connection = lambda: conn
+    manager.release_connection = MagicMock()
+    before = metrics.db_query_rows.snapshot(label="test.rows")
+
+    assert manager.execute_query("SELECT x FROM t", label="test.rows") == [(1,), (2,)]
+
+    after = metrics.db_query_rows.snapshot(label="test.rows")
+    assert (after["count"], after["sum"]) == (before["count"] + 1, before["sum"] + 2)
@@ -0,0 +1,97 @@
+from unittest.mock import MagicMock
+
+import migrations
+import psycopg2.errors
+import pytest
+from migrations import LATEST_VERSION, MIGRATIONS, SchemaOutdatedError, ensure_schema, migrate
+
+
+class RecordingCursor:
+    def __init__(self, statements, applied):
+        self.statements = statements
+        self.applied = applied
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.statements.append((" ".join(query.split()), params))
+        if query.startswith("SELECT version FROM"):
+            self._result = [(version,) for version in self.applied]
+        else:
+            self._result = []
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def db():
+    db = MagicMock()
+    db.statements = []
+    db.conn = MagicMock()
+    db.conn.cursor.side_effect = lambda **_: RecordingCursor(db.statements, db.applied)
+    db.get_connection.return_value = db.conn
+    db.applied = []
+    return db
+
+
+def test_migration_versions_are_ordered_and_unique():
+    versions = [migration.version for migration in MIGRATIONS]
+    assert versions == sorted(set(versions))
+    assert LATEST_VERSION == versions[-1]
+
+
+def test_startup_on_a_current_database_is_one_query(db):
+    db.execute_query.return_value = [(LATEST_VERSION,)]
+
+    assert ensure_schema(db) == LATEST_VERSION
+
+    db.execute_query.assert_called_once()
+    db.get_connection.assert_not_called()
+
+
+def test_startup_refuses_an_outdated_schema_without_auto_migrate(db):
+    db.execute_query.side_effect = psycopg2.errors.UndefinedTable()
+
+    with pytest.raises(SchemaOutdatedError, match="migrate-db.py"):
+        ensure_schema(db, auto_migrate=False)
+
+    db.get_connection.assert_not_called()
+
+
+def test_migrate_applies_pending_migrations_under_a_lock(db, monkeypatch):
+    applied = []
+    fake = [migrations.Migration(v, f"m{v}", lambda cursor, v=v: applied.append(v)) for v in (1, 2, 3)]
+    monkeypatch.setattr(migrations, "MIGRATIONS", fake)
+    monkeypatch.setattr(migrations, "LATEST_VERSION", 3)
+    db.applied = [1]
+
+    done = migrate(db)
+
+    assert [m.version for m in done] == applied == [2, 3]
+    recorded = [params[0] for query, params in db.statements if query.startswith("INSERT INTO")]
+    assert recorded == [2, 3]
+    assert db.statements[0][0] == "SELECT pg_advisory_lock(hashtext(%s))"
+    assert db.statements[-1][0] == "SELECT pg_advisory_unlock(hashtext(%s))"
+    # The version table read, then one transaction per migration
+    assert db.conn.commit.call_count == 3
+    assert db.conn.autocommit is True
+
+
+def test_failed_migration_is_rolled_back_and_not_recorded(db, monkeypatch):
+    def broken(cursor):
+        raise psycopg2.errors.SyntaxError("boom")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [migrations.Migration(1, "broken", broken)])
+
+    with pytest.raises(psycopg2.errors.SyntaxError):
+        migrate(db)
+
+    assert not any(query.startswith("INSERT INTO") for query, _ in db.statements)
+    db.conn.rollback.assert_called_once()
+    assert db.statements[-1][0] == "SELECT pg_advisory_unlock(hashtext(%s))"
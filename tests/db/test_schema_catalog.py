@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock
+
+import pytest
+from db_manager import DatabaseManager
+from schema_catalog import SchemaCatalog
+
+ROWS = [
+    ("document_data", "rag_document_blocks", "name", "text"),
+    ("document_data", "rag_document_blocks", "embedding", "vector(1536)"),
+    ("document_data", "rag_document_blocks", "content_tsv", "tsvector"),
+    ("document_data", "files", "id", "uuid"),
+    ("empty_schema", None, None, None),
+]
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.version = 1
+        self.loads = 0
+
+    def execute_query(self, query, params=None, label=None):
+        if label == "schema_catalog.version":
+            return [(self.version,)]
+        self.loads += 1
+        return ROWS
+
+
+@pytest.fixture
+def db():
+    return FakeDatabase()
+
+
+def test_lookups_are_served_from_one_catalog_scan(db):
+    catalog = SchemaCatalog(db, "document_data.catalog_version", ttl=300, version_check=300)
+
+    assert catalog.schemas() == ["document_data", "empty_schema"]
+    assert catalog.tables("document_data") == ["rag_document_blocks", "files"]
+    assert catalog.tables("empty_schema") == []
+    assert catalog.columns("document_data", "files") == [{"name": "id", "type": "uuid"}]
+    assert catalog.has_column("document_data", "rag_document_blocks", "embedding")
+    assert not catalog.has_column("document_data", "files", "embedding")
+    assert db.loads == 1
+
+
+def test_reloads_when_ddl_bumped_the_version(db):
+    catalog = SchemaCatalog(db, "document_data.catalog_version", ttl=300, version_check=0)
+    catalog.schemas()
+    catalog.schemas()
+    assert db.loads == 1
+
+    db.version += 1
+    catalog.schemas()
+
+    assert db.loads == 2
+
+
+def test_reloads_after_ttl_without_event_trigger(db):
+    catalog = SchemaCatalog(db, None, ttl=0, version_check=300)
+    catalog.schemas()
+    catalog.schemas()
+
+    assert db.loads == 2
+
+
+def test_database_manager_uses_catalog_for_special_columns_and_sampling(db):
+    manager = object.__new__(DatabaseManager)
+    manager.schema_catalog = SchemaCatalog(db, None, ttl=300, version_check=300)
+    manager.execute_query = MagicMock(return_value=[("letter_1",)])
+
+    special = manager.identify_special_columns("document_data", "rag_document_blocks")
+
+    assert special == {"embedding": ["embedding"], "tsvector": ["content_tsv"]}
+    assert manager.get_column_samples("document_data", "rag_document_blocks", "name") == ["letter_1"]
+    with pytest.raises(ValueError, match="Unknown column"):
+        manager.get_column_samples("document_data", "files", "missing")
+    manager.execute_query.assert_called_once()
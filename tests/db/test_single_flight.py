@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from single_flight import SingleFlight, flight_key
+
+
+def test_identical_calls_in_flight_run_once():
+    flights = SingleFlight("test")
+    calls = []
+
+    def slow():
+        calls.append(True)
+        time.sleep(0.05)
+        return {"rows": 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("q", slow))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [True]
+    assert results == [{"rows": 1}] * 4
+    assert all(result is results[0] for result in results)
+    # Nothing is kept once the call returned
+    assert flights.do("q", lambda: "again") == "again"
+
+
+def test_keys_ignore_argument_order_and_accept_lists():
+    assert flight_key(["a", "b"], limit=1, page=None) == flight_key(["a", "b"], page=None, limit=1)
+    assert flight_key(["a"], limit=1) != flight_key(["a"], limit=2)
+
+
+@pytest.mark.asyncio
+async def test_async_callers_share_the_call_and_may_leave_it():
+    flights = SingleFlight("test", retry_on=(KeyError,))
+    calls = []
+
+    async def search():
+        calls.append(True)
+        await asyncio.sleep(0.02)
+        return ["block"]
+
+    leaving = asyncio.create_task(flights.ado("q", search))
+    staying = asyncio.create_task(flights.ado("q", search))
+    await asyncio.sleep(0)
+    leaving.cancel()
+
+    assert await staying == ["block"]
+    assert calls == [True]
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_unless_retried():
+    flights = SingleFlight("test", retry_on=(KeyError,))
+    attempts = []
+
+    async def cancelled_then_ok():
+        attempts.append(True)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise KeyError("the leader's own request was aborted")
+        return "ok"
+
+    leader = asyncio.create_task(flights.ado("q", cancelled_then_ok))
+    follower = asyncio.create_task(flights.ado("q", cancelled_then_ok))
+
+    with pytest.raises(KeyError):
+        await leader
+    assert await follower == "ok"
+    assert len(attempts) == 2
@@ -0,0 +1,159 @@
+import threading
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+import pytest
+from psycopg2 import errors
+from sql_guard import QueryCancelled, QueryRejected, run_limited_query, running_queries
+
+
+class FakeCursor:
+    def __init__(self, statements, plan=None, on_query=None):
+        self.statements = statements
+        self.plan = plan
+        self.on_query = on_query
+        self.description = None
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+        self.description, self._result = None, []
+        if query.startswith("EXPLAIN"):
+            self._result = [([{"Plan": self.plan}],)]
+        elif query.startswith("SELECT * FROM"):
+            if self.on_query:
+                self.on_query()
+            self.description = [MagicMock(), MagicMock()]
+            self.description[0].name, self.description[1].name = "site", "total"
+            self._result = [("Paris", 3)]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def db(monkeypatch):
+    for name in ("STATEMENT_TIMEOUT", "WORK_MEM", "MAX_COST", "MAX_ROWS"):
+        monkeypatch.delenv(f"AGENT_SQL_{name}", raising=False)
+        monkeypatch.delenv(f"SQL_EXECUTOR_{name}", raising=False)
+    db = MagicMock()
+    db.statements = []
+    db.cursor_kwargs = {}
+
+    @contextmanager
+    def connection():
+        conn = MagicMock()
+        conn.get_backend_pid.return_value = 4242
+        conn.cursor.side_effect = lambda: FakeCursor(db.statements, **db.cursor_kwargs)
+        yield conn
+
+    db.connection = connection
+    return db
+
+
+def test_limits_are_scoped_to_a_read_only_transaction(db, monkeypatch):
+    monkeypatch.setenv("AGENT_SQL_STATEMENT_TIMEOUT", "10s")
+    monkeypatch.setenv("SQL_EXECUTOR_WORK_MEM", "8MB")
+
+    columns, rows = run_limited_query("SELECT * FROM sites", "SQL_EXECUTOR", db_manager=db)
+
+    assert (columns, rows) == (["site", "total"], [("Paris", 3)])
+    assert db.statements == [
+        ("BEGIN READ ONLY", None),
+        ("SELECT set_config('statement_timeout', %s, true)", ("10s",)),
+        ("SELECT set_config('work_mem', %s, true)", ("8MB",)),
+        ("SELECT * FROM sites", None),
+        ("ROLLBACK", None),
+    ]
+
+
+def test_expensive_plan_is_rejected_before_running(db, monkeypatch):
+    monkeypatch.setenv("AGENT_SQL_MAX_COST", "1000")
+    db.cursor_kwargs = {"plan": {"Total Cost": 250000.0, "Plan Rows": 90000}}
+
+    with pytest.raises(QueryRejected, match="WHERE filters"):
+        run_limited_query("SELECT * FROM sites", "SQL_EXECUTOR", db_manager=db)
+
+    executed = [query for query, _ in db.statements]
+    assert "SELECT * FROM sites" not in executed
+    assert executed[-1] == "ROLLBACK"
+
+
+def test_cheap_plan_runs(db, monkeypatch):
+    monkeypatch.setenv("AGENT_SQL_MAX_ROWS", "1000")
+    db.cursor_kwargs = {"plan": {"Total Cost": 12.5, "Plan Rows": 10}}
+
+    _, rows = run_limited_query("SELECT * FROM sites", "SQL_EXECUTOR", db_manager=db)
+
+    assert rows == [("Paris", 3)]
+
+
+def test_statement_timeout_is_reported(db):
+    def time_out():
+        raise errors.QueryCanceled("canceling statement due to statement timeout")
+
+    db.cursor_kwargs = {"on_query": time_out}
+
+    with pytest.raises(QueryRejected, match="30s statement timeout"):
+        run_limited_query("SELECT * FROM sites", "SQL_EXECUTOR", db_manager=db)
+    assert db.statements[-1] == ("ROLLBACK", None)
+
+
+@pytest.fixture
+def canceller():
+    canceller = MagicMock()
+    cursor = canceller.connection.return_value.__enter__.return_value.cursor.return_value
+    canceller.cursor = cursor.__enter__.return_value
+    canceller.cursor.fetchall.return_value = [(True,)]
+    return canceller
+
+
+def test_aborted_run_cancels_its_queries(db, canceller):
+    cancelled = threading.Event()
+
+    def abort_from_another_thread():
+        thread = threading.Thread(target=lambda: running_queries.cancel("thread-1", canceller))
+        thread.start()
+        thread.join()
+        cancelled.set()
+        raise errors.QueryCanceled("canceling statement due to user request")
+
+    db.cursor_kwargs = {"on_query": abort_from_another_thread}
+
+    with pytest.raises(QueryCancelled, match="aborted"):
+        run_limited_query("SELECT * FROM sites", "SQL_EXECUTOR", owner="thread-1", db_manager=db)
+
+    assert cancelled.is_set()
+    query, params = canceller.cursor.execute.call_args.args
+    assert "pg_cancel_backend" in query and params == ([4242],)
+    assert running_queries.cancel("thread-1", canceller) == 0
+
+
+def test_a_later_timeout_on_a_cancelled_connection_is_not_reported_as_cancelled(db, canceller):
+    # The cancel reaches the backend after its query ended: the next one runs to completion
+    db.cursor_kwargs = {"on_query": lambda: running_queries.cancel("thread-1", canceller)}
+    run_limited_query("SELECT * FROM sites", "SQL_EXECUTOR", owner="thread-1", db_manager=db)
+
+    def time_out():
+        raise errors.QueryCanceled("canceling statement due to statement timeout")
+
+    db.cursor_kwargs = {"on_query": time_out}
+    with pytest.raises(QueryRejected, match="statement timeout"):
+        run_limited_query("SELECT * FROM sites", "SQL_EXECUTOR", owner="thread-2", db_manager=db)
+
+
+def test_cancel_signals_nothing_once_the_queries_ended(canceller):
+    with running_queries.track("thread-1", 4242):
+        pass
+
+    assert running_queries.cancel("thread-1", canceller) == 0
+    canceller.connection.assert_not_called()
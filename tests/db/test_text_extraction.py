@@ -0,0 +1,62 @@
+import io
+
+import pytest
+from text_extraction import iter_decoded, iter_pdf_page_texts, take_text
+
+
+def test_text_stops_at_the_character_limit_without_reading_further():
+    read = []
+
+    def pages():
+        for text in ("first page ", "second page ", "third page"):
+            read.append(text)
+            yield text
+
+    extracted = take_text(pages(), max_chars=15)
+
+    assert extracted.text == "first page seco"
+    assert extracted.truncated
+    assert read == ["first page ", "second page "]
+    assert take_text(["short"], max_chars=15) == take_text(["short"], max_chars=5)
+    assert not take_text(["short"], max_chars=5).truncated
+
+
+def test_characters_split_across_chunks_are_decoded():
+    data = "Ahmad أحمد é".encode()
+    chunks = [data[i : i + 3] for i in range(0, len(data), 3)]
+
+    assert "".join(iter_decoded(chunks)) == "Ahmad أحمد é"
+    assert "".join(iter_decoded([b"ok \xff", b"done"])) == "ok done"
+
+
+def test_pdf_text_is_extracted_page_by_page():
+    pypdf = pytest.importorskip("pypdf")
+    from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+    writer = pypdf.PdfWriter()
+    font = writer._add_object(
+        DictionaryObject(
+            {
+                NameObject("/Type"): NameObject("/Font"),
+                NameObject("/Subtype"): NameObject("/Type1"),
+                NameObject("/BaseFont"): NameObject("/Helvetica"),
+            }
+        )
+    )
+    for text in ("Hello", "World"):
+        page = writer.add_blank_page(612, 792)
+        contents = DecodedStreamObject()
+        contents.set_data(f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode())
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})}
+        )
+        page[NameObject("/Contents")] = writer._add_object(contents)
+    pdf = io.BytesIO()
+    writer.write(pdf)
+    pdf.seek(0)
+
+    pages = iter_pdf_page_texts(pdf)
+
+    assert next(pages).strip() == "Hello"
+    assert next(pages).strip() == "World"
+    assert next(pages, None) is None
@@ -0,0 +1,78 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+from db_manager import RECORD_RUN_USAGE_SQL, SAVE_FEEDBACK_SQL, DatabaseManager
+from migrations import MIGRATIONS
+
+
+def _db_manager(rows=None):
+    db = object.__new__(DatabaseManager)
+    db.execute_query = MagicMock(return_value=rows or [])
+    return db
+
+
+def test_recording_a_run_is_one_statement_for_every_counter():
+    db = _db_manager()
+    thread_id, user_id = uuid4(), uuid4()
+
+    db.record_run_usage(thread_id, user_id, user_messages=1, ai_messages=3)
+
+    db.execute_query.assert_called_once()
+    query, params = db.execute_query.call_args.args
+    assert query is RECORD_RUN_USAGE_SQL
+    for table in ("conversation_usage", "usage_daily", "usage_totals"):
+        assert table in query
+    assert params == {
+        "thread_id": str(thread_id),
+        "user_id": str(user_id),
+        "user_messages": 1,
+        "ai_messages": 3,
+        "runs": 1,
+        "at": None,
+        "backfill": False,
+    }
+    assert db.execute_query.call_args.kwargs["label"] == "usage.record"
+
+
+def test_anonymous_backfilled_runs_keep_their_date():
+    db = _db_manager()
+    started = datetime(2025, 3, 1, 12, 30)
+
+    db.record_run_usage("t-1", None, 4, 4, runs=0, at=started, backfill=True)
+
+    params = db.execute_query.call_args.args[1]
+    assert params["user_id"] is None
+    assert params["at"] == started
+    assert (params["runs"], params["backfill"]) == (0, True)
+
+
+def test_totals_are_read_from_the_totals_row():
+    db = _db_manager(rows=[(12, 40, 85, 41)])
+
+    assert db.get_usage_totals() == {
+        "conversations": 12,
+        "user_messages": 40,
+        "ai_messages": 85,
+        "runs": 41,
+    }
+    query = db.execute_query.call_args.args[0]
+    assert "usage_totals" in query
+    assert "conversations c" not in query and "checkpoint" not in query
+
+
+def test_saving_feedback_updates_the_daily_rollup():
+    assert "INSERT INTO" in SAVE_FEEDBACK_SQL and ".feedback_daily" in SAVE_FEEDBACK_SQL
+    assert SAVE_FEEDBACK_SQL.count("%s") == 6
+
+
+def test_counters_come_with_a_migration():
+    usage = [m for m in MIGRATIONS if m.name == "usage_counters"]
+    assert len(usage) == 1
+    cursor = MagicMock()
+
+    usage[0].apply(cursor)
+
+    ddl = cursor.execute.call_args.args[0]
+    for table in ("conversation_usage", "usage_daily", "usage_totals", "feedback_daily"):
+        assert f".{table} (" in ddl
@@ -0,0 +1,121 @@
+import os
+import threading
+
+import pytest
+from lazy import _inherited, lazy_singleton, reset_after_fork
+from leader import LeaderLock
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.conn.closed:
+            raise ConnectionError("connection closed")
+        self.conn.server.statements.append(sql)
+
+    def fetchone(self):
+        server = self.conn.server
+        if server.holder is None:
+            server.holder = self.conn
+        return (server.holder is self.conn,)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.closed = False
+        self.autocommit = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        # Like PostgreSQL, the session's advisory locks go with it
+        self.closed = True
+        if self.server.holder is self:
+            self.server.holder = None
+
+
+class FakeServer:
+    def __init__(self):
+        self.holder = None
+        self.statements = []
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+def test_one_worker_leads_until_it_goes_away():
+    server = FakeServer()
+    first = LeaderLock("maintenance:test", server.connect)
+    second = LeaderLock("maintenance:test", server.connect)
+
+    assert first.is_leader()
+    assert not second.is_leader()
+    # The leader keeps its session; followers do not hold connections open
+    assert first.is_leader()
+    assert server.holder is first._conn
+    assert second._conn is None
+
+    first.release()
+    assert second.is_leader()
+    assert not first.is_leader()
+
+
+def test_a_leader_losing_its_connection_steps_down():
+    server = FakeServer()
+    leader = LeaderLock("maintenance:test", server.connect)
+    assert leader.is_leader()
+
+    server.holder.close()
+    other = LeaderLock("maintenance:test", server.connect)
+    assert other.is_leader()
+    assert not leader.is_leader()
+
+
+def test_unreachable_database_means_not_leading():
+    def connect():
+        raise ConnectionError("database unreachable")
+
+    assert not LeaderLock("maintenance:test", connect).is_leader()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_children_build_their_own_singletons():
+    @reset_after_fork
+    class Pool:
+        _instance = None
+        _instance_lock = threading.Lock()
+
+        def __new__(cls):
+            if cls._instance is None:
+                cls._instance = super().__new__(cls)
+            return cls._instance
+
+    @lazy_singleton
+    def get_client():
+        return object()
+
+    pool, client = Pool(), get_client()
+    pid = os.fork()
+    if pid == 0:
+        # Exit codes tell the parent which check failed
+        code = 0
+        if Pool() is pool or get_client() is client:
+            code = 1
+        elif pool not in _inherited or client not in _inherited:
+            code = 2
+        os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # The parent keeps its own
+    assert Pool() is pool
+    assert get_client() is client
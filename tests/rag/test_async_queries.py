@@ -0,0 +1,82 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from async_db_manager import AsyncDatabaseManager
+from lru import LRUCache
+from rag_system import RAGSystem
+from single_flight import SingleFlight
+
+ROW = ("letter_1", 4, "Constat", 1, "para", None, None, None, None, 0.5)
+BLOCK = (10, 4, "Constat", "letter_1", 0, 1, "para", "", 1.0, 2.0, 3.0, 5.0, None)
+
+
+def _rows(query, params=None, label=None):
+    if "COUNT(" in query:
+        return [(1,)]
+    if "parent_idx = %s" in query:
+        return []
+    if "block_idx IN" in query:
+        return [BLOCK]
+    return [ROW]
+
+
+@pytest.fixture
+def rag():
+    rag = RAGSystem.__new__(RAGSystem)
+    rag.LANGUAGE = "french"
+    rag.boilerplate_min_docs = 5
+    rag.boilerplate_mode = "downrank"
+    rag.boilerplate_weight = 0.1
+    rag.db_manager = MagicMock()
+    rag.db_manager.execute_query.side_effect = _rows
+    rag.async_db_manager = MagicMock()
+    rag.async_db_manager.execute_query = AsyncMock(side_effect=_rows)
+    rag._annotations_cache = LRUCache(0)
+    rag._query_flights = SingleFlight("rag_query")
+    return rag
+
+
+def _statements(mock):
+    return [call.args for call in mock.call_args_list]
+
+
+@pytest.mark.asyncio
+async def test_async_query_runs_the_same_statements(rag):
+    expected = rag.query(["constat"], source_names=["letter_1"])
+
+    assert await rag.aquery(["constat"], source_names=["letter_1"]) == expected
+    assert expected["results"][0]["document_name"] == "letter_1"
+    assert _statements(rag.async_db_manager.execute_query) == _statements(rag.db_manager.execute_query)
+
+
+@pytest.mark.asyncio
+async def test_async_annotations_match_sync(rag):
+    expected = rag.get_annotations_by_indices("letter_1", [4])
+
+    assert await rag.aget_annotations_by_indices("letter_1", [4]) == expected
+    assert expected == [{"page": 1, "x": 1.0, "y": 2.0, "height": 3.0, "width": 2.0, "color": "red"}]
+    rag.db_manager.execute_query.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_without_async_pool_queries_run_in_worker_threads():
+    manager = object.__new__(AsyncDatabaseManager)
+    manager.pool = None
+    manager.db_manager = MagicMock()
+    manager.db_manager.get_conversations.return_value = [{"thread_id": "t"}]
+
+    assert await manager.get_conversations("user", limit=5) == [{"thread_id": "t"}]
+    manager.db_manager.get_conversations.assert_called_once_with("user", limit=5)
+
+
+@pytest.mark.asyncio
+async def test_annotations_are_cached_until_the_document_changes(rag):
+    rag._annotations_cache = LRUCache(8)
+    expected = rag.get_annotations_by_indices("letter_1", [4])
+
+    assert await rag.aget_annotations_by_indices("letter_1", [4]) == expected
+    rag.async_db_manager.execute_query.assert_not_called()
+
+    rag._annotations_cache.discard_where(lambda key: key[0] == "letter_1")
+    assert await rag.aget_annotations_by_indices("letter_1", [4]) == expected
+    rag.async_db_manager.execute_query.assert_called_once()
@@ -0,0 +1,115 @@
+from unittest.mock import MagicMock
+
+import pytest
+from lru import LRUCache
+from rag_system import BlockMetadata, DocumentBlock, RAGSystem, content_hash
+from single_flight import SingleFlight
+
+BOILERPLATE = "Veuillez agréer, Monsieur, l'expression de ma considération distinguée."
+
+
+@pytest.fixture
+def rag():
+    rag = RAGSystem.__new__(RAGSystem)
+    rag.LANGUAGE = "french"
+    rag.db_manager = MagicMock()
+    rag.db_manager.execute_query.side_effect = lambda query, *args, **kwargs: [(1,)] if "COUNT(" in query else []
+    rag.boilerplate_min_docs = 5
+    rag.boilerplate_mode = "downrank"
+    rag.boilerplate_weight = 0.1
+    rag._annotations_cache = LRUCache(0)
+    rag._query_flights = SingleFlight("rag_query")
+    return rag
+
+
+def _block(idx, content):
+    metadata = BlockMetadata(idx, 0, 0, "para", "", (0.0, 0.0, 1.0, 1.0))
+    return DocumentBlock(idx, content, metadata)
+
+
+def test_content_hash_matches_postgres_md5():
+    assert content_hash("abc") == "900150983cd24fb0d6963f7d28e17f72"
+
+
+def test_insert_blocks_stores_each_distinct_text_once(rag):
+    blocks = [_block(0, BOILERPLATE), _block(1, "Constat A"), _block(2, BOILERPLATE)]
+
+    rag._insert_blocks("letter_1", blocks)
+
+    contents_call, blocks_call = rag.db_manager.execute_batch.call_args_list
+    assert "block_contents" in contents_call.args[0]
+    assert list(contents_call.args[1]) == [
+        (content_hash(BOILERPLATE), BOILERPLATE),
+        (content_hash("Constat A"), "Constat A"),
+    ]
+    rows = list(blocks_call.args[1])
+    assert [row[-1] for row in rows] == [
+        content_hash(BOILERPLATE),
+        content_hash("Constat A"),
+        content_hash(BOILERPLATE),
+    ]
+    refresh_sql, (hashes, _) = rag.db_manager.execute_query.call_args.args
+    assert "doc_count" in refresh_sql
+    assert set(hashes) == {content_hash(BOILERPLATE), content_hash("Constat A")}
+
+
+def test_searchable_blocks_only_reference_their_text(rag):
+    rag._insert_blocks("letter_1", [_block(0, "Constat A")])
+    rag._insert_blocks("upload", [_block(0, "Constat A")], table_name="s.uploaded_document_blocks")
+
+    searchable_call, uploaded_call = rag.db_manager.execute_batch.call_args_list[1:]
+    assert "content," not in searchable_call.args[0].split("ON CONFLICT")[0]
+    assert "Constat A" not in next(iter(searchable_call.args[1]))
+    assert "Constat A" in next(iter(uploaded_call.args[1]))
+
+
+def test_blocks_are_read_with_their_text_from_block_contents(rag):
+    rag.get_blocks_by_idx([0], source_name="letter_1")
+
+    sql = _search_sql(rag)
+    assert "COALESCE(bc.content, '')" in sql
+    assert "LEFT JOIN document_data.block_contents bc ON bc.content_hash = r.content_hash" in sql
+
+
+def test_reindexing_recounts_the_texts_a_document_stopped_using(rag):
+    rag.db_manager.execute_query.side_effect = lambda query, *args, **kwargs: (
+        [(content_hash("Old text"),), (content_hash("Constat A"),)] if "SELECT DISTINCT content_hash" in query else []
+    )
+
+    rag._insert_blocks("letter_1", [_block(0, "Constat A")])
+
+    delete_call, refresh_call = rag.db_manager.execute_query.call_args_list[-2:]
+    assert "DELETE" in delete_call.args[0]
+    assert delete_call.args[1] == ("letter_1", [0])
+    hashes, _ = refresh_call.args[1]
+    assert set(hashes) == {content_hash("Old text"), content_hash("Constat A")}
+
+
+def test_uploaded_blocks_skip_shared_contents(rag):
+    rag._insert_blocks("upload", [_block(0, "x")], table_name="s.uploaded_document_blocks")
+
+    assert rag.db_manager.execute_batch.call_count == 1
+    # Only the blocks of a previous upload under that name are deleted, nothing is recounted
+    (delete_call,) = rag.db_manager.execute_query.call_args_list
+    assert delete_call.args[0].startswith("DELETE FROM s.uploaded_document_blocks")
+
+
+def _search_sql(rag):
+    return " ".join(rag.db_manager.execute_query.call_args_list[-1].args[0].split())
+
+
+def test_query_searches_shared_contents_and_downranks_boilerplate(rag):
+    rag.query(["radioprotection"], get_children=False)
+
+    sql = _search_sql(rag)
+    assert "JOIN document_data.block_contents bc ON bc.content_hash = r.content_hash" in sql
+    assert "bc.content_tsv @@" in sql
+    assert "CASE WHEN COALESCE(bc.doc_count, 0) >= 5 THEN 0.1 ELSE 1 END" in sql
+
+
+def test_query_can_exclude_boilerplate(rag):
+    rag.query(["radioprotection"], get_children=False, boilerplate="exclude")
+
+    sql = _search_sql(rag)
+    assert "NOT COALESCE(bc.doc_count, 0) >= 5" in sql
+    assert "CASE WHEN" not in sql
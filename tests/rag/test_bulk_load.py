@@ -0,0 +1,114 @@
+from unittest.mock import MagicMock
+
+import pytest
+from lru import LRUCache
+from rag_system import BlockMetadata, DocumentBlock, RAGSystem
+
+
+class RecordingCursor:
+    def __init__(self, statements, lock_available=True):
+        self.statements = statements
+        self.lock_available = lock_available
+        self._result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.statements.append(" ".join(query.split()))
+        if "pg_try_advisory_lock" in query:
+            self._result = [(self.lock_available,)]
+        else:
+            self._result = []
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+@pytest.fixture
+def rag():
+    rag = RAGSystem.__new__(RAGSystem)
+    rag.statements = []
+    rag.db_manager = MagicMock()
+    rag.db_manager.execute_query.return_value = []
+    rag.db_manager.get_connection.side_effect = lambda: MagicMock(cursor=lambda **_: RecordingCursor(rag.statements))
+    rag.bulk_maintenance_work_mem = "2GB"
+    rag.bulk_gin_pending_list_limit = 65536
+    return rag
+
+
+def test_bulk_load_drops_and_rebuilds_indexes_concurrently(rag):
+    with rag.bulk_load():
+        rag.statements.append("LOAD")
+
+    load_at = rag.statements.index("LOAD")
+    before, after = rag.statements[:load_at], rag.statements[load_at:]
+
+    assert before[0].startswith("SELECT pg_advisory_lock")
+    assert sum(s.startswith("DROP INDEX") for s in before) == len(RAGSystem.SECONDARY_INDEXES)
+    rebuilt = [s for s in after if s.startswith("CREATE INDEX CONCURRENTLY")]
+    assert len(rebuilt) == len(RAGSystem.SECONDARY_INDEXES)
+    assert after.index("SET maintenance_work_mem = %s") < after.index(rebuilt[0])
+    # doc_count is recounted once for the whole table, after the rebuild
+    recount = [s for s in after if s.startswith("UPDATE document_data.block_contents")]
+    assert len(recount) == 1
+    assert "ANY(" not in recount[0]
+    assert after.index(rebuilt[-1]) < after.index(recount[0])
+    assert any(s.startswith("ANALYZE") for s in after)
+    assert after[-1] == "SELECT pg_advisory_unlock_all()"
+
+
+def test_bulk_load_restores_indexes_when_load_fails(rag):
+    with pytest.raises(RuntimeError), rag.bulk_load():
+        raise RuntimeError("parser died")
+
+    assert any(s.startswith("CREATE INDEX CONCURRENTLY") for s in rag.statements)
+    assert rag.statements[-1] == "SELECT pg_advisory_unlock_all()"
+
+
+def test_bulk_load_can_keep_indexes_and_defer_gin_updates(rag):
+    with rag.bulk_load(drop_indexes=False):
+        pass
+
+    assert not any(s.startswith("DROP INDEX") for s in rag.statements)
+    assert any("SET (gin_pending_list_limit = %s)" in s for s in rag.statements)
+    assert any("gin_clean_pending_list" in s for s in rag.statements)
+
+
+def test_restore_indexes_skips_indexes_during_bulk_load(rag):
+    rag.db_manager.get_connection.side_effect = lambda: MagicMock(
+        cursor=lambda **_: RecordingCursor(rag.statements, lock_available=False)
+    )
+
+    rag._restore_indexes()
+
+    assert not any(s.startswith("CREATE INDEX") for s in rag.statements)
+
+
+def test_restore_indexes_is_a_single_read_when_indexes_are_valid(rag):
+    rag.db_manager.execute_query.return_value = [(name,) for name in RAGSystem.SECONDARY_INDEXES]
+
+    rag._restore_indexes()
+
+    assert rag.statements == []
+    rag.db_manager.get_connection.assert_not_called()
+
+
+def test_documents_indexed_during_a_bulk_load_skip_their_recount(rag):
+    rag.db_manager.get_connection.side_effect = lambda: MagicMock(
+        cursor=lambda **_: RecordingCursor(rag.statements, lock_available=False)
+    )
+    rag._annotations_cache = LRUCache(0)
+    block = DocumentBlock(0, "Constat A", BlockMetadata(0, 0, 0, "para", "", (0.0, 0.0, 1.0, 1.0)))
+
+    rag._insert_blocks("letter_1", [block])
+
+    queries = [call.args[0] for call in rag.db_manager.execute_query.call_args_list]
+    assert not any("doc_count" in query or "SELECT DISTINCT content_hash" in query for query in queries)
+    assert rag.db_manager.execute_batch.call_count == 2
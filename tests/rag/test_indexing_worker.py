@@ -0,0 +1,64 @@
+from unittest.mock import MagicMock
+
+import pytest
+from indexing_worker import IndexingWorker
+
+
+@pytest.fixture
+def db_manager():
+    return MagicMock()
+
+
+@pytest.fixture
+def rag_system():
+    rag_system = MagicMock()
+
+    def index_document(pdf_path, document_name_override=None, timings=None):
+        timings.update(parse=0.5, classify=0.1, insert=0.2)
+        return document_name_override
+
+    rag_system.index_document.side_effect = index_document
+    return rag_system
+
+
+@pytest.fixture
+def worker(db_manager, rag_system):
+    return IndexingWorker(
+        worker_id="node-1:42",
+        lease_seconds=30,
+        poll_interval=0.01,
+        db_manager=db_manager,
+        rag_system=rag_system,
+    )
+
+
+def test_run_once_processes_claimed_batches(worker, db_manager, rag_system, tmp_path):
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4")
+    db_manager.claim_indexing_jobs.side_effect = [
+        [{"id": 1, "source_id": 10, "attempts": 1, "name": "a", "path": str(pdf), "url": None}],
+        [],
+    ]
+
+    assert worker.run(once=True) == 1
+
+    rag_system.index_document.assert_called_once()
+    assert rag_system.index_document.call_args.args[0] == str(pdf)
+    job_id, worker_id, timings = db_manager.complete_indexing_job.call_args.args
+    assert (job_id, worker_id) == (1, "node-1:42")
+    assert {"fetch", "parse", "classify", "insert", "total"} <= timings.keys()
+    db_manager.claim_indexing_jobs.assert_called_with("node-1:42", worker.batch_size, 30)
+
+
+def test_failed_job_is_released_with_error(worker, db_manager, rag_system):
+    db_manager.fail_indexing_job.return_value = "pending"
+    job = {"id": 2, "source_id": 11, "attempts": 1, "name": "b", "path": None, "url": None}
+
+    assert worker.process_job(job) is False
+
+    db_manager.complete_indexing_job.assert_not_called()
+    job_id, worker_id, error, timings = db_manager.fail_indexing_job.call_args.args
+    assert (job_id, worker_id) == (2, "node-1:42")
+    assert "no readable path or url" in error
+    assert "total" in timings
+    assert not worker._held
@@ -0,0 +1,65 @@
+from unittest.mock import MagicMock
+
+import pytest
+from content_classifiers import ContentClassifier
+from rag_system import BlockMetadata, DocumentBlock, RAGSystem
+from reclassify import UNCLASSIFIED, Reclassifier, classify_document
+
+LETTER = [
+    "Synthèse de l'inspection",
+    "L'inspection a porté sur l'organisation de la radioprotection.",
+    None,
+    "A. Demandes d'actions correctives",
+    "Je vous demande de transmettre le plan de formation.",
+]
+
+
+def _blocks(contents):
+    return [
+        DocumentBlock(idx, content, BlockMetadata(idx, 0, 0, "para", "", ())) for idx, content in enumerate(contents)
+    ]
+
+
+def test_classify_document_matches_indexing_classification():
+    rag = RAGSystem.__new__(RAGSystem)
+    rag.content_classifier = ContentClassifier()
+    blocks = _blocks(LETTER)
+    rag._classify_blocks(blocks)
+
+    rows = classify_document("letter", list(enumerate(LETTER)))
+
+    expected = [("letter", b.block_idx, b.content_type, b.section_type, b.demand_priority) for b in blocks]
+    assert rows == expected
+    assert rows[2][2:] == UNCLASSIFIED
+    assert any(row[2] == "section_header" for row in rows)
+
+
+def test_classify_document_resets_non_letters():
+    rows = classify_document("report", [(0, "Introduction"), (1, "Résultats")])
+
+    assert rows == [("report", 0, *UNCLASSIFIED), ("report", 1, *UNCLASSIFIED)]
+
+
+@pytest.fixture
+def rag_system():
+    rag_system = MagicMock()
+    documents = {"a": [(0, LETTER[1]), (1, LETTER[4])], "b": [(0, "Texte")]}
+    rag_system.db_manager.execute_query.side_effect = lambda query, params: (
+        [("a",), ("b",)] if "document_classifications" in query else documents[params[0]]
+    )
+    return rag_system
+
+
+def test_run_batches_updates_and_records_version(rag_system):
+    updates = []
+    rag_system.db_manager.execute_values.side_effect = lambda query, rows, **_: updates.append((query, list(rows)))
+    recorded = []
+    rag_system.record_classifier_version.side_effect = lambda names, version: recorded.extend(names)
+    reclassifier = Reclassifier(workers=2, batch_size=1, rag_system=rag_system)
+
+    assert reclassifier.run() == 2
+
+    assert all("FROM (VALUES %s)" in query for query, _ in updates)
+    written = {row[:2] for _, rows in updates for row in rows}
+    assert written == {("a", 0), ("a", 1), ("b", 0)}
+    assert sorted(recorded) == ["a", "b"]
@@ -0,0 +1,206 @@
+import asyncio
+import io
+import json
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+from rag_system import BlockMetadata, DocumentBlock, SherpaDocumentProcessor
+
+LAYOUT_BLOCKS = [
+    {
+        "block_idx": 0,
+        "level": 0,
+        "page_idx": 0,
+        "tag": "header",
+        "block_class": "cls_0",
+        "bbox": [10, 10, 200, 30],
+        "sentences": ["Introduction"],
+    },
+    {
+        "block_idx": 1,
+        "level": 1,
+        "page_idx": 0,
+        "tag": "para",
+        "block_class": "cls_1",
+        "bbox": [10, 40, 200, 80],
+        "sentences": [{"text": "First sentence."}, {"text": "Second sentence."}],
+    },
+    {
+        "block_idx": 2,
+        "level": 1,
+        "page_idx": 1,
+        "tag": "table",
+        "bbox": [10, 10, 200, 100],
+        "table_rows": [
+            {"cells": [{"cell_value": "a"}, {"cell_value": 1}]},
+            {"cell_value": "total"},
+        ],
+    },
+]
+
+
+@pytest.fixture
+def processor():
+    return SherpaDocumentProcessor(sherpa_api_url="http://nlm-ingestor/api/parseDocument")
+
+
+def test_process_sherpa_data_builds_slotted_blocks(processor):
+    blocks = processor._process_sherpa_data(LAYOUT_BLOCKS)
+
+    assert [b.block_idx for b in blocks] == [0, 1, 2]
+    assert blocks[1].content == "First sentence. Second sentence."
+    assert blocks[2].content == "a | 1\ntotal\n"
+    assert blocks[0].metadata.bbox == (10.0, 10.0, 200.0, 30.0)
+    assert blocks[2].metadata.block_class == ""
+    assert blocks[0].content_type == "regular"
+
+    for block in blocks:
+        assert not hasattr(block, "__dict__")
+        assert not hasattr(block.metadata, "__dict__")
+
+
+def test_process_sherpa_data_accepts_json_and_iterators(processor):
+    from_json = processor._process_sherpa_data(json.dumps(LAYOUT_BLOCKS))
+    from_iter = processor._process_sherpa_data(iter(LAYOUT_BLOCKS))
+
+    assert from_json == from_iter
+
+
+def test_process_sherpa_data_establishes_hierarchy(processor):
+    blocks = processor._process_sherpa_data(LAYOUT_BLOCKS)
+
+    assert blocks[0].parent_idx is None
+    assert blocks[1].parent_idx == 0
+    assert blocks[2].parent_idx == 0
+
+
+def test_process_sherpa_data_rejects_invalid_json(processor):
+    with pytest.raises(ValueError, match="Invalid JSON"):
+        processor._process_sherpa_data("not json")
+
+
+def test_process_pdf_streams_parser_response(processor, tmp_path):
+    pdf_path = tmp_path / "doc.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+    body = json.dumps({"return_dict": {"result": {"blocks": LAYOUT_BLOCKS}}}).encode()
+
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.raw = io.BytesIO(body)
+
+    with patch("rag_system.requests.post", return_value=response) as post:
+        blocks = processor.process_pdf(str(pdf_path))
+
+    post.assert_called_once()
+    assert post.call_args.kwargs["stream"] is True
+    assert [b.content for b in blocks][0] == "Introduction"
+    assert isinstance(blocks[0], DocumentBlock)
+    assert isinstance(blocks[0].metadata, BlockMetadata)
+
+
+def test_process_pdf_wraps_parser_errors(processor, tmp_path):
+    pdf_path = tmp_path / "doc.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+
+    with patch("rag_system.requests.post", side_effect=ConnectionError("refused")):
+        with pytest.raises(ValueError, match="Error processing PDF with llmsherpa"):
+            processor.process_pdf(str(pdf_path))
+
+
+def test_page_ranges_cover_document():
+    from pdf_chunking import page_ranges
+
+    assert page_ranges(5, 2) == [(0, 2), (2, 4), (4, 5)]
+    assert page_ranges(2, 50) == [(0, 2)]
+    with pytest.raises(ValueError):
+        page_ranges(10, 0)
+
+
+def test_fanout_stitches_chunks_with_global_indices(processor):
+    chunk_a = [
+        {"block_idx": 0, "level": 0, "page_idx": 0, "tag": "header", "bbox": [0, 5, 1, 6], "sentences": ["Section"]},
+        {"block_idx": 1, "level": 1, "page_idx": 1, "tag": "para", "bbox": [0, 5, 1, 6], "sentences": ["Body A"]},
+    ]
+    chunk_b = [
+        {"block_idx": 0, "level": 1, "page_idx": 0, "tag": "para", "bbox": [0, 5, 1, 6], "sentences": ["Body B"]},
+        {
+            "block_idx": 1,
+            "level": 0,
+            "page_idx": 1,
+            "tag": "header",
+            "bbox": [0, 5, 1, 6],
+            "sentences": ["Next section"],
+        },
+    ]
+    responses = {"p0-2": chunk_a, "p2-4": chunk_b}
+
+    def handler(request):
+        body = request.content.decode("latin-1")
+        key = "p0-2" if "_p0-2.pdf" in body else "p2-4"
+        return httpx.Response(200, json={"return_dict": {"result": {"blocks": responses[key]}}})
+
+    real_client = httpx.AsyncClient
+    splitter = MagicMock(extract=MagicMock(return_value=b"%PDF-1.4"))
+
+    def client_factory(**kwargs):
+        return real_client(transport=httpx.MockTransport(handler), **kwargs)
+
+    with (
+        patch("rag_system.httpx.AsyncClient", side_effect=client_factory),
+    ):
+        blocks = asyncio.run(processor.aprocess_page_ranges("big.pdf", [(0, 2), (2, 4)], splitter))
+    processor._establish_hierarchy(blocks)
+
+    assert [b.block_idx for b in blocks] == [0, 1, 2, 3]
+    assert [b.metadata.page_idx for b in blocks] == [0, 1, 2, 3]
+    # The first block of the second chunk continues the section opened in the first chunk
+    assert blocks[2].content == "Body B"
+    assert blocks[2].parent_idx == 0
+    assert blocks[3].parent_idx is None
+
+
+def test_fanout_retries_server_errors(processor):
+    processor.max_retries = 2
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"return_dict": {"result": {"blocks": LAYOUT_BLOCKS}}})
+
+    real_client = httpx.AsyncClient
+    splitter = MagicMock(extract=MagicMock(return_value=b"%PDF-1.4"))
+
+    def client_factory(**kwargs):
+        return real_client(transport=httpx.MockTransport(handler), **kwargs)
+
+    with (
+        patch("rag_system.httpx.AsyncClient", side_effect=client_factory),
+        patch("rag_system.wait_exponential", return_value=lambda retry_state: 0),
+    ):
+        blocks = asyncio.run(processor.aprocess_page_ranges("big.pdf", [(0, 3)], splitter))
+
+    assert len(calls) == 2
+    assert len(blocks) == len(LAYOUT_BLOCKS)
+
+
+def test_fanout_parses_the_pdf_once_for_all_ranges(processor, tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    writer = pypdf.PdfWriter()
+    for _ in range(5):
+        writer.add_blank_page(612, 792)
+    pdf_path = tmp_path / "big.pdf"
+    with open(pdf_path, "wb") as pdf:
+        writer.write(pdf)
+    processor.fanout_min_pages = 3
+    processor.fanout_chunk_pages = 2
+
+    with patch("pdf_chunking.PdfReader", wraps=pypdf.PdfReader) as reader:
+        splitter, ranges = processor._fanout_page_ranges(str(pdf_path))
+        chunks = [splitter.extract(start, end) for start, end in ranges]
+
+    assert reader.call_count == 1
+    assert ranges == [(0, 2), (2, 4), (4, 5)]
+    assert [len(pypdf.PdfReader(io.BytesIO(chunk)).pages) for chunk in chunks] == [2, 2, 1]
@@ -0,0 +1,73 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from admission import AdmissionController, AdmissionRejected
+
+
+async def _admitted(admission):
+    positions = [position async for position in admission.wait()]
+    return positions
+
+
+@pytest.mark.asyncio
+async def test_the_user_with_fewest_runs_goes_first():
+    controller = AdmissionController(max_running=1, max_running_per_user=0, queue_timeout=5)
+    a1 = controller.enqueue("a")
+    a2, a3 = controller.enqueue("a"), controller.enqueue("a")
+    b1 = controller.enqueue("b")
+
+    assert [controller.position(run._waiter) for run in (a1, b1, a2, a3)] == [None, 1, 2, 3]
+
+    waiting_b = asyncio.create_task(_admitted(b1))
+    await asyncio.sleep(0)
+    a1.release()
+    assert await waiting_b == [1]
+    assert controller.stats() == {"running": 1, "queued": 2, "users_running": 1, "users_queued": 1}
+
+    b1.release()
+    assert await _admitted(a2) == []
+    assert controller.position(a3._waiter) == 1
+
+
+@pytest.mark.asyncio
+async def test_full_queues_are_refused_at_once():
+    controller = AdmissionController(max_running=1, max_running_per_user=1, max_queued=2, max_queued_per_user=1)
+    controller.enqueue("a")
+    controller.enqueue("a")
+    with pytest.raises(AdmissionRejected) as user_limit:
+        controller.enqueue("a")
+    controller.enqueue("b")
+    with pytest.raises(AdmissionRejected) as queue_full:
+        controller.enqueue("c")
+
+    assert user_limit.value.status_code == 429
+    assert queue_full.value.status_code == 503
+    assert queue_full.value.retry_after >= 1
+
+
+@pytest.mark.asyncio
+async def test_runs_leave_the_queue_when_they_wait_too_long():
+    controller = AdmissionController(max_running=1, queue_timeout=0.01)
+    running = controller.enqueue("a")
+    waiting = controller.enqueue("b")
+
+    with pytest.raises(AdmissionRejected) as timed_out:
+        await _admitted(waiting)
+
+    assert timed_out.value.status_code == 503
+    assert controller.stats()["queued"] == 0
+    running.release()
+    waiting.release()
+    assert controller.stats()["running"] == 0
+
+
+def test_overloaded_runs_get_retry_after(test_client):
+    busy = AdmissionRejected("The service is busy, please retry later.", 503, 7)
+    with patch("service.service.admission.enqueue", side_effect=busy):
+        invoke = test_client.post("/invoke", json={"message": "hi"})
+        stream = test_client.post("/stream", json={"message": "hi"})
+
+    for response in (invoke, stream):
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "7"
@@ -0,0 +1,57 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from service.body_limit import BodySizeLimitMiddleware
+
+
+def _client(received: list[int]):
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_size=100, applies_to=lambda path: path.endswith("/upload"))
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        body = await request.body()
+        received.append(len(body))
+        return {"size": len(body)}
+
+    @app.post("/other")
+    async def other(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+
+def test_bodies_within_the_limit_reach_the_endpoint():
+    received = []
+    response = _client(received).post("/upload", content=b"x" * 100)
+
+    assert response.status_code == 200
+    assert received == [100]
+
+
+def test_declared_oversized_bodies_are_refused_before_the_endpoint():
+    received = []
+    response = _client(received).post("/upload", content=b"x" * 101)
+
+    assert response.status_code == 413
+    assert "100 bytes" in response.json()["detail"]
+    assert received == []
+
+
+def test_streamed_bodies_are_cut_off_once_over_the_limit():
+    received = []
+
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 40
+
+    # No Content-Length: the size is only known while receiving
+    response = _client(received).post("/upload", content=chunks())
+
+    assert response.status_code == 413
+    assert received == []
+
+
+def test_other_paths_are_not_limited():
+    response = _client([]).post("/other", content=b"x" * 1000)
+
+    assert response.json() == {"size": 1000}
@@ -1,5 +1,5 @@
 import json
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import langsmith
 import pytest
@@ -9,6 +9,7 @@ from langgraph.pregel.types import StateSnapshot
 from langgraph.types import Interrupt
 from schema import ChatHistory, ChatMessage, ServiceMetadata
 from schema.models import OpenAIModelName
+from service.service import _inflight_streams, _TokenCoalescer
 
 
 def test_invoke(test_client, mock_agent) -> None:
@@ -177,11 +178,13 @@ def test_history(test_client, mock_agent) -> None:
         created_at=None,
         parent_config=None,
         tasks=(),
+        interrupts=(),
     )
 
-    response = test_client.post(
-        "/history", json={"thread_id": "7bcc7cc1-99d7-4b1d-bdb5-e6f90ed44de6"}
-    )
+    with patch("service.service.latest_checkpoint_id", Mock(return_value=None)):
+        response = test_client.post(
+            "/history", json={"thread_id": "7bcc7cc1-99d7-4b1d-bdb5-e6f90ed44de6"}
+        )
     assert response.status_code == 200
 
     output = ChatHistory.model_validate(response.json())
@@ -191,6 +194,67 @@ def test_history(test_client, mock_agent) -> None:
     assert output.messages[1].content == ANSWER
 
 
+def test_history_pages_feedback_by_run_and_etag(test_client, mock_agent) -> None:
+    messages = []
+    for turn in range(3):
+        messages.append(HumanMessage(content=f"Question {turn}", id=f"run-input-run{turn}"))
+        messages.append(AIMessage(content=f"Answer {turn}"))
+    mock_agent.get_state.return_value = StateSnapshot(
+        values={"messages": messages},
+        next=(),
+        config={"configurable": {"checkpoint_id": "cp-1"}},
+        metadata=None,
+        created_at=None,
+        parent_config=None,
+        tasks=(),
+        interrupts=(),
+    )
+    feedbacks = [
+        {"id": 1, "run_id": "run2", "score": 1.0, "additional_data": {"comment": "Great"}},
+        {"id": 2, "run_id": "run1", "score": 0.2, "additional_data": {"comment": "Wrong"}},
+    ]
+    db_manager = Mock()
+    db_manager.get_feedbacks_for_conversation.return_value = feedbacks
+    body = {"thread_id": "7bcc7cc1-99d7-4b1d-bdb5-e6f90ed44de6", "limit": 2}
+
+    with (
+        patch("service.service.get_db_manager", Mock(return_value=db_manager)),
+        patch("service.service.latest_checkpoint_id", Mock(return_value="cp-1")) as checkpoint,
+    ):
+        response = test_client.post("/history", json=body)
+        output = ChatHistory.model_validate(response.json())
+        assert [m.content.split("\n")[0] for m in output.messages] == ["Question 2", "Answer 2"]
+        assert output.messages[1].run_id == "run2"
+        assert "*Great*" in output.messages[1].content
+        assert output.next_cursor == 4
+
+        older = test_client.post("/history", json={**body, "before": output.next_cursor})
+        older_output = ChatHistory.model_validate(older.json())
+        assert [m.content.split("\n")[0] for m in older_output.messages] == [
+            "Question 1",
+            "Answer 1",
+        ]
+        assert "*Wrong*" in older_output.messages[1].content
+        assert older.headers["ETag"] != response.headers["ETag"]
+
+        etag = response.headers["ETag"]
+        mock_agent.get_state.reset_mock()
+        unchanged = test_client.post("/history", json=body, headers={"If-None-Match": etag})
+        assert unchanged.status_code == 304
+        mock_agent.get_state.assert_not_called()
+
+        checkpoint.return_value = "cp-2"
+        answered = test_client.post("/history", json=body, headers={"If-None-Match": etag})
+        assert answered.status_code == 200
+        config = mock_agent.get_state.call_args.kwargs["config"]
+        assert config["configurable"]["checkpoint_id"] == "cp-2"
+        checkpoint.return_value = "cp-1"
+
+        feedbacks.append({"id": 3, "run_id": "run2", "score": 0.6, "additional_data": {}})
+        changed = test_client.post("/history", json=body, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+
+
 @pytest.mark.asyncio
 async def test_stream(test_client, mock_agent) -> None:
     """Test streaming tokens and messages."""
@@ -233,11 +297,15 @@ async def test_stream(test_client, mock_agent) -> None:
             if line and line.strip() != "data: [DONE]":  # Skip [DONE] message
                 messages.append(json.loads(line.lstrip("data: ")))
 
-        # Verify streamed tokens
+        # Metadata comes once, first, and is not repeated in the other events
+        assert messages[0]["type"] == "metadata"
+        assert [msg for msg in messages if msg["type"] == "metadata"] == messages[:1]
+        assert all("additional_data" not in msg for msg in messages[1:])
+
+        # Verify streamed tokens, coalesced into fewer frames
         token_messages = [msg for msg in messages if msg["type"] == "token"]
-        assert len(token_messages) == len(TOKENS)
-        for i, msg in enumerate(token_messages):
-            assert msg["content"] == TOKENS[i]
+        assert 1 <= len(token_messages) <= len(TOKENS)
+        assert "".join(msg["content"] for msg in token_messages) == "".join(TOKENS)
 
         # Verify final message
         final_messages = [msg for msg in messages if msg["type"] == "message"]
@@ -246,6 +314,50 @@ async def test_stream(test_client, mock_agent) -> None:
         assert final_messages[0]["content"]["type"] == "ai"
 
 
+def test_stream_counts_ai_messages_after_a_supervisor_update(test_client, mock_agent) -> None:
+    events = [
+        (
+            "updates",
+            {"supervisor": {"messages": [HumanMessage(content="hi"), AIMessage(content="routing")]}},
+        ),
+        ("updates", {"chat_model": {"messages": [AIMessage(content="answer")]}}),
+    ]
+
+    async def mock_astream(**kwargs):
+        for event in events:
+            yield event
+
+    mock_agent.astream = mock_astream
+
+    with (
+        patch("service.service._record_run_usage") as record_run_usage,
+        test_client.stream("POST", "/stream", json={"message": "hi", "stream_tokens": False}) as response,
+    ):
+        messages = [
+            json.loads(line.removeprefix("data: ")) for line in response.iter_lines() if line and line != "data: [DONE]"
+        ]
+
+    assert not [msg for msg in messages if msg["type"] == "error"]
+    assert [msg["content"]["content"] for msg in messages if msg["type"] == "message"] == ["routing", "answer"]
+    assert record_run_usage.call_args.args[1] == 2
+
+def test_stream_on_a_thread_is_shared_while_running(test_client, mock_agent) -> None:
+    """Requests to an existing thread go through the shared run, forgotten once it ends."""
+
+    async def mock_astream(**kwargs):
+        yield ("updates", {"chat_model": {"messages": [AIMessage(content="Done.")]}})
+
+    mock_agent.astream = mock_astream
+    body = {"message": "Hi", "thread_id": "7bcc7cc1-99d7-4b1d-bdb5-e6f90ed44de6"}
+
+    response = test_client.post("/stream", json=body)
+
+    events = [line for line in response.text.split("\n\n") if line]
+    assert events[-1] == "data: [DONE]"
+    assert json.loads(events[1].removeprefix("data: "))["content"]["content"] == "Done."
+    assert _inflight_streams == {}
+
+
 @pytest.mark.asyncio
 async def test_stream_no_tokens(test_client, mock_agent) -> None:
     """Test streaming without tokens."""
@@ -287,6 +399,7 @@ async def test_stream_no_tokens(test_client, mock_agent) -> None:
         for line in response.iter_lines():
             if line and line.strip() != "data: [DONE]":  # Skip [DONE] message
                 messages.append(json.loads(line.lstrip("data: ")))
+        messages = [msg for msg in messages if msg["type"] != "metadata"]
 
         # Verify no token messages
         token_messages = [msg for msg in messages if msg["type"] == "token"]
@@ -299,6 +412,96 @@ async def test_stream_no_tokens(test_client, mock_agent) -> None:
         assert messages[0]["content"]["type"] == "ai"
 
 
+
+def test_upload_streams_the_file_to_the_blob_store(test_client, tmp_path) -> None:
+    from blob_store import LocalBlobStore
+    from upload_jobs import UploadJob
+
+    store = LocalBlobStore(tmp_path / "blobs")
+    content = b"line of text\n" * 10_000
+    upload = {"params": {"user_id": "user-1"}, "files": {"file": ("notes.txt", content, "text/plain")}}
+    with (
+        patch("service.service.get_blob_store", return_value=store),
+        patch("service.service.upload_jobs.submit") as submit,
+        patch(
+            "service.service.upload_jobs.snapshot",
+            side_effect=lambda job_id: UploadJob("notes.txt", "user-1", job_id=job_id).to_dict(),
+        ),
+    ):
+        response = test_client.post("/upload", **upload)
+        with patch("service.service.UPLOAD_MAX_BYTES", 1000):
+            too_large = test_client.post("/upload", **upload)
+
+    assert response.status_code == 202
+    # Stored before the job runs; the job only gets the blob's address
+    blob = submit.call_args.args[1].keywords["blob"]
+    assert blob.size == len(content)
+    assert store.open(blob.sha256).read() == content
+    assert too_large.status_code == 413
+    assert submit.call_count == 1
+    assert list(store.iter_digests()) == [blob.sha256]
+
+
+def test_upload_jobs_are_only_shown_to_their_owner(test_client) -> None:
+    from upload_jobs import UploadJob
+
+    job = UploadJob("notes.txt", "user-1")
+    with patch("service.service.upload_jobs.snapshot", return_value=job.to_dict()):
+        anonymous = test_client.get(f"/upload/jobs/{job.job_id}")
+        anonymous_events = test_client.get(f"/upload/jobs/{job.job_id}/events")
+        other_user = test_client.get(f"/upload/jobs/{job.job_id}", params={"user_id": "user-2"})
+        owner = test_client.get(f"/upload/jobs/{job.job_id}", params={"user_id": "user-1"})
+
+    assert anonymous.status_code == anonymous_events.status_code == 400
+    assert other_user.status_code == 404
+    assert owner.json()["filename"] == "notes.txt"
+
+
+def test_upload_jobs_of_other_workers_are_read_from_the_database(test_client) -> None:
+    from upload_jobs import UploadJob
+
+    job = UploadJob("notes.txt", "user-1", status="succeeded")
+    db_manager = Mock(get_upload_job=AsyncMock(return_value=job.to_dict()))
+    with patch("service.service.get_async_db_manager", return_value=db_manager):
+        response = test_client.get(f"/upload/jobs/{job.job_id}", params={"user_id": "user-1"})
+        events = test_client.get(f"/upload/jobs/{job.job_id}/events", params={"user_id": "user-1"})
+
+    assert response.json()["status"] == "succeeded"
+    assert f'"job_id": "{job.job_id}"' in events.text
+    assert events.text.endswith("data: [DONE]\n\n")
+
+
+def test_upload_job_fails_when_indexing_fails_but_not_when_extraction_does(tmp_path, monkeypatch) -> None:
+    from blob_store import LocalBlobStore
+    from service.service import _process_upload
+    from upload_jobs import UploadJob
+
+    store = LocalBlobStore(tmp_path / "blobs")
+    blob = store.put(b"%PDF-1.7 not really a pdf")
+    db_manager = Mock()
+    rag_system = Mock()
+    rag_system.index_document.side_effect = RuntimeError("ingestor unreachable")
+    monkeypatch.setattr("service.service.get_blob_store", lambda: store)
+    monkeypatch.setattr("service.service.get_db_manager", lambda: db_manager)
+    monkeypatch.setattr("service.service.get_rag_system", lambda: rag_system)
+
+    def process():
+        job = UploadJob("letter.pdf", "user-1")
+        return _process_upload(
+            job, Mock(), blob=blob, content_type="application/pdf", agent_id="agent", loop=Mock()
+        )
+
+    monkeypatch.setenv("UPLOADED_PDF_PARSER", "nlm-ingestor")
+    with pytest.raises(RuntimeError, match="ingestor unreachable"):
+        process()
+    db_manager.save_file.assert_not_called()
+
+    # Unreadable text is logged, and the file kept without it
+    monkeypatch.setenv("UPLOADED_PDF_PARSER", "pypdf")
+    process()
+    assert db_manager.save_file.call_args.kwargs["text_content"] is None
+
+
 def test_stream_interrupt(test_client, mock_agent) -> None:
     QUESTION = "What is the weather in Tokyo?"
     INTERRUPT = "Confirm weather check"
@@ -327,6 +530,7 @@ def test_stream_interrupt(test_client, mock_agent) -> None:
         for line in response.iter_lines():
             if line and line.strip() != "data: [DONE]":  # Skip [DONE] message
                 messages.append(json.loads(line.lstrip("data: ")))
+        messages = [msg for msg in messages if msg["type"] != "metadata"]
 
         # Verify interrupt message
         assert len(messages) == 1
@@ -334,6 +538,20 @@ def test_stream_interrupt(test_client, mock_agent) -> None:
         assert messages[0]["content"]["type"] == "ai"
 
 
+def test_token_coalescer_joins_tokens_within_a_window() -> None:
+    tokens = _TokenCoalescer(window=60, max_chars=10)
+
+    assert tokens.add("Hello") == "Hello"  # nothing sent yet: no wait for the first token
+    assert tokens.add(" wor") is None
+    assert tokens.add("ld, and") == " world, and"  # max_chars reached
+    assert tokens.add(" more") is None
+    assert tokens.flush() == " more"
+    assert tokens.flush() is None
+
+    unbuffered = _TokenCoalescer(window=0, max_chars=64)
+    assert [unbuffered.add(t) for t in ("a", "b")] == ["a", "b"]
+
+
 def test_info(test_client, mock_settings) -> None:
     """Test that /info returns the correct service metadata."""
 
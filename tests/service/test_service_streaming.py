@@ -1,6 +1,8 @@
+import asyncio
+
 import pytest
 from langchain_core.messages import AIMessage
-from service.service import _create_ai_message
+from service.service import _create_ai_message, _SharedStream
 
 
 @pytest.mark.parametrize(
@@ -55,3 +57,50 @@ def test_create_ai_message_empty_dict_raises():
     """
     with pytest.raises(TypeError):
         _create_ai_message({})
+
+
+@pytest.mark.asyncio
+async def test_duplicate_streams_follow_one_run():
+    started = []
+    release = asyncio.Event()
+
+    async def events():
+        started.append(True)
+        yield b"data: first\n\n"
+        await release.wait()
+        yield b"data: [DONE]\n\n"
+
+    done = []
+    shared = _SharedStream(events(), on_done=lambda: done.append(True))
+
+    async def collect():
+        return [event async for event in shared.follow()]
+
+    first, second = asyncio.create_task(collect()), asyncio.create_task(collect())
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await first == await second == [b"data: first\n\n", b"data: [DONE]\n\n"]
+    assert started == [True]
+    await asyncio.sleep(0)
+    assert done == [True]
+
+
+@pytest.mark.asyncio
+async def test_shared_stream_is_cancelled_when_nobody_follows_it():
+    cancelled = asyncio.Event()
+
+    async def events():
+        try:
+            yield b"data: first\n\n"
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    shared = _SharedStream(events(), on_done=lambda: None)
+    follower = shared.follow()
+    assert await anext(follower) == b"data: first\n\n"
+    await follower.aclose()
+
+    await asyncio.wait_for(cancelled.wait(), 1)
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+
+import pytest
+from upload_jobs import UploadJob, UploadJobManager, UploadQueueFullError
+
+
+@pytest.fixture
+def manager():
+    manager = UploadJobManager(max_workers=1, max_pending=2)
+    yield manager
+    manager.shutdown(wait=True)
+
+
+def _wait_finished(manager, job, timeout=5):
+    async def collect():
+        return [snapshot async for snapshot in manager.watch(job.job_id, poll_interval=0.01)]
+
+    return asyncio.run(asyncio.wait_for(collect(), timeout))
+
+
+def test_job_reports_progress_and_result(manager):
+    def work(job, report):
+        report("indexing", 0.5)
+        return {"file_id": str(job.file_id)}
+
+    job = manager.submit(UploadJob(filename="doc.pdf", user_id="u1"), work)
+    snapshots = _wait_finished(manager, job)
+
+    final = snapshots[-1]
+    assert final["status"] == "succeeded"
+    assert final["progress"] == 1.0
+    assert final["result"] == {"file_id": str(job.file_id)}
+    assert manager.snapshot(job.job_id)["job_id"] == str(job.job_id)
+
+
+def test_failed_job_records_error(manager):
+    def work(job, report):
+        raise ValueError("parser unavailable")
+
+    job = manager.submit(UploadJob(filename="doc.pdf", user_id="u1"), work)
+    final = _wait_finished(manager, job)[-1]
+
+    assert final["status"] == "failed"
+    assert final["error"] == "parser unavailable"
+
+
+def test_submit_rejects_when_pool_is_full(manager):
+    release = threading.Event()
+
+    def blocking(job, report):
+        release.wait(5)
+        return {}
+
+    first = manager.submit(UploadJob(filename="a.pdf", user_id="u1"), blocking)
+    manager.submit(UploadJob(filename="b.pdf", user_id="u1"), blocking)
+    with pytest.raises(UploadQueueFullError):
+        manager.submit(UploadJob(filename="c.pdf", user_id="u1"), blocking)
+
+    release.set()
+    _wait_finished(manager, first)
+
+
+def test_unknown_job_has_no_snapshot(manager):
+    job = UploadJob(filename="a.pdf", user_id="u1")
+
+    assert manager.snapshot(job.job_id) is None
+    assert _wait_finished(manager, job) == []
+
+
+class FakeStore:
+    """The upload_jobs table as seen by every worker: keeps the latest version of each job."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.pruned = []
+
+    def save_upload_job(self, job_id, version, snapshot):
+        if job_id not in self.jobs or self.jobs[job_id][0] < version:
+            self.jobs[job_id] = (version, snapshot)
+
+    def delete_finished_upload_jobs(self, retention_seconds):
+        self.pruned.append(retention_seconds)
+        return 0
+
+    async def load(self, job_id):
+        return self.jobs[job_id][1] if job_id in self.jobs else None
+
+
+def test_job_states_are_shared_with_other_workers():
+    store = FakeStore()
+    worker = UploadJobManager(max_workers=1, max_pending=2, retention_seconds=60, store=lambda: store)
+    other_worker = UploadJobManager(max_workers=1, max_pending=2)
+    release = threading.Event()
+
+    def work(job, report):
+        report("indexing", 0.5)
+        release.wait(5)
+        return {"file_id": str(job.file_id)}
+
+    job = worker.submit(UploadJob(filename="doc.pdf", user_id="u1"), work)
+    assert store.jobs[job.job_id][1]["status"] in ("queued", "running")
+    assert store.pruned == [60]
+
+    async def follow():
+        snapshots = []
+        async for snapshot in other_worker.watch(job.job_id, poll_interval=0.01, load=store.load):
+            snapshots.append(snapshot)
+            release.set()
+        return snapshots
+
+    snapshots = asyncio.run(asyncio.wait_for(follow(), 5))
+    worker.shutdown(wait=True)
+
+    assert other_worker.snapshot(job.job_id) is None
+    assert snapshots[-1] == worker.snapshot(job.job_id)
+    assert snapshots[-1]["status"] == "succeeded"
+    # Each change is yielded once
+    assert len(snapshots) == len({str(snapshot) for snapshot in snapshots})
+
+
+def test_unreachable_store_does_not_fail_the_job():
+    def unreachable():
+        raise ConnectionError("database unreachable")
+
+    manager = UploadJobManager(max_workers=1, max_pending=2, store=unreachable)
+    job = manager.submit(UploadJob(filename="doc.pdf", user_id="u1"), lambda job, report: {})
+
+    assert _wait_finished(manager, job)[-1]["status"] == "succeeded"
+    manager.shutdown(wait=True)